@@ -0,0 +1,18 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+
+Throughput benchmarks of the parsers of ``tc ... show`` outputs.
+Run with ``python -m benchmarks --help``.
+"""
+
+from ._generator import TcShowOutputGenerator
+from ._runner import BenchmarkResult, BenchmarkTarget, find_regressions, run_benchmark
+
+
+__all__ = (
+    "BenchmarkResult",
+    "BenchmarkTarget",
+    "TcShowOutputGenerator",
+    "find_regressions",
+    "run_benchmark",
+)
@@ -0,0 +1,154 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import argparse
+import json
+import sys
+
+from ._runner import BenchmarkTarget, find_regressions, run_benchmark
+
+
+DEFAULT_NUM_RULES = (10, 1000, 10000, 50000)
+
+# targets that outputs do not change whether filters use marks or not
+_MARK_INDEPENDENT_TARGETS = (BenchmarkTarget.QDISC, BenchmarkTarget.CLASS)
+
+
+def parse_option():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="""
+Measure the parsers of 'tc qdisc/class/filter show' outputs with generated outputs.
+Commands are not executed: no root privileges required.
+""",
+        epilog="""
+examples:
+  python -m benchmarks --output baseline.json
+  python -m benchmarks --baseline baseline.json --tolerance 0.2
+""",
+    )
+
+    parser.add_argument(
+        "--target",
+        dest="targets",
+        nargs="+",
+        choices=BenchmarkTarget.LIST,
+        default=list(BenchmarkTarget.LIST),
+        help="parsers to measure. defaults to all of the parsers.",
+    )
+    parser.add_argument(
+        "--rules",
+        dest="num_rules_list",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_NUM_RULES),
+        help="the numbers of shaping rules. defaults to %(default)s.",
+    )
+    parser.add_argument(
+        "--ip-version",
+        dest="ip_versions",
+        type=int,
+        nargs="+",
+        choices=(4, 6),
+        default=[4, 6],
+        help="IP versions of the shaping rules. defaults to %(default)s.",
+    )
+    parser.add_argument(
+        "--mark",
+        dest="mark_modes",
+        nargs="+",
+        choices=("off", "on"),
+        default=["off", "on"],
+        help="""classify packets by u32 filters (off) and/or by fw filters with marks of
+        iptables (on). defaults to %(default)s.""",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="the number of measurements of each condition: the best one is reported.",
+    )
+    parser.add_argument("--output", help="write the results to a JSON file.")
+    parser.add_argument(
+        "--baseline",
+        help="""compare the results with the results of a JSON file that written by --output.
+        exit with a non-zero code if any of the results regressed.""",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="""acceptable ratio of the degradation from the baseline for both throughput
+        and peak memory. defaults to %(default)s.""",
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    options = parse_option()
+
+    print(
+        "{:<14s} {:>4s} {:>5s} {:>7s} {:>10s} {:>14s} {:>14s}".format(
+            "target", "ip", "mark", "rules", "elapsed[s]", "rules/sec", "peak mem[KiB]"
+        )
+    )
+
+    results = []
+    for target in options.targets:
+        for ip_version in options.ip_versions:
+            for mark_mode in options.mark_modes:
+                is_mark = mark_mode == "on"
+                if is_mark and target in _MARK_INDEPENDENT_TARGETS:
+                    continue
+
+                for num_rules in options.num_rules_list:
+                    result = run_benchmark(
+                        target,
+                        num_rules,
+                        ip_version=ip_version,
+                        is_mark=is_mark,
+                        repeat=options.repeat,
+                    )
+                    results.append(result._asdict())
+
+                    print(
+                        "{:<14s} {:>4s} {:>5s} {:>7d} {:>10.3f} {:>14.1f} {:>14.1f}".format(
+                            target,
+                            f"v{ip_version:d}",
+                            mark_mode,
+                            num_rules,
+                            result.elapsed,
+                            result.rules_per_sec,
+                            result.peak_memory / 1024,
+                        ),
+                        flush=True,
+                    )
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump({"results": results}, f, indent=4)
+
+    if not options.baseline:
+        return 0
+
+    with open(options.baseline) as f:
+        baseline_results = json.load(f)["results"]
+
+    regressions = find_regressions(results, baseline_results, options.tolerance)
+    if regressions:
+        print(f"\n{len(regressions):d} regression(s) found:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression:s}", file=sys.stderr)
+
+        return 1
+
+    print("\nno regressions found")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
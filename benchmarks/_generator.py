@@ -0,0 +1,187 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import ipaddress
+
+
+class TcShowOutputGenerator:
+    """
+    Generate outputs of ``tc qdisc/class/filter show`` commands (and the mangle table of
+    ``iptables``) for a device that has shaping rules like ``tcset`` adds:
+    a HTB class and a netem qdisc per rule, and a filter per rule that classifies packets
+    by the destination network/port (``u32`` filters) or by the mark of ``iptables``
+    (``fw`` filters).
+    """
+
+    QDISC_MAJOR_ID = 0x1A1A
+    __MIN_NETEM_MAJOR_ID = 0x2000
+    __MIN_MARK_ID = 101
+
+    # the number of the buckets of a u32 hash table: 12 bits of node ids
+    __HT_BUCKET_SIZE = 0x800
+
+    @property
+    def num_rules(self):
+        return self.__num_rules
+
+    @property
+    def ip_version(self):
+        return self.__ip_version
+
+    @property
+    def is_mark(self):
+        return self.__is_mark
+
+    def __init__(self, num_rules, ip_version=4, is_mark=False):
+        if not (0 < num_rules <= 0xFFFF - self.__MIN_NETEM_MAJOR_ID):
+            raise ValueError(f"the number of rules out of range: {num_rules}")
+
+        if ip_version not in (4, 6):
+            raise ValueError(f"invalid ip version: {ip_version}")
+
+        self.__num_rules = num_rules
+        self.__ip_version = ip_version
+        self.__is_mark = is_mark
+
+    def get_dst_network(self, rule_idx):
+        if self.__ip_version == 6:
+            return str(ipaddress.IPv6Network((0x20010DB8 << 96 | rule_idx << 80, 48)))
+
+        return f"10.{rule_idx >> 8 & 0xFF:d}.{rule_idx & 0xFF:d}.0/24"
+
+    def get_dst_port(self, rule_idx):
+        return 1024 + rule_idx % 60000
+
+    def to_qdisc_text(self):
+        lines = [
+            f"qdisc htb {self.QDISC_MAJOR_ID:x}: root refcnt 2 r2q 10 default 1 "
+            "direct_packets_stat 0 direct_qlen 1000"
+        ]
+
+        for rule_idx in range(self.__num_rules):
+            lines.append(
+                f"qdisc netem {self.__get_netem_major_id(rule_idx):x}: "
+                f"parent {self.__get_classid(rule_idx):s} limit 1000 "
+                f"delay {rule_idx % 100 + 1:d}.0ms  1.0ms loss {rule_idx % 10:d}.1%"
+            )
+
+        return "\n".join(lines)
+
+    def to_class_text(self):
+        lines = [
+            f"class htb {self.QDISC_MAJOR_ID:x}:1 root rate 1Gbit ceil 1Gbit "
+            "burst 1375b cburst 1375b"
+        ]
+
+        for rule_idx in range(self.__num_rules):
+            lines.append(
+                f"class htb {self.__get_classid(rule_idx):s} parent {self.QDISC_MAJOR_ID:x}:1 "
+                f"leaf {self.__get_netem_major_id(rule_idx):x}: prio 0 "
+                f"rate {rule_idx % 1000 + 1:d}Mbit ceil {rule_idx % 1000 + 1:d}Mbit "
+                "burst 1600b cburst 1600b"
+            )
+
+        return "\n".join(lines)
+
+    def to_filter_text(self):
+        if self.__is_mark:
+            return self.__to_fw_filter_text()
+
+        return self.__to_u32_filter_text()
+
+    def to_iptables_text(self):
+        """
+        :return:
+            Output of ``iptables -t mangle --line-numbers -L`` that has mark entries of
+            the ``fw`` filters. Empty chains if the generator does not use marks.
+        """
+
+        lines = [
+            "Chain PREROUTING (policy ACCEPT)",
+            "num  target     prot opt source               destination",
+            "",
+            "Chain OUTPUT (policy ACCEPT)",
+            "num  target     prot opt source               destination",
+        ]
+
+        if not self.__is_mark:
+            return "\n".join(lines)
+
+        for rule_idx in range(self.__num_rules):
+            lines.append(
+                f"{rule_idx + 1:<4d} MARK       all  --  anywhere             "
+                f"{self.get_dst_network(rule_idx):20s} "
+                f"MARK set {self.__get_mark_id(rule_idx):#x}"
+            )
+
+        return "\n".join(lines)
+
+    def __to_u32_filter_text(self):
+        protocol, priority = ("ipv6", 6) if self.__ip_version == 6 else ("ip", 5)
+        header = (
+            f"filter parent {self.QDISC_MAJOR_ID:x}: protocol {protocol:s} pref {priority:d} "
+            "u32 chain 0"
+        )
+        lines = [header]
+
+        for rule_idx in range(self.__num_rules):
+            ht_id, node_id = divmod(rule_idx, self.__HT_BUCKET_SIZE)
+            ht_id += 0x800
+            node_id += 0x800
+
+            if node_id == 0x800:
+                lines.append(f"{header:s} fh {ht_id:x}: ht divisor 1")
+
+            lines.append(
+                f"{header:s} fh {ht_id:x}::{node_id:x} order {node_id:d} key ht {ht_id:x} "
+                f"bkt 0 flowid {self.__get_classid(rule_idx):s} not_in_hw"
+            )
+            lines.extend(self.__to_u32_match_lines(rule_idx))
+
+        return "\n".join(lines)
+
+    def __to_u32_match_lines(self, rule_idx):
+        dst_network = ipaddress.ip_network(self.get_dst_network(rule_idx))
+        address_hex = f"{int(dst_network.network_address):0{dst_network.max_prefixlen // 4}x}"
+        netmask_hex = f"{int(dst_network.netmask):0{dst_network.max_prefixlen // 4}x}"
+
+        # offsets of the destination address and the L4 header
+        dst_offset, l4_offset = (24, 40) if self.__ip_version == 6 else (16, 20)
+
+        lines = []
+        for word_idx in range(0, len(address_hex), 8):
+            mask = netmask_hex[word_idx : word_idx + 8]
+            if int(mask, 16) == 0:
+                break
+
+            lines.append(
+                f"  match {address_hex[word_idx : word_idx + 8]:s}/{mask:s} "
+                f"at {dst_offset + word_idx // 2:d}"
+            )
+
+        lines.append(f"  match {self.get_dst_port(rule_idx):08x}/0000ffff at {l4_offset:d}")
+
+        return lines
+
+    def __to_fw_filter_text(self):
+        protocol = "ipv6" if self.__ip_version == 6 else "ip"
+        header = f"filter parent {self.QDISC_MAJOR_ID:x}: protocol {protocol:s} pref 1 fw chain 0"
+        lines = [header]
+
+        for rule_idx in range(self.__num_rules):
+            lines.append(
+                f"{header:s} handle {self.__get_mark_id(rule_idx):#x} "
+                f"classid {self.__get_classid(rule_idx):s}"
+            )
+
+        return "\n".join(lines)
+
+    def __get_classid(self, rule_idx):
+        return f"{self.QDISC_MAJOR_ID:x}:{rule_idx + 2:x}"
+
+    def __get_netem_major_id(self, rule_idx):
+        return self.__MIN_NETEM_MAJOR_ID + rule_idx
+
+    def __get_mark_id(self, rule_idx):
+        return self.__MIN_MARK_ID + rule_idx
@@ -0,0 +1,205 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import gc
+import time
+import tracemalloc
+from collections import namedtuple
+from unittest import mock
+
+from tcconfig._const import TcCommandOutput, TcSubCommand
+from tcconfig._iptables import IptablesMangleController
+from tcconfig._logger import logger
+from tcconfig._tc_command_helper import get_tc_show_command
+from tcconfig._tc_snapshot import clear_snapshot, set_snapshot
+from tcconfig.parser._class import TcClassParser
+from tcconfig.parser._filter import TcFilterParser
+from tcconfig.parser._qdisc import TcQdiscParser
+from tcconfig.parser._store import TcRecordStore
+from tcconfig.parser.shaping_rule import TcShapingRuleParser
+
+from ._generator import TcShowOutputGenerator
+
+
+DEVICE = "bench0"
+
+BenchmarkResult = namedtuple(
+    "BenchmarkResult", "target ip_version is_mark num_rules elapsed rules_per_sec peak_memory"
+)
+
+
+class BenchmarkTarget:
+    FILTER = "filter"
+    QDISC = "qdisc"
+    CLASS = "class"
+    SHAPING_RULE = "shaping_rule"
+
+    LIST = (FILTER, QDISC, CLASS, SHAPING_RULE)
+
+
+class _TcShowOutputs:
+    # outputs are generated before measurements: measurements include only the parsers
+    def __init__(self, generator):
+        self.ip_version = generator.ip_version
+        self.qdisc_text = generator.to_qdisc_text()
+        self.class_text = generator.to_class_text()
+        self.filter_text = generator.to_filter_text()
+        self.iptables_text = generator.to_iptables_text()
+
+
+def _parse_filter(outputs):
+    TcFilterParser(TcRecordStore(), outputs.ip_version).parse(DEVICE, outputs.filter_text)
+
+
+def _parse_qdisc(outputs):
+    TcQdiscParser(TcRecordStore()).parse(DEVICE, outputs.qdisc_text)
+
+
+def _parse_class(outputs):
+    TcClassParser(TcRecordStore()).parse(DEVICE, outputs.class_text)
+
+
+def _get_tc_parameter(outputs):
+    # outputs of the show commands are read from the tc snapshots of the process and
+    # the mangle table from the generated output: commands are not executed.
+    # TcCommandOutput.STDOUT skips the verification of the device and the lookup of
+    # the ifb device as tcshow --tc-command does.
+    clear_snapshot()
+    IptablesMangleController.clear_snapshot()
+
+    for subcommand, text in (
+        (TcSubCommand.QDISC, outputs.qdisc_text),
+        (TcSubCommand.CLASS, outputs.class_text),
+        (TcSubCommand.FILTER, outputs.filter_text),
+    ):
+        # plain text outputs of -json commands are the outputs of tc that does not
+        # support JSON outputs
+        for is_json in (False, True):
+            set_snapshot(DEVICE, get_tc_show_command(subcommand, DEVICE, is_json=is_json), text)
+
+    try:
+        with mock.patch.object(
+            IptablesMangleController, "get_iptables", lambda self: outputs.iptables_text
+        ):
+            tc_param = TcShapingRuleParser(
+                DEVICE, outputs.ip_version, logger, TcCommandOutput.STDOUT
+            ).get_tc_parameter()
+    finally:
+        clear_snapshot()
+        IptablesMangleController.clear_snapshot()
+
+    return tc_param
+
+
+_TARGET_FUNCS = {
+    BenchmarkTarget.FILTER: _parse_filter,
+    BenchmarkTarget.QDISC: _parse_qdisc,
+    BenchmarkTarget.CLASS: _parse_class,
+    BenchmarkTarget.SHAPING_RULE: _get_tc_parameter,
+}
+
+
+def run_target(target, generator):
+    """
+    Feed the outputs of a generator to a parser.
+
+    :return: Return value of the parser.
+    """
+
+    return _TARGET_FUNCS[target](_TcShowOutputs(generator))
+
+
+def run_benchmark(target, num_rules, ip_version=4, is_mark=False, repeat=3):
+    """
+    Measure a parser with generated outputs of ``tc ... show`` commands.
+    Elapsed time is the best of ``repeat`` runs; peak memory is measured by
+    a preceding run since ``tracemalloc`` slows down executions.
+
+    :param str target: One of ``BenchmarkTarget.LIST``.
+    :rtype: BenchmarkResult
+    """
+
+    if target not in _TARGET_FUNCS:
+        raise ValueError(f"unknown target: expected={BenchmarkTarget.LIST}, actual={target}")
+
+    outputs = _TcShowOutputs(
+        TcShowOutputGenerator(num_rules, ip_version=ip_version, is_mark=is_mark)
+    )
+    target_func = _TARGET_FUNCS[target]
+
+    # warm up with a rule: peak memory excludes the modules that imported on first use
+    target_func(_TcShowOutputs(TcShowOutputGenerator(1, ip_version=ip_version, is_mark=is_mark)))
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        target_func(outputs)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    elapsed_list = []
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        start_time = time.perf_counter()
+        target_func(outputs)
+        elapsed_list.append(time.perf_counter() - start_time)
+
+    elapsed = min(elapsed_list)
+
+    return BenchmarkResult(
+        target=target,
+        ip_version=ip_version,
+        is_mark=is_mark,
+        num_rules=num_rules,
+        elapsed=elapsed,
+        rules_per_sec=num_rules / elapsed if elapsed > 0 else float("inf"),
+        peak_memory=peak_memory,
+    )
+
+
+def _to_result_key(result):
+    return (result["target"], result["ip_version"], result["is_mark"], result["num_rules"])
+
+
+def find_regressions(results, baseline_results, tolerance):
+    """
+    Compare benchmark results with baseline results of the same conditions.
+
+    :param list results: ``BenchmarkResult._asdict()`` of the results.
+    :param list baseline_results: ``BenchmarkResult._asdict()`` of the baseline results.
+    :param float tolerance:
+        Acceptable ratio of the degradation: e.g. ``0.2`` accepts results that are
+        up to 20% slower (or use up to 20% more memory) than the baseline.
+    :return: Messages of the regressions.
+    :rtype: list
+    """
+
+    baseline_table = {_to_result_key(result): result for result in baseline_results}
+    regressions = []
+
+    for result in results:
+        baseline = baseline_table.get(_to_result_key(result))
+        if baseline is None:
+            continue
+
+        condition = "{target:s} (IPv{ip_version:d}, mark={is_mark}, rules={num_rules:d})".format(
+            **result
+        )
+
+        min_rules_per_sec = baseline["rules_per_sec"] * (1 - tolerance)
+        if result["rules_per_sec"] < min_rules_per_sec:
+            regressions.append(
+                f"{condition:s}: {result['rules_per_sec']:.1f} rules/sec is slower than "
+                f"the baseline {baseline['rules_per_sec']:.1f} rules/sec"
+            )
+
+        max_peak_memory = baseline["peak_memory"] * (1 + tolerance)
+        if result["peak_memory"] > max_peak_memory:
+            regressions.append(
+                f"{condition:s}: peak memory {result['peak_memory']:d} bytes is larger than "
+                f"the baseline {baseline['peak_memory']:d} bytes"
+            )
+
+    return regressions
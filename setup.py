@@ -56,7 +56,7 @@ setuptools.setup(
     long_description_content_type="text/x-rst",
     license=pkg_info["__license__"],
     include_package_data=True,
-    packages=setuptools.find_packages(exclude=["test*"]),
+    packages=setuptools.find_packages(exclude=["benchmarks*", "test*"]),
     project_urls={
         "Changelog": f"{REPOSITORY_URL:s}/blob/master/CHANGELOG.md",
         "Documentation": f"https://{MODULE_NAME:s}.rtfd.io/",
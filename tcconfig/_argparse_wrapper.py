@@ -5,28 +5,116 @@
 import argparse
 from textwrap import dedent
 
-from ._const import TcCommandOutput, TrafficDirection
+from humanreadable import ParameterError
+
+from ._common import split_port_range, to_port_range_str
+from ._const import Classifier, IpProto, TcBackend, TcCommandOutput, TrafficDirection
 from ._logger import LogLevel
 
 
+_DEPRECATED_DEVICE_DEST = "deprecated_device"
+
+
+def _port_range(value):
+    try:
+        return to_port_range_str(*split_port_range(value))
+    except ParameterError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+def has_option(parser, name):
+    return f"--{name:s}" in parser._option_string_actions
+
+
+def get_default_options(parser):
+    """
+    :return: Namespace that has the default values of the arguments of a parser.
+    :rtype: argparse.Namespace
+    """
+
+    options = argparse.Namespace()
+
+    for action in parser._actions:
+        if action.default == argparse.SUPPRESS or action.dest == _DEPRECATED_DEVICE_DEST:
+            continue
+
+        # actions of mutually exclusive options may share a dest (e.g. --debug/--quiet)
+        if not hasattr(options, action.dest):
+            setattr(options, action.dest, action.default)
+
+    return options
+
+
+def set_option_value(parser, options, name, value):
+    """
+    Set a value of an option to options as the parser does for ``--<name>=<value>``
+    without parsing command line arguments.
+
+    :param str name: Long option name without the leading hyphens.
+    :param value: Value of the option. ``True`` for options that take no value.
+    :raises ValueError: If the option is unknown or the value is invalid.
+    """
+
+    action = parser._option_string_actions.get(f"--{name:s}")
+    if action is None:
+        raise ValueError(f"unknown option: --{name:s}")
+
+    if action.nargs == 0:
+        if value is not True:
+            raise ValueError(f"--{name:s} option does not take a value: {value}")
+
+        setattr(options, action.dest, action.const)
+        return
+
+    value = str(value)
+    if action.type is not None:
+        try:
+            value = action.type(value)
+        except (argparse.ArgumentTypeError, TypeError, ValueError) as e:
+            raise ValueError(f"invalid value for --{name:s}: {e}") from e
+
+    if action.choices is not None and value not in action.choices:
+        raise ValueError(
+            f"invalid value for --{name:s}: expected={list(action.choices)}, actual={value}"
+        )
+
+    setattr(options, action.dest, value)
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    def parse_known_args(self, args=None, namespace=None):
+        namespace, extras = super().parse_known_args(args, namespace)
+
+        if hasattr(namespace, _DEPRECATED_DEVICE_DEST):
+            # devices of the deprecated -d/--device option are merged into the positional ones
+            namespace.device = (namespace.device or []) + (
+                getattr(namespace, _DEPRECATED_DEVICE_DEST) or []
+            )
+            delattr(namespace, _DEPRECATED_DEVICE_DEST)
+
+            if not namespace.device:
+                self.error("the following arguments are required: device")
+
+        return namespace, extras
+
+
 class ArgparseWrapper:
     """
     Wrapper class for argparse
     """
 
     def __init__(self, version, description=""):
-        self.parser = argparse.ArgumentParser(
+        self.parser = _ArgumentParser(
             formatter_class=argparse.RawDescriptionHelpFormatter,
             description=description,
-            epilog=dedent(
-                """\
+            epilog=dedent("""\
                 Documentation: https://tcconfig.rtfd.io/
                 Issue tracker: https://github.com/thombashi/tcconfig/issues
-                """
-            ),
+                """),
         )
         self.parser.add_argument("-V", "--version", action="version", version=f"%(prog)s {version}")
         self._add_tc_command_arg_group()
+        self._add_tc_backend_argument()
         self._add_log_level_argument_group()
 
         group = self.parser.add_argument_group("Debug")
@@ -43,6 +131,17 @@ class ArgparseWrapper:
             """,
         )
 
+    def add_device_argument(self, group, help):
+        group.add_argument("device", nargs="*", help=help)
+        group.add_argument(
+            "-d",
+            "--device",
+            dest=_DEPRECATED_DEVICE_DEST,
+            action="append",
+            metavar="DEVICE",
+            help="network device name (e.g. eth0). deprecated: use the positional arguments.",
+        )
+
     def add_routing_group(self):
         group = self.parser.add_argument_group("Routing")
         group.add_argument(
@@ -61,6 +160,14 @@ class ArgparseWrapper:
             help="""specify destination IP-address/network that applies traffic control.
             defaults to any.""",
         )
+        group.add_argument(
+            "--dst-network-file",
+            dest="dst_network_file",
+            help="""specify a file that written destination IP-addresses/networks
+            (a network per line) that apply traffic control.
+            the networks are stored to an ipset and matched by a single filter.
+            can not be used with other network/port options.""",
+        )
         group.add_argument(
             "--src-network",
             help="""specify a source IP-address/network that applies traffic control.
@@ -74,13 +181,26 @@ class ArgparseWrapper:
             "--port",
             "--dst-port",
             dest="dst_port",
-            type=int,
-            help="specify a destination port number that applies traffic control. defaults to any.",
+            type=_port_range,
+            help="""specify a destination port number that applies traffic control.
+            a port range (e.g. 8000-8080) can be specified with --classifier {flower}.
+            defaults to any.
+            """.format(flower=Classifier.FLOWER),
         )
         group.add_argument(
             "--src-port",
-            type=int,
-            help="specify a source port number that applies traffic control. defaults to any.",
+            type=_port_range,
+            help="""specify a source port number that applies traffic control.
+            a port range (e.g. 8000-8080) can be specified with --classifier {flower}.
+            defaults to any.
+            """.format(flower=Classifier.FLOWER),
+        )
+        group.add_argument(
+            "--ip-proto",
+            choices=IpProto.LIST,
+            help="""specify a L4 protocol that applies traffic control.
+            requires --classifier {flower}, and one of {ports} to match ports. defaults to any.
+            """.format(flower=Classifier.FLOWER, ports=", ".join(IpProto.PORT_LIST)),
         )
         group.add_argument(
             "--ipv6",
@@ -92,6 +212,16 @@ class ArgparseWrapper:
 
         return group
 
+    def add_jobs_argument(self):
+        self.parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            help="""the number of worker processes that apply traffic control to
+            multiple devices concurrently. defaults to the number of CPUs.
+            """,
+        )
+
     def _add_log_level_argument_group(self):
         dest = "log_level"
 
@@ -135,6 +265,24 @@ class ArgparseWrapper:
 
         return group
 
+    def _add_tc_backend_argument(self):
+        self.parser.add_argument(
+            "--tc-backend",
+            choices=TcBackend.LIST,
+            default=TcBackend.SUBPROCESS,
+            help="""the method to apply traffic control rules.
+            {subprocess}: execute tc/ip commands.
+            {netlink}: send requests to the kernel through a netlink socket without
+            executing tc/ip commands. commands that the netlink backend can not handle are
+            executed as with the {subprocess} backend.
+            {batch}: queue tc commands and execute them at once with a single
+            'tc -batch' process. the batch stops at the first failed command.
+            (default = %(default)s)
+            """.format(
+                subprocess=TcBackend.SUBPROCESS, netlink=TcBackend.NETLINK, batch=TcBackend.BATCH
+            ),
+        )
+
     def _add_tc_command_arg_group(self):
         group = self.parser.add_mutually_exclusive_group()
         group.add_argument(
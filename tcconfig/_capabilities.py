@@ -5,6 +5,7 @@
 import errno
 import os
 import re
+import struct
 import sys
 
 import subprocrunner as spr
@@ -13,11 +14,29 @@ from ._common import find_bin_path
 from ._logger import logger
 
 
+# struct vfs_cap_data of linux/capability.h: the value of the security.capability xattr
+_VFS_CAP_XATTR_NAME = "security.capability"
+_VFS_CAP_REVISION_MASK = 0xFF000000
+_VFS_CAP_FLAGS_EFFECTIVE = 0x000001
+_VFS_CAP_U32_MAP = {
+    0x01000000: 1,  # VFS_CAP_REVISION_1
+    0x02000000: 2,  # VFS_CAP_REVISION_2
+    0x03000000: 2,  # VFS_CAP_REVISION_3: followed by the root uid of the namespace
+}
+_CAPABILITY_BIT_MAP = {"cap_net_admin": 12, "cap_net_raw": 13}
+
+# results of the capability checks in the process: keys include the identity of the binary
+# file to detect replaced binaries and setcap (that changes ctime of the file)
+_capability_cache = {}
+
+
 def get_required_capabilities(command):
     required_capabilities_map = {
         "tc": ["cap_net_admin"],
         "ip": ["cap_net_raw", "cap_net_admin"],
         "iptables": ["cap_net_raw", "cap_net_admin"],
+        "ipset": ["cap_net_admin"],
+        "nft": ["cap_net_admin"],
     }
 
     return required_capabilities_map[command]
@@ -39,7 +58,7 @@ def get_permission_error_message(command):
     )
 
 
-def _has_capabilies(bin_path, capabilities):
+def _has_capabilies_by_getcap(bin_path, capabilities):
     getcap_bin_path = find_bin_path("getcap")
 
     if not getcap_bin_path:
@@ -47,7 +66,6 @@ def _has_capabilies(bin_path, capabilities):
         # assume that the command has the required capabilities if getcap command is not found
         return True
 
-    bin_path = os.path.realpath(bin_path)
     proc = spr.SubprocessRunner(f"{getcap_bin_path:s} {bin_path:s}")
     if proc.run() != 0:
         logger.error(proc.stderr)
@@ -79,6 +97,114 @@ def _has_capabilies(bin_path, capabilities):
     return has_capabilies
 
 
+def clear_capability_cache():
+    _capability_cache.clear()
+
+
+def parse_file_capabilities(data):
+    """
+    Parse a value of the ``security.capability`` extended attribute.
+
+    :param bytes data: ``struct vfs_cap_data`` of a file.
+    :return: Bits of the permitted capabilities and whether the effective flag is set.
+    :rtype: tuple
+    :raises ValueError: If the data is not a known revision of ``vfs_cap_data``.
+    """
+
+    if len(data) < 4:
+        raise ValueError(f"too short vfs_cap_data: {len(data):d} bytes")
+
+    (magic_etc,) = struct.unpack_from("<I", data)
+    num_u32 = _VFS_CAP_U32_MAP.get(magic_etc & _VFS_CAP_REVISION_MASK)
+    if num_u32 is None:
+        raise ValueError(f"unknown vfs_cap_data revision: 0x{magic_etc:08x}")
+
+    if len(data) < 4 + num_u32 * 8:
+        raise ValueError(f"too short vfs_cap_data: {len(data):d} bytes")
+
+    permitted = 0
+    for i in range(num_u32):
+        permitted_u32, _inheritable_u32 = struct.unpack_from("<II", data, 4 + i * 8)
+        permitted |= permitted_u32 << (32 * i)
+
+    return (permitted, bool(magic_etc & _VFS_CAP_FLAGS_EFFECTIVE))
+
+
+def _has_capabilies_by_xattr(bin_path, capabilities):
+    """
+    :return:
+        Whether the file has the capabilities with the effective flag.
+        |None| if the capabilities can not be read from the extended attribute.
+    """
+
+    try:
+        capability_bits = [_CAPABILITY_BIT_MAP[capability] for capability in capabilities]
+    except KeyError:
+        return None
+
+    try:
+        data = os.getxattr(bin_path, _VFS_CAP_XATTR_NAME)
+    except AttributeError:
+        # platforms without extended attribute support
+        return None
+    except OSError as e:
+        if e.errno == errno.ENODATA:
+            logger.debug(f"no capabilities found for {bin_path:s}")
+            return False
+
+        logger.debug(f"failed to read {_VFS_CAP_XATTR_NAME:s} of {bin_path:s}: {e}")
+        return None
+
+    try:
+        permitted, is_effective = parse_file_capabilities(data)
+    except ValueError as e:
+        logger.debug(f"failed to parse {_VFS_CAP_XATTR_NAME:s} of {bin_path:s}: {e}")
+        return None
+
+    has_capabilies = is_effective
+
+    for capability, capability_bit in zip(capabilities, capability_bits):
+        if permitted & (1 << capability_bit):
+            logger.debug(f"{bin_path:s} has {capability:s} capability")
+        else:
+            logger.debug(f"{bin_path:s} has no {capability:s} capability")
+            has_capabilies = False
+
+    if not is_effective:
+        logger.debug(f"{bin_path:s} has no effective flag of capabilities")
+
+    return has_capabilies
+
+
+def _has_capabilies(bin_path, capabilities):
+    bin_path = os.path.realpath(bin_path)
+
+    try:
+        stat = os.stat(bin_path)
+    except OSError:
+        cache_key = None
+    else:
+        cache_key = (
+            bin_path,
+            tuple(capabilities),
+            stat.st_dev,
+            stat.st_ino,
+            stat.st_mtime_ns,
+            stat.st_ctime_ns,
+        )
+        if cache_key in _capability_cache:
+            return _capability_cache[cache_key]
+
+    has_capabilies = _has_capabilies_by_xattr(bin_path, capabilities)
+    if has_capabilies is None:
+        has_capabilies = _has_capabilies_by_getcap(bin_path, capabilities)
+
+    if cache_key is not None:
+        _capability_cache[cache_key] = has_capabilies
+
+    return has_capabilies
+
+
 def has_execution_authority(command):
     from ._common import check_command_installation
 
@@ -13,10 +13,10 @@ import subprocrunner as spr
 import typepy
 from humanreadable import ParameterError
 from path import Path
-from simplesqlite import SimpleSQLite
 
 from ._const import IPV6_OPTION_ERROR_MSG_FORMAT, TcCommandOutput
 from ._logger import LogLevel, logger, set_log_level
+from ._tc_backend import get_tc_backend, set_tc_backend
 
 
 _bin_path_cache = {}
@@ -72,7 +72,12 @@ def initialize_cli(options):
     if options.is_output_stacktrace:
         spr.SubprocessRunner.is_output_stacktrace = options.is_output_stacktrace
 
-    SimpleSQLite.global_debug_query = options.debug_query
+    if options.debug_query:
+        from simplesqlite import SimpleSQLite
+
+        SimpleSQLite.global_debug_query = options.debug_query
+
+    set_tc_backend(options.tc_backend)
 
 
 def is_execute_tc_command(tc_command_output):
@@ -105,6 +110,45 @@ def validate_within_min_max(param_name, value, min_value, max_value, unit):
         )
 
 
+def split_port_range(value):
+    """
+    :param value: A port number or a port range (``<min port>-<max port>``).
+    :return: ``(port, max port)``. max port is ``None`` if the value is a single port.
+    :raises ParameterError: If the value is neither a port number nor a port range.
+    """
+
+    if value is None or value == "":
+        return (None, None)
+
+    if isinstance(value, int):
+        return (value, None)
+
+    try:
+        ports = [int(port) for port in str(value).split("-")]
+    except ValueError:
+        ports = []
+
+    if len(ports) == 1:
+        return (ports[0], None)
+
+    if len(ports) != 2 or ports[0] > ports[1]:
+        raise ParameterError(
+            "invalid port", expected="<port> or <min port>-<max port>", value=value
+        )
+
+    if ports[0] == ports[1]:
+        return (ports[0], None)
+
+    return tuple(ports)
+
+
+def to_port_range_str(port, max_port):
+    if max_port is None:
+        return f"{port}"
+
+    return f"{port}-{max_port}"
+
+
 def normalize_tc_value(tc_obj):
     import ipaddress
 
@@ -125,38 +169,43 @@ def run_command_helper(
     msg_log_level="WARNING",
     exception_class=None,
 ):
-    runner = spr.SubprocessRunner(command, error_log_level=LogLevel.QUIET)
-    runner.run()
-
-    returncode = runner.returncode
-    if returncode == 0:
-        return 0
-
-    if ignore_error_msg_regexp and runner.stderr:
-        if ignore_error_msg_regexp.search(runner.stderr) is None:
-            error_msg = "\n".join(
-                [
-                    "command execution failed",
-                    f"  command={command}",
-                    f"  stderr={runner.stderr}",
-                ]
-            )
-
-            if re.search("RTNETLINK answers: Operation not permitted", runner.stderr):
+    # the result might be handled after the command execution is deferred by the tc backend
+    def handle_result(result):
+        returncode = result.returncode
+        if returncode == 0:
+            return 0
+
+        if ignore_error_msg_regexp and result.stderr:
+            if ignore_error_msg_regexp.search(result.stderr) is None:
+                error_msg = "\n".join(
+                    [
+                        "command execution failed",
+                        f"  command={command}",
+                        f"  stderr={result.stderr}",
+                    ]
+                )
+
+                if re.search("RTNETLINK answers: Operation not permitted", result.stderr):
+                    logger.error(error_msg)
+                    sys.exit(returncode)
+
                 logger.error(error_msg)
-                sys.exit(returncode)
 
-            logger.error(error_msg)
+                return returncode
+            else:
+                # ignorable error occurred
+                returncode = 0
+
+        if typepy.is_not_null_string(notice_msg):
+            logger.log(msg_log_level, notice_msg)
 
-            return returncode
-        else:
-            # ignorable error occurred
-            returncode = 0
+        if exception_class is not None:
+            raise exception_class(command)
 
-    if typepy.is_not_null_string(notice_msg):
-        logger.log(msg_log_level, notice_msg)
+        return returncode
 
-    if exception_class is not None:
-        raise exception_class(command)
+    result = get_tc_backend().run(
+        command, error_log_level=LogLevel.QUIET, result_handler=handle_result
+    )
 
-    return returncode
+    return result.returncode
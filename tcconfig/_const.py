@@ -42,15 +42,20 @@ class Tc:
         DIRECTION = "direction"
         FILTER_ID = "filter_id"
         CLASS_ID = "classid"
+        CLASSIFIER = "classifier"
         DST_NETWORK = "dst_network"
         DST_PORT = "dst_port"
+        DST_PORT_MAX = "dst_port_max"
         FLOW_ID = "flowid"
         HANDLE = "handle"
+        IP_PROTO = "ip_proto"
+        NETWORK_SET = "network_set"
         PARENT = "parent"
         PRIORITY = "priority"
         PROTOCOL = "protocol"
         SRC_NETWORK = "src_network"
         SRC_PORT = "src_port"
+        SRC_PORT_MAX = "src_port_max"
 
     class ValueRange:
         class LatencyTime:
@@ -64,6 +69,40 @@ class Tc:
         LATENCY_TIME = "60min"
 
 
+class TcBackend:
+    SUBPROCESS = "subprocess"
+    NETLINK = "netlink"
+    BATCH = "batch"
+    LIST = [SUBPROCESS, NETLINK, BATCH]
+
+
+class MarkBackend:
+    IPTABLES = "iptables"
+    NFTABLES = "nftables"
+    LIST = [IPTABLES, NFTABLES]
+
+
+class Classifier:
+    U32 = "u32"
+    FLOWER = "flower"
+    LIST = [U32, FLOWER]
+
+    # filters of network sets: not selectable with --classifier
+    BASIC = "basic"
+
+
+class IpProto:
+    TCP = "tcp"
+    UDP = "udp"
+    SCTP = "sctp"
+    ICMP = "icmp"
+    ICMPV6 = "icmpv6"
+    LIST = [TCP, UDP, SCTP, ICMP, ICMPV6]
+
+    # protocols that can be matched by ports
+    PORT_LIST = [TCP, UDP, SCTP]
+
+
 class TcCommandOutput:
     NOT_SET = None
     STDOUT = "STDOUT"
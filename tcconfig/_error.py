@@ -4,8 +4,6 @@
 
 import abc
 
-from pyroute2 import IPRoute
-
 
 class TargetNotFoundError(Exception):
     @property
@@ -39,10 +37,10 @@ class NetworkInterfaceNotFoundError(TargetNotFoundError):
         return "network interface"
 
     def __str__(self, *args, **kwargs):
-        item_list = [super().__str__(*args, **kwargs)]
+        from ._network import get_network_interfaces
 
-        with IPRoute() as ipr:
-            avail_interfaces = [link.get_attr("IFLA_IFNAME") for link in ipr.get_links()]
+        item_list = [super().__str__(*args, **kwargs)]
+        avail_interfaces = get_network_interfaces()
 
         item_list.append("(available interfaces: {})".format(", ".join(avail_interfaces)))
 
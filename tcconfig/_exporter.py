@@ -0,0 +1,38 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+from simplesqlite import SimpleSQLite
+from simplesqlite.model import Integer, Model, Text
+
+
+class ShapingRuleModel(Model):
+    device = Text(not_null=True)
+    direction = Text(not_null=True)
+    filter_id = Text(not_null=True)
+    dst_network = Text()
+    dst_port = Integer()
+    src_network = Text()
+    src_port = Integer()
+    protocol = Text(not_null=True)
+
+    delay = Text()
+    delay_distro = Text()
+    loss = Text()
+    duplicate = Text()
+    corrupt = Text()
+    reorder = Text()
+    rate = Text()
+    limit = Text()
+
+
+def export_settings(export_path, out_rules, in_rules):
+    with SimpleSQLite(export_path, mode="a") as con:
+        ShapingRuleModel.attach(con)
+        ShapingRuleModel.create()
+
+        for out_rule in out_rules:
+            ShapingRuleModel.insert(ShapingRuleModel(**out_rule))
+
+        for in_rule in in_rules:
+            ShapingRuleModel.insert(ShapingRuleModel(**in_rule))
@@ -4,13 +4,16 @@
 
 import errno
 import re
+from collections import namedtuple
 from typing import Optional
 
 import msgfy
 import pyparsing as pp
 import subprocrunner as spr
 
-from ._const import Network, Tc, TcCommandOutput, TrafficDirection
+from ._const import Classifier, Network, Tc, TcCommandOutput, TrafficDirection
+from ._logger import LogLevel
+from ._rule_compiler import ShapingRuleCompiler
 
 
 try:
@@ -22,12 +25,33 @@ except ImportError:
 RE_CONTAINER_ID = re.compile(r"[a-z0-9]{12}\s+\(device=[a-z0-9]+\)")
 # e.g. edfd9dbb3969 (device=veth6f7b798)
 
+RE_CONTAINER_DEVICE = re.compile(r"\(device=(?P<device>[a-z0-9]+)\)")
+
+
+class TcConfigCommand(namedtuple("TcConfigCommand", "command target option_items")):
+    """
+    A tcset/tcdel invocation that applies a part of a config file.
+
+    ``option_items`` are pairs of long option names (without the leading hyphens) and
+    the values of the options. Values of options that take no value are ``True``.
+    """
+
+    def __str__(self):
+        option_list = [
+            f"--{name:s}" if value is True else f"--{name:s}={value}"
+            for name, value in self.option_items
+        ]
+
+        return " ".join([self.command, self.target] + option_list)
+
 
 class TcConfigLoader:
     def __init__(self, logger):
         self.__logger = logger
         self.__config_table = None
+        self.__tcset_parser = None
         self.is_overwrite = False
+        self.is_reconcile = False
         self.tc_command_output = TcCommandOutput.NOT_SET
 
     def load_tcconfig(self, config_file_path):
@@ -46,99 +70,349 @@ class TcConfigLoader:
         self.__logger.debug(f"tc config file: {dumped_config:s}")
 
     def get_tcconfig_commands(self):
-        from .tcset import get_arg_parser
+        """
+        :return: Command lines that are equivalent to the config.
+        :rtype: list
+        :raises ValueError: If both of ``is_overwrite`` and ``is_reconcile`` are set.
+        """
+
+        return [str(tcconfig_command) for tcconfig_command in self.build_tcconfig_commands()]
+
+    def build_tcconfig_commands(self):
+        """
+        :return: |TcConfigCommand| list that applies the config.
+        :rtype: list
+        :raises ValueError: If both of ``is_overwrite`` and ``is_reconcile`` are set.
+        """
+
+        if self.is_overwrite and self.is_reconcile:
+            raise ValueError("--overwrite and --reconcile options are mutually exclusive")
 
         command_list = []
 
         for device, device_table in self.__config_table.items():
             is_container = RE_CONTAINER_ID.search(device) is not None
-            if is_container:
-                device = device.split()[0]
+            target = device.split()[0] if is_container else device
+            device_table = self.__compile(device_table)
+
+            if self.is_reconcile:
+                command_list.extend(
+                    self.__get_reconcile_commands(
+                        target, is_container, self.__to_device(device), device_table
+                    )
+                )
+                continue
 
             if self.is_overwrite:
+                command_list.append(self.__to_tcdel_all_command(target, is_container))
+
+            command_list.extend(self.__get_tcset_commands(target, is_container, device_table))
+
+        return command_list
+
+    def __compile(self, device_table):
+        compiler = ShapingRuleCompiler(self.__logger)
+
+        return {
+            direction: compiler.compile(direction_table or {})
+            for direction, direction_table in device_table.items()
+        }
+
+    def __get_tcset_commands(self, target, is_container, device_table):
+        command_list = []
+
+        for direction, direction_table in device_table.items():
+            is_first_set = True
+
+            for tc_filter, filter_table in direction_table.items():
+                self.__logger.debug(
+                    "is_first_set={}, filter='{}', table={}".format(
+                        is_first_set, tc_filter, filter_table
+                    )
+                )
+
+                if not filter_table:
+                    continue
+
                 command_list.append(
-                    " ".join(
-                        [Tc.Command.TCDEL, device, "--all"] + (["--docker"] if is_container else [])
+                    self.__to_tcset_command(
+                        target,
+                        is_container,
+                        direction,
+                        tc_filter,
+                        filter_table,
+                        [] if is_first_set else [("add", True)],
                     )
                 )
 
-            for direction, direction_table in device_table.items():
-                is_first_set = True
+                is_first_set = False
+
+        return command_list
+
+    def __get_current_table(self, device):
+        """
+        Read the shaping rules of a device for both IP versions: filters of an IP version are
+        decoded correctly only by the parser of the version.
+        """
+
+        from .parser.shaping_rule import TcShapingRuleParser
+
+        current_table = {}
+
+        for ip_version in (4, 6):
+            tc_param = (
+                TcShapingRuleParser(
+                    device=device,
+                    ip_version=ip_version,
+                    logger=self.__logger,
+                    tc_command_output=self.tc_command_output,
+                )
+                .get_tc_parameter()
+                .get(device, {})
+            )
+
+            for direction, direction_table in tc_param.items():
+                merged_table = current_table.setdefault(direction, {})
+
+                for tc_filter, filter_table in (direction_table or {}).items():
+                    if self.__get_filter_ip_version(tc_filter) == ip_version:
+                        merged_table[tc_filter] = filter_table
+
+        return current_table
+
+    def __get_reconcile_commands(self, target, is_container, device, device_table):
+        current_table = self.__get_current_table(device)
+
+        del_command_list = []
+        change_command_list = []
+        add_command_list = []
+
+        for direction in TrafficDirection.LIST:
+            config_rules = {
+                self.__to_filter_key(tc_filter): (tc_filter, filter_table)
+                for tc_filter, filter_table in (device_table.get(direction) or {}).items()
+                if filter_table
+            }
+            current_rules = {
+                self.__to_filter_key(tc_filter): (tc_filter, filter_table)
+                for tc_filter, filter_table in (current_table.get(direction) or {}).items()
+            }
+            kept_filter_keys = set(config_rules).intersection(current_rules)
+
+            if current_rules and not kept_filter_keys:
+                # tcdel deletes the qdiscs of a device (both directions) when the last
+                # filter of the device is deleted: rebuild the device instead.
+                self.__logger.debug(f"no shaping rules to keep: rebuild {device:s}")
+
+                return [self.__to_tcdel_all_command(target, is_container)] + (
+                    self.__get_tcset_commands(target, is_container, device_table)
+                )
+
+            for filter_key, (tc_filter, _filter_table) in current_rules.items():
+                if filter_key not in config_rules:
+                    del_command_list.append(
+                        self.__to_tcdel_command(target, is_container, direction, tc_filter)
+                    )
 
-                for tc_filter, filter_table in direction_table.items():
-                    self.__logger.debug(
-                        "is_first_set={}, filter='{}', table={}".format(
-                            is_first_set, tc_filter, filter_table
+            is_first_set = not current_rules
+
+            for filter_key, (tc_filter, filter_table) in config_rules.items():
+                if filter_key not in current_rules:
+                    add_command_list.append(
+                        self.__to_tcset_command(
+                            target,
+                            is_container,
+                            direction,
+                            tc_filter,
+                            filter_table,
+                            [] if is_first_set else [("add", True)],
                         )
                     )
+                    is_first_set = False
+                    continue
 
-                    if not filter_table:
-                        continue
+                if self.__to_shaping_params(filter_table) == self.__to_shaping_params(
+                    current_rules[filter_key][1]
+                ):
+                    self.__logger.debug(f"unchanged: device={device}, filter='{tc_filter}'")
+                    continue
 
-                    option_list = [device, f"--direction={direction:s}"] + (
-                        ["--docker"] if is_container else []
+                change_command_list.append(
+                    self.__to_tcset_command(
+                        target, is_container, direction, tc_filter, filter_table, [("change", True)]
                     )
+                )
 
-                    for key, value in filter_table.items():
-                        arg_item = f"--{key:s}={value}"
-
-                        parse_result = get_arg_parser().parse_known_args(["dummy", arg_item])
-                        if parse_result[1]:
-                            self.__logger.debug(f"unknown parameter: key={key}, value={value}")
-                            continue
-
-                        option_list.append(arg_item)
-
-                    try:
-                        src_network = self.__parse_tc_filter_src_network(tc_filter)
-                        if src_network not in (
-                            Network.Ipv4.ANYWHERE,
-                            Network.Ipv6.ANYWHERE,
-                        ):
-                            option_list.append(f"--src-network={src_network:s}")
-                    except pp.ParseException:
-                        pass
-
-                    try:
-                        dst_network = self.__parse_tc_filter_dst_network(tc_filter)
-                        if dst_network not in (
-                            Network.Ipv4.ANYWHERE,
-                            Network.Ipv6.ANYWHERE,
-                        ):
-                            option_list.append(f"--dst-network={dst_network:s}")
-                    except pp.ParseException:
-                        pass
-
-                    try:
-                        src_port = self.__parse_tc_filter_src_port(tc_filter)
-                        option_list.append(f"--src-port={src_port}")
-                    except pp.ParseException:
-                        pass
-
-                    try:
-                        dst_port = self.__parse_tc_filter_dst_port(tc_filter)
-                        option_list.append(f"--dst-port={dst_port}")
-                    except pp.ParseException:
-                        pass
-
-                    if not is_first_set:
-                        option_list.append("--add")
-
-                    if self.tc_command_output == TcCommandOutput.STDOUT:
-                        option_list.append("--tc-command")
-                    elif self.tc_command_output == TcCommandOutput.SCRIPT:
-                        option_list.append("--tc-script")
+        return del_command_list + change_command_list + add_command_list
 
-                    is_first_set = False
+    def __to_tcset_command(
+        self, target, is_container, direction, tc_filter, filter_table, extra_options
+    ):
+        from ._argparse_wrapper import has_option
+        from .tcset import get_arg_parser
 
-                    command_list.append(" ".join([Tc.Command.TCSET] + option_list))
+        if self.__tcset_parser is None:
+            self.__tcset_parser = get_arg_parser()
 
-        return command_list
+        option_items = [("direction", direction)] + ([("docker", True)] if is_container else [])
+
+        for key, value in filter_table.items():
+            if not has_option(self.__tcset_parser, key):
+                self.__logger.debug(f"unknown parameter: key={key}, value={value}")
+                continue
+
+            option_items.append((key, value))
+
+        filter_option_items = self.__to_filter_options(tc_filter)
+        option_items.extend(filter_option_items)
+        if self.__is_flower_filter(filter_option_items):
+            option_items.append(("classifier", Classifier.FLOWER))
+        option_items.extend(extra_options)
+
+        return TcConfigCommand(
+            Tc.Command.TCSET, target, option_items + self.__to_tc_command_output_options()
+        )
+
+    def __to_tcdel_all_command(self, target, is_container):
+        return TcConfigCommand(
+            Tc.Command.TCDEL,
+            target,
+            [("all", True)]
+            + ([("docker", True)] if is_container else [])
+            + self.__to_tc_command_output_options(),
+        )
+
+    def __to_tcdel_command(self, target, is_container, direction, tc_filter):
+        return TcConfigCommand(
+            Tc.Command.TCDEL,
+            target,
+            [("direction", direction)]
+            + ([("docker", True)] if is_container else [])
+            + self.__to_filter_options(tc_filter)
+            + self.__to_tc_command_output_options(),
+        )
+
+    def __to_tc_command_output_options(self):
+        if self.tc_command_output == TcCommandOutput.STDOUT:
+            return [("tc-command", True)]
+        if self.tc_command_output == TcCommandOutput.SCRIPT:
+            return [("tc-script", True)]
+
+        return []
+
+    def __to_filter_options(self, tc_filter):
+        """
+        :return: Pairs of option names and values that select the filter.
+        :raises ValueError: If the filter can not be expressed by the options of the commands.
+        """
+
+        if Tc.Param.NETWORK_SET in self.__to_filter_key_items(tc_filter):
+            # commands without the filter would shape all of the traffic of the device
+            raise ValueError(
+                f"filters of network sets can not be imported: '{tc_filter}' "
+                "(use tcset --dst-network-file instead)"
+            )
+
+        option_items = []
+
+        if self.__get_filter_ip_version(tc_filter) == 6:
+            option_items.append(("ipv6", True))
+
+        try:
+            src_network = self.__parse_tc_filter_src_network(tc_filter)
+            if src_network not in (
+                Network.Ipv4.ANYWHERE,
+                Network.Ipv6.ANYWHERE,
+            ):
+                option_items.append(("src-network", src_network))
+        except pp.ParseException:
+            pass
+
+        try:
+            dst_network = self.__parse_tc_filter_dst_network(tc_filter)
+            if dst_network not in (
+                Network.Ipv4.ANYWHERE,
+                Network.Ipv6.ANYWHERE,
+            ):
+                option_items.append(("dst-network", dst_network))
+        except pp.ParseException:
+            pass
+
+        try:
+            src_port = self.__parse_tc_filter_src_port(tc_filter)
+            option_items.append(("src-port", src_port))
+        except pp.ParseException:
+            pass
+
+        try:
+            dst_port = self.__parse_tc_filter_dst_port(tc_filter)
+            option_items.append(("dst-port", dst_port))
+        except pp.ParseException:
+            pass
+
+        try:
+            ip_proto = self.__parse_tc_filter_ip_proto(tc_filter)
+            option_items.append(("ip-proto", ip_proto))
+        except pp.ParseException:
+            pass
+
+        return option_items
+
+    @staticmethod
+    def __is_flower_filter(filter_option_items):
+        # L4 protocols and port ranges can only be matched by flower filters
+        for name, value in filter_option_items:
+            if name == "ip-proto":
+                return True
+
+            if name in ("src-port", "dst-port") and "-" in value:
+                return True
+
+        return False
+
+    @staticmethod
+    def __to_device(device):
+        # e.g. edfd9dbb3969 (device=veth6f7b798)
+        match = RE_CONTAINER_DEVICE.search(device)
+        if match is None:
+            return device
+
+        return match.group("device")
+
+    @staticmethod
+    def __to_filter_key(tc_filter):
+        # filter keys of a config file might be written in a different order/spacing
+        return frozenset(item.strip() for item in tc_filter.split(",") if item.strip())
+
+    @classmethod
+    def __to_filter_key_items(cls, tc_filter):
+        return dict(item.split("=", 1) for item in cls.__to_filter_key(tc_filter) if "=" in item)
+
+    @classmethod
+    def __get_filter_ip_version(cls, tc_filter):
+        key_items = cls.__to_filter_key_items(tc_filter)
+        protocol = key_items.get(Tc.Param.PROTOCOL)
+
+        if protocol == "ipv6":
+            return 6
+        if protocol == "ip":
+            return 4
+
+        # filters of mangle marks have L4 protocols: e.g. protocol=all
+        for param in (Tc.Param.SRC_NETWORK, Tc.Param.DST_NETWORK):
+            if ":" in key_items.get(param, ""):
+                return 6
+
+        return 4
+
+    @staticmethod
+    def __to_shaping_params(filter_table):
+        return {key: str(value) for key, value in filter_table.items() if key != Tc.Param.FILTER_ID}
 
     @staticmethod
     def __parse_tc_filter_src_network(text):
         network_pattern = pp.SkipTo(f"{Tc.Param.SRC_NETWORK:s}=", include=True) + pp.Word(
-            pp.alphanums + "." + "/"
+            pp.alphanums + ".:/"
         )
 
         return network_pattern.parseString(text)[-1]
@@ -146,31 +420,91 @@ class TcConfigLoader:
     @staticmethod
     def __parse_tc_filter_dst_network(text):
         network_pattern = pp.SkipTo(f"{Tc.Param.DST_NETWORK:s}=", include=True) + pp.Word(
-            pp.alphanums + "." + "/"
+            pp.alphanums + ".:/"
         )
 
         return network_pattern.parseString(text)[-1]
 
     @staticmethod
     def __parse_tc_filter_src_port(text):
-        port_pattern = pp.SkipTo(f"{Tc.Param.SRC_PORT:s}=", include=True) + pp.Word(pp.nums)
+        port_pattern = pp.SkipTo(f"{Tc.Param.SRC_PORT:s}=", include=True) + pp.Word(pp.nums + "-")
 
         return port_pattern.parseString(text)[-1]
 
     @staticmethod
     def __parse_tc_filter_dst_port(text):
-        port_pattern = pp.SkipTo(f"{Tc.Param.DST_PORT:s}=", include=True) + pp.Word(pp.nums)
+        port_pattern = pp.SkipTo(f"{Tc.Param.DST_PORT:s}=", include=True) + pp.Word(pp.nums + "-")
 
         return port_pattern.parseString(text)[-1]
 
+    @staticmethod
+    def __parse_tc_filter_ip_proto(text):
+        ip_proto_pattern = pp.SkipTo(f"{Tc.Param.IP_PROTO:s}=", include=True) + pp.Word(
+            pp.alphanums
+        )
+
+        return ip_proto_pattern.parseString(text)[-1]
+
+
+def to_tcconfig_options(tcconfig_command: TcConfigCommand, log_level: str):
+    """
+    Make the options of tcset/tcdel that a |TcConfigCommand| represents
+    without parsing command line arguments.
+
+    :rtype: argparse.Namespace
+    :raises ValueError: If the command has invalid options.
+    """
+
+    from ._argparse_wrapper import get_default_options, set_option_value
+
+    if tcconfig_command.command == Tc.Command.TCDEL:
+        from .tcdel import get_arg_parser
+    elif tcconfig_command.command == Tc.Command.TCSET:
+        from .tcset import get_arg_parser
+    else:
+        raise ValueError(f"unknown command: {tcconfig_command.command}")
+
+    parser = get_arg_parser()
+    options = get_default_options(parser)
+    options.device = [tcconfig_command.target]
+
+    for name, value in tcconfig_command.option_items:
+        set_option_value(parser, options, name, value)
+
+    options.log_level = log_level
+
+    return options
+
+
+def apply_tcconfig_command(tcconfig_command: TcConfigCommand, options) -> int:
+    """
+    Apply a tcset/tcdel command in the current process instead of executing it.
+    """
+
+    from .tcdel import TcDelMain
+    from .tcset import TcSetMain
+
+    spr.SubprocessRunner.clear_history()
+
+    if tcconfig_command.command == Tc.Command.TCDEL:
+        return TcDelMain(options).run(options.is_delete_all)
+
+    return TcSetMain(options).run()
+
 
 def set_tc_from_file(
-    logger, config_file_path: str, is_overwrite: bool, tc_command_output: Optional[str]
+    logger,
+    config_file_path: str,
+    is_overwrite: bool,
+    tc_command_output: Optional[str],
+    log_level: str = LogLevel.INFO,
+    is_reconcile: bool = False,
 ) -> int:
     return_code = 0
 
     loader = TcConfigLoader(logger)
     loader.is_overwrite = is_overwrite
+    loader.is_reconcile = is_reconcile
     loader.tc_command_output = tc_command_output
 
     try:
@@ -179,13 +513,18 @@ def set_tc_from_file(
         logger.error(msgfy.to_error_message(e))
         return errno.EIO
 
-    for tcconfig_command in loader.get_tcconfig_commands():
-        runner = spr.SubprocessRunner(tcconfig_command)
-        return_code |= runner.run()
+    try:
+        # options of all of the commands are verified before applying any of them
+        tcconfig_commands = [
+            (tcconfig_command, to_tcconfig_options(tcconfig_command, log_level))
+            for tcconfig_command in loader.build_tcconfig_commands()
+        ]
+    except ValueError as e:
+        logger.error(msgfy.to_error_message(e))
+        return errno.EINVAL
 
-        if return_code != 0:
-            logger.error(runner.stderr)
-        elif tc_command_output == TcCommandOutput.STDOUT:
-            print(runner.stdout.strip())
+    for tcconfig_command, options in tcconfig_commands:
+        logger.debug(f"apply: {tcconfig_command}")
+        return_code |= apply_tcconfig_command(tcconfig_command, options)
 
     return return_code
@@ -0,0 +1,184 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import errno
+import hashlib
+import os
+import re
+
+from subprocrunner import SubprocessRunner
+
+from ._common import find_bin_path
+from ._logger import LogLevel, logger
+from ._network import sanitize_network
+
+
+SET_NAME_PREFIX = "tc_"
+
+# the maximum length of ipset names is 31 characters
+_MAX_SET_NAME_LEN = 31
+_MAX_SET_NAME_STEM_LEN = 18
+_TEMP_SET_NAME_SUFFIX = "_n"
+_DEFAULT_MAXELEM = 65536
+
+_RE_NUM_ENTRIES = re.compile(r"^Number of entries:\s*(?P<count>\d+)", re.MULTILINE)
+
+
+def get_ipset_command():
+    # fall back to the command name: dry runs output commands even if ipset is not installed
+    return find_bin_path("ipset") or "ipset"
+
+
+def make_network_set_name(network_file, ip_version):
+    """
+    :return:
+        The name of the set that stores the networks of a file:
+        ``tc_<stem of the file name>_<hash of the file path and the ip version>``.
+    :rtype: str
+    """
+
+    stem = os.path.splitext(os.path.basename(network_file))[0]
+    stem = re.sub(r"[^\w-]", "_", stem)[:_MAX_SET_NAME_STEM_LEN]
+    digest = hashlib.md5(
+        f"{os.path.realpath(network_file)}:{ip_version}".encode("utf-8")
+    ).hexdigest()[:6]
+
+    return f"{SET_NAME_PREFIX:s}{stem:s}_{digest:s}"
+
+
+def load_network_file(network_file, ip_version):
+    """
+    Load networks from a file that written a network per line.
+    Empty lines and comments (start with ``#``) are ignored.
+
+    :return: Sanitized networks.
+    :rtype: list
+    :raises ValueError: If the file includes invalid networks.
+    """
+
+    networks = []
+
+    with open(network_file, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+
+            try:
+                networks.append(sanitize_network(line, ip_version))
+            except ValueError as e:
+                raise ValueError(
+                    f"invalid network at line {line_no:d} of {network_file}: {e}"
+                ) from e
+
+    return networks
+
+
+def to_temp_set_name(set_name):
+    """
+    :return: The name of the set that networks are restored to before swapped with a set.
+    :rtype: str
+    """
+
+    stem_len = _MAX_SET_NAME_LEN - len(_TEMP_SET_NAME_SUFFIX)
+
+    return f"{set_name[:stem_len]:s}{_TEMP_SET_NAME_SUFFIX:s}"
+
+
+def render_network_set_restore(set_name, networks, ip_version, is_set_exist=False):
+    """
+    :param bool is_set_exist:
+        Whether the set already exists: a set is created to swap with otherwise.
+    :return:
+        Lines of an ``ipset restore`` input that replaces the members of a ``hash:net`` set
+        with the networks. The networks are added to a temporary set and the sets are
+        swapped: the set is not empty while the members are replaced.
+    :rtype: list
+    """
+
+    family = "inet6" if ip_version == 6 else "inet"
+    # the temporary set is always created from scratch: the size of the current set
+    # does not limit the number of the networks
+    maxelem = max(_DEFAULT_MAXELEM, len(networks))
+    create_params = f"hash:net family {family:s} maxelem {maxelem:d}"
+    temp_set_name = to_temp_set_name(set_name)
+
+    lines = []
+    if not is_set_exist:
+        lines.append(f"create {set_name:s} {create_params:s}")
+
+    return (
+        lines
+        + [f"create {temp_set_name:s} {create_params:s}", f"flush {temp_set_name:s}"]
+        + [f"add {temp_set_name:s} {network:s}" for network in networks]
+        + [f"swap {temp_set_name:s} {set_name:s}", f"destroy {temp_set_name:s}"]
+    )
+
+
+class NetworkSetController:
+    """
+    Store networks to ``hash:net`` ipsets: filters match packets by a single
+    set lookup regardless of the number of the networks.
+    """
+
+    def __init__(self, ip_version):
+        self.__ip_version = ip_version
+
+    def restore(self, set_name, networks):
+        """
+        Replace the members of a set with the networks by an ``ipset restore`` execution.
+
+        :return: Return code of ``ipset``.
+        """
+
+        self.__check_execution_authority()
+
+        # outputs of dry runs may be executed on hosts that do not have the set
+        is_set_exist = (
+            not SubprocessRunner.default_is_dry_run and self.get_member_count(set_name) is not None
+        )
+        lines = render_network_set_restore(
+            set_name, networks, self.__ip_version, is_set_exist=is_set_exist
+        )
+        logger.debug(f"restore {len(networks):d} networks to the {set_name:s} set")
+
+        if SubprocessRunner.default_is_dry_run:
+            # execute commands one by one to output the commands with --tc-command/--tc-script
+            for line in lines:
+                proc = SubprocessRunner(f"{get_ipset_command():s} -exist {line:s}")
+                proc.run()
+
+            return proc.returncode
+
+        proc = SubprocessRunner(f"{get_ipset_command():s} -exist restore")
+        if proc.run(input="\n".join(lines) + "\n") != 0:
+            logger.error(f"failed to restore the {set_name:s} set: {proc.stderr.strip()}")
+
+        return proc.returncode
+
+    def get_member_count(self, set_name):
+        """
+        :return: The number of the members of a set. ``None`` if failed to get the set.
+        :rtype: int
+        """
+
+        proc = SubprocessRunner(
+            f"{get_ipset_command():s} list -terse {set_name:s}", error_log_level=LogLevel.QUIET
+        )
+        if proc.run() != 0:
+            logger.debug(f"failed to list the {set_name:s} set: {proc.stderr}")
+            return None
+
+        match = _RE_NUM_ENTRIES.search(proc.stdout)
+        if match is None:
+            return None
+
+        return int(match.group("count"))
+
+    @staticmethod
+    def __check_execution_authority():
+        from ._capabilities import get_permission_error_message, has_execution_authority
+
+        if not has_execution_authority("ipset"):
+            raise OSError(errno.EPERM, get_permission_error_message("ipset"))
@@ -3,6 +3,7 @@
 """
 
 import errno
+import os
 import re
 
 import typepy
@@ -19,19 +20,35 @@ from ._split_line_list import split_line_list
 VALID_CHAIN_LIST = ["PREROUTING", "INPUT", "OUTPUT"]
 
 
-def get_iptables_base_command():
-    iptables_path = find_bin_path("iptables")
+def get_iptables_base_command(ip_version=4):
+    command = "ip6tables" if ip_version == 6 else "iptables"
+    iptables_path = find_bin_path(command)
 
     if iptables_path:
-        if re.search("iptables$", iptables_path):
+        if re.search(f"{command:s}$", iptables_path):
             return iptables_path
 
         # debian/ubuntu may return /sbin/xtables-multi
-        return f"{iptables_path:s} iptables"
+        return f"{iptables_path:s} {command:s}"
 
     return None
 
 
+def get_iptables_restore_command(ip_version):
+    """
+    :return:
+        Path to ``iptables-restore``/``ip6tables-restore`` that corresponds to the
+        ``ip_version``. ``None`` if the command not found.
+    """
+
+    bin_path = find_bin_path("ip6tables-restore" if ip_version == 6 else "iptables-restore")
+    if not os.path.isabs(bin_path):
+        # find_bin_path returns the command name as it is if the command not found
+        return None
+
+    return bin_path
+
+
 class IptablesMangleMarkEntry:
     @property
     def line_number(self):
@@ -67,6 +84,7 @@ class IptablesMangleMarkEntry:
         protocol="all",
         line_number=None,
     ):
+        self.__ip_version = ip_version
         self.__line_number = line_number
         self.__mark_id = mark_id
         self.__source = sanitize_network(source, ip_version)
@@ -108,12 +126,37 @@ class IptablesMangleMarkEntry:
         return ", ".join(str_list)
 
     def to_append_command(self):
+        return "{:s} -A {:s} -t mangle {:s}".format(
+            get_iptables_base_command(self.__ip_version), self.chain, self.__to_rule_spec()
+        )
+
+    def to_delete_command(self):
+        Integer(self.line_number).validate()
+
+        return "{:s} -t mangle -D {:s} {}".format(
+            get_iptables_base_command(self.__ip_version), self.chain, self.line_number
+        )
+
+    def to_restore_append_line(self):
+        """
+        :return: A line of an ``iptables-restore`` input that appends the entry.
+        """
+
+        return f"-A {self.chain:s} {self.__to_rule_spec():s}"
+
+    def to_restore_delete_line(self):
+        """
+        :return: A line of an ``iptables-restore`` input that deletes the entry.
+        """
+
+        Integer(self.line_number).validate()
+
+        return f"-D {self.chain:s} {self.line_number}"
+
+    def __to_rule_spec(self):
         Integer(self.mark_id).validate()
 
-        command_item_list = [
-            f"{get_iptables_base_command():s} -A {self.chain:s} -t mangle -j MARK",
-            f"--set-mark {self.mark_id}",
-        ]
+        command_item_list = ["-j MARK", f"--set-mark {self.mark_id}"]
 
         if typepy.is_not_null_string(self.protocol) or Integer(self.protocol).is_type():
             command_item_list.append(f"-p {self.protocol}")
@@ -124,13 +167,6 @@ class IptablesMangleMarkEntry:
 
         return " ".join(command_item_list)
 
-    def to_delete_command(self):
-        Integer(self.line_number).validate()
-
-        return "{:s} -t mangle -D {:s} {}".format(
-            get_iptables_base_command(), self.chain, self.line_number
-        )
-
     @staticmethod
     def __is_valid_srcdst(srcdst):
         return typepy.is_not_null_string(srcdst) and srcdst not in (
@@ -139,12 +175,80 @@ class IptablesMangleMarkEntry:
         )
 
 
+class IptablesMangleSnapshot:
+    """
+    Snapshot of the mark entries of the iptables mangle table.
+    """
+
+    @property
+    def entries(self):
+        """
+        :return: Mark entries in the order of deletion: chains in the order of
+            ``VALID_CHAIN_LIST`` and line numbers in descending order for each chain.
+        :rtype: list
+        """
+
+        return sorted(
+            self.__entries,
+            key=lambda entry: (VALID_CHAIN_LIST.index(entry.chain), -entry.line_number),
+        )
+
+    @property
+    def mark_ids(self):
+        return set(self.__mark_table)
+
+    def __init__(self, entries, chain_line_counts):
+        self.__entries = []
+        self.__mark_table = {}  # mark id -> entry
+        self.__chain_line_counts = dict(chain_line_counts)
+
+        for entry in entries:
+            self.__append(entry)
+
+    def has_mark_id(self, mark_id):
+        return mark_id in self.__mark_table
+
+    def get_entry(self, mark_id):
+        return self.__mark_table.get(mark_id)
+
+    def add_entry(self, ip_version, entry):
+        """
+        Add an entry that was appended to the end of a chain by ``iptables -A``.
+        """
+
+        line_number = self.__chain_line_counts.get(entry.chain, 0) + 1
+        self.__chain_line_counts[entry.chain] = line_number
+
+        self.__append(
+            IptablesMangleMarkEntry(
+                ip_version=ip_version,
+                mark_id=entry.mark_id,
+                source=entry.source,
+                destination=entry.destination,
+                chain=entry.chain,
+                protocol=entry.protocol,
+                line_number=line_number,
+            )
+        )
+
+    def __append(self, entry):
+        self.__entries.append(entry)
+        self.__mark_table.setdefault(entry.mark_id, entry)
+
+
 class IptablesMangleController:
     __RE_CHAIN = re.compile("Chain {:s} |Chain {:s} |Chain {:s} ".format(*VALID_CHAIN_LIST))
     __RE_CHAIN_NAME = re.compile("{:s}|{:s}|{:s}".format(*VALID_CHAIN_LIST))
     __MAX_MARK_ID = 0xFFFFFFFF
     __MARK_ID_OFFSET = 100
 
+    # ip version -> IptablesMangleSnapshot: shared by the controllers of a process.
+    # discarded when the process deletes entries.
+    __snapshot_table = {}
+
+    # execution authority is verified once per process
+    __is_authority_verified = False
+
     @property
     def enable(self):
         return self.__enable
@@ -153,47 +257,156 @@ class IptablesMangleController:
         self.__enable = enable
         self.__ip_version = ip_version
 
+        # entries to be appended by the next flush()
+        self.__pending_entries = []
+
     def clear(self):
         if not self.enable:
             return
 
         self.__check_execution_authority()
+        self.flush()
 
-        for mangle in self.parse():
-            proc = SubprocessRunner(mangle.to_delete_command())
-            if proc.run() != 0:
-                raise OSError(proc.returncode, proc.stderr)
+        try:
+            mangle_list = list(self.parse())
+
+            if mangle_list and self.__is_bulk_available():
+                proc = self.__restore([mangle.to_restore_delete_line() for mangle in mangle_list])
+                if proc.returncode != 0:
+                    raise OSError(proc.returncode, proc.stderr)
+
+                return
+
+            for mangle in mangle_list:
+                proc = SubprocessRunner(mangle.to_delete_command())
+                if proc.run() != 0:
+                    raise OSError(proc.returncode, proc.stderr)
+        finally:
+            self.clear_snapshot()
 
     def get_iptables(self):
         self.__check_execution_authority()
 
-        proc = SubprocessRunner(f"{get_iptables_base_command():s} {LIST_MANGLE_TABLE_OPTION:s}")
+        proc = SubprocessRunner(
+            "{:s} {:s}".format(
+                get_iptables_base_command(self.__ip_version), LIST_MANGLE_TABLE_OPTION
+            )
+        )
         if proc.run() != 0:
             raise OSError(proc.returncode, proc.stderr)
 
         return proc.stdout
 
-    def get_unique_mark_id(self):
-        self.__check_execution_authority()
+    def get_snapshot(self):
+        """
+        :return: Snapshot of the mangle table.
+            The mangle table is read only at the first call in a process.
+        :rtype: IptablesMangleSnapshot
+        """
+
+        snapshot = self.__snapshot_table.get(self.__ip_version)
+        if snapshot is None:
+            snapshot = self.__parse_iptables(self.get_iptables())
+            self.__snapshot_table[self.__ip_version] = snapshot
+
+        return snapshot
 
-        mark_id_list = [mangle.mark_id for mangle in self.parse()]
-        logger.debug(f"mangle mark list: {mark_id_list}")
+    @classmethod
+    def clear_snapshot(cls):
+        cls.__snapshot_table.clear()
+
+    def get_unique_mark_id(self):
+        snapshot = self.get_snapshot()
+        logger.debug(f"mangle mark list: {sorted(snapshot.mark_ids)}")
 
         unique_mark_id = 1 + self.__MARK_ID_OFFSET
         while unique_mark_id < self.__MAX_MARK_ID:
-            if unique_mark_id not in mark_id_list:
+            if not snapshot.has_mark_id(unique_mark_id):
                 return unique_mark_id
 
             unique_mark_id += 1
 
         raise RuntimeError("usable mark id not found")
 
+    def get_mangle_mark(self, mark_id):
+        """
+        :return: Mark entry that has the ``mark_id``. ``None`` if not found.
+        :rtype: IptablesMangleMarkEntry
+        """
+
+        return self.get_snapshot().get_entry(mark_id)
+
     def parse(self):
+        yield from self.get_snapshot().entries
+
+    def add(self, mangling_mark):
+        """
+        Append an entry to the mangle table.
+        The entry is appended by the next ``flush()`` call if ``iptables-restore``
+        is available: entries are appended with a single ``iptables-restore`` execution.
+        """
+
+        if not self.enable:
+            return 0
+
         self.__check_execution_authority()
 
+        if self.__is_bulk_available():
+            self.__pending_entries.append(mangling_mark)
+            self.get_snapshot().add_entry(self.__ip_version, mangling_mark)
+
+            return 0
+
+        return_code = SubprocessRunner(mangling_mark.to_append_command()).run()
+        if return_code == 0:
+            self.get_snapshot().add_entry(self.__ip_version, mangling_mark)
+
+        return return_code
+
+    def flush(self):
+        """
+        Append the pending entries to the mangle table as a transaction.
+
+        :return: Return code of ``iptables-restore``.
+        """
+
+        if not self.__pending_entries:
+            return 0
+
+        pending_entries = self.__pending_entries
+        self.__pending_entries = []
+
+        proc = self.__restore([mangle.to_restore_append_line() for mangle in pending_entries])
+        if proc.returncode != 0:
+            logger.error(f"failed to append mangle table entries: {proc.stderr.strip()}")
+            # entries of the snapshot no longer match the mangle table
+            self.clear_snapshot()
+
+        return proc.returncode
+
+    def __is_bulk_available(self):
+        # execute commands one by one to output the commands with --tc-command/--tc-script
+        return not SubprocessRunner.default_is_dry_run and typepy.is_not_null_string(
+            get_iptables_restore_command(self.__ip_version)
+        )
+
+    def __restore(self, rule_lines):
+        """
+        Apply rules to the mangle table with a ``iptables-restore --noflush`` execution.
+        """
+
+        proc = SubprocessRunner(f"{get_iptables_restore_command(self.__ip_version):s} --noflush")
+        proc.run(input="\n".join(["*mangle"] + rule_lines + ["COMMIT", ""]))
+
+        return proc
+
+    def __parse_iptables(self, iptables_output):
         MANGLE_ITEM_COUNT = 6
 
-        for block in split_line_list(self.get_iptables().splitlines()):
+        entries = []
+        chain_line_counts = {}
+
+        for block in split_line_list(iptables_output.splitlines()):
             if len(block) <= 1:
                 # skip if there is no mangle table entry exists
                 continue
@@ -204,7 +417,7 @@ class IptablesMangleController:
 
             chain = self.__RE_CHAIN_NAME.search(match.group()).group()
 
-            for line in reversed(block[2:]):
+            for line in block[2:]:
                 item_list = line.split()
                 if len(item_list) < MANGLE_ITEM_COUNT:
                     continue
@@ -215,6 +428,8 @@ class IptablesMangleController:
                 source = item_list[4]
                 destination = item_list[5]
 
+                chain_line_counts[chain] = max(chain_line_counts.get(chain, 0), line_number)
+
                 try:
                     mark = int(item_list[-1], 16)
                 except ValueError:
@@ -223,28 +438,28 @@ class IptablesMangleController:
                 if target != "MARK":
                     continue
 
-                yield IptablesMangleMarkEntry(
-                    ip_version=self.__ip_version,
-                    mark_id=mark,
-                    source=source,
-                    destination=destination,
-                    chain=chain,
-                    protocol=protocol,
-                    line_number=line_number,
+                entries.append(
+                    IptablesMangleMarkEntry(
+                        ip_version=self.__ip_version,
+                        mark_id=mark,
+                        source=source,
+                        destination=destination,
+                        chain=chain,
+                        protocol=protocol,
+                        line_number=line_number,
+                    )
                 )
 
-    @classmethod
-    def add(cls, mangling_mark):
-        if not cls.enable:
-            return 0
-
-        cls.__check_execution_authority()
-
-        return SubprocessRunner(mangling_mark.to_append_command()).run()
+        return IptablesMangleSnapshot(entries, chain_line_counts)
 
-    @staticmethod
-    def __check_execution_authority():
+    @classmethod
+    def __check_execution_authority(cls):
         from ._capabilities import get_permission_error_message, has_execution_authority
 
+        if cls.__is_authority_verified:
+            return
+
         if not has_execution_authority("iptables"):
             raise OSError(errno.EPERM, get_permission_error_message("iptables"))
+
+        cls.__is_authority_verified = True
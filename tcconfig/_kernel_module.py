@@ -0,0 +1,162 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import os
+
+import msgfy
+import subprocrunner as spr
+
+from ._const import TcCommandOutput
+from ._logger import logger
+
+
+PROC_MODULES_PATH = "/proc/modules"
+LIB_MODULES_DIR_PATH = "/lib/modules"
+SYS_MODULE_DIR_PATH = "/sys/module"
+
+
+class KernelModule:
+    NETEM = "sch_netem"
+    HTB = "sch_htb"
+    TBF = "sch_tbf"
+    U32 = "cls_u32"
+    FLOWER = "cls_flower"
+    FW = "cls_fw"
+    IFB = "ifb"
+
+
+class _ModuleState:
+    # states of kernel modules are read once in a process
+    loaded_modules = None
+    builtin_modules = None
+    is_sys_module_available = None
+
+
+def clear_module_state_cache():
+    _ModuleState.loaded_modules = None
+    _ModuleState.builtin_modules = None
+    _ModuleState.is_sys_module_available = None
+
+
+def _to_module_name(name):
+    # module names of /proc/modules use underscores in place of hyphens
+    return name.replace("-", "_")
+
+
+def _read_loaded_modules():
+    """
+    :return: Names of the loadable modules that loaded. |None| if ``/proc/modules`` not found.
+    :rtype: set
+    """
+
+    try:
+        with open(PROC_MODULES_PATH) as f:
+            return {line.split(" ", 1)[0] for line in f if line.strip()}
+    except OSError as e:
+        logger.debug(f"failed to read {PROC_MODULES_PATH:s}: {e}")
+        return None
+
+
+def _read_builtin_modules():
+    """
+    :return:
+        Names of the modules that built into the kernel.
+        |None| if ``modules.builtin`` of the running kernel not found.
+    :rtype: set
+    """
+
+    builtin_path = os.path.join(LIB_MODULES_DIR_PATH, os.uname().release, "modules.builtin")
+
+    try:
+        with open(builtin_path) as f:
+            # e.g. kernel/net/sched/sch_htb.ko
+            return {
+                _to_module_name(os.path.basename(line.strip()).split(".", 1)[0])
+                for line in f
+                if line.strip()
+            }
+    except OSError as e:
+        logger.debug(f"failed to read {builtin_path:s}: {e}")
+        return None
+
+
+def _load_module_state():
+    if _ModuleState.is_sys_module_available is not None:
+        return
+
+    _ModuleState.loaded_modules = _read_loaded_modules()
+    _ModuleState.builtin_modules = _read_builtin_modules()
+    _ModuleState.is_sys_module_available = os.path.isdir(SYS_MODULE_DIR_PATH)
+
+
+def is_module_available(name):
+    """
+    Check whether a kernel module is loaded or built into the kernel without
+    executing ``lsmod``.
+
+    :return: |None| if the state of the module can not be determined.
+    :rtype: bool
+    """
+
+    _load_module_state()
+
+    name = _to_module_name(name)
+
+    if _ModuleState.builtin_modules is not None and name in _ModuleState.builtin_modules:
+        return True
+
+    if _ModuleState.loaded_modules is not None and name in _ModuleState.loaded_modules:
+        return True
+
+    if _ModuleState.is_sys_module_available:
+        # loaded modules and built-in modules that have parameters exist under /sys/module
+        return os.path.isdir(os.path.join(SYS_MODULE_DIR_PATH, name))
+
+    if _ModuleState.loaded_modules is None or _ModuleState.builtin_modules is None:
+        # the module may be loaded or built into the kernel
+        return None
+
+    return False
+
+
+def find_unavailable_modules(names):
+    """
+    :return: Names of the modules that are neither loaded nor built into the kernel.
+        Modules that the states can not be determined are not included.
+    :rtype: list
+    """
+
+    return [name for name in names if is_module_available(name) is False]
+
+
+def load_module(name, tc_command_output=TcCommandOutput.NOT_SET):
+    """
+    Execute ``modprobe`` if a kernel module is not available.
+    ``modprobe`` is always added to the command history when commands are not executed:
+    outputs of the commands may be executed in another environment.
+
+    :return: Return code of ``modprobe``.
+    :rtype: int
+    """
+
+    from ._common import is_execute_tc_command
+
+    if is_execute_tc_command(tc_command_output) and is_module_available(name):
+        logger.debug(f"{name:s} module already available")
+        return 0
+
+    runner = spr.SubprocessRunner(f"modprobe {name:s}")
+
+    try:
+        return_code = runner.run()
+    except spr.CommandError as e:
+        logger.debug(msgfy.to_debug_message(e))
+        return 0
+
+    if return_code != 0:
+        logger.error(runner.stderr)
+    elif is_execute_tc_command(tc_command_output) and _ModuleState.loaded_modules is not None:
+        _ModuleState.loaded_modules.add(_to_module_name(name))
+
+    return return_code
@@ -4,7 +4,6 @@
 
 import sys
 
-import simplesqlite
 import subprocrunner
 from loguru import logger
 
@@ -26,9 +25,12 @@ def set_logger(is_enable):
     else:
         logger.disable(MODULE_NAME)
 
-    simplesqlite.set_logger(is_enable)
     subprocrunner.set_logger(is_enable)
 
+    # simplesqlite is imported only by the code paths that use SQLite
+    if "simplesqlite" in sys.modules:
+        sys.modules["simplesqlite"].set_logger(is_enable)
+
 
 def set_log_level(log_level):
     if log_level == LogLevel.QUIET:
@@ -1,20 +1,47 @@
+import multiprocessing
+import os
 import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 import msgfy
-from docker.errors import DockerException
+import subprocrunner as spr
 
 from ._const import TcCommandOutput
-from ._docker import DockerClient
 from ._logger import logger
+from ._network import expand_network_interfaces
 from ._tc_script import write_tc_script
 
 
+TargetResult = namedtuple("TargetResult", "target return_code command_history filename_suffix")
+
+# function that forked worker processes apply to targets
+_apply_func = None
+
+
+def _apply(apply_func, target):
+    # command histories are stored for each target
+    spr.SubprocessRunner.clear_history()
+
+    return apply_func(target)
+
+
+def _apply_in_worker(target):
+    return _apply(_apply_func, target)
+
+
 class Main:
     def __init__(self, options):
         self._options = options
 
         self._dclient = None
         if self._options.use_docker:
+            # docker is imported only when containers are the targets:
+            # the import takes a large part of the startup time
+            from docker.errors import DockerException
+
+            from ._docker import DockerClient
+
             try:
                 self._dclient = DockerClient(options.tc_command_output)
             except DockerException as e:
@@ -35,16 +62,91 @@ class Main:
 
     def _fetch_tc_targets(self):
         if not self._options.use_docker:
-            return [self._options.device]
+            return expand_network_interfaces(self._options.device)
 
-        container = self._options.device
+        tc_targets = []
 
-        self._dclient.verify_container(container, exit_on_exception=True)
-        self._dclient.create_veth_table(container)
+        for container in self._options.device:
+            self._dclient.verify_container(container, exit_on_exception=True)
+            self._dclient.create_veth_table(container)
+
+            tc_targets.extend(
+                self._dclient.fetch_veth_list(self._dclient.extract_container_info(container).name)
+            )
+
+        return tc_targets
+
+    def _run_targets(self, tc_targets, apply_func, tc_command):
+        """
+        Call ``apply_func`` for each of the targets and dump the command histories of
+        the targets in order.
+        Multiple targets are applied concurrently by forked worker processes since
+        qdisc trees of network interfaces are independent of each other.
+        Targets are applied sequentially when rules share state across the targets
+        (iptables/nftables marks and ipset network sets): worker processes would
+        allocate the same ids independently.
+
+        :param apply_func: Function that returns a ``TargetResult`` of a target.
+        :return: Combined return code of the targets.
+        """
+
+        global _apply_func
+
+        if self._is_shared_state_used():
+            max_workers = 1
+        else:
+            max_workers = min(len(tc_targets), self._options.jobs or os.cpu_count() or 1)
+
+        if max_workers <= 1:
+            results = [_apply(apply_func, tc_target) for tc_target in tc_targets]
+        else:
+            logger.debug(f"apply to {len(tc_targets)} targets with {max_workers} workers")
+
+            _apply_func = apply_func
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=max_workers, mp_context=multiprocessing.get_context("fork")
+                ) as executor:
+                    results = list(executor.map(_apply_in_worker, tc_targets))
+            finally:
+                _apply_func = None
 
-        return self._dclient.fetch_veth_list(self._dclient.extract_container_info(container).name)
+        for result in results:
+            if result.command_history is None:
+                continue
+
+            filename_suffix = result.filename_suffix
+            if not filename_suffix and len(results) > 1:
+                filename_suffix = result.target
+
+            self._dump_history(result.command_history, tc_command, filename_suffix)
+
+        return self._get_return_code([result.return_code for result in results])
+
+    def _is_shared_state_used(self):
+        options = self._options
+
+        return bool(getattr(options, "is_enable_iptables", False) or options.dst_network_file)
+
+    @staticmethod
+    def _to_target_result(tc_target, return_code, tc=None):
+        if tc is None:
+            return TargetResult(tc_target, return_code, None, None)
+
+        try:
+            filename_suffix = tc.netem_param.make_param_name()
+        except AttributeError:
+            filename_suffix = None
+
+        return TargetResult(tc_target, return_code, list(tc.get_command_history()), filename_suffix)
 
     def _get_return_code(self, return_code_list):
+        """
+        :return:
+            ``0`` if any of the targets succeeded.
+            Otherwise, the return code of the last failed target.
+        """
+
         error_return_code = None
 
         for return_code in return_code_list:
@@ -55,19 +157,14 @@ class Main:
 
         return error_return_code
 
-    def _dump_history(self, tc, tc_command):
-        command_history = "\n".join(tc.get_command_history())
+    def _dump_history(self, command_history, tc_command, filename_suffix=None):
+        command_history = "\n".join(command_history)
         command_output = self._options.tc_command_output
 
         if command_output == TcCommandOutput.STDOUT:
             print(command_history)
             return
 
-        try:
-            filename_suffix = tc.netem_param.make_param_name()
-        except AttributeError:
-            filename_suffix = None
-
         if command_output == TcCommandOutput.SCRIPT:
             write_tc_script(tc_command, command_history, filename_suffix=filename_suffix)
             return
@@ -0,0 +1,604 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import ipaddress
+import os
+import shlex
+from collections import namedtuple
+
+import subprocrunner as spr
+from pyroute2 import IPRoute, protocols
+from pyroute2.netlink.exceptions import NetlinkError
+from pyroute2.netlink.rtnl import TC_H_INGRESS, TC_H_ROOT
+
+from ._const import TcBackend
+from ._logger import LogLevel, logger
+from ._tc_backend import CommandResult, TcBackendInterface
+from ._tc_snapshot import invalidate_snapshot
+
+
+NetlinkRequest = namedtuple("NetlinkRequest", "method command kind device params")
+
+_PRIO_QDISC_PRIOMAP = [1, 2, 2, 2, 1, 2, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1]
+_ETHER_PROTOCOL_MAP = {
+    "all": protocols.ETH_P_ALL,
+    "ip": protocols.ETH_P_IP,
+    "ipv6": protocols.ETH_P_IPV6,
+}
+
+
+class UnsupportedCommandError(ValueError):
+    """
+    Exception raised when a command line can not be translated to a netlink request.
+    """
+
+
+def to_tc_handle(text):
+    """
+    Convert a tc handle/classid notation (e.g. ``1a1a:``, ``1a1a:2``) to an integer.
+    Both the major and minor numbers are hexadecimal as with the tc command.
+    """
+
+    major, sep, minor = text.partition(":")
+    if not sep:
+        raise UnsupportedCommandError(f"invalid handle: {text}")
+
+    return (int(major or "0", 16) << 16) | int(minor or "0", 16)
+
+
+def to_u32_filter_handle(text):
+    # u32 filter handles consist of htid:hash:node
+    items = text.split(":")
+    if len(items) != 3:
+        raise UnsupportedCommandError(f"invalid u32 filter handle: {text}")
+
+    htid, hash_id, node = [int(item or "0", 16) for item in items]
+
+    return (htid << 20) | (hash_id << 12) | node
+
+
+def _parse_value_with_unit(text, unit_table, default_unit):
+    value = text.rstrip("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ%")
+    unit = text[len(value) :] or default_unit
+
+    try:
+        return float(value) * unit_table[unit.casefold()]
+    except (KeyError, ValueError) as e:
+        raise UnsupportedCommandError(f"invalid value: {text}") from e
+
+
+def to_bytes_per_sec(text):
+    # same as the rate units of iproute2 (case insensitive, SI prefixes)
+    bits_per_sec = _parse_value_with_unit(
+        text,
+        {"bit": 1, "kbit": 1000, "mbit": 1000**2, "gbit": 1000**3, "tbit": 1000**4},
+        default_unit="bit",
+    )
+
+    return int(bits_per_sec / 8)
+
+
+def to_bytes(text):
+    # same as the size units of iproute2 (case insensitive)
+    return int(
+        _parse_value_with_unit(
+            text,
+            {
+                "b": 1,
+                "k": 1024,
+                "kb": 1024,
+                "kbit": 1024 / 8,
+                "m": 1024**2,
+                "mb": 1024**2,
+                "mbit": 1024**2 / 8,
+                "g": 1024**3,
+                "gb": 1024**3,
+                "gbit": 1024**3 / 8,
+            },
+            default_unit="b",
+        )
+    )
+
+
+def to_usec(text):
+    return _parse_value_with_unit(
+        text, {"s": 1000**2, "ms": 1000, "us": 1, "usec": 1}, default_unit="us"
+    )
+
+
+def to_percent(text):
+    try:
+        return float(text.rstrip("%"))
+    except ValueError as e:
+        raise UnsupportedCommandError(f"invalid percentage: {text}") from e
+
+
+def _is_time_str(text):
+    try:
+        to_usec(text)
+    except UnsupportedCommandError:
+        return False
+
+    return True
+
+
+class TcNetlinkTranslator:
+    """
+    Translate ``tc``/``ip`` command lines that generated by tcconfig into netlink requests.
+    """
+
+    class U32Offset:
+        class Ipv4:
+            SRC_NETWORK = 12
+            DST_NETWORK = 16
+            PORT = 20
+
+        class Ipv6:
+            SRC_NETWORK = 8
+            DST_NETWORK = 24
+            PORT = 40
+
+    def translate(self, command):
+        try:
+            tokens = shlex.split(command)
+        except ValueError as e:
+            raise UnsupportedCommandError(e) from e
+
+        if len(tokens) < 3:
+            raise UnsupportedCommandError(f"too short command: {command}")
+
+        bin_name = os.path.basename(tokens[0])
+        object_name = tokens[1]
+        action = tokens[2]
+        args = tokens[3:]
+
+        if bin_name == "tc":
+            if object_name == "qdisc":
+                return self.__translate_qdisc(command, action, args)
+            if object_name == "class":
+                return self.__translate_class(command, action, args)
+            if object_name == "filter":
+                return self.__translate_filter(command, action, args)
+        elif bin_name == "ip" and object_name == "link":
+            return self.__translate_link(command, action, args)
+
+        raise UnsupportedCommandError(f"unsupported command: {command}")
+
+    @staticmethod
+    def __pop(args, name):
+        try:
+            return args.pop(0)
+        except IndexError as e:
+            raise UnsupportedCommandError(f"missing a value for '{name}'") from e
+
+    def __translate_qdisc(self, command, action, args):
+        if action not in ("add", "change", "del"):
+            raise UnsupportedCommandError(f"unsupported qdisc action: {action}")
+
+        device = None
+        kind = None
+        params = {}
+
+        while args:
+            token = args.pop(0)
+
+            if token == "dev":
+                device = self.__pop(args, token)
+            elif token == "root":
+                params["parent"] = TC_H_ROOT
+            elif token == "ingress":
+                kind = "ingress"
+                params["parent"] = TC_H_INGRESS
+                if action != "del":
+                    params["handle"] = 0xFFFF0000
+            elif token in ("parent", "handle"):
+                params[token] = to_tc_handle(self.__pop(args, token))
+            elif token == "htb":
+                kind = token
+                params.update(self.__parse_htb_qdisc_options(args))
+            elif token == "prio":
+                kind = token
+                params.update({"bands": 3, "priomap": _PRIO_QDISC_PRIOMAP})
+            elif token == "tbf":
+                kind = token
+                params.update(self.__parse_tbf_options(args))
+            elif token == "netem":
+                kind = token
+                params.update(self.__parse_netem_options(args))
+            else:
+                raise UnsupportedCommandError(f"unsupported qdisc argument: {token}")
+
+        if action == "del":
+            kind = None
+        elif kind is None:
+            raise UnsupportedCommandError(f"qdisc kind not found: {command}")
+
+        return NetlinkRequest(method="tc", command=action, kind=kind, device=device, params=params)
+
+    def __translate_class(self, command, action, args):
+        if action not in ("add", "change"):
+            raise UnsupportedCommandError(f"unsupported class action: {action}")
+
+        device = None
+        kind = None
+        params = {}
+
+        while args:
+            token = args.pop(0)
+
+            if token == "dev":
+                device = self.__pop(args, token)
+            elif token in ("parent", "classid"):
+                params["parent" if token == "parent" else "handle"] = to_tc_handle(
+                    self.__pop(args, token)
+                )
+            elif token == "htb":
+                kind = token
+            elif token in ("rate", "ceil") and kind == "htb":
+                params[token] = to_bytes_per_sec(self.__pop(args, token))
+            elif token in ("burst", "cburst") and kind == "htb":
+                params[token] = to_bytes(self.__pop(args, token))
+            else:
+                raise UnsupportedCommandError(f"unsupported class argument: {token}")
+
+        if kind is None:
+            raise UnsupportedCommandError(f"class kind not found: {command}")
+
+        return NetlinkRequest(
+            method="tc", command=f"{action:s}-class", kind=kind, device=device, params=params
+        )
+
+    def __translate_filter(self, command, action, args):
+        if action not in ("add", "del"):
+            raise UnsupportedCommandError(f"unsupported filter action: {action}")
+
+        device = None
+        kind = None
+        handle = None
+        params = {}
+        keys = []
+
+        while args:
+            token = args.pop(0)
+
+            if token == "dev":
+                device = self.__pop(args, token)
+            elif token == "protocol":
+                protocol = self.__pop(args, token)
+                try:
+                    params["protocol"] = _ETHER_PROTOCOL_MAP[protocol]
+                except KeyError as e:
+                    raise UnsupportedCommandError(f"unsupported protocol: {protocol}") from e
+            elif token == "parent":
+                params["parent"] = to_tc_handle(self.__pop(args, token))
+            elif token in ("prio", "pref"):
+                params["prio"] = int(self.__pop(args, token))
+            elif token == "handle":
+                handle = self.__pop(args, token)
+            elif token in ("u32", "fw"):
+                kind = token
+            elif token == "match" and kind == "u32":
+                keys.extend(self.__parse_u32_match(args))
+            elif token in ("flowid", "classid"):
+                params["target"] = to_tc_handle(self.__pop(args, token))
+            elif token == "action":
+                params["action"] = self.__parse_action(args)
+            else:
+                raise UnsupportedCommandError(f"unsupported filter argument: {token}")
+
+        if kind is None:
+            raise UnsupportedCommandError(f"filter kind not found: {command}")
+
+        if handle is not None:
+            if kind == "u32":
+                params["handle"] = to_u32_filter_handle(handle)
+            else:
+                params["handle"] = int(handle, 0)
+
+        if action == "add":
+            if kind == "u32":
+                params["keys"] = keys if keys else ["0x0/0x0+0"]
+            elif kind == "fw":
+                params["classid"] = params.pop("target")
+
+        return NetlinkRequest(
+            method="tc", command=f"{action:s}-filter", kind=kind, device=device, params=params
+        )
+
+    def __translate_link(self, command, action, args):
+        if action == "add" and args[1:] == ["type", "ifb"]:
+            return NetlinkRequest(
+                method="link", command="add", kind="ifb", device=None, params={"ifname": args[0]}
+            )
+
+        if action == "set" and len(args) == 3 and args[0] == "dev" and args[2] in ("up", "down"):
+            return NetlinkRequest(
+                method="link", command="set", kind=None, device=args[1], params={"state": args[2]}
+            )
+
+        if action == "delete" and args[1:] in ([], ["type", "ifb"]):
+            return NetlinkRequest(
+                method="link", command="del", kind=None, device=args[0], params={}
+            )
+
+        raise UnsupportedCommandError(f"unsupported link command: {command}")
+
+    def __parse_htb_qdisc_options(self, args):
+        params = {}
+
+        while args:
+            token = args.pop(0)
+
+            if token == "default":
+                params["default"] = int(self.__pop(args, token), 16)
+            elif token == "r2q":
+                params["r2q"] = int(self.__pop(args, token))
+            else:
+                raise UnsupportedCommandError(f"unsupported htb argument: {token}")
+
+        return params
+
+    def __parse_tbf_options(self, args):
+        params = {}
+
+        while args:
+            token = args.pop(0)
+
+            if token == "rate":
+                params["rate"] = to_bytes_per_sec(self.__pop(args, token))
+            elif token in ("buffer", "burst"):
+                params["burst"] = to_bytes(self.__pop(args, token))
+            elif token == "limit":
+                params["limit"] = to_bytes(self.__pop(args, token))
+            else:
+                raise UnsupportedCommandError(f"unsupported tbf argument: {token}")
+
+        return params
+
+    def __parse_netem_options(self, args):
+        params = {}
+
+        while args:
+            token = args.pop(0)
+
+            if token in ("loss", "duplicate"):
+                params[token] = to_percent(self.__pop(args, token))
+            elif token == "corrupt":
+                params["prob_corrupt"] = to_percent(self.__pop(args, token))
+            elif token == "reorder":
+                params["prob_reorder"] = to_percent(self.__pop(args, token))
+            elif token == "limit":
+                params["limit"] = int(float(self.__pop(args, token)))
+            elif token == "delay":
+                params["delay"] = to_usec(self.__pop(args, token))
+                if args and _is_time_str(args[0]):
+                    params["jitter"] = to_usec(args.pop(0))
+            elif token == "distribution":
+                # pyroute2 can not load delay distribution tables
+                raise UnsupportedCommandError("delay distribution tables are not supported")
+            else:
+                raise UnsupportedCommandError(f"unsupported netem argument: {token}")
+
+        return params
+
+    def __parse_u32_match(self, args):
+        match_type = self.__pop(args, "match")
+
+        if match_type in ("ip", "ip6"):
+            field = self.__pop(args, match_type)
+            value = self.__pop(args, field)
+
+            if field in ("src", "dst"):
+                return self.__make_network_keys(match_type, field, value)
+
+            if field in ("sport", "dport"):
+                mask = int(self.__pop(args, field), 0)
+                offset = (
+                    self.U32Offset.Ipv4.PORT if match_type == "ip" else self.U32Offset.Ipv6.PORT
+                )
+                if field == "sport":
+                    return [f"0x{int(value) << 16:08x}/0x{mask << 16:08x}+{offset:d}"]
+
+                return [f"0x{int(value):08x}/0x{mask:08x}+{offset:d}"]
+
+            raise UnsupportedCommandError(f"unsupported match field: {field}")
+
+        if match_type == "u32":
+            value = int(self.__pop(args, match_type), 0)
+            mask = int(self.__pop(args, match_type), 0)
+            offset = 0
+            if args and args[0] == "at":
+                args.pop(0)
+                offset = int(self.__pop(args, "at"), 0)
+
+            return [f"0x{value:08x}/0x{mask:08x}+{offset:d}"]
+
+        raise UnsupportedCommandError(f"unsupported match type: {match_type}")
+
+    def __make_network_keys(self, match_type, field, value):
+        if match_type == "ip":
+            network = ipaddress.IPv4Network(value, strict=False)
+            offset = (
+                self.U32Offset.Ipv4.SRC_NETWORK
+                if field == "src"
+                else self.U32Offset.Ipv4.DST_NETWORK
+            )
+        else:
+            network = ipaddress.IPv6Network(value, strict=False)
+            offset = (
+                self.U32Offset.Ipv6.SRC_NETWORK
+                if field == "src"
+                else self.U32Offset.Ipv6.DST_NETWORK
+            )
+
+        if network.prefixlen == 0:
+            return [f"0x00000000/0x00000000+{offset:d}"]
+
+        address = int(network.network_address)
+        netmask = int(network.netmask)
+        word_count = network.max_prefixlen // 32
+        keys = []
+
+        for i in range(word_count):
+            shift = 32 * (word_count - i - 1)
+            mask = (netmask >> shift) & 0xFFFFFFFF
+            if mask == 0:
+                break
+
+            keys.append(f"0x{(address >> shift) & 0xFFFFFFFF:08x}/0x{mask:08x}+{offset + 4 * i:d}")
+
+        return keys
+
+    def __parse_action(self, args):
+        action_kind = self.__pop(args, "action")
+        if action_kind != "mirred":
+            raise UnsupportedCommandError(f"unsupported action: {action_kind}")
+
+        direction = self.__pop(args, action_kind)
+        action = self.__pop(args, direction)
+        if self.__pop(args, action) != "dev":
+            raise UnsupportedCommandError("mirred action requires a device")
+
+        return {
+            "kind": "mirred",
+            "direction": direction,
+            "action": action,
+            "dev": self.__pop(args, "dev"),
+        }
+
+
+class NetlinkBackend(TcBackendInterface):
+    """
+    Send traffic control requests (RTM_NEWQDISC/RTM_NEWTCLASS/RTM_NEWTFILTER etc.)
+    through a netlink socket rather than executing ``tc``/``ip`` commands.
+    Commands that can not be translated are executed by the fallback backend.
+    """
+
+    __ERROR_RETURN_CODE = 2
+
+    @property
+    def name(self):
+        return TcBackend.NETLINK
+
+    @property
+    def iproute(self):
+        if self.__ipr is None:
+            self.__ipr = IPRoute()
+
+        return self.__ipr
+
+    def __init__(self, fallback):
+        self.__fallback = fallback
+        self.__translator = TcNetlinkTranslator()
+        self.__ipr = None
+        self.__ifindex_cache = {}
+
+    def sync(self):
+        # requests are sent immediately: only the fallback backend may defer commands
+        self.__fallback.sync()
+
+    def discard(self):
+        self.__fallback.discard()
+
+    def close(self):
+        if self.__ipr is not None:
+            self.__ipr.close()
+            self.__ipr = None
+
+        self.__ifindex_cache = {}
+
+    def run(self, command, error_log_level=None, result_handler=None):
+        try:
+            request = self.__translator.translate(command)
+        except UnsupportedCommandError as e:
+            logger.debug(f"fallback to the {self.__fallback.name} backend: {e}")
+            return self.__fallback.run(
+                command, error_log_level=error_log_level, result_handler=result_handler
+            )
+
+        if spr.SubprocessRunner.default_is_dry_run:
+            self.__save_history(command)
+            return self._handle_result(
+                CommandResult(returncode=0, stdout="", stderr=""), result_handler
+            )
+
+        try:
+            result = self.__send(request)
+        except NetlinkError as e:
+            result = CommandResult(
+                returncode=self.__ERROR_RETURN_CODE,
+                stdout="",
+                stderr=f"RTNETLINK answers: {os.strerror(e.code):s}",
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            # reach here if pyroute2 failed to encode the request
+            logger.debug(f"fallback to the {self.__fallback.name} backend: {e}")
+            return self.__fallback.run(
+                command, error_log_level=error_log_level, result_handler=result_handler
+            )
+
+        self.__save_history(command)
+        invalidate_snapshot(command)
+
+        if result.returncode != 0 and error_log_level != LogLevel.QUIET:
+            logger.warning(
+                f"command='{command}', returncode={result.returncode}, stderr={result.stderr!r}"
+            )
+
+        return self._handle_result(result, result_handler)
+
+    def __get_ifindex(self, device):
+        if device not in self.__ifindex_cache:
+            ifindex_list = self.iproute.link_lookup(ifname=device)
+            if not ifindex_list:
+                return None
+
+            self.__ifindex_cache[device] = ifindex_list[0]
+
+        return self.__ifindex_cache[device]
+
+    def __send(self, request):
+        params = dict(request.params)
+
+        if request.method == "link":
+            if request.command != "add":
+                ifindex = self.__get_ifindex(request.device)
+                if ifindex is None:
+                    return self.__make_device_not_found_result(request.device)
+
+                params["index"] = ifindex
+                self.__ifindex_cache.pop(request.device, None)
+
+            if request.kind:
+                params["kind"] = request.kind
+
+            self.iproute.link(request.command, **params)
+
+            return CommandResult(returncode=0, stdout="", stderr="")
+
+        ifindex = self.__get_ifindex(request.device)
+        if ifindex is None:
+            return self.__make_device_not_found_result(request.device)
+
+        action = params.get("action")
+        if isinstance(action, dict) and "dev" in action:
+            action = dict(action)
+            redirect_device = action.pop("dev")
+            action["ifindex"] = self.__get_ifindex(redirect_device)
+            if action["ifindex"] is None:
+                return self.__make_device_not_found_result(redirect_device)
+
+            params["action"] = action
+
+        self.iproute.tc(request.command, kind=request.kind, index=ifindex, **params)
+
+        return CommandResult(returncode=0, stdout="", stderr="")
+
+    def __make_device_not_found_result(self, device):
+        return CommandResult(returncode=1, stdout="", stderr=f'Cannot find device "{device}"')
+
+    @staticmethod
+    def __save_history(command):
+        # record the command to the same history as the subprocess backend for --tc-command
+        spr.SubprocessRunner(command, dry_run=True).run()
@@ -2,16 +2,26 @@
 .. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
 """
 
+import fnmatch
+import re
+import socket
+
 import humanreadable as hr
 import typepy
-from pyroute2 import IPRoute
 
 from ._const import Network
 from ._error import NetworkInterfaceNotFoundError
 
 
+_REGEX_PATTERN_PREFIX = "re:"
+_GLOB_PATTERN_CHARS = "*?["
+
+
 def get_anywhere_network(ip_version):
-    ip_version_n = typepy.Integer(ip_version).try_convert()
+    if ip_version in (4, 6):
+        ip_version_n = ip_version
+    else:
+        ip_version_n = typepy.Integer(ip_version).try_convert()
 
     if ip_version_n == 4:
         return Network.Ipv4.ANYWHERE
@@ -84,7 +94,13 @@ def sanitize_network(network, ip_version):
 
     import ipaddress
 
-    if typepy.is_null_string(network) or network.casefold() == "anywhere":
+    if network is None or isinstance(network, str):
+        # typepy checks are expensive for parsers that sanitize every filter
+        is_null_network = not network or not network.strip()
+    else:
+        is_null_network = typepy.is_null_string(network)
+
+    if is_null_network or network.casefold() == "anywhere":
         return get_anywhere_network(ip_version)
 
     try:
@@ -108,14 +124,77 @@ def sanitize_network(network, ip_version):
     raise ValueError(f"unexpected ip version: {ip_version}")
 
 
+def get_network_interfaces():
+    """
+    :return: Network interface names in the order of the interface indexes.
+    :rtype: list
+    """
+
+    return [name for _, name in socket.if_nameindex()]
+
+
 def verify_network_interface(device, tc_command_output):
     from ._common import is_execute_tc_command
 
     if not is_execute_tc_command(tc_command_output):
         return
 
-    with IPRoute() as ipr:
-        avail_interfaces = [link.get_attr("IFLA_IFNAME") for link in ipr.get_links()]
-
-    if device not in avail_interfaces:
+    if device not in get_network_interfaces():
         raise NetworkInterfaceNotFoundError(target=device)
+
+
+def is_network_interface_pattern(target):
+    return target.startswith(_REGEX_PATTERN_PREFIX) or any(
+        char in target for char in _GLOB_PATTERN_CHARS
+    )
+
+
+def expand_network_interfaces(targets, avail_interfaces=None):
+    """
+    Expand network interface patterns to network interface names.
+    A target is treated as:
+
+        - a regular expression that matches the whole of interface names if the target
+          starts with ``re:`` (e.g. ``re:eth0\\.\\d+``)
+        - a glob pattern if the target includes any of ``*?[`` (e.g. ``veth*``, ``eth0.*``)
+        - a network interface name otherwise
+
+    :return: Network interface names without duplicates.
+    :rtype: list
+    :raises NetworkInterfaceNotFoundError:
+        if a pattern does not match any interface or a regular expression is invalid.
+    """
+
+    devices = []
+
+    for target in targets:
+        if not is_network_interface_pattern(target):
+            matched_devices = [target]
+        else:
+            if avail_interfaces is None:
+                avail_interfaces = get_network_interfaces()
+
+            if target.startswith(_REGEX_PATTERN_PREFIX):
+                try:
+                    regexp = re.compile(target[len(_REGEX_PATTERN_PREFIX) :])
+                except re.error as e:
+                    raise NetworkInterfaceNotFoundError(
+                        f"invalid regular expression: {e}", target=target
+                    ) from e
+
+                matched_devices = [
+                    device for device in avail_interfaces if regexp.fullmatch(device)
+                ]
+            else:
+                matched_devices = fnmatch.filter(avail_interfaces, target)
+
+            if not matched_devices:
+                raise NetworkInterfaceNotFoundError(target=target)
+
+            matched_devices.sort()
+
+        for device in matched_devices:
+            if device not in devices:
+                devices.append(device)
+
+    return devices
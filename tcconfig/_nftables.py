@@ -0,0 +1,365 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import errno
+import ipaddress
+import json
+import shlex
+
+from subprocrunner import SubprocessRunner
+
+from ._common import find_bin_path
+from ._iptables import VALID_CHAIN_LIST, IptablesMangleMarkEntry
+from ._logger import LogLevel, logger
+
+
+TABLE_FAMILY = "inet"
+TABLE_NAME = "tcconfig"
+
+# chain -> (hook, chain type, packet fields that are looked up by the mark map of the chain)
+_CHAIN_DEFINITIONS = {
+    "PREROUTING": ("prerouting", "filter", ("saddr", "daddr")),
+    "INPUT": ("input", "filter", ("saddr",)),
+    "OUTPUT": ("output", "route", ("daddr",)),
+}
+
+
+def get_nft_command():
+    return find_bin_path("nft")
+
+
+def get_mark_map_name(chain, ip_version):
+    return f"{chain.lower():s}_ip{ip_version:d}"
+
+
+def render_mark_map_commands(chain, ip_version):
+    """
+    :return:
+        nft commands that create a map from addresses to marks and a chain that
+        marks packets by looking up the map.
+        Packets are marked by a single map lookup regardless of the number of entries.
+        The map and the chain are named by ``get_mark_map_name``.
+    :rtype: list
+    """
+
+    hook, chain_type, fields = _CHAIN_DEFINITIONS[chain]
+    table = f"{TABLE_FAMILY:s} {TABLE_NAME:s}"
+    name = get_mark_map_name(chain, ip_version)
+    addr_type = "ipv6_addr" if ip_version == 6 else "ipv4_addr"
+    protocol = "ip6" if ip_version == 6 else "ip"
+
+    return [
+        "add map {table:s} {name:s} {{ type {key:s} : mark; flags interval; }}".format(
+            table=table, name=name, key=" . ".join([addr_type] * len(fields))
+        ),
+        "add chain {table:s} {name:s} {{ type {type:s} hook {hook:s} priority mangle; "
+        "policy accept; }}".format(table=table, name=name, type=chain_type, hook=hook),
+        f"flush chain {table:s} {name:s}",
+        "add rule {table:s} {name:s} meta mark set {key:s} map @{name:s}".format(
+            table=table,
+            name=name,
+            key=" . ".join([f"{protocol:s} {field:s}" for field in fields]),
+        ),
+    ]
+
+
+def _get_map_key(entry):
+    _hook, _chain_type, fields = _CHAIN_DEFINITIONS[entry.chain]
+    addr_table = {"saddr": entry.source, "daddr": entry.destination}
+
+    return [addr_table[field] for field in fields]
+
+
+def render_mark_element(entry):
+    return "{key:s} : {mark:d}".format(key=" . ".join(_get_map_key(entry)), mark=entry.mark_id)
+
+
+def is_overlapping_entry(lhs, rhs):
+    """
+    :return:
+        |True| if the map keys of the entries overlap: elements of a map with
+        interval flags can not overlap with each other.
+    :rtype: bool
+    """
+
+    if lhs.chain != rhs.chain:
+        return False
+
+    return all(
+        [
+            ipaddress.ip_network(lhs_network, strict=False).overlaps(
+                ipaddress.ip_network(rhs_network, strict=False)
+            )
+            for lhs_network, rhs_network in zip(_get_map_key(lhs), _get_map_key(rhs))
+        ]
+    )
+
+
+class NftablesMarkController:
+    """
+    Mark packets with nftables instead of iptables mangle table entries.
+    Marks are stored to maps of a dedicated ``tcconfig`` table:
+    the maps are changed with a single ``nft -f`` transaction and
+    read from ``nft -j list table`` outputs.
+    Has the same interface as ``IptablesMangleController``.
+
+    Elements of the maps can not overlap with each other: an entry that overlaps with
+    an existing entry (e.g. ``10.0.0.0/8`` and ``10.1.0.0/16``) is rejected by ``add()``
+    and fails the next ``flush()``.
+    """
+
+    __MAX_MARK_ID = 0xFFFFFFFF
+    __MARK_ID_OFFSET = 100
+
+    # ip version -> {mark id: IptablesMangleMarkEntry}: shared by the controllers of a process.
+    # discarded when the process deletes entries.
+    __snapshot_table = {}
+
+    @property
+    def enable(self):
+        return self.__enable
+
+    def __init__(self, enable, ip_version):
+        self.__enable = enable
+        self.__ip_version = ip_version
+
+        # entries to be added by the next flush()
+        self.__pending_entries = []
+        self.__pending_error_code = 0
+
+    def clear(self):
+        if not self.enable:
+            return
+
+        self.__check_execution_authority()
+        self.flush()
+
+        try:
+            commands = [
+                "flush map {:s} {:s} {:s}".format(
+                    TABLE_FAMILY, TABLE_NAME, get_mark_map_name(chain, self.__ip_version)
+                )
+                for chain in sorted({mangle.chain for mangle in self.parse()})
+            ]
+
+            if commands:
+                proc = self.__apply(commands)
+                if proc.returncode != 0:
+                    raise OSError(proc.returncode, proc.stderr)
+        finally:
+            self.clear_snapshot()
+
+    def get_nftables(self):
+        """
+        :return: JSON output of the ``tcconfig`` table. ``None`` if the table not exists.
+        :rtype: str
+        """
+
+        self.__check_execution_authority()
+
+        proc = SubprocessRunner(
+            f"{get_nft_command():s} -j list table {TABLE_FAMILY:s} {TABLE_NAME:s}",
+            error_log_level=LogLevel.QUIET,
+        )
+        if proc.run() != 0:
+            logger.debug(f"failed to list the {TABLE_NAME:s} table: {proc.stderr}")
+            return None
+
+        return proc.stdout
+
+    @classmethod
+    def clear_snapshot(cls):
+        cls.__snapshot_table.clear()
+
+    def get_unique_mark_id(self):
+        mark_table = self.__get_mark_table()
+        logger.debug(f"nftables mark list: {sorted(mark_table)}")
+
+        unique_mark_id = 1 + self.__MARK_ID_OFFSET
+        while unique_mark_id < self.__MAX_MARK_ID:
+            if unique_mark_id not in mark_table:
+                return unique_mark_id
+
+            unique_mark_id += 1
+
+        raise RuntimeError("usable mark id not found")
+
+    def get_mangle_mark(self, mark_id):
+        return self.__get_mark_table().get(mark_id)
+
+    def parse(self):
+        yield from self.__get_mark_table().values()
+
+    def add(self, mangling_mark):
+        """
+        Add a mark entry. The entry is added to a map by the next ``flush()`` call.
+        """
+
+        if not self.enable:
+            return 0
+
+        self.__check_execution_authority()
+
+        for entry in self.__get_mark_table().values():
+            if is_overlapping_entry(mangling_mark, entry):
+                logger.error(
+                    "failed to add a nftables mark entry: networks of {} chain entries "
+                    "can not overlap with each other: {} (mark={:d}) overlaps with {} "
+                    "(mark={:d})".format(
+                        mangling_mark.chain,
+                        " . ".join(_get_map_key(mangling_mark)),
+                        mangling_mark.mark_id,
+                        " . ".join(_get_map_key(entry)),
+                        entry.mark_id,
+                    )
+                )
+                self.__pending_error_code = errno.EINVAL
+
+                return self.__pending_error_code
+
+        self.__pending_entries.append(mangling_mark)
+        self.__get_mark_table().setdefault(mangling_mark.mark_id, mangling_mark)
+
+        return 0
+
+    def flush(self):
+        """
+        Add the pending entries to the maps as a transaction.
+        None of the pending entries are added if ``add()`` rejected an entry.
+
+        :return: Return code of ``nft``. ``errno.EINVAL`` if ``add()`` rejected an entry.
+        """
+
+        pending_entries = self.__pending_entries
+        self.__pending_entries = []
+
+        if self.__pending_error_code != 0:
+            return_code = self.__pending_error_code
+            self.__pending_error_code = 0
+            # the snapshot has the rejected transaction entries
+            self.clear_snapshot()
+
+            return return_code
+
+        if not pending_entries:
+            return 0
+
+        commands = [f"add table {TABLE_FAMILY:s} {TABLE_NAME:s}"]
+        for chain in VALID_CHAIN_LIST:
+            entries = [entry for entry in pending_entries if entry.chain == chain]
+            if not entries:
+                continue
+
+            commands.extend(render_mark_map_commands(chain, self.__ip_version))
+            commands.append(
+                "add element {:s} {:s} {:s} {{ {:s} }}".format(
+                    TABLE_FAMILY,
+                    TABLE_NAME,
+                    get_mark_map_name(chain, self.__ip_version),
+                    ", ".join([render_mark_element(entry) for entry in entries]),
+                )
+            )
+
+        proc = self.__apply(commands)
+        if proc.returncode != 0:
+            logger.error(f"failed to add nftables mark entries: {proc.stderr.strip()}")
+            # entries of the snapshot no longer match the maps
+            self.clear_snapshot()
+
+        return proc.returncode
+
+    def parse_nftables(self, nftables_output):
+        """
+        :return: Mark entries of the maps in a ``nft -j list table`` output.
+        :rtype: list
+        """
+
+        map_chain_table = {
+            get_mark_map_name(chain, self.__ip_version): chain for chain in VALID_CHAIN_LIST
+        }
+        entries = []
+
+        try:
+            items = json.loads(nftables_output).get("nftables", [])
+        except ValueError as e:
+            logger.debug(f"failed to load a nft output: {e}")
+            return []
+
+        for item in items:
+            nft_map = item.get("map")
+            if not nft_map or nft_map.get("name") not in map_chain_table:
+                continue
+
+            chain = map_chain_table[nft_map["name"]]
+            _hook, _chain_type, fields = _CHAIN_DEFINITIONS[chain]
+
+            for key, mark_id in nft_map.get("elem", []):
+                if isinstance(key, dict) and "concat" in key:
+                    key = key["concat"]
+                else:
+                    key = [key]
+
+                try:
+                    addr_table = dict(zip(fields, [self.__to_network(addr) for addr in key]))
+                except ValueError as e:
+                    logger.debug(f"skip a map element: {e}")
+                    continue
+
+                entries.append(
+                    IptablesMangleMarkEntry(
+                        ip_version=self.__ip_version,
+                        mark_id=mark_id,
+                        source=addr_table.get("saddr"),
+                        destination=addr_table.get("daddr"),
+                        chain=chain,
+                    )
+                )
+
+        return entries
+
+    def __get_mark_table(self):
+        mark_table = self.__snapshot_table.get(self.__ip_version)
+
+        if mark_table is None:
+            nftables_output = self.get_nftables()
+            entries = self.parse_nftables(nftables_output) if nftables_output else []
+
+            mark_table = {}
+            for entry in entries:
+                mark_table.setdefault(entry.mark_id, entry)
+
+            self.__snapshot_table[self.__ip_version] = mark_table
+
+        return mark_table
+
+    def __apply(self, commands):
+        if SubprocessRunner.default_is_dry_run:
+            # execute commands one by one to output the commands with --tc-command/--tc-script
+            for command in commands:
+                proc = SubprocessRunner(f"{get_nft_command():s} {shlex.quote(command):s}")
+                proc.run()
+
+            return proc
+
+        proc = SubprocessRunner(f"{get_nft_command():s} -f -")
+        proc.run(input="\n".join(commands) + "\n")
+
+        return proc
+
+    @staticmethod
+    def __to_network(addr):
+        if isinstance(addr, str):
+            return addr
+
+        if isinstance(addr, dict) and "prefix" in addr:
+            return "{:s}/{:d}".format(addr["prefix"]["addr"], addr["prefix"]["len"])
+
+        raise ValueError(f"unsupported address: {addr}")
+
+    @staticmethod
+    def __check_execution_authority():
+        from ._capabilities import get_permission_error_message, has_execution_authority
+
+        if not has_execution_authority("nft"):
+            raise OSError(errno.EPERM, get_permission_error_message("nft"))
@@ -0,0 +1,313 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import ipaddress
+from collections import OrderedDict, namedtuple
+
+from ._common import split_port_range
+from ._const import Tc
+
+
+# shaping parameters that are applied per class: rules that have the parameters can not
+# share a class without sharing the bandwidth.
+_PER_CLASS_PARAMS = ("rate",)
+
+# the order of the items of filter keys that tcshow outputs
+_FILTER_KEY_ORDER = (
+    Tc.Param.SRC_NETWORK,
+    Tc.Param.DST_NETWORK,
+    Tc.Param.SRC_PORT,
+    Tc.Param.DST_PORT,
+    Tc.Param.IP_PROTO,
+    Tc.Param.NETWORK_SET,
+    Tc.Param.PROTOCOL,
+)
+
+_ShapingRule = namedtuple("_ShapingRule", "index filter_key key_items params")
+
+
+def parse_filter_key(filter_key):
+    """
+    :param str filter_key:
+        Filter key of a ``tcshow`` output/config file
+        (e.g. ``dst_network=192.168.0.0/24, dst_port=80, protocol=ip``).
+    :return: Key items of the filter key.
+    :rtype: collections.OrderedDict
+    """
+
+    key_items = OrderedDict()
+
+    for item in filter_key.split(","):
+        key, sep, value = item.strip().partition("=")
+        if not sep:
+            continue
+
+        key_items[key.strip()] = value.strip()
+
+    return key_items
+
+
+def to_filter_key(key_items):
+    keys = [key for key in _FILTER_KEY_ORDER if key in key_items] + [
+        key for key in key_items if key not in _FILTER_KEY_ORDER
+    ]
+
+    return ", ".join([f"{key}={key_items[key]}" for key in keys])
+
+
+def get_filter_priority(key_items):
+    """
+    :return:
+        Filter priority of a rule. Follows the priorities that the shapers assign to filters:
+        filters of the same priority are evaluated in the order they are added.
+    :rtype: int
+    """
+
+    offset = 4
+    if Tc.Param.NETWORK_SET in key_items:
+        offset += 16
+    elif Tc.Param.IP_PROTO in key_items or any(
+        "-" in key_items.get(key, "") for key in (Tc.Param.SRC_PORT, Tc.Param.DST_PORT)
+    ):
+        offset += 8
+
+    protocol = key_items.get(Tc.Param.PROTOCOL)
+    if protocol == "ip":
+        return 1 + offset
+
+    if protocol == "ipv6":
+        return 2 + offset
+
+    return 3 + offset
+
+
+class ShapingRuleCompiler:
+    """
+    Reduce the shaping rules of a direction before they are applied:
+
+    - rules that have the same shaping parameters and differ only in ``dst_network``
+      are merged into rules of the minimal covering set of the networks.
+    - rules that never match packets because of the preceding rules are reported.
+      such rules are dropped if the shaping parameters are the same as the preceding rule.
+
+    Rules are merged only if no other rules overlap the merged networks:
+    the merge does not change the rule that matches a packet.
+    Rules that have per class parameters (e.g. ``rate``) are not merged
+    since the merged networks share the bandwidth of a class.
+    """
+
+    def __init__(self, logger):
+        self.__logger = logger
+
+    def compile(self, direction_table):
+        """
+        :param dict direction_table: Filter key -> shaping parameters.
+        :return: Compiled rules.
+        :rtype: collections.OrderedDict
+        """
+
+        rules = []
+        for tc_filter, filter_table in direction_table.items():
+            if not filter_table:
+                continue
+
+            key_items = parse_filter_key(tc_filter)
+
+            try:
+                self.__to_match(key_items)
+            except ValueError as e:
+                self.__logger.debug(f"skip compiling a rule: filter='{tc_filter}', {e}")
+                return OrderedDict(direction_table)
+
+            rules.append(
+                _ShapingRule(
+                    index=len(rules), filter_key=tc_filter, key_items=key_items, params=filter_table
+                )
+            )
+
+        rules = self.__drop_shadowed_rules(rules)
+        rules = self.__merge_networks(rules)
+
+        return OrderedDict([(rule.filter_key, rule.params) for rule in rules])
+
+    def __drop_shadowed_rules(self, rules):
+        evaluation_order = sorted(
+            rules, key=lambda rule: (get_filter_priority(rule.key_items), rule.index)
+        )
+        dropped_indices = set()
+
+        for i, rule in enumerate(evaluation_order):
+            for preceding_rule in evaluation_order[:i]:
+                if preceding_rule.index in dropped_indices:
+                    continue
+
+                if not self.__is_cover(preceding_rule.key_items, rule.key_items):
+                    continue
+
+                if self.__to_params(preceding_rule) == self.__to_params(rule):
+                    self.__logger.info(
+                        "drop a shaping rule '{}': covered by '{}' with the same "
+                        "parameters".format(rule.filter_key, preceding_rule.filter_key)
+                    )
+                    dropped_indices.add(rule.index)
+                else:
+                    self.__logger.warning(
+                        "shaping rule '{}' is shadowed by '{}': no packets match the rule".format(
+                            rule.filter_key, preceding_rule.filter_key
+                        )
+                    )
+
+                break
+
+        return [rule for rule in rules if rule.index not in dropped_indices]
+
+    def __merge_networks(self, rules):
+        groups = OrderedDict()
+
+        for rule in rules:
+            if any(param in rule.params for param in _PER_CLASS_PARAMS):
+                continue
+
+            if Tc.Param.NETWORK_SET in rule.key_items:
+                continue
+
+            group_key = (
+                tuple(
+                    (key, value)
+                    for key, value in rule.key_items.items()
+                    if key != Tc.Param.DST_NETWORK
+                ),
+                tuple(sorted(self.__to_params(rule).items())),
+                self.__to_match(rule.key_items)[0].version,
+            )
+            groups.setdefault(group_key, []).append(rule)
+
+        merged_table = {}  # index of the first rule of a group -> merged rules
+        merged_indices = set()
+
+        for group in groups.values():
+            if len(group) < 2:
+                continue
+
+            networks = list(
+                ipaddress.collapse_addresses([self.__to_match(rule.key_items)[0] for rule in group])
+            )
+            if len(networks) >= len(group):
+                continue
+
+            group_indices = {rule.index for rule in group}
+            if any(
+                self.__to_match(rule.key_items)[0].overlaps(network)
+                for rule in rules
+                if rule.index not in group_indices
+                for network in networks
+            ):
+                self.__logger.debug(
+                    "skip merging networks: other rules overlap with {}".format(
+                        [str(network) for network in networks]
+                    )
+                )
+                continue
+
+            first_rule = group[0]
+            merged_rules = []
+            for network in networks:
+                key_items = OrderedDict(first_rule.key_items)
+                if network.prefixlen == 0:
+                    key_items.pop(Tc.Param.DST_NETWORK, None)
+                else:
+                    key_items[Tc.Param.DST_NETWORK] = str(network)
+
+                merged_rules.append(
+                    first_rule._replace(filter_key=to_filter_key(key_items), key_items=key_items)
+                )
+
+            self.__logger.info(
+                "merge {:d} shaping rules into {:d}: {}".format(
+                    len(group), len(merged_rules), [rule.filter_key for rule in merged_rules]
+                )
+            )
+            merged_table[first_rule.index] = merged_rules
+            merged_indices |= group_indices
+
+        compiled_rules = []
+        for rule in rules:
+            if rule.index in merged_table:
+                compiled_rules.extend(merged_table[rule.index])
+            elif rule.index not in merged_indices:
+                compiled_rules.append(rule)
+
+        return compiled_rules
+
+    def __is_cover(self, key_items, other_key_items):
+        """
+        :return: ``True`` if packets that match ``other_key_items`` also match ``key_items``.
+        """
+
+        if key_items.get(Tc.Param.PROTOCOL) != other_key_items.get(Tc.Param.PROTOCOL):
+            return False
+
+        if Tc.Param.NETWORK_SET in key_items or Tc.Param.NETWORK_SET in other_key_items:
+            return key_items == other_key_items
+
+        dst_network, src_network, ports = self.__to_match(key_items)
+        other_dst_network, other_src_network, other_ports = self.__to_match(other_key_items)
+
+        if dst_network.version != other_dst_network.version:
+            return False
+
+        if not other_dst_network.subnet_of(dst_network):
+            return False
+
+        if not other_src_network.subnet_of(src_network):
+            return False
+
+        for port_range, other_port_range in zip(ports, other_ports):
+            if port_range is None:
+                continue
+
+            if other_port_range is None:
+                return False
+
+            if not (port_range[0] <= other_port_range[0] and other_port_range[1] <= port_range[1]):
+                return False
+
+        ip_proto = key_items.get(Tc.Param.IP_PROTO)
+        if ip_proto and ip_proto != other_key_items.get(Tc.Param.IP_PROTO):
+            return False
+
+        return True
+
+    @staticmethod
+    def __to_match(key_items):
+        """
+        :return: (dst network, src network, (src port range, dst port range))
+        :raises ValueError: If the key items include invalid values.
+        """
+
+        anywhere = "::/0" if key_items.get(Tc.Param.PROTOCOL) == "ipv6" else "0.0.0.0/0"
+        dst_network = ipaddress.ip_network(
+            key_items.get(Tc.Param.DST_NETWORK, anywhere), strict=False
+        )
+        src_network = ipaddress.ip_network(
+            key_items.get(Tc.Param.SRC_NETWORK, anywhere), strict=False
+        )
+        if dst_network.version != src_network.version:
+            raise ValueError("mixed ip versions")
+
+        ports = []
+        for key in (Tc.Param.SRC_PORT, Tc.Param.DST_PORT):
+            value = key_items.get(key)
+            if value is None:
+                ports.append(None)
+                continue
+
+            port, max_port = split_port_range(value)
+            ports.append((port, port if max_port is None else max_port))
+
+        return (dst_network, src_network, tuple(ports))
+
+    @staticmethod
+    def __to_params(rule):
+        return {key: value for key, value in rule.params.items() if key != Tc.Param.FILTER_ID}
@@ -2,11 +2,10 @@
 .. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
 """
 
-from simplesqlite.query import And, Where
+from collections import OrderedDict
 
 from ._const import Tc, TrafficDirection
 from ._network import is_anywhere_network
-from .parser._model import Filter, Qdisc
 from .parser.shaping_rule import TcShapingRuleParser
 
 
@@ -31,27 +30,24 @@ class TcShapingRuleFinder:
         self.__shaping_rule_parser.clear()
 
     def find_qdisc_handle(self, parent):
-        for qdisc in Qdisc.select(where=Where(Tc.Param.PARENT, parent)):
+        for qdisc in self._parser.store.find_qdiscs(parent):
             return qdisc.handle
 
         return None
 
     def find_filter_param(self):
-        where_query = And(self.__get_filter_conditions())
-        table_name = Filter.get_table_name()
-        self.__logger.debug(f"find filter param: table={table_name}, where={where_query}")
+        conditions = self.__get_filter_conditions()
+        self.__logger.debug(f"find filter param: conditions={dict(conditions)}")
 
-        for record in Filter.select(where=where_query):
+        for record in self._parser.store.find_filters(conditions):
             return record.as_dict()
 
-        self.__logger.debug(
-            f"find filter param: empty result (table={table_name}, where={where_query})"
-        )
+        self.__logger.debug(f"find filter param: empty result (conditions={dict(conditions)})")
 
         return None
 
     def find_parent(self):
-        for record in Filter.select(where=And(self.__get_filter_conditions())):
+        for record in self._parser.store.find_filters(self.__get_filter_conditions()):
             return record.flowid
 
         return None
@@ -60,7 +56,7 @@ class TcShapingRuleFinder:
         return self.find_parent() is not None
 
     def is_any_filter(self):
-        return Filter.fetch_num_records() > 0
+        return len(self._parser.store.filters) > 0
 
     def is_empty_filter_condition(self):
         from typepy import is_null_string
@@ -71,6 +67,8 @@ class TcShapingRuleFinder:
                 is_anywhere_network(self.__tc.src_network, self.__tc.ip_version),
                 is_null_string(self.__tc.dst_port),
                 is_null_string(self.__tc.src_port),
+                is_null_string(self.__tc.ip_proto),
+                is_null_string(self.__tc.network_set_name),
             ]
         )
 
@@ -84,7 +82,7 @@ class TcShapingRuleFinder:
 
     def get_filter_string(self):
         return ", ".join(
-            [where.to_query() for where in self.__get_filter_conditions() if where.value]
+            [f"{key}={value}" for key, value in self.__get_filter_conditions().items() if value]
         )
 
     def __get_filter_conditions(self):
@@ -93,11 +91,17 @@ class TcShapingRuleFinder:
         elif self.__tc.direction == TrafficDirection.INCOMING:
             device = self._parser.ifb_device
 
-        return [
-            Where(Tc.Param.DEVICE, device),
-            Where(Tc.Param.PROTOCOL, self.__tc.protocol),
-            Where(Tc.Param.DST_NETWORK, self.__tc.dst_network),
-            Where(Tc.Param.SRC_NETWORK, self.__tc.src_network),
-            Where(Tc.Param.DST_PORT, self.__tc.dst_port),
-            Where(Tc.Param.SRC_PORT, self.__tc.src_port),
-        ]
+        return OrderedDict(
+            [
+                (Tc.Param.DEVICE, device),
+                (Tc.Param.PROTOCOL, self.__tc.protocol),
+                (Tc.Param.DST_NETWORK, self.__tc.dst_network),
+                (Tc.Param.SRC_NETWORK, self.__tc.src_network),
+                (Tc.Param.DST_PORT, self.__tc.dst_port),
+                (Tc.Param.SRC_PORT, self.__tc.src_port),
+                (Tc.Param.DST_PORT_MAX, self.__tc.dst_port_max),
+                (Tc.Param.SRC_PORT_MAX, self.__tc.src_port_max),
+                (Tc.Param.IP_PROTO, self.__tc.ip_proto),
+                (Tc.Param.NETWORK_SET, self.__tc.network_set_name),
+            ]
+        )
@@ -0,0 +1,340 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import abc
+import os
+import re
+from collections import namedtuple
+
+import subprocrunner as spr
+
+from ._const import TcBackend
+from ._error import TcAlreadyExist, TcCommandExecutionError
+from ._logger import LogLevel, logger
+from ._tc_snapshot import invalidate_snapshot
+
+
+CommandResult = namedtuple("CommandResult", "returncode stdout stderr")
+_BatchEntry = namedtuple(
+    "_BatchEntry", "command tc_bin_path tc_args error_log_level result_handler"
+)
+
+
+class TcBackendInterface(metaclass=abc.ABCMeta):
+    @property
+    @abc.abstractmethod
+    def name(self):  # pragma: no cover
+        ...
+
+    @abc.abstractmethod
+    def run(self, command, error_log_level=None, result_handler=None):  # pragma: no cover
+        """
+        Execute a command line.
+
+        :param result_handler:
+            Callable that receives the |CommandResult| of the command and returns
+            the return code to report.
+            Backends that defer the execution call the handler when the command
+            is actually executed.
+        """
+
+    @abc.abstractmethod
+    def sync(self):  # pragma: no cover
+        """
+        Execute commands that are deferred by the backend (if any).
+        """
+
+    def flush(self):
+        """
+        Same as :py:meth:`.sync`, and also raise errors that occurred while
+        executing deferred commands.
+        """
+
+        self.sync()
+
+    @abc.abstractmethod
+    def discard(self):  # pragma: no cover
+        """
+        Discard commands that are deferred by the backend (if any) without executing them.
+        """
+
+    @abc.abstractmethod
+    def close(self):  # pragma: no cover
+        """
+        Release resources of the backend.
+        """
+
+    @staticmethod
+    def _handle_result(result, result_handler):
+        if result_handler is None:
+            return result
+
+        return result._replace(returncode=result_handler(result))
+
+
+class SubprocessBackend(TcBackendInterface):
+    """
+    Execute ``tc``/``ip`` command lines as child processes.
+    """
+
+    @property
+    def name(self):
+        return TcBackend.SUBPROCESS
+
+    def sync(self):
+        # commands are executed immediately
+        pass
+
+    def discard(self):
+        pass
+
+    def close(self):
+        pass
+
+    def run(self, command, error_log_level=None, result_handler=None):
+        runner = spr.SubprocessRunner(command, error_log_level=error_log_level)
+        runner.run()
+        invalidate_snapshot(command)
+
+        return self._handle_result(
+            CommandResult(returncode=runner.returncode, stdout=runner.stdout, stderr=runner.stderr),
+            result_handler,
+        )
+
+
+class BatchBackend(TcBackendInterface):
+    """
+    Queue ``tc`` command lines and execute them at once with a ``tc -batch -`` process.
+    Other commands are executed by the fallback backend after the queued
+    commands are executed to keep the execution order.
+
+    Return codes of queued commands are always ``0``: the actual results are
+    passed to result handlers when the queued commands are executed
+    (at :py:meth:`.sync`/:py:meth:`.flush`).
+
+    ``tc -batch`` stops at the first failed line (``-force`` is not used).
+    Lines that failed because of existing objects (|TcAlreadyExist| or failed deletions)
+    do not prevent the following lines: the rest of the lines are executed with
+    another ``tc -batch``. Other failures abort the batch: the following lines and
+    the lines queued until :py:meth:`.flush` are not executed, because they may
+    depend on the qdisc/class of the failed line.
+    """
+
+    __ERROR_RETURN_CODE = 2
+    __BATCH_OPTIONS = "-batch -"
+    __DELETE_VERBS = ("del", "delete")
+    __RE_COMMAND_FAILED = re.compile(r"^Command failed .+:(?P<line_no>\d+)$")
+
+    @property
+    def name(self):
+        return TcBackend.BATCH
+
+    def __init__(self, fallback):
+        self.__fallback = fallback
+        self.__entries = []
+        self.__deferred_errors = []
+        self.__abort_error = None
+
+    def close(self):
+        self.sync()
+        self.__fallback.close()
+
+    def run(self, command, error_log_level=None, result_handler=None):
+        if spr.SubprocessRunner.default_is_dry_run:
+            return self.__fallback.run(
+                command, error_log_level=error_log_level, result_handler=result_handler
+            )
+
+        tokens = command.split(maxsplit=1)
+        if len(tokens) != 2 or os.path.basename(tokens[0]) != "tc":
+            self.sync()
+            return self.__fallback.run(
+                command, error_log_level=error_log_level, result_handler=result_handler
+            )
+
+        # the queued command is executed before the next read (sync)
+        invalidate_snapshot(command)
+        self.__entries.append(
+            _BatchEntry(
+                command=command,
+                tc_bin_path=tokens[0],
+                tc_args=tokens[1],
+                error_log_level=error_log_level,
+                result_handler=result_handler,
+            )
+        )
+
+        # record the command to the same history as the subprocess backend for --tc-command
+        spr.SubprocessRunner(command, dry_run=True).run()
+
+        return CommandResult(returncode=0, stdout="", stderr="")
+
+    def sync(self):
+        entries = self.__entries
+        self.__entries = []
+
+        while entries:
+            if self.__abort_error is not None:
+                for entry in entries:
+                    logger.warning(f"not executed because of the preceding error: {entry.command}")
+                return
+
+            entries = self.__execute_batch(entries)
+
+    def flush(self):
+        """
+        Same as :py:meth:`.sync`, and also raise errors that occurred while
+        executing deferred commands.
+        The error that aborted the batch takes precedence over |TcAlreadyExist|.
+        """
+
+        self.sync()
+
+        error = self.__abort_error
+        if error is None and self.__deferred_errors:
+            error = self.__deferred_errors[0]
+
+        self.__abort_error = None
+        self.__deferred_errors = []
+
+        if error is not None:
+            raise error
+
+    def discard(self):
+        for entry in self.__entries:
+            logger.debug(f"discard a queued command: {entry.command}")
+
+        self.__entries = []
+        self.__deferred_errors = []
+        self.__abort_error = None
+
+    def __execute_batch(self, entries):
+        """
+        :return: Entries that are not executed yet.
+        :rtype: list
+        """
+
+        runner = spr.SubprocessRunner(
+            f"{entries[0].tc_bin_path} {self.__BATCH_OPTIONS}", error_log_level=LogLevel.QUIET
+        )
+        runner.run(input="\n".join([entry.tc_args for entry in entries]) + "\n")
+
+        if runner.returncode == 0:
+            failed_line_no = len(entries) + 1
+            error_msg = None
+        else:
+            error_msgs = self.parse_batch_errors(runner.stderr)
+            if error_msgs:
+                failed_line_no = min(error_msgs)
+                error_msg = error_msgs[failed_line_no]
+            else:
+                # failed before executing lines (e.g. tc command not found)
+                failed_line_no = 1
+                error_msg = runner.stderr.strip()
+
+        for entry in entries[: failed_line_no - 1]:
+            self.__handle_result(entry, CommandResult(returncode=0, stdout="", stderr=""))
+
+        if failed_line_no > len(entries):
+            return []
+
+        self.__handle_result(
+            entries[failed_line_no - 1],
+            CommandResult(returncode=self.__ERROR_RETURN_CODE, stdout="", stderr=error_msg),
+        )
+
+        return entries[failed_line_no:]
+
+    def __handle_result(self, entry, result):
+        if entry.result_handler is None:
+            returncode = result.returncode
+            if returncode != 0 and entry.error_log_level != LogLevel.QUIET:
+                logger.warning(
+                    f"command='{entry.command}', returncode={returncode}, "
+                    f"stderr={result.stderr!r}"
+                )
+        else:
+            try:
+                returncode = entry.result_handler(result)
+            except TcAlreadyExist as e:
+                # objects of the line exist: the following lines can be executed
+                self.__deferred_errors.append(e)
+                return
+            except TcCommandExecutionError as e:
+                self.__abort_error = e
+                return
+
+        if returncode == 0 or self.__is_delete_command(entry.tc_args):
+            # failed deletions leave nothing that the following lines depend on
+            return
+
+        self.__abort_error = TcCommandExecutionError(
+            f"failed to execute '{entry.command}' (returncode={returncode}): "
+            f"{result.stderr.strip()}"
+        )
+
+    @classmethod
+    def __is_delete_command(cls, tc_args):
+        # e.g. 'qdisc del dev eth0 root'
+        tokens = tc_args.split(maxsplit=2)
+
+        return len(tokens) >= 2 and tokens[1] in cls.__DELETE_VERBS
+
+    @classmethod
+    def parse_batch_errors(cls, stderr):
+        """
+        Map error messages of a ``tc -batch`` execution to line numbers of the batch.
+
+        :return: Mapping of line numbers (1-origin) to error messages.
+        :rtype: dict
+        """
+
+        error_msgs = {}
+        msg_lines = []
+
+        for line in (stderr or "").splitlines():
+            match = cls.__RE_COMMAND_FAILED.search(line.strip())
+            if match is None:
+                if line.strip():
+                    msg_lines.append(line.strip())
+                continue
+
+            error_msgs[int(match.group("line_no"))] = "\n".join(msg_lines)
+            msg_lines = []
+
+        return error_msgs
+
+
+_backend = None
+
+
+def get_tc_backend():
+    global _backend
+
+    if _backend is None:
+        _backend = SubprocessBackend()
+
+    return _backend
+
+
+def set_tc_backend(backend_name):
+    global _backend
+
+    if backend_name == TcBackend.SUBPROCESS:
+        backend = SubprocessBackend()
+    elif backend_name == TcBackend.NETLINK:
+        from ._netlink import NetlinkBackend
+
+        backend = NetlinkBackend(fallback=SubprocessBackend())
+    elif backend_name == TcBackend.BATCH:
+        backend = BatchBackend(fallback=SubprocessBackend())
+    else:
+        raise ValueError(f"unknown tc backend: expected={TcBackend.LIST}, actual={backend_name}")
+
+    if _backend is not None:
+        _backend.close()
+
+    _backend = backend
+
+    return _backend
@@ -7,6 +7,9 @@ import subprocrunner as spr
 from ._common import find_bin_path
 from ._const import TcSubCommand
 from ._error import NetworkInterfaceNotFoundError
+from ._logger import LogLevel
+from ._tc_backend import CommandResult, get_tc_backend
+from ._tc_snapshot import get_snapshot, set_snapshot
 
 
 def get_tc_base_command(tc_subcommand):
@@ -16,15 +19,65 @@ def get_tc_base_command(tc_subcommand):
     return "{:s} {:s}".format(find_bin_path("tc"), tc_subcommand.value)
 
 
-def run_tc_show(subcommand, device, tc_command_output):
+def get_tc_show_command(subcommand, device, is_json=False):
+    """
+    :return: ``tc ... show`` command that reads the configurations of a device.
+        Outputs of the commands are cached by the command strings.
+    :rtype: str
+    """
+
+    if is_json:
+        return "{:s} -json {:s} show dev {:s}".format(find_bin_path("tc"), subcommand.value, device)
+
+    return f"{get_tc_base_command(subcommand):s} show dev {device:s}"
+
+
+def run_show_command(device, command, error_log_level=None, dry_run=None):
+    """
+    Execute a command that reads the configurations of a device.
+    Outputs are shared by the process until the process executes commands that
+    change the device: rule finders and shapers of a process read a device once.
+
+    :rtype: CommandResult
+    """
+
+    # execute queued commands (if any) before reading the current configurations
+    get_tc_backend().sync()
+
+    is_dry_run = spr.SubprocessRunner.default_is_dry_run if dry_run is None else dry_run
+    if not is_dry_run:
+        output = get_snapshot(device, command)
+        if output is not None:
+            return CommandResult(returncode=0, stdout=output, stderr="")
+
+    runner = spr.SubprocessRunner(command, error_log_level=error_log_level, dry_run=dry_run)
+    runner.run()
+
+    if runner.returncode == 0 and not is_dry_run:
+        set_snapshot(device, command, runner.stdout)
+
+    return CommandResult(returncode=runner.returncode, stdout=runner.stdout, stderr=runner.stderr)
+
+
+def run_tc_show(subcommand, device, tc_command_output, is_json=False):
     from ._network import verify_network_interface
 
     verify_network_interface(device, tc_command_output)
 
-    runner = spr.SubprocessRunner(f"{get_tc_base_command(subcommand):s} show dev {device:s}")
-    if runner.run() != 0 and runner.stderr.find("Cannot find device") != -1:
-        # reach here if the device does not exist at the system and netiface
-        # not installed.
-        raise NetworkInterfaceNotFoundError(target=device)
+    result = run_show_command(
+        device,
+        get_tc_show_command(subcommand, device, is_json=is_json),
+        error_log_level=LogLevel.QUIET if is_json else None,
+    )
+
+    if result.returncode != 0:
+        if result.stderr.find("Cannot find device") != -1:
+            # reach here if the device does not exist at the system and netiface
+            # not installed.
+            raise NetworkInterfaceNotFoundError(target=device)
+
+        if is_json:
+            # the tc command does not support the -json option
+            return None
 
-    return runner.stdout
+    return result.stdout
@@ -0,0 +1,48 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import re
+
+from ._logger import logger
+
+
+_RE_DEVICE = re.compile(r"\bdev\s+(?P<device>\S+)")
+
+# device -> {show command: output}: outputs of 'tc ... show' commands that executed by
+# the process. discarded when the process executes commands that may change the device.
+_snapshot_table = {}
+
+
+def get_snapshot(device, command):
+    """
+    :return: The cached output of a show command. ``None`` if the output is not cached.
+    :rtype: str
+    """
+
+    return _snapshot_table.get(device, {}).get(command)
+
+
+def set_snapshot(device, command, output):
+    _snapshot_table.setdefault(device, {})[command] = output
+
+
+def invalidate_snapshot(command):
+    """
+    Discard the snapshots of the devices that a command might change.
+    All of the snapshots are discarded if the command does not specify devices
+    (e.g. ``ip link add ifb0 type ifb``).
+    """
+
+    devices = _RE_DEVICE.findall(command)
+    if not devices:
+        clear_snapshot()
+        return
+
+    for device in devices:
+        if _snapshot_table.pop(device, None) is not None:
+            logger.debug(f"invalidate the tc snapshot of {device:s}: {command}")
+
+
+def clear_snapshot():
+    _snapshot_table.clear()
@@ -9,6 +9,7 @@ import typepy
 from .._const import ShapingAlgorithm, Tc, TcSubCommand
 from .._logger import logger
 from ._interface import AbstractParser
+from ._store import ClassRecord
 
 
 try:
@@ -51,8 +52,8 @@ class TcClassParser(AbstractParser):
             logger.debug(f"parse a class entry: {self.__parsed_param}")
             entry_list.append(self.__parsed_param)
 
-        if entry_list:
-            self._con.create_table_from_data_matrix(self._tc_subcommand, self.Key.LIST, entry_list)
+        for entry in entry_list:
+            self._store.add_class(ClassRecord(**entry))
 
         logger.debug(f"tc {self._tc_subcommand:s} parse result: {json.dumps(entry_list, indent=4)}")
 
@@ -2,17 +2,224 @@
 .. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
 """
 
+import functools
 import ipaddress
 import re
 
-import pyparsing as pp
 import typepy
 
-from .._const import Tc, TcSubCommand
+from .._common import split_port_range
+from .._const import Classifier, Tc, TcSubCommand
 from .._logger import logger
 from .._network import sanitize_network
 from ._interface import AbstractParser
-from ._model import Filter
+from ._store import FilterRecord
+
+
+def to_flower_filter_params(keys, ip_version):
+    """
+    Convert the keys of a flower filter (``ip_proto``, ``dst_ip``, ``src_ip``,
+    ``dst_port``, ``src_port``) to the parameters of a ``FilterRecord``.
+    A port range is either a ``<min>-<max>`` string or a ``{"start": <min>, "end": <max>}``.
+    """
+
+    params = {
+        Tc.Param.CLASSIFIER: Classifier.FLOWER,
+        Tc.Param.IP_PROTO: keys.get("ip_proto"),
+        Tc.Param.SRC_NETWORK: sanitize_network(keys.get("src_ip"), ip_version),
+        Tc.Param.DST_NETWORK: sanitize_network(keys.get("dst_ip"), ip_version),
+    }
+
+    for key, port_param, max_port_param in (
+        ("src_port", Tc.Param.SRC_PORT, Tc.Param.SRC_PORT_MAX),
+        ("dst_port", Tc.Param.DST_PORT, Tc.Param.DST_PORT_MAX),
+    ):
+        port = keys.get(key)
+        if isinstance(port, dict):
+            port = "{}-{}".format(port.get("start"), port.get("end"))
+
+        params[port_param], params[max_port_param] = split_port_range(port)
+
+    return params
+
+
+_RE_IPSET_EMATCH = re.compile(r"ipset\(\s*(?P<name>[\w.-]+)\s+(?P<flags>[a-z,]+)\s*\)")
+
+
+def find_network_set(text):
+    """
+    :return:
+        The name of the set that matched by the ``ipset`` ematch of a basic filter.
+        ``None`` if the text does not include an ``ipset`` ematch.
+    :rtype: str
+    """
+
+    match = _RE_IPSET_EMATCH.search(text)
+    if match is None:
+        return None
+
+    return match.group("name")
+
+
+def to_network_set_filter_params(network_set, ip_version):
+    return {
+        Tc.Param.CLASSIFIER: Classifier.BASIC,
+        Tc.Param.NETWORK_SET: network_set,
+        Tc.Param.SRC_NETWORK: sanitize_network(None, ip_version),
+        Tc.Param.DST_NETWORK: sanitize_network(None, ip_version),
+    }
+
+
+# keys of filter lines that followed by values
+_FILTER_LINE_KEYS = ("parent", "protocol", "pref", "fh", "handle", "flowid", "classid")
+
+_RE_TC_HANDLE = re.compile("^[0-9a-fA-F:]+$")
+_RE_FILTER_HANDLE = re.compile("^(0x)?[0-9a-fA-F]+$")
+
+
+def tokenize_filter_line(line):
+    """
+    Split a line of ``tc filter show`` outputs into a keyword (the first word) and tokens.
+
+    :return:
+        - ``("filter", {key: value})`` for filter lines (e.g.
+          ``filter parent 1a1a: protocol ip pref 5 u32 ... fh 800::800 ... flowid 1a1a:2``).
+          the key of the classifier name (``u32``, ``flower``, ...) is ``kind``.
+        - ``("match", (value hex, mask hex, offset))`` for u32 match lines
+          (e.g. ``match c0a80000/ffffff00 at 16``).
+        - ``(keyword, [the rest of the words])`` for the other lines.
+    :raises ValueError: If a filter/match line is not the form the tokenizer expects.
+    """
+
+    words = line.split()
+    if not words:
+        return ("", [])
+
+    keyword = words[0]
+
+    if keyword == "filter":
+        return (keyword, _tokenize_filter_words(words))
+
+    if keyword == "match":
+        return (keyword, _tokenize_match_words(words))
+
+    return (keyword, words[1:])
+
+
+def _tokenize_filter_words(words):
+    if len(words) < 3 or words[1] != "parent":
+        raise ValueError("filter line without parent")
+
+    tokens = {}
+    idx = 1
+    while idx < len(words) - 1:
+        # tc prefixes flow ids of non-terminal u32 filters with "*" (e.g. "*flowid 1a1a:2")
+        key = words[idx].lstrip("*")
+        if key not in _FILTER_LINE_KEYS:
+            idx += 1
+            continue
+
+        tokens.setdefault(key, words[idx + 1])
+        if key == "pref" and idx + 2 < len(words):
+            tokens.setdefault("kind", words[idx + 2])
+
+        idx += 2
+
+    if "pref" in tokens and not tokens["pref"].isdigit():
+        raise ValueError(f"invalid pref: {tokens['pref']}")
+
+    for key, regexp in (
+        ("fh", _RE_TC_HANDLE),
+        ("flowid", _RE_TC_HANDLE),
+        ("classid", _RE_TC_HANDLE),
+        ("handle", _RE_FILTER_HANDLE),
+    ):
+        if key in tokens and regexp.search(tokens[key]) is None:
+            raise ValueError(f"invalid {key}: {tokens[key]}")
+
+    return tokens
+
+
+def _tokenize_match_words(words):
+    if len(words) < 4 or words[2] != "at" or not words[3].isdigit():
+        raise ValueError("unknown match form")
+
+    value_hex, sep, mask_hex = words[1].partition("/")
+    if not sep:
+        raise ValueError(f"match without mask: {words[1]}")
+
+    return (value_hex, mask_hex, int(words[3]))
+
+
+@functools.lru_cache(maxsize=None)
+def _build_filter_grammars(pp):
+    """
+    Build the pyparsing grammars of the fallback parser at the first use.
+
+    :param pp: ``pyparsing`` module.
+    """
+
+    return {
+        "flowid": (
+            pp.Literal("filter parent")
+            + pp.SkipTo("flowid", include=True)
+            + pp.Word(pp.hexnums + ":")
+        ),
+        "protocol": (
+            pp.Literal("filter parent")
+            + pp.SkipTo("protocol", include=True)
+            + pp.Word(pp.alphanums)
+        ),
+        "priority": (
+            pp.Literal("filter parent") + pp.SkipTo("pref", include=True) + pp.Word(pp.nums)
+        ),
+        "filter_id": (
+            pp.Literal("filter parent") + pp.SkipTo("fh", include=True) + pp.Word(pp.hexnums + ":")
+        ),
+        "match": (
+            pp.Literal("match") + pp.Word(pp.alphanums + "/") + pp.Literal("at") + pp.Word(pp.nums)
+        ),
+        "flower": (
+            pp.Literal("filter parent")
+            + pp.SkipTo(" flower ", include=True)
+            + pp.SkipTo("handle", include=True)
+            + pp.Word(pp.hexnums + "x")
+            + pp.SkipTo("classid", include=True)
+            + pp.Word(pp.hexnums + ":")
+        ),
+        "basic": (
+            pp.Literal("filter parent")
+            + pp.SkipTo(" basic ", include=True)
+            + pp.SkipTo("handle", include=True)
+            + pp.Word(pp.hexnums + "x")
+            + pp.SkipTo("flowid", include=True)
+            + pp.Word(pp.hexnums + ":")
+        ),
+        "mangle_mark": (
+            pp.Literal("filter parent")
+            + pp.SkipTo("handle", include=True)
+            + pp.Word(pp.hexnums)
+            + pp.SkipTo("classid", include=True)
+            + pp.Word(pp.hexnums + ":")
+        ),
+    }
+
+
+def _parse_with_grammar(name, line):
+    """
+    Parse a line by one of the pyparsing grammars of the fallback parser.
+    pyparsing is not imported as long as ``tokenize_filter_line`` can interpret lines.
+
+    :return: Parsed tokens.
+    :raises ValueError: If the line does not match with the grammar.
+    """
+
+    import pyparsing as pp
+
+    try:
+        return _build_filter_grammars(pp)[name].parseString(line)
+    except pp.ParseException as e:
+        raise ValueError(e) from e
 
 
 class TcFilterParser(AbstractParser):
@@ -26,28 +233,7 @@ class TcFilterParser(AbstractParser):
         OUTGOING_NETWORK_LIST = [24, 28, 32, 36]
         PORT = 40
 
-    __FILTER_FLOWID_PATTERN = (
-        pp.Literal("filter parent") + pp.SkipTo("flowid", include=True) + pp.Word(pp.hexnums + ":")
-    )
-    __FILTER_PROTOCOL_PATTERN = (
-        pp.Literal("filter parent") + pp.SkipTo("protocol", include=True) + pp.Word(pp.alphanums)
-    )
-    __FILTER_PRIORITY_PATTERN = (
-        pp.Literal("filter parent") + pp.SkipTo("pref", include=True) + pp.Word(pp.nums)
-    )
-    __FILTER_ID_PATTERN = (
-        pp.Literal("filter parent") + pp.SkipTo("fh", include=True) + pp.Word(pp.hexnums + ":")
-    )
-    __FILTER_MATCH_PATTERN = (
-        pp.Literal("match") + pp.Word(pp.alphanums + "/") + pp.Literal("at") + pp.Word(pp.nums)
-    )
-    __FILTER_MANGLE_MARK_PATTERN = (
-        pp.Literal("filter parent")
-        + pp.SkipTo("handle", include=True)
-        + pp.Word(pp.hexnums)
-        + pp.SkipTo("classid", include=True)
-        + pp.Word(pp.hexnums + ":")
-    )
+    __FILTER_FLOWER_KEYS = ("ip_proto", "dst_ip", "src_ip", "dst_port", "src_port")
 
     @property
     def protocol(self):
@@ -57,12 +243,13 @@ class TcFilterParser(AbstractParser):
     def _tc_subcommand(self):
         return TcSubCommand.FILTER.value
 
-    def __init__(self, con, ip_version):
-        super().__init__(con)
+    def __init__(self, store, ip_version):
+        super().__init__(store)
 
         self.__ip_version = ip_version
         self.__buffer = None
         self.__parse_idx = 0
+        self.__records = []
 
         self.__protocol = None
 
@@ -77,67 +264,107 @@ class TcFilterParser(AbstractParser):
         self.__buffer = self._to_unicode(text).splitlines()
         self.__parse_idx = 0
 
+        # parsed filters are added to the store at once
+        self.__records = []
+
         while self.__parse_idx < len(self.__buffer):
             line = self._to_unicode(self.__buffer[self.__parse_idx].strip())
             self.__parse_idx += 1
 
-            if typepy.is_null_string(line):
+            if not line:
                 continue
 
             self.__device = device
 
             try:
-                self.__parse_mangle_mark(line)
-            except pp.ParseException:
-                logger.debug(f"failed to parse mangle: {line}")
-            else:
-                Filter.insert(
-                    Filter(
-                        **{
-                            Tc.Param.DEVICE: self.__device,
-                            Tc.Param.CLASS_ID: self.__classid,
-                            Tc.Param.HANDLE: self.__handle,
-                        }
-                    )
-                )
-                self._clear()
+                keyword, tokens = tokenize_filter_line(line)
+            except ValueError as e:
+                logger.debug("fall back to the filter grammar: {}, line={}", e, line)
+                self.__parse_line_with_grammar(device, line)
                 continue
 
-            tc_filter = self.__get_filter()
+            if keyword == "filter":
+                self.__parse_filter_tokens(device, tokens)
+            elif keyword == "match" and self.__flow_id:
+                self.__parse_match(line, *tokens)
 
-            try:
+        if self.__flow_id:
+            self.__records.append(self.__get_filter())
+
+        self._store.add_filters(self.__records)
+
+    def __parse_line_with_grammar(self, device, line):
+        """
+        Parse a line by the pyparsing grammars: a compatibility fallback for the lines that
+        ``tokenize_filter_line`` can not interpret.
+        """
+
+        try:
+            parsed_list = _parse_with_grammar("flower", line)
+        except ValueError:
+            logger.debug(f"failed to parse flower: {line}")
+        else:
+            self.__parse_flower(line, parsed_list)
+            return
+
+        try:
+            parsed_list = _parse_with_grammar("basic", line)
+        except ValueError:
+            logger.debug(f"failed to parse basic: {line}")
+        else:
+            self.__parse_basic(line, parsed_list)
+            return
+
+        try:
+            parsed_list = _parse_with_grammar("mangle_mark", line)
+        except ValueError:
+            logger.debug(f"failed to parse mangle: {line}")
+        else:
+            self.__parse_mangle_mark(line, parsed_list)
+            self.__add_mangle_mark_filter()
+            return
+
+        tc_filter = self.__get_filter()
+
+        try:
+            self.__parse_flow_id(line)
+            self.__parse_protocol(line)
+            self.__parse_priority(line)
+            self.__parse_filter_id(line)
+        except ValueError:
+            logger.debug(f"failed to parse flow id: {line}")
+        else:
+            if tc_filter.flowid:
+                logger.debug(f"store filter: {tc_filter}")
+                self.__records.append(tc_filter)
+                self._clear()
+
+                self.__device = device
                 self.__parse_flow_id(line)
                 self.__parse_protocol(line)
                 self.__parse_priority(line)
                 self.__parse_filter_id(line)
 
-                if tc_filter.flowid:
-                    logger.debug(f"store filter: {tc_filter}")
-                    Filter.insert(tc_filter)
-                    self._clear()
-
-                    self.__device = device
-                    self.__parse_flow_id(line)
-                    self.__parse_protocol(line)
-                    self.__parse_priority(line)
-                    self.__parse_filter_id(line)
+            return
 
-                continue
-            except pp.ParseException:
-                logger.debug(f"failed to parse flow id: {line}")
+        if line.startswith("filter parent"):
+            # filters without flow id, such as u32 hash tables and links to them:
+            # matches that follow the line are not the matches of the current filter.
+            if tc_filter.flowid:
+                logger.debug(f"store filter: {tc_filter}")
+                self.__records.append(tc_filter)
+            self._clear()
+            return
 
-            try:
-                if self.__ip_version == 4:
-                    self.__parse_filter_ipv4(line)
-                elif self.__ip_version == 6:
-                    self.__parse_filter_ipv6(line)
-                else:
-                    raise ValueError(f"unknown ip version: {self.__ip_version}")
-            except pp.ParseException:
-                logger.debug(f"failed to parse filter: {line}")
+        if not self.__flow_id:
+            return
 
-        if self.__flow_id:
-            Filter.insert(self.__get_filter())
+        try:
+            match = self.__parse_filter_ip_line(line)
+        except ValueError:
+            logger.debug(f"failed to parse filter: {line}")
+        else:
+            self.__parse_match(line, *match)
 
     def parse_incoming_device(self, text):
         if typepy.is_null_string(text):
@@ -166,7 +393,7 @@ class TcFilterParser(AbstractParser):
         self.__classid = None
 
     def __get_filter(self):
-        return Filter(
+        return FilterRecord(
             device=self.__device,
             filter_id=self.__filter_id,
             flowid=self.__flow_id,
@@ -179,39 +406,206 @@ class TcFilterParser(AbstractParser):
         )
 
     def __parse_flow_id(self, line):
-        parsed_list = self.__FILTER_FLOWID_PATTERN.parseString(line)
+        parsed_list = _parse_with_grammar("flowid", line)
         self.__flow_id = parsed_list[-1]
         logger.debug(f"succeed to parse flow id: flow-id={self.__flow_id}, line={line}")
 
     def __parse_protocol(self, line):
-        parsed_list = self.__FILTER_PROTOCOL_PATTERN.parseString(line)
+        parsed_list = _parse_with_grammar("protocol", line)
         self.__protocol = parsed_list[-1]
         logger.debug(f"succeed to parse protocol: protocol={self.__protocol}, line={line}")
 
     def __parse_priority(self, line):
-        parsed_list = self.__FILTER_PRIORITY_PATTERN.parseString(line)
+        parsed_list = _parse_with_grammar("priority", line)
         self.__priority = int(parsed_list[-1])
         logger.debug(f"succeed to parse priority: priority={self.__priority}, line={line}")
 
     def __parse_filter_id(self, line):
-        parsed_list = self.__FILTER_ID_PATTERN.parseString(line)
+        parsed_list = _parse_with_grammar("filter_id", line)
         self.__filter_id = parsed_list[-1]
         logger.debug(f"succeed to parse filter id: filter-id={self.__filter_id}, line={line}")
 
-    def __parse_mangle_mark(self, line):
-        parsed_list = self.__FILTER_MANGLE_MARK_PATTERN.parseString(line)
+    def __parse_filter_tokens(self, device, tokens):
+        kind = tokens.get("kind")
+        has_header = "protocol" in tokens and "pref" in tokens
+
+        if kind == "flower" and has_header and "handle" in tokens and "classid" in tokens:
+            self.__flush_filter()
+            self.__protocol = tokens["protocol"]
+            self.__priority = int(tokens["pref"])
+            self.__read_flower_filter(tokens["handle"], tokens["classid"])
+            return
+
+        if kind == "basic" and has_header and "handle" in tokens and "flowid" in tokens:
+            self.__flush_filter()
+            self.__protocol = tokens["protocol"]
+            self.__priority = int(tokens["pref"])
+            self.__read_basic_filter(tokens["handle"], tokens["flowid"])
+            return
+
+        if "handle" in tokens and "classid" in tokens:
+            # filters for the packets that marked by iptables/nftables
+            self.__classid = tokens["classid"]
+            self.__handle = int(tokens["handle"], 16)
+            self.__add_mangle_mark_filter()
+            return
+
+        # a filter line ends the current u32 filter. filters without flow id, such as
+        # u32 hash tables and links to them, do not start a new filter.
+        self.__flush_filter()
+
+        if all(key in tokens for key in ("flowid", "protocol", "pref", "fh")):
+            self.__device = device
+            self.__flow_id = tokens["flowid"]
+            self.__protocol = tokens["protocol"]
+            self.__priority = int(tokens["pref"])
+            self.__filter_id = tokens["fh"]
+
+    def __flush_filter(self):
+        """
+        Store the u32 filter that being parsed (if any), then clear the parse state.
+        """
+
+        device = self.__device
+
+        if self.__flow_id:
+            tc_filter = self.__get_filter()
+            logger.debug("store filter: {}", tc_filter)
+            self.__records.append(tc_filter)
+
+        self._clear()
+        self.__device = device
+
+    def __parse_match(self, line, value_hex, mask_hex, match_id):
+        value_hex, mask_hex, match_id = self.__align_u32_match(value_hex, mask_hex, match_id)
+
+        if self.__ip_version == 4:
+            self.__parse_filter_ipv4(line, value_hex, mask_hex, match_id)
+        elif self.__ip_version == 6:
+            self.__parse_filter_ipv6(line, value_hex, mask_hex, match_id)
+        else:
+            raise ValueError(f"unknown ip version: {self.__ip_version}")
+
+    def __parse_flower(self, line, parsed_list):
+        self.__flush_filter()
+        self.__parse_protocol(line)
+        self.__parse_priority(line)
+        self.__read_flower_filter(filter_id=parsed_list[-4], flow_id=parsed_list[-1])
+
+    def __read_flower_filter(self, filter_id, flow_id):
+        keys = {}
+        while self.__parse_idx < len(self.__buffer):
+            key_line = self._to_unicode(self.__buffer[self.__parse_idx].strip())
+            if key_line.startswith("filter parent"):
+                break
+
+            self.__parse_idx += 1
+
+            items = key_line.split()
+            if len(items) == 2 and items[0] in self.__FILTER_FLOWER_KEYS:
+                keys[items[0]] = items[1]
+
+        expected_protocol = "ipv6" if self.__ip_version == 6 else "ip"
+        if self.__protocol != expected_protocol:
+            logger.debug("skip a flower filter for {}: filter-id={}", self.__protocol, filter_id)
+        else:
+            tc_filter = FilterRecord(
+                device=self.__device,
+                filter_id=filter_id,
+                flowid=flow_id,
+                protocol=self.__protocol,
+                priority=self.__priority,
+                **to_flower_filter_params(keys, self.__ip_version),
+            )
+            logger.debug("store filter: {}", tc_filter)
+            self.__records.append(tc_filter)
+
+        self._clear()
+
+    def __parse_basic(self, line, parsed_list):
+        self.__flush_filter()
+        self.__parse_protocol(line)
+        self.__parse_priority(line)
+        self.__read_basic_filter(filter_id=parsed_list[-4], flow_id=parsed_list[-1])
+
+    def __read_basic_filter(self, filter_id, flow_id):
+        network_set = None
+        while self.__parse_idx < len(self.__buffer):
+            ematch_line = self._to_unicode(self.__buffer[self.__parse_idx].strip())
+            if ematch_line.startswith("filter parent"):
+                break
+
+            self.__parse_idx += 1
+            network_set = network_set or find_network_set(ematch_line)
+
+        if network_set is None:
+            logger.debug("skip a basic filter without ipset ematch: filter-id={}", filter_id)
+        else:
+            tc_filter = FilterRecord(
+                device=self.__device,
+                filter_id=filter_id,
+                flowid=flow_id,
+                protocol=self.__protocol,
+                priority=self.__priority,
+                **to_network_set_filter_params(network_set, self.__ip_version),
+            )
+            logger.debug("store filter: {}", tc_filter)
+            self.__records.append(tc_filter)
+
+        self._clear()
+
+    def __add_mangle_mark_filter(self):
+        self.__records.append(
+            FilterRecord(
+                **{
+                    Tc.Param.DEVICE: self.__device,
+                    Tc.Param.CLASS_ID: self.__classid,
+                    Tc.Param.HANDLE: self.__handle,
+                }
+            )
+        )
+        self._clear()
+
+    def __parse_mangle_mark(self, line, parsed_list):
         self.__classid = parsed_list[-1]
         self.__handle = int("0" + parsed_list[-3], 16)
         logger.debug(
-            "succeed to parse mangle mark: " "classid={}, handle={}, line={}".format(
-                self.__classid, self.__handle, line
-            )
+            "succeed to parse mangle mark: "
+            "classid={}, handle={}, line={}".format(self.__classid, self.__handle, line)
         )
 
     def __parse_filter_ip_line(self, line):
-        parsed_list = self.__FILTER_MATCH_PATTERN.parseString(line)
+        parsed_list = _parse_with_grammar("match", line)
         value_hex, mask_hex = parsed_list[1].split("/")
-        match_id = int(parsed_list[3])
+
+        return (value_hex, mask_hex, int(parsed_list[3]))
+
+    def __read_u32_match(self, line):
+        """
+        :return: Aligned (value hex, mask hex, offset) of a u32 match line.
+        :raises ValueError: If the line is not a u32 match.
+        """
+
+        try:
+            keyword, tokens = tokenize_filter_line(line)
+        except ValueError:
+            keyword, tokens = (None, None)
+
+        if keyword != "match":
+            tokens = self.__parse_filter_ip_line(line)
+
+        return self.__align_u32_match(*tokens)
+
+    @staticmethod
+    def __align_u32_match(value_hex, mask_hex, match_id):
+        unaligned_bytes = match_id % 4
+        if unaligned_bytes and int(mask_hex, 16) & ((1 << (unaligned_bytes * 8)) - 1) == 0:
+            # filters that added via netlink (e.g. pyroute2) may have keys that start from
+            # the first masked byte: convert to the aligned form that the tc command uses.
+            shift = unaligned_bytes * 8
+            value_hex = f"{int(value_hex, 16) >> shift:08x}"
+            mask_hex = f"{int(mask_hex, 16) >> shift:08x}"
+            match_id -= unaligned_bytes
 
         return (value_hex, mask_hex, match_id)
 
@@ -249,9 +643,12 @@ class TcFilterParser(AbstractParser):
             except IndexError:
                 break
 
+            if not line.startswith("match"):
+                break
+
             try:
-                value_hex, mask_hex, match_id = self.__parse_filter_ip_line(line)
-            except pp.ParseException:
+                value_hex, mask_hex, match_id = self.__read_u32_match(line)
+            except ValueError:
                 break
 
             if (
@@ -313,7 +710,9 @@ class TcFilterParser(AbstractParser):
         src_port_hex = value_hex[:4]
         dst_port_hex = value_hex[4:]
 
-        logger.debug(f"parse ipv4 port: src-port-hex={src_port_hex}, dst-port-hex={dst_port_hex}")
+        logger.debug(
+            "parse ipv4 port: src-port-hex={}, dst-port-hex={}", src_port_hex, dst_port_hex
+        )
 
         src_port_decimal = int(src_port_hex, 16)
         self.__filter_src_port = src_port_decimal if src_port_decimal != 0 else None
@@ -321,9 +720,7 @@ class TcFilterParser(AbstractParser):
         dst_port_decimal = int(dst_port_hex, 16)
         self.__filter_dst_port = dst_port_decimal if dst_port_decimal != 0 else None
 
-    def __parse_filter_ipv4(self, line):
-        value_hex, mask_hex, match_id = self.__parse_filter_ip_line(line)
-
+    def __parse_filter_ipv4(self, line, value_hex, mask_hex, match_id):
         if match_id in [
             self.FilterMatchIdIpv4.INCOMING_NETWORK,
             self.FilterMatchIdIpv4.OUTGOING_NETWORK,
@@ -342,25 +739,20 @@ class TcFilterParser(AbstractParser):
             )
             return
         else:
-            logger.debug(f"unknown match id: {match_id}")
+            logger.debug("unknown match id: {}", match_id)
             return
 
         logger.debug(
-            "succeed to parse ipv4 filter: "
-            + ", ".join(
-                [
-                    f"src_network={self.__filter_src_network}",
-                    f"dst_network={self.__filter_dst_network}",
-                    f"src_port={self.__filter_src_port}",
-                    f"dst_port={self.__filter_dst_port}",
-                    f"line={line}",
-                ]
-            )
+            "succeed to parse ipv4 filter: src_network={}, dst_network={}, "
+            "src_port={}, dst_port={}, line={}",
+            self.__filter_src_network,
+            self.__filter_dst_network,
+            self.__filter_src_port,
+            self.__filter_dst_port,
+            line,
         )
 
-    def __parse_filter_ipv6(self, line):
-        value_hex, mask_hex, match_id = self.__parse_filter_ip_line(line)
-
+    def __parse_filter_ipv6(self, line, value_hex, mask_hex, match_id):
         if (
             match_id in self.FilterMatchIdIpv6.INCOMING_NETWORK_LIST
             or match_id in self.FilterMatchIdIpv6.OUTGOING_NETWORK_LIST
@@ -369,18 +761,15 @@ class TcFilterParser(AbstractParser):
         elif match_id == self.FilterMatchIdIpv6.PORT:
             self.__parse_filter_port(value_hex)
         else:
-            logger.debug(f"unknown match id: {match_id}")
+            logger.debug("unknown match id: {}", match_id)
             return
 
         logger.debug(
-            "succeed to parse ipv6 filter: "
-            + ", ".join(
-                [
-                    f"src_network={self.__filter_src_network}",
-                    f"dst_network={self.__filter_dst_network}",
-                    f"src_port={self.__filter_src_port}",
-                    f"dst_port={self.__filter_dst_port}",
-                    f"line={line}",
-                ]
-            )
+            "succeed to parse ipv6 filter: src_network={}, dst_network={}, "
+            "src_port={}, dst_port={}, line={}",
+            self.__filter_src_network,
+            self.__filter_dst_network,
+            self.__filter_src_port,
+            self.__filter_dst_port,
+            line,
         )
@@ -12,13 +12,13 @@ class ParserInterface(metaclass=abc.ABCMeta):
 
 
 class AbstractParser(ParserInterface, metaclass=abc.ABCMeta):
-    def __init__(self, con):
-        self._con = con
+    def __init__(self, store):
+        self._store = store
         self._clear()
 
     @property
-    def con(self):
-        return self._con
+    def store(self):
+        return self._store
 
     @property
     @abc.abstractmethod
@@ -14,6 +14,16 @@ class Filter(Model):
     src_port = Integer(attr_name=Tc.Param.SRC_PORT)
     dst_port = Integer(attr_name=Tc.Param.DST_PORT)
 
+    # flower filters: classifier is None for u32 filters.
+    # *_port_max are the upper bounds of port ranges.
+    classifier = Text(attr_name=Tc.Param.CLASSIFIER)
+    ip_proto = Text(attr_name=Tc.Param.IP_PROTO)
+    src_port_max = Integer(attr_name=Tc.Param.SRC_PORT_MAX)
+    dst_port_max = Integer(attr_name=Tc.Param.DST_PORT_MAX)
+
+    # name of the ipset that matched by a basic filter
+    network_set = Text(attr_name=Tc.Param.NETWORK_SET)
+
     classid = Text(attr_name=Tc.Param.CLASS_ID)
     handle = Integer(attr_name=Tc.Param.HANDLE)
 
@@ -0,0 +1,411 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import ipaddress
+import re
+import socket
+import struct
+
+from .._const import ShapingAlgorithm, Tc
+from .._error import NetworkInterfaceNotFoundError
+from .._logger import logger
+from .._network import sanitize_network
+from ._class import TcClassParser
+from ._filter import TcFilterParser
+from ._store import ClassRecord, FilterRecord, QdiscRecord
+
+
+_UINT32_MAX = 0xFFFFFFFF
+_TC_H_ROOT = 0xFFFFFFFF  # TC_H_ROOT of linux/pkt_sched.h
+_TCA_EGRESS_REDIR = 1
+_PROTOCOL_NAME_MAP = {0x0003: "all", 0x0800: "ip", 0x86DD: "ipv6"}
+
+# struct tc_u32_sel: nla header (4 bytes) + selector fields (16 bytes) + keys (16 bytes each)
+_U32_SEL_KEY_OFFSET = 20
+_U32_KEY_SIZE = 16
+
+
+def format_tc_handle(handle):
+    """
+    Format a qdisc/class handle in the same notation as the tc command (e.g. ``1a1a:2``).
+    """
+
+    if handle == _TC_H_ROOT:
+        return "root"
+
+    major = handle >> 16
+    minor = handle & 0xFFFF
+
+    if major == 0:
+        return f":{minor:x}"
+    if minor == 0:
+        return f"{major:x}:"
+
+    return f"{major:x}:{minor:x}"
+
+
+def format_u32_filter_handle(handle):
+    htid = handle >> 20
+    hash_id = (handle >> 12) & 0xFF
+    node = handle & 0xFFF
+    text = ""
+
+    if htid:
+        text += f"{htid:x}:"
+    if hash_id:
+        text += f"{hash_id:x}"
+    if node:
+        text += f":{node:x}"
+
+    return text
+
+
+def format_rate(bytes_per_sec):
+    # port of print_rate() of iproute2
+    bits_per_sec = bytes_per_sec * 8
+    kilo = 1000
+    units = ("", "K", "M", "G", "T")
+    unit_idx = 0
+
+    while unit_idx < len(units) - 1:
+        if bits_per_sec < kilo:
+            break
+        if bits_per_sec % kilo != 0 and bits_per_sec < 1000 * kilo:
+            break
+
+        bits_per_sec //= kilo
+        unit_idx += 1
+
+    return f"{bits_per_sec:d}{units[unit_idx]:s}bit"
+
+
+def format_time(usec):
+    # port of print_time64() of iproute2
+    nsec = usec * 1000
+
+    if nsec >= 1000**3:
+        return "{:.3g}s".format(nsec / 1000**3)
+    if nsec >= 1000**2:
+        return "{:.3g}ms".format(nsec / 1000**2)
+    if nsec >= 1000:
+        return "{:.3g}us".format(nsec / 1000)
+
+    return f"{int(nsec):d}ns"
+
+
+def format_percent(value):
+    return "{:g}%".format(100.0 * value / _UINT32_MAX)
+
+
+def unpack_u32_keys(sel):
+    """
+    Extract ``(value, mask, offset)`` of the keys from a ``TCA_U32_SEL`` attribute.
+    Keys are read from the raw attribute because some pyroute2 versions decode them
+    from a misaligned position.
+    """
+
+    keys = []
+    offset = sel.offset + _U32_SEL_KEY_OFFSET
+
+    for _i in range(sel["nkeys"]):
+        mask, value = struct.unpack_from(">II", sel.data, offset)
+        key_offset, _offmask = struct.unpack_from("=ii", sel.data, offset + 8)
+        keys.append((value, mask, key_offset))
+        offset += _U32_KEY_SIZE
+
+    return keys
+
+
+def to_aligned_u32_words(keys):
+    """
+    Re-align u32 keys to 32-bit words as shown by the ``tc filter show`` command.
+
+    :return: Mapping of ``offset -> (value, mask)``.
+    :rtype: dict
+    """
+
+    words = {}
+
+    for value, mask, key_offset in keys:
+        for i in range(4):
+            shift = (3 - i) * 8
+            byte_mask = (mask >> shift) & 0xFF
+            if not byte_mask:
+                continue
+
+            byte_offset = key_offset + i
+            word_offset = byte_offset - byte_offset % 4
+            word_shift = (3 - byte_offset % 4) * 8
+            word_value, word_mask = words.get(word_offset, (0, 0))
+            words[word_offset] = (
+                word_value | (((value >> shift) & byte_mask) << word_shift),
+                word_mask | (byte_mask << word_shift),
+            )
+
+    return words
+
+
+def to_filter_match_params(words, ip_version):
+    """
+    Convert u32 words (the output of :py:func:`.to_aligned_u32_words`) to the
+    network/port parameters of a ``FilterRecord``.
+    """
+
+    src_network = None
+    dst_network = None
+
+    if ip_version == 4:
+        match_id = TcFilterParser.FilterMatchIdIpv4
+        if match_id.INCOMING_NETWORK in words:
+            src_network = _to_ipv4_network(*words[match_id.INCOMING_NETWORK])
+        if match_id.OUTGOING_NETWORK in words:
+            dst_network = _to_ipv4_network(*words[match_id.OUTGOING_NETWORK])
+
+        ipv6_match_ids = set(
+            TcFilterParser.FilterMatchIdIpv6.INCOMING_NETWORK_LIST
+            + TcFilterParser.FilterMatchIdIpv6.OUTGOING_NETWORK_LIST
+            + [TcFilterParser.FilterMatchIdIpv6.PORT]
+        ) - {match_id.INCOMING_NETWORK, match_id.OUTGOING_NETWORK, match_id.PORT}
+        for unknown_match_id in sorted(ipv6_match_ids.intersection(words)):
+            logger.warning(
+                "unknown match id for an IPv4 filter: might be an IPv6 filter. "
+                "try to use --ipv6 option. (id={})".format(unknown_match_id)
+            )
+    elif ip_version == 6:
+        match_id = TcFilterParser.FilterMatchIdIpv6
+        if set(match_id.INCOMING_NETWORK_LIST + match_id.OUTGOING_NETWORK_LIST).intersection(words):
+            src_network = _to_ipv6_network(words, match_id.INCOMING_NETWORK_LIST)
+            dst_network = _to_ipv6_network(words, match_id.OUTGOING_NETWORK_LIST)
+    else:
+        raise ValueError(f"unknown ip version: {ip_version}")
+
+    src_port = None
+    dst_port = None
+    if match_id.PORT in words:
+        port_value, _mask = words[match_id.PORT]
+        src_port = (port_value >> 16) or None
+        dst_port = (port_value & 0xFFFF) or None
+
+    return {
+        Tc.Param.SRC_NETWORK: sanitize_network(src_network, ip_version),
+        Tc.Param.DST_NETWORK: sanitize_network(dst_network, ip_version),
+        Tc.Param.SRC_PORT: src_port,
+        Tc.Param.DST_PORT: dst_port,
+    }
+
+
+def _to_ipv4_network(value, mask):
+    return f"{ipaddress.IPv4Address(value)}/{bin(mask).count('1'):d}"
+
+
+def _to_ipv6_network(words, match_id_list):
+    # same as TcFilterParser: the matched words are packed from the head of the address
+    address = 0
+    netmask = 0
+    match_ids = [match_id for match_id in match_id_list if match_id in words]
+
+    for match_id in match_ids:
+        value, mask = words[match_id]
+        address = (address << 32) | value
+        netmask += bin(mask).count("1")
+
+    address <<= 32 * (len(match_id_list) - len(match_ids))
+
+    return ipaddress.IPv6Network((address, netmask), strict=False).compressed
+
+
+class TcNetlinkDumpReader:
+    """
+    Read qdiscs, classes and filters from a netlink dump and store them to the same
+    tables as ``TcQdiscParser``, ``TcClassParser`` and ``TcFilterParser`` do from
+    the ``tc ... show`` outputs.
+    """
+
+    def __init__(self, store, ip_version, ipr):
+        self.__store = store
+        self.__ip_version = ip_version
+        self.__ipr = ipr
+
+    def read(self, device):
+        ifindex = self.__get_ifindex(device)
+
+        self.__read_class(device, ifindex)
+        self.__read_filter(device, ifindex)
+        self.__read_qdisc(device, ifindex)
+
+    def read_incoming_device(self, device):
+        ifindex = self.__get_ifindex(device)
+
+        for msg in self.__ipr.get_filters(ifindex, parent=_TC_H_ROOT):
+            options = msg.get_attr("TCA_OPTIONS")
+            if options is None or msg.get_attr("TCA_KIND") != "u32":
+                continue
+
+            actions = options.get_attr("TCA_U32_ACT")
+            if actions is None:
+                continue
+
+            for _prio, action in actions["attrs"]:
+                if action.get_attr("TCA_ACT_KIND") != "mirred":
+                    continue
+
+                params = action.get_attr("TCA_ACT_OPTIONS").get_attr("TCA_MIRRED_PARMS")
+                if params["eaction"] != _TCA_EGRESS_REDIR:
+                    continue
+
+                links = self.__ipr.get_links(params["ifindex"])
+                if not links:
+                    continue
+
+                match = re.search(r"ifb[\d]+", links[0].get_attr("IFLA_IFNAME"))
+                if match is not None:
+                    return match.group()
+
+        return None
+
+    def __get_ifindex(self, device):
+        ifindex_list = self.__ipr.link_lookup(ifname=device)
+        if not ifindex_list:
+            raise NetworkInterfaceNotFoundError(target=device)
+
+        return ifindex_list[0]
+
+    def __read_qdisc(self, device, ifindex):
+        params = {}
+
+        for msg in self.__ipr.get_qdiscs(ifindex):
+            kind = msg.get_attr("TCA_KIND")
+            options = msg.get_attr("TCA_OPTIONS")
+
+            if kind == ShapingAlgorithm.HTB:
+                # same as TcQdiscParser: carried over to the next netem/tbf entry
+                direct_qlen = options.get_attr("TCA_HTB_DIRECT_QLEN") if options else None
+                if direct_qlen is not None:
+                    params["direct_qlen"] = direct_qlen
+                continue
+
+            if options is None:
+                continue
+
+            if kind == "netem":
+                params.update(self.__to_netem_params(msg, options))
+            elif kind == ShapingAlgorithm.TBF:
+                tbf_params = options.get_attr("TCA_TBF_PARMS")
+                params["rate"] = format_rate(tbf_params["rate"]).rstrip("bit")
+            else:
+                continue
+
+            params[Tc.Param.DEVICE] = device
+
+            logger.debug(f"read a qdisc entry: {params}")
+
+            self.__store.add_qdisc(QdiscRecord(**params))
+
+            params = {}
+
+    @staticmethod
+    def __to_netem_params(msg, options):
+        # pyroute2 reads the clock resolution of the kernel at the import
+        from pyroute2.netlink.rtnl.tcmsg.common import tick_in_usec
+
+        params = {
+            Tc.Param.PARENT: format_tc_handle(msg["parent"]),
+            Tc.Param.HANDLE: format_tc_handle(msg["handle"]),
+            "limit": options["limit"],
+        }
+
+        if options["delay"]:
+            params["delay"] = format_time(options["delay"] / tick_in_usec)
+            if options["jitter"]:
+                params["delay-distro"] = format_time(options["jitter"] / tick_in_usec)
+
+        if options["loss"]:
+            params["loss"] = format_percent(options["loss"])
+        if options["duplicate"]:
+            params["duplicate"] = format_percent(options["duplicate"])
+
+        corrupt = options.get_attr("TCA_NETEM_CORRUPT")
+        if corrupt is not None and corrupt["prob_corrupt"]:
+            params["corrupt"] = format_percent(corrupt["prob_corrupt"])
+
+        reorder = options.get_attr("TCA_NETEM_REORDER")
+        if reorder is not None and reorder["prob_reorder"]:
+            params["reorder"] = format_percent(reorder["prob_reorder"])
+
+        rate = options.get_attr("TCA_NETEM_RATE")
+        if rate is not None and rate["rate"]:
+            params["rate"] = format_rate(rate["rate"]).rstrip("bit")
+
+        return params
+
+    def __read_class(self, device, ifindex):
+        entry_list = []
+
+        for msg in self.__ipr.get_classes(ifindex):
+            entry = {
+                TcClassParser.Key.DEVICE: device,
+                TcClassParser.Key.CLASS_ID: None,
+                TcClassParser.Key.RATE: None,
+            }
+
+            options = msg.get_attr("TCA_OPTIONS")
+            if msg.get_attr("TCA_KIND") == ShapingAlgorithm.HTB and options is not None:
+                rate = options.get_attr("TCA_HTB_RATE64")
+                if rate is None:
+                    rate = options.get_attr("TCA_HTB_PARMS")["rate"]
+
+                entry[TcClassParser.Key.CLASS_ID] = format_tc_handle(msg["handle"])
+                entry[TcClassParser.Key.RATE] = re.sub("bit$", "bps", format_rate(rate))
+
+            logger.debug(f"read a class entry: {entry}")
+            entry_list.append(entry)
+
+        for entry in entry_list:
+            self.__store.add_class(ClassRecord(**entry))
+
+    def __read_filter(self, device, ifindex):
+        for msg in self.__ipr.get_filters(ifindex):
+            kind = msg.get_attr("TCA_KIND")
+            options = msg.get_attr("TCA_OPTIONS")
+            if options is None:
+                continue
+
+            if kind == "fw":
+                classid = options.get_attr("TCA_FW_CLASSID")
+                if classid is None:
+                    continue
+
+                self.__store.add_filter(
+                    FilterRecord(
+                        **{
+                            Tc.Param.DEVICE: device,
+                            Tc.Param.CLASS_ID: format_tc_handle(classid),
+                            Tc.Param.HANDLE: msg["handle"],
+                        }
+                    )
+                )
+                continue
+
+            if kind != "u32":
+                continue
+
+            classid = options.get_attr("TCA_U32_CLASSID")
+            sel = options.get_attr("TCA_U32_SEL")
+            if classid is None or sel is None:
+                continue
+
+            protocol = socket.ntohs(msg["info"] & 0xFFFF)
+            tc_filter = FilterRecord(
+                device=device,
+                filter_id=format_u32_filter_handle(msg["handle"]),
+                flowid=format_tc_handle(classid),
+                protocol=_PROTOCOL_NAME_MAP.get(protocol, f"0x{protocol:04x}"),
+                priority=msg["info"] >> 16,
+                **to_filter_match_params(
+                    to_aligned_u32_words(unpack_u32_keys(sel)), self.__ip_version
+                ),
+            )
+
+            logger.debug(f"read a filter entry: {tc_filter}")
+            self.__store.add_filter(tc_filter)
@@ -4,13 +4,127 @@
 
 import re
 
-import pyparsing as pp
 import typepy
 
-from .._const import Tc, TcSubCommand
+from .._const import ShapingAlgorithm, Tc, TcSubCommand
 from .._logger import logger
 from ._interface import AbstractParser
-from ._model import Qdisc
+from ._store import QdiscRecord
+
+
+_RE_QDISC_ID = re.compile("^[0-9a-fA-F]*:[0-9a-fA-F]*$")
+_RE_NUMBER = re.compile("^-?[0-9]+$")
+_RE_HEX = re.compile("^(0x)?[0-9a-fA-F]+$")
+_RE_VERSION = re.compile(r"^[0-9]+(\.[0-9]+)*$")
+_RE_TIME = re.compile(r"^[0-9.]+(us|ms|s)$")
+_RE_PERCENT = re.compile(r"^[0-9.]+%$")
+_RE_RATE = re.compile(r"^[0-9.]+[KMGT]?(bit|bps)$")
+_RE_SIZE = re.compile(r"^[0-9.]+([KMG]?b)?$")
+
+# keyword of qdisc lines -> (required values, optional values) that follow the keyword.
+# each value is a pair of the attribute name and the regexp of the value.
+# words that are not the keywords are flags (e.g. ecn of netem): attributes of True.
+_QDISC_LINE_KEYWORDS = {
+    "parent": ((("parent", _RE_QDISC_ID),), ()),
+    "refcnt": ((("refcnt", _RE_NUMBER),), ()),
+    # htb
+    "r2q": ((("r2q", _RE_NUMBER),), ()),
+    "default": ((("default", _RE_HEX),), ()),
+    "direct_packets_stat": ((("direct_packets_stat", _RE_NUMBER),), ()),
+    "direct_qlen": ((("direct_qlen", _RE_NUMBER),), ()),
+    "ver": ((("ver", _RE_VERSION),), ()),
+    # netem
+    "limit": ((("limit", _RE_SIZE),), ()),
+    "delay": (
+        (("delay", _RE_TIME),),
+        (("delay-distro", _RE_TIME), ("delay-correlation", _RE_PERCENT)),
+    ),
+    "loss": ((("loss", _RE_PERCENT),), (("loss-correlation", _RE_PERCENT),)),
+    "duplicate": ((("duplicate", _RE_PERCENT),), (("duplicate-correlation", _RE_PERCENT),)),
+    "corrupt": ((("corrupt", _RE_PERCENT),), (("corrupt-correlation", _RE_PERCENT),)),
+    "reorder": ((("reorder", _RE_PERCENT),), (("reorder-correlation", _RE_PERCENT),)),
+    "gap": ((("gap", _RE_NUMBER),), ()),
+    "rate": ((("rate", _RE_RATE),), ()),
+    "packetoverhead": ((("packetoverhead", _RE_NUMBER),), ()),
+    "cellsize": ((("cellsize", _RE_NUMBER),), ()),
+    "celloverhead": ((("celloverhead", _RE_NUMBER),), ()),
+    "slot": ((("slot", _RE_TIME), ("slot-max", _RE_TIME)), ()),
+    "packets": ((("packets", _RE_NUMBER),), ()),
+    "bytes": ((("bytes", _RE_SIZE),), ()),
+    "seed": ((("seed", _RE_NUMBER),), ()),
+    # tbf
+    "burst": ((("burst", _RE_SIZE),), ()),
+    "peakrate": ((("peakrate", _RE_RATE),), ()),
+    "mtu": ((("mtu", _RE_SIZE),), ()),
+    "minburst": ((("minburst", _RE_SIZE),), ()),
+    "lat": ((("lat", _RE_TIME),), ()),
+}
+
+_RE_SHAPING_QDISC_LINE = re.compile("^qdisc (netem|htb|tbf) ")
+
+# attributes of netem qdiscs that stored to the qdisc records
+_NETEM_RECORD_ATTRS = (
+    Tc.Param.PARENT,
+    Tc.Param.HANDLE,
+    "delay",
+    "delay-distro",
+    "loss",
+    "duplicate",
+    "corrupt",
+    "reorder",
+    "limit",
+)
+
+
+def tokenize_qdisc_line(line):
+    """
+    Split a line of ``tc qdisc show`` outputs into the attributes of the qdisc
+    by a single pass of the words of the line.
+
+    :return:
+        ``(kind, {attribute name: value})`` (e.g. ``("netem", {"handle": "2873:",
+        "parent": "1a1a:2", "limit": "1000", "delay": "10.0ms", "delay-distro": "1.0ms"})``).
+        optional values of keywords are named with suffixes (e.g. ``delay-correlation``)
+        and flags (e.g. ``root``, ``ecn``) have ``True``.
+    :raises ValueError: If the line is not a qdisc line or a value is not the form of the keyword.
+    """
+
+    words = line.split()
+    if len(words) < 3 or words[0] != "qdisc":
+        raise ValueError("not a qdisc line")
+
+    kind = words[1]
+    if _RE_QDISC_ID.search(words[2]) is None:
+        raise ValueError(f"invalid handle: {words[2]}")
+
+    attrs = {Tc.Param.HANDLE: words[2]}
+    idx = 3
+    num_words = len(words)
+
+    while idx < num_words:
+        keyword = words[idx]
+        idx += 1
+
+        value_specs = _QDISC_LINE_KEYWORDS.get(keyword)
+        if value_specs is None:
+            attrs.setdefault(keyword, True)
+            continue
+
+        required_specs, optional_specs = value_specs
+
+        for attr_name, regexp in required_specs:
+            if idx >= num_words or regexp.search(words[idx]) is None:
+                raise ValueError(f"invalid value of {keyword}: {words[idx:idx + 1]}")
+
+            attrs[attr_name] = words[idx]
+            idx += 1
+
+        for attr_name, regexp in optional_specs:
+            if idx < num_words and regexp.search(words[idx]) is not None:
+                attrs[attr_name] = words[idx]
+                idx += 1
+
+    return (kind, attrs)
 
 
 class TcQdiscParser(AbstractParser):
@@ -33,45 +147,90 @@ class TcQdiscParser(AbstractParser):
         if typepy.is_null_string(text):
             return []
 
-        text = text.strip()
+        records = []
+
+        for line in self._to_unicode(text).splitlines():
+            line = line.strip()
 
-        for line in text.splitlines():
-            if typepy.is_null_string(line):
+            match = _RE_SHAPING_QDISC_LINE.search(line)
+            if match is None:
                 continue
 
-            line = self._to_unicode(line.lstrip())
+            try:
+                kind, attrs = tokenize_qdisc_line(line)
+            except ValueError as e:
+                logger.debug("fall back to the qdisc grammar: {}, line={}", e, line)
+                record = self.__parse_line_with_grammar(device, line)
+            else:
+                record = self.__parse_qdisc_attrs(device, kind, attrs)
 
-            if re.search("^qdisc netem |^qdisc htb |^qdisc tbf ", line) is None:
-                continue
+            if record is not None:
+                records.append(record)
 
-            if re.search("^qdisc htb ", line) is not None:
-                self.__parse_direct_qlen(line)
-                continue
+        self._store.add_qdiscs(records)
+
+    def __parse_qdisc_attrs(self, device, kind, attrs):
+        if kind == ShapingAlgorithm.HTB:
+            # carried over to the next netem/tbf entry
+            if "direct_qlen" in attrs:
+                self.__parsed_param["direct_qlen"] = int(attrs["direct_qlen"])
+            return None
+
+        if kind == "netem":
+            for attr_name in _NETEM_RECORD_ATTRS:
+                if attr_name in attrs:
+                    self.__parsed_param[attr_name] = attrs[attr_name]
+
+        if "rate" in attrs:
+            self.__parsed_param["rate"] = attrs["rate"].rstrip("bit")
+
+        self.__parsed_param[Tc.Param.DEVICE] = device
+
+        return self.__flush_record()
 
-            if re.search("^qdisc netem ", line) is not None:
-                self.__parse_netem_param(line, "parent", pp.hexnums + ":")
+    def __parse_line_with_grammar(self, device, line):
+        """
+        Parse a line by the pyparsing grammars: a compatibility fallback for the lines that
+        ``tokenize_qdisc_line`` can not interpret.
+        pyparsing is imported at the first fallback.
+        """
 
-            self.__parsed_param[Tc.Param.DEVICE] = device
-            self.__parse_netem_param(line, "netem", pp.hexnums + ":", "handle")
-            self.__parse_netem_param(line, "delay", pp.nums + ".msu")
-            self.__parse_netem_delay_distro(line)
-            self.__parse_netem_param(line, "loss", pp.nums + ".%")
-            self.__parse_netem_param(line, "duplicate", pp.nums + ".%")
-            self.__parse_netem_param(line, "corrupt", pp.nums + ".%")
-            self.__parse_netem_param(line, "reorder", pp.nums + ".%")
-            self.__parse_netem_param(line, "limit", pp.nums)
-            self.__parse_bandwidth_rate(line)
+        import pyparsing as pp
 
-            logger.debug(f"parse a qdisc entry: {self.__parsed_param}")
+        if re.search("^qdisc htb ", line) is not None:
+            self.__parse_direct_qlen(line)
+            return None
 
-            Qdisc.insert(Qdisc(**self.__parsed_param))
+        if re.search("^qdisc netem ", line) is not None:
+            self.__parse_netem_param(line, "parent", pp.hexnums + ":")
 
-            self._clear()
+        self.__parsed_param[Tc.Param.DEVICE] = device
+        self.__parse_netem_param(line, "netem", pp.hexnums + ":", "handle")
+        self.__parse_netem_param(line, "delay", pp.nums + ".msu")
+        self.__parse_netem_delay_distro(line)
+        self.__parse_netem_param(line, "loss", pp.nums + ".%")
+        self.__parse_netem_param(line, "duplicate", pp.nums + ".%")
+        self.__parse_netem_param(line, "corrupt", pp.nums + ".%")
+        self.__parse_netem_param(line, "reorder", pp.nums + ".%")
+        self.__parse_netem_param(line, "limit", pp.nums)
+        self.__parse_bandwidth_rate(line)
+
+        return self.__flush_record()
+
+    def __flush_record(self):
+        logger.debug("parse a qdisc entry: {}", self.__parsed_param)
+
+        record = QdiscRecord(**self.__parsed_param)
+        self._clear()
+
+        return record
 
     def _clear(self):
         self.__parsed_param = {}
 
     def __parse_netem_delay_distro(self, line):
+        import pyparsing as pp
+
         parse_param_name = "delay"
         pattern = (
             pp.SkipTo(parse_param_name, include=True)
@@ -87,6 +246,8 @@ class TcQdiscParser(AbstractParser):
             pass
 
     def __parse_netem_param(self, line, parse_param_name, word_pattern, key_name=None):
+        import pyparsing as pp
+
         pattern = pp.SkipTo(parse_param_name, include=True) + pp.Word(word_pattern)
         if not key_name:
             key_name = parse_param_name
@@ -99,6 +260,8 @@ class TcQdiscParser(AbstractParser):
             pass
 
     def __parse_bandwidth_rate(self, line):
+        import pyparsing as pp
+
         parse_param_name = "rate"
         pattern = pp.SkipTo(parse_param_name, include=True) + pp.Word(pp.alphanums + "." + ":")
 
@@ -0,0 +1,236 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import ipaddress
+import re
+from collections import namedtuple
+
+from .._common import split_port_range
+from .._const import IpProto, Tc
+
+
+Flow = namedtuple("Flow", "dst_address dst_port src_address src_port ip_proto")
+
+_RE_ADDRESS_PORT = re.compile(r"^\[(?P<ipv6>[0-9a-fA-F:.]+)\](:(?P<port>\d+))?$")
+
+_IndexedRule = namedtuple("_IndexedRule", "order filter_key key_items src_network ports")
+
+
+def parse_flow(terms):
+    """
+    Parse a flow specification: ``dst=<address>[:<port>]``, ``src=<address>[:<port>]``
+    and ``proto=<L4 protocol>``. Terms are separated by spaces/commas.
+    IPv6 addresses with ports are enclosed in brackets (e.g. ``dst=[2001:db8::1]:443``).
+
+    :param terms: A flow specification string or a list of the terms.
+    :rtype: Flow
+    :raises ValueError: If the specification is invalid.
+    """
+
+    if isinstance(terms, str):
+        terms = [terms]
+
+    values = {}
+    for term in ",".join(terms).replace(" ", ",").split(","):
+        if not term:
+            continue
+
+        key, sep, value = term.partition("=")
+        if not sep or key not in ("dst", "src", "proto"):
+            raise ValueError(f"invalid flow term: expected dst=, src= or proto=, actual={term}")
+
+        values[key] = value
+
+    dst_address, dst_port = _split_address_port(values.get("dst"))
+    src_address, src_port = _split_address_port(values.get("src"))
+
+    if dst_address is None and src_address is None:
+        raise ValueError("either dst or src address required")
+
+    if dst_address and src_address and dst_address.version != src_address.version:
+        raise ValueError("dst and src addresses must be the same ip version")
+
+    ip_proto = values.get("proto")
+    if ip_proto is not None and ip_proto not in IpProto.LIST:
+        raise ValueError(f"unknown L4 protocol: expected={IpProto.LIST}, actual={ip_proto}")
+
+    return Flow(
+        dst_address=dst_address,
+        dst_port=dst_port,
+        src_address=src_address,
+        src_port=src_port,
+        ip_proto=ip_proto,
+    )
+
+
+def _split_address_port(value):
+    if not value:
+        return (None, None)
+
+    match = _RE_ADDRESS_PORT.search(value)
+    if match:
+        address, port = match.group("ipv6"), match.group("port")
+    elif value.count(":") == 1:
+        address, port = value.split(":")
+    else:
+        address, port = value, None
+
+    return (ipaddress.ip_address(address), None if port is None else int(port))
+
+
+class _RadixNode:
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children = [None, None]
+        self.values = []
+
+
+class RadixTrie:
+    """
+    Binary trie of network prefixes.
+    Both insertions and lookups take O(prefix length) regardless of the number of prefixes.
+    """
+
+    def __init__(self, max_prefixlen):
+        self.__max_prefixlen = max_prefixlen
+        self.__root = _RadixNode()
+
+    def add(self, network, value):
+        node = self.__root
+        bits = int(network.network_address)
+
+        for depth in range(network.prefixlen):
+            bit = (bits >> (self.__max_prefixlen - 1 - depth)) & 1
+            if node.children[bit] is None:
+                node.children[bit] = _RadixNode()
+            node = node.children[bit]
+
+        node.values.append(value)
+
+    def iter_matches(self, address):
+        """
+        :return: Values of the prefixes that include the address, from the shortest prefix.
+        """
+
+        node = self.__root
+        bits = int(address)
+
+        for depth in range(self.__max_prefixlen + 1):
+            yield from node.values
+
+            if depth == self.__max_prefixlen:
+                break
+
+            node = node.children[(bits >> (self.__max_prefixlen - 1 - depth)) & 1]
+            if node is None:
+                break
+
+
+class ShapingRuleIndex:
+    """
+    Index of the filters of a device to find the rule that a flow hits.
+    Filters are indexed by destination networks: a lookup walks the prefixes that
+    include the destination address of a flow, then picks the first filter in the
+    evaluation order (filter priority, then the order of the filters) that matches
+    the other conditions.
+    """
+
+    def __init__(self, ip_version):
+        self.__ip_version = ip_version
+        self.__trie = RadixTrie(128 if ip_version == 6 else 32)
+        self.__anywhere = ipaddress.ip_network("::/0" if ip_version == 6 else "0.0.0.0/0")
+        self.__num_rules = 0
+
+    def __len__(self):
+        return self.__num_rules
+
+    def add(self, filter_key, key_items, priority):
+        """
+        :param str filter_key: Filter key of the rule (the key of a ``tcshow`` output).
+        :param dict key_items: Match conditions of the rule.
+        :param int priority: Filter priority.
+        """
+
+        dst_network = self.__to_network(key_items.get(Tc.Param.DST_NETWORK))
+        src_network = self.__to_network(key_items.get(Tc.Param.SRC_NETWORK))
+
+        ports = []
+        for key in (Tc.Param.SRC_PORT, Tc.Param.DST_PORT):
+            port, max_port = split_port_range(key_items.get(key))
+            ports.append(None if port is None else (port, port if max_port is None else max_port))
+
+        self.__trie.add(
+            dst_network,
+            _IndexedRule(
+                order=(priority, self.__num_rules),
+                filter_key=filter_key,
+                key_items=key_items,
+                src_network=src_network,
+                ports=tuple(ports),
+            ),
+        )
+        self.__num_rules += 1
+
+    def lookup(self, flow):
+        """
+        :return: Filter key of the rule that the flow hits. ``None`` if no rules match.
+        :rtype: str
+        """
+
+        dst_address = flow.dst_address
+        if dst_address is None:
+            # flows without destinations only match the rules for any destinations
+            dst_address = self.__anywhere.network_address
+
+        if dst_address.version != self.__ip_version:
+            raise ValueError(
+                f"an IPv{dst_address.version:d} flow can not be looked up "
+                f"from IPv{self.__ip_version:d} rules"
+            )
+
+        hit_rule = None
+        for rule in self.__trie.iter_matches(dst_address):
+            if flow.dst_address is None and rule.key_items.get(Tc.Param.DST_NETWORK):
+                continue
+
+            if hit_rule is not None and hit_rule.order < rule.order:
+                continue
+
+            if self.__is_match(rule, flow):
+                hit_rule = rule
+
+        if hit_rule is None:
+            return None
+
+        return hit_rule.filter_key
+
+    @staticmethod
+    def __is_match(rule, flow):
+        if Tc.Param.NETWORK_SET in rule.key_items:
+            # members of ipsets are not available to the index
+            return False
+
+        if rule.src_network.prefixlen > 0:
+            if flow.src_address is None or flow.src_address not in rule.src_network:
+                return False
+
+        for port_range, port in zip(rule.ports, (flow.src_port, flow.dst_port)):
+            if port_range is None:
+                continue
+
+            if port is None or not (port_range[0] <= port <= port_range[1]):
+                return False
+
+        ip_proto = rule.key_items.get(Tc.Param.IP_PROTO)
+        if ip_proto and ip_proto != flow.ip_proto:
+            return False
+
+        return True
+
+    def __to_network(self, network):
+        if not network:
+            return self.__anywhere
+
+        return ipaddress.ip_network(network, strict=False)
@@ -0,0 +1,279 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+from collections import OrderedDict
+
+from .._const import Tc
+
+
+def _to_integer(value):
+    # convert values as the integer affinity of SQLite columns does
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class _Record:
+    """
+    A parsed entry of ``tc ... show`` outputs. Records have the same attributes as
+    the SQLite models of ``_model.py``, without the cost of SQLite round trips.
+    """
+
+    __slots__ = ()
+
+    # attribute name -> column name, for the attributes that differ from the column names
+    _COLUMN_NAMES = {}
+
+    # attributes of integer columns
+    _INTEGER_ATTRS = ()
+
+    def __init__(self, **kwargs):
+        for attr_name in self.__slots__:
+            value = kwargs.get(attr_name)
+            if value is None:
+                value = kwargs.get(self._COLUMN_NAMES.get(attr_name))
+
+            if value is not None and attr_name in self._INTEGER_ATTRS:
+                value = _to_integer(value)
+
+            setattr(self, attr_name, value)
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return False
+
+        return all(
+            getattr(self, attr_name) == getattr(other, attr_name) for attr_name in self.__slots__
+        )
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        items = ", ".join([f"{key}={value}" for key, value in self.as_dict().items()])
+
+        return f"{type(self).__name__:s} ({items:s})"
+
+    def as_dict(self):
+        """
+        :return: Column name -> value of the attributes that have values.
+        :rtype: collections.OrderedDict
+        """
+
+        return OrderedDict(
+            [
+                (self._COLUMN_NAMES.get(attr_name, attr_name), getattr(self, attr_name))
+                for attr_name in self.__slots__
+                if getattr(self, attr_name) is not None
+            ]
+        )
+
+
+class FilterRecord(_Record):
+    __slots__ = (
+        Tc.Param.DEVICE,
+        Tc.Param.FILTER_ID,
+        Tc.Param.FLOW_ID,
+        Tc.Param.PROTOCOL,
+        Tc.Param.PRIORITY,
+        Tc.Param.SRC_NETWORK,
+        Tc.Param.DST_NETWORK,
+        Tc.Param.SRC_PORT,
+        Tc.Param.DST_PORT,
+        Tc.Param.CLASSIFIER,
+        Tc.Param.IP_PROTO,
+        Tc.Param.SRC_PORT_MAX,
+        Tc.Param.DST_PORT_MAX,
+        Tc.Param.NETWORK_SET,
+        Tc.Param.CLASS_ID,
+        Tc.Param.HANDLE,
+    )
+
+    _INTEGER_ATTRS = (
+        Tc.Param.PRIORITY,
+        Tc.Param.SRC_PORT,
+        Tc.Param.DST_PORT,
+        Tc.Param.SRC_PORT_MAX,
+        Tc.Param.DST_PORT_MAX,
+        Tc.Param.HANDLE,
+    )
+
+
+class QdiscRecord(_Record):
+    __slots__ = (
+        Tc.Param.DEVICE,
+        "direct_qlen",
+        Tc.Param.PARENT,
+        Tc.Param.HANDLE,
+        "delay",
+        "delay_distro",
+        "loss",
+        "duplicate",
+        "corrupt",
+        "reorder",
+        "rate",
+        "limit",
+    )
+
+    _COLUMN_NAMES = {"delay_distro": "delay-distro"}
+    _INTEGER_ATTRS = ("direct_qlen", "limit")
+
+
+class ClassRecord(_Record):
+    __slots__ = (Tc.Param.DEVICE, Tc.Param.CLASS_ID, "rate")
+
+
+# table name -> columns that queries of the materialized tables look up
+_SQLITE_INDEX_ATTRS = (
+    ("filter", (Tc.Param.DEVICE, Tc.Param.FLOW_ID, Tc.Param.CLASS_ID, Tc.Param.FILTER_ID)),
+    ("qdisc", (Tc.Param.DEVICE, Tc.Param.PARENT)),
+    ("class", (Tc.Param.DEVICE, Tc.Param.CLASS_ID)),
+)
+
+
+def _is_equal_value(lhs, rhs):
+    if lhs is None or rhs is None:
+        return lhs is rhs
+
+    # compare as the SQLite column affinity does: e.g. 80 and "80" are the same port
+    return lhs == rhs or str(lhs) == str(rhs)
+
+
+class TcRecordStore:
+    """
+    In-memory store of the parsed filters/qdiscs/classes.
+    Qdiscs are indexed by ``(device, parent)`` and classes by ``(device, classid)``:
+    joining filters with the qdiscs/classes that the filters classify packets to
+    takes a hash lookup per filter.
+    """
+
+    @property
+    def filters(self):
+        return self.__filters
+
+    @property
+    def qdiscs(self):
+        return self.__qdiscs
+
+    @property
+    def classes(self):
+        return self.__classes
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.__filters = []
+        self.__qdiscs = []
+        self.__classes = []
+
+        self.__device_filters = {}  # device -> [FilterRecord]
+        self.__id_filters = {}  # filter_id -> [FilterRecord]
+        self.__parent_qdiscs = {}  # (device, parent) -> [QdiscRecord]
+        self.__id_classes = {}  # (device, classid) -> ClassRecord
+
+    def add_filter(self, record):
+        self.add_filters([record])
+
+    def add_filters(self, records):
+        self.__filters.extend(records)
+        for record in records:
+            self.__device_filters.setdefault(record.device, []).append(record)
+            self.__id_filters.setdefault(record.filter_id, []).append(record)
+
+    def add_qdisc(self, record):
+        self.add_qdiscs([record])
+
+    def add_qdiscs(self, records):
+        self.__qdiscs.extend(records)
+        for record in records:
+            self.__parent_qdiscs.setdefault((record.device, record.parent), []).append(record)
+
+    def add_class(self, record):
+        self.__classes.append(record)
+        self.__id_classes.setdefault((record.device, record.classid), record)
+
+    def get_filters(self, device):
+        return self.__device_filters.get(device, [])
+
+    def get_qdiscs(self, device, parent):
+        return self.__parent_qdiscs.get((device, parent), [])
+
+    def get_class(self, device, classid):
+        return self.__id_classes.get((device, classid))
+
+    def find_qdiscs(self, parent):
+        return [qdisc for qdisc in self.__qdiscs if _is_equal_value(qdisc.parent, parent)]
+
+    def find_filters(self, conditions):
+        """
+        :param dict conditions:
+            Attribute name -> value that filters are required to have.
+            ``None`` values match filters that do not have the attributes.
+        :return: Filters that match all of the conditions, in the order they parsed.
+        :rtype: list
+        """
+
+        if conditions.get(Tc.Param.FILTER_ID) is not None:
+            candidates = self.__id_filters.get(str(conditions[Tc.Param.FILTER_ID]), [])
+        elif conditions.get(Tc.Param.DEVICE) is not None:
+            candidates = self.get_filters(conditions[Tc.Param.DEVICE])
+        else:
+            candidates = self.__filters
+
+        return [
+            record
+            for record in candidates
+            if all(
+                _is_equal_value(getattr(record, key), value) for key, value in conditions.items()
+            )
+        ]
+
+    def to_sqlite(self, con):
+        """
+        Materialize the records to SQLite tables that ``tcshow --dump-db``/``--export``
+        output: ``filter``/``qdisc`` tables of the models and ``class`` table.
+        Records of a table are inserted by an ``executemany`` and the tables are
+        committed as a transaction. Indexes are created after the inserts.
+
+        :param simplesqlite.SimpleSQLite con: Connection to write the tables.
+        :return: The connection.
+        """
+
+        from ._model import Filter, Qdisc
+
+        for model, records in ((Filter, self.__filters), (Qdisc, self.__qdiscs)):
+            model.attach(con)
+            model.create()
+
+            # records have the same attributes as the models
+            attr_names = model.get_attr_names()
+            if records:
+                con.insert_many(
+                    model.get_table_name(),
+                    [
+                        tuple(getattr(record, attr_name) for attr_name in attr_names)
+                        for record in records
+                    ],
+                    attr_names=[model.attr_to_column(attr_name) for attr_name in attr_names],
+                )
+
+        if self.__classes:
+            con.create_table_from_data_matrix(
+                "class",
+                ClassRecord.__slots__,
+                [
+                    [getattr(record, attr_name) for attr_name in ClassRecord.__slots__]
+                    for record in self.__classes
+                ],
+            )
+
+        for table_name, index_attrs in _SQLITE_INDEX_ATTRS:
+            if con.has_table(table_name):
+                con.create_index_list(table_name, index_attrs)
+
+        con.commit()
+
+        return con
@@ -0,0 +1,293 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import json
+import re
+
+from .._const import ShapingAlgorithm, Tc
+from .._logger import logger
+from .._tc_command_helper import run_tc_show
+from ._class import TcClassParser
+from ._filter import find_network_set, to_flower_filter_params, to_network_set_filter_params
+from ._netlink_dump import format_rate, format_time, to_aligned_u32_words, to_filter_match_params
+from ._store import ClassRecord, FilterRecord, QdiscRecord
+
+
+# netem JSON object name -> parameter name
+_NETEM_PERCENT_PARAMS = (
+    ("loss-random", "loss"),
+    ("duplicate", "duplicate"),
+    ("corrupt", "corrupt"),
+    ("reorder", "reorder"),
+)
+
+_json_unsupported_subcommands = set()
+
+
+def _to_dict(pairs):
+    # 'tc -json filter show' outputs a key for each u32 key of a filter:
+    # e.g. {"match": {...}, "match": {...}}
+    result = {}
+    duplicate_keys = set()
+
+    for key, value in pairs:
+        if key not in result:
+            result[key] = value
+            continue
+
+        if key not in duplicate_keys:
+            result[key] = [result[key]]
+            duplicate_keys.add(key)
+
+        result[key].append(value)
+
+    return result
+
+
+def load_tc_json(text):
+    """
+    Load an output of a ``tc -json ... show`` command.
+
+    :return:
+        Entries of the output.
+        ``None`` if the text is not a JSON output: ``tc`` prints plain texts for
+        subcommands that do not support JSON outputs.
+    :rtype: list
+    """
+
+    if text is None:
+        return None
+
+    text = text.strip()
+    if not text:
+        return []
+
+    if not text.startswith("["):
+        return None
+
+    try:
+        return json.loads(text, object_pairs_hook=_to_dict)
+    except ValueError:
+        return None
+
+
+def run_tc_show_json(subcommand, device, tc_command_output):
+    """
+    Execute a ``tc -json ... show`` command and load the output.
+    Whether the ``tc`` command supports JSON outputs is detected by the first
+    execution for each subcommand.
+
+    :return:
+        Entries of the output.
+        ``None`` if the ``tc`` command does not support JSON outputs for the subcommand.
+    :rtype: list
+    """
+
+    if subcommand in _json_unsupported_subcommands:
+        return None
+
+    entries = load_tc_json(run_tc_show(subcommand, device, tc_command_output, is_json=True))
+    if entries is None:
+        logger.debug(f"tc {subcommand.value:s} does not support JSON outputs")
+        _json_unsupported_subcommands.add(subcommand)
+
+    return entries
+
+
+class TcJsonParser:
+    """
+    Store the outputs of ``tc -json ... show`` commands to the same tables as
+    ``TcQdiscParser``, ``TcClassParser`` and ``TcFilterParser`` do from
+    the ``tc ... show`` outputs.
+    """
+
+    def __init__(self, store, ip_version):
+        self.__store = store
+        self.__ip_version = ip_version
+
+    def parse_qdisc(self, device, entries):
+        params = {}
+
+        for entry in entries:
+            kind = entry.get("kind")
+            options = entry.get("options") or {}
+
+            if kind == ShapingAlgorithm.HTB:
+                # same as TcQdiscParser: carried over to the next netem/tbf entry
+                if "direct_qlen" in options:
+                    params["direct_qlen"] = options["direct_qlen"]
+                continue
+
+            if kind == "netem":
+                params.update(self.__to_netem_params(entry, options))
+            elif kind == ShapingAlgorithm.TBF:
+                if "rate" in options:
+                    params["rate"] = format_rate(options["rate"]).rstrip("bit")
+            else:
+                continue
+
+            params[Tc.Param.DEVICE] = device
+
+            logger.debug(f"parse a qdisc entry: {params}")
+
+            self.__store.add_qdisc(QdiscRecord(**params))
+
+            params = {}
+
+    def parse_class(self, device, entries):
+        entry_list = []
+
+        for entry in entries:
+            class_entry = {
+                TcClassParser.Key.DEVICE: device,
+                TcClassParser.Key.CLASS_ID: None,
+                TcClassParser.Key.RATE: None,
+            }
+
+            rate = entry.get("rate", (entry.get("options") or {}).get("rate"))
+            if entry.get("class") == ShapingAlgorithm.HTB and rate is not None:
+                class_entry[TcClassParser.Key.CLASS_ID] = entry.get("handle")
+                class_entry[TcClassParser.Key.RATE] = re.sub("bit$", "bps", format_rate(rate))
+
+            logger.debug(f"parse a class entry: {class_entry}")
+            entry_list.append(class_entry)
+
+        for entry in entry_list:
+            self.__store.add_class(ClassRecord(**entry))
+
+    def parse_filter(self, device, entries):
+        for entry in entries:
+            kind = entry.get("kind")
+            options = entry.get("options") or {}
+
+            if kind == "fw":
+                if "classid" not in options or "handle" not in options:
+                    continue
+
+                handle = options["handle"]
+                if isinstance(handle, str):
+                    handle = int(handle, 16)
+
+                self.__store.add_filter(
+                    FilterRecord(
+                        **{
+                            Tc.Param.DEVICE: device,
+                            Tc.Param.CLASS_ID: options["classid"],
+                            Tc.Param.HANDLE: handle,
+                        }
+                    )
+                )
+                continue
+
+            if kind == "flower":
+                self.__parse_flower_filter(device, entry, options)
+                continue
+
+            if kind == "basic":
+                self.__parse_basic_filter(device, entry, options)
+                continue
+
+            if kind != "u32" or "flowid" not in options:
+                continue
+
+            matches = options.get("match", [])
+            if isinstance(matches, dict):
+                matches = [matches]
+
+            keys = [
+                (int(match["value"], 16), int(match["mask"], 16), int(match["off"]))
+                for match in matches
+            ]
+            tc_filter = FilterRecord(
+                device=device,
+                filter_id=options.get("fh"),
+                flowid=options["flowid"],
+                protocol=entry.get("protocol"),
+                priority=entry.get("pref"),
+                **to_filter_match_params(to_aligned_u32_words(keys), self.__ip_version),
+            )
+
+            logger.debug(f"parse a filter entry: {tc_filter}")
+            self.__store.add_filter(tc_filter)
+
+    def __parse_flower_filter(self, device, entry, options):
+        if "classid" not in options:
+            return
+
+        protocol = entry.get("protocol")
+        if protocol != ("ipv6" if self.__ip_version == 6 else "ip"):
+            logger.debug(f"skip a flower filter for {protocol}: {entry}")
+            return
+
+        handle = options.get("handle")
+        if isinstance(handle, int):
+            handle = f"0x{handle:x}"
+
+        tc_filter = FilterRecord(
+            device=device,
+            filter_id=handle,
+            flowid=options["classid"],
+            protocol=protocol,
+            priority=entry.get("pref"),
+            **to_flower_filter_params(options.get("keys") or {}, self.__ip_version),
+        )
+
+        logger.debug(f"parse a filter entry: {tc_filter}")
+        self.__store.add_filter(tc_filter)
+
+    def __parse_basic_filter(self, device, entry, options):
+        if "flowid" not in options:
+            return
+
+        # ematches are output as strings: look up the ipset ematch from all of the values
+        network_set = find_network_set(json.dumps(options))
+        if network_set is None:
+            logger.debug(f"skip a basic filter without ipset ematch: {entry}")
+            return
+
+        handle = options.get("handle")
+        if isinstance(handle, int):
+            handle = f"0x{handle:x}"
+
+        tc_filter = FilterRecord(
+            device=device,
+            filter_id=handle,
+            flowid=options["flowid"],
+            protocol=entry.get("protocol"),
+            priority=entry.get("pref"),
+            **to_network_set_filter_params(network_set, self.__ip_version),
+        )
+
+        logger.debug(f"parse a filter entry: {tc_filter}")
+        self.__store.add_filter(tc_filter)
+
+    @staticmethod
+    def __to_netem_params(entry, options):
+        params = {}
+
+        for key in (Tc.Param.PARENT, Tc.Param.HANDLE):
+            if key in entry:
+                params[key] = entry[key]
+
+        if "limit" in options:
+            params["limit"] = options["limit"]
+
+        # delays are in seconds
+        delay = options.get("delay") or {}
+        if delay.get("delay"):
+            params["delay"] = format_time(round(delay["delay"] * 1000**2))
+            if delay.get("jitter"):
+                params["delay-distro"] = format_time(round(delay["jitter"] * 1000**2))
+
+        # percentages are in the range of 0-100
+        for object_name, param_name in _NETEM_PERCENT_PARAMS:
+            value = (options.get(object_name) or {}).get(param_name)
+            if value:
+                params[param_name] = f"{value:g}%"
+
+        rate = (options.get("rate") or {}).get("rate")
+        if rate:
+            params["rate"] = format_rate(rate).rstrip("bit")
+
+        return params
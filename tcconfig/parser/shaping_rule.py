@@ -7,27 +7,42 @@ from collections import OrderedDict
 
 import subprocrunner
 import typepy
-from simplesqlite import SimpleSQLite, TableNotFoundError, connect_memdb
-from simplesqlite.query import And, Where
 
-from .._common import is_execute_tc_command
-from .._const import Tc, TcSubCommand, TrafficDirection
+from .._common import is_execute_tc_command, to_port_range_str
+from .._const import Tc, TcBackend, TcSubCommand, TrafficDirection
 from .._error import NetworkInterfaceNotFoundError
+from .._ipset import NetworkSetController
 from .._iptables import IptablesMangleController
 from .._logger import LogLevel
 from .._network import is_anywhere_network
-from .._tc_command_helper import get_tc_base_command, run_tc_show
+from .._nftables import NftablesMarkController
+from .._tc_backend import get_tc_backend
+from .._tc_command_helper import get_tc_base_command, run_show_command, run_tc_show
 from ._class import TcClassParser
 from ._filter import TcFilterParser
-from ._model import Filter, Qdisc
 from ._qdisc import TcQdiscParser
+from ._rule_index import ShapingRuleIndex
+from ._store import TcRecordStore
+from ._tc_json import TcJsonParser, run_tc_show_json
 
 
 class TcShapingRuleParser:
     @property
     def con(self):
+        """
+        SQLite database of the parse results. The database is materialized on demand:
+        parsers store the results to the in-memory store.
+        """
+
+        if self.__con is None:
+            self.__materialize()
+
         return self.__con
 
+    @property
+    def store(self):
+        return self.__store
+
     @property
     def device(self):
         return self.__device
@@ -46,33 +61,37 @@ class TcShapingRuleParser:
         is_parse_filter_id=True,
         dump_db_path=None,
     ):
-        if dump_db_path is None:
-            self.__con = connect_memdb()
-        else:
-            self.__con = SimpleSQLite(dump_db_path, "w")
-
-        Filter.attach(self.__con)
-        Filter.create()
-
-        Qdisc.attach(self.__con)
-        Qdisc.create()
+        self.__store = TcRecordStore()
+        self.__con = None
+        self.__dump_db_path = dump_db_path
 
         self.__device = device
         self.__ip_version = ip_version
         self.__tc_command_output = tc_command_output
         self.__logger = logger
         self.__export_path = export_path
+        self.__dump_reader = self.__create_dump_reader()
 
         self.clear()
         self.__ifb_device = self.__get_ifb_from_device()
 
-        self.__iptables_ctrl = IptablesMangleController(True, ip_version)
+        # packets can be marked by either iptables or nftables
+        self.__mark_ctrls = [
+            IptablesMangleController(True, ip_version),
+            NftablesMarkController(True, ip_version),
+        ]
 
         self.is_parse_filter_id = is_parse_filter_id
 
+        # set name -> the number of the members
+        self.__network_set_members = {}
+
     def clear(self):
-        self.__filter_parser = TcFilterParser(self.__con, self.__ip_version)
+        self.__store.clear()
+        self.__con = None
+        self.__filter_parser = TcFilterParser(self.__store, self.__ip_version)
         self.__parsed_mappings = {}
+        self.__rule_indexes = {}
 
     def extract_export_parameters(self):
         _, out_rules = self.__get_shaping_rule(self.device)
@@ -107,10 +126,35 @@ class TcShapingRuleParser:
             }
         }
 
+    def get_matched_tc_parameter(self, flow):
+        """
+        :param Flow flow: A flow to look up.
+        :return:
+            The same structure as ``get_tc_parameter``, but each direction has only
+            the shaping rule that the flow hits (empty if the flow is not shaped).
+        """
+
+        out_rule_maps, _ = self.__get_shaping_rule(self.device)
+        in_rule_maps, _ = self.__get_shaping_rule(self.ifb_device)
+
+        return {
+            self.device: {
+                TrafficDirection.OUTGOING: self.__find_matched_rule(
+                    self.device, out_rule_maps, flow
+                ),
+                TrafficDirection.INCOMING: self.__find_matched_rule(
+                    self.ifb_device, in_rule_maps, flow
+                ),
+            }
+        }
+
     def parse(self):
         self.__parse_device(self.device)
         self.__parse_device(self.ifb_device)
 
+        if self.__dump_db_path is not None:
+            self.__materialize()
+
     def __parse_device(self, device):
         if not device:
             return
@@ -118,25 +162,123 @@ class TcShapingRuleParser:
         if self.__parsed_mappings.get(device):
             return
 
-        self.__parse_tc_class(device)
-        self.__parse_tc_filter(device)
-        self.__parse_tc_qdisc(device)
+        if self.__dump_reader is not None:
+            self.__dump_reader.read(device)
+        else:
+            self.__parse_tc_class(device)
+            self.__parse_tc_filter(device)
+            self.__parse_tc_qdisc(device)
 
         self.__parsed_mappings[device] = True
+        self.__con = None
+
+    def __create_dump_reader(self):
+        # read the tc configurations via the netlink socket of the netlink backend
+        # instead of parsing the outputs of 'tc ... show' commands
+        tc_backend = get_tc_backend()
+        if tc_backend.name != TcBackend.NETLINK:
+            return None
+
+        if not is_execute_tc_command(self.__tc_command_output):
+            return None
+
+        from ._netlink_dump import TcNetlinkDumpReader
+
+        return TcNetlinkDumpReader(self.__store, self.__ip_version, tc_backend.iproute)
+
+    def __materialize(self):
+        from simplesqlite import SimpleSQLite, connect_memdb
+
+        if self.__dump_db_path is None:
+            con = connect_memdb()
+        else:
+            con = SimpleSQLite(self.__dump_db_path, "w")
+
+        self.__con = self.__store.to_sqlite(con)
 
     def __get_ifb_from_device(self):
         if not is_execute_tc_command(self.__tc_command_output):
             return None
 
-        filter_runner = subprocrunner.SubprocessRunner(
+        if self.__dump_reader is not None:
+            return self.__dump_reader.read_incoming_device(self.device)
+
+        result = run_show_command(
+            self.device,
             f"{get_tc_base_command(TcSubCommand.FILTER):s} show dev {self.device:s} root",
             error_log_level=LogLevel.QUIET,
             dry_run=False,
         )
-        if filter_runner.run() != 0 and filter_runner.stderr.find("Cannot find device") != -1:
+        if result.returncode != 0 and result.stderr.find("Cannot find device") != -1:
             raise NetworkInterfaceNotFoundError(target=self.device)
 
-        return self.__filter_parser.parse_incoming_device(filter_runner.stdout)
+        return self.__filter_parser.parse_incoming_device(result.stdout)
+
+    def __find_mangle_mark(self, mark_id):
+        for mark_ctrl in list(self.__mark_ctrls):
+            try:
+                mangle = mark_ctrl.get_mangle_mark(mark_id)
+            except (OSError, subprocrunner.CommandError) as e:
+                # a controller that failed fails for the other marks as well
+                # (e.g. iptables-nft on nftables only hosts): skip it for the rest of the parse
+                self.__logger.debug(f"failed to get marks by {mark_ctrl.__class__.__name__:s}: {e}")
+                self.__mark_ctrls.remove(mark_ctrl)
+                continue
+
+            if mangle is not None:
+                return mangle
+
+        return None
+
+    def __get_network_set_members(self, set_name):
+        if set_name not in self.__network_set_members:
+            try:
+                members = NetworkSetController(self.__ip_version).get_member_count(set_name)
+            except subprocrunner.CommandError as e:
+                self.__logger.debug(f"failed to get the members of {set_name}: {e}")
+                members = None
+
+            self.__network_set_members[set_name] = members
+
+        return self.__network_set_members[set_name]
+
+    def __get_rule_index(self, device):
+        if device in self.__rule_indexes:
+            return self.__rule_indexes[device]
+
+        self.__parse_device(device)
+        rule_index = ShapingRuleIndex(self.__ip_version)
+
+        # all of the filters are indexed, including filters that classify packets to
+        # the default class (e.g. filters of --exclude-dst-network)
+        for filter_record in self.__store.get_filters(device):
+            filter_param = filter_record.as_dict()
+
+            try:
+                filter_key, key_items = self.__get_filter_key(filter_param)
+            except ValueError as e:
+                self.__logger.debug(f"skip indexing a filter: {e}")
+                continue
+
+            if typepy.is_null_string(filter_key):
+                continue
+
+            rule_index.add(filter_key, key_items, filter_param.get(Tc.Param.PRIORITY) or 0)
+
+        self.__logger.debug(f"indexed {len(rule_index):d} filters of {device}")
+        self.__rule_indexes[device] = rule_index
+
+        return rule_index
+
+    def __find_matched_rule(self, device, rule_maps, flow):
+        if typepy.is_null_string(device):
+            return {}
+
+        filter_key = self.__get_rule_index(device).lookup(flow)
+        if filter_key is None or filter_key not in rule_maps:
+            return {}
+
+        return {filter_key: rule_maps[filter_key]}
 
     def __get_filter_key(self, filter_param):
         key_items = OrderedDict()
@@ -146,18 +288,14 @@ class TcShapingRuleParser:
             typepy.Integer(handle).validate()
             handle = int(handle)
 
-            for mangle in self.__iptables_ctrl.parse():
-                if mangle.mark_id != handle:
-                    continue
-
-                key_items[Tc.Param.DST_NETWORK] = mangle.destination
-                if typepy.is_not_null_string(mangle.source):
-                    key_items[Tc.Param.SRC_NETWORK] = mangle.source
-                key_items[Tc.Param.PROTOCOL] = mangle.protocol
+            mangle = self.__find_mangle_mark(handle)
+            if mangle is None:
+                raise ValueError(f"mangle mark not found: {handle}")
 
-                break
-            else:
-                raise ValueError(f"mangle mark not found: {mangle}")
+            key_items[Tc.Param.DST_NETWORK] = mangle.destination
+            if typepy.is_not_null_string(mangle.source):
+                key_items[Tc.Param.SRC_NETWORK] = mangle.source
+            key_items[Tc.Param.PROTOCOL] = mangle.protocol
         else:
             src_network = filter_param.get(Tc.Param.SRC_NETWORK)
             if typepy.is_not_null_string(src_network) and not is_anywhere_network(
@@ -173,7 +311,9 @@ class TcShapingRuleParser:
 
             src_port = filter_param.get(Tc.Param.SRC_PORT)
             if typepy.Integer(src_port).is_type():
-                key_items[Tc.Param.SRC_PORT] = f"{src_port}"
+                key_items[Tc.Param.SRC_PORT] = to_port_range_str(
+                    src_port, filter_param.get(Tc.Param.SRC_PORT_MAX)
+                )
             elif src_port is not None:
                 self.__logger.warning(
                     "expected a integer value for {}, actual {}: {}".format(
@@ -183,7 +323,9 @@ class TcShapingRuleParser:
 
             dst_port = filter_param.get(Tc.Param.DST_PORT)
             if typepy.Integer(dst_port).is_type():
-                key_items[Tc.Param.DST_PORT] = f"{dst_port}"
+                key_items[Tc.Param.DST_PORT] = to_port_range_str(
+                    dst_port, filter_param.get(Tc.Param.DST_PORT_MAX)
+                )
             elif src_port is not None:
                 self.__logger.warning(
                     "expected a integer value for {}, actual {}".format(
@@ -191,6 +333,14 @@ class TcShapingRuleParser:
                     )
                 )
 
+            ip_proto = filter_param.get(Tc.Param.IP_PROTO)
+            if typepy.is_not_null_string(ip_proto):
+                key_items[Tc.Param.IP_PROTO] = ip_proto
+
+            network_set = filter_param.get(Tc.Param.NETWORK_SET)
+            if typepy.is_not_null_string(network_set):
+                key_items[Tc.Param.NETWORK_SET] = network_set
+
             protocol = filter_param.get(Tc.Param.PROTOCOL)
             if typepy.is_not_null_string(protocol):
                 key_items[Tc.Param.PROTOCOL] = protocol
@@ -204,25 +354,14 @@ class TcShapingRuleParser:
             return ({}, [])
 
         self.__parse_device(device)
-        where_dev_query = Where(Tc.Param.DEVICE, device)
-
-        try:
-            class_params = self.__con.select_as_dict(
-                table_name=TcSubCommand.CLASS.value, where=where_dev_query
-            )
-        except TableNotFoundError:
-            class_params = []
-
-        try:
-            filter_params = Filter.select(where=where_dev_query)
-        except TableNotFoundError:
-            filter_params = []
 
         shaping_rule_mapping = {}
         shaping_rules = []
 
-        for filter_param in filter_params:
-            filter_param = filter_param.as_dict()
+        # join the filters with the qdiscs/classes that the filters classify packets to:
+        # each filter takes hash lookups of the store
+        for filter_record in self.__store.get_filters(device):
+            filter_param = filter_record.as_dict()
             self.__logger.debug(f"{TcSubCommand.FILTER:s} param: {filter_param}")
             shaping_rule = {}
 
@@ -235,15 +374,8 @@ class TcShapingRuleParser:
             if qdisc_id is None:
                 qdisc_id = filter_param.get(Tc.Param.CLASS_ID)
 
-            try:
-                qdisc_params = Qdisc.select(
-                    where=And([where_dev_query, Where(Tc.Param.PARENT, qdisc_id)])
-                )
-            except TableNotFoundError:
-                qdisc_params = []
-
-            for qdisc_param in qdisc_params:
-                qdisc_param = qdisc_param.as_dict()
+            for qdisc_record in self.__store.get_qdiscs(device, qdisc_id):
+                qdisc_param = qdisc_record.as_dict()
                 self.__logger.debug(f"{TcSubCommand.QDISC:s} param: {qdisc_param}")
 
                 if self.is_parse_filter_id:
@@ -264,15 +396,16 @@ class TcShapingRuleParser:
                     )
                 )
 
-            for class_param in class_params:
-                self.__logger.debug(f"{TcSubCommand.CLASS:s} param: {class_param}")
-
-                if class_param.get(Tc.Param.CLASS_ID) not in (
-                    filter_param.get(Tc.Param.FLOW_ID),
-                    filter_param.get(Tc.Param.CLASS_ID),
-                ):
+            for classid in OrderedDict.fromkeys(
+                [filter_param.get(Tc.Param.FLOW_ID), filter_param.get(Tc.Param.CLASS_ID)]
+            ):
+                class_record = self.__store.get_class(device, classid)
+                if class_record is None:
                     continue
 
+                class_param = class_record.as_dict()
+                self.__logger.debug(f"{TcSubCommand.CLASS:s} param: {class_param}")
+
                 if self.is_parse_filter_id:
                     shaping_rule[Tc.Param.FILTER_ID] = filter_param.get(Tc.Param.FILTER_ID)
 
@@ -287,6 +420,13 @@ class TcShapingRuleParser:
                 self.__logger.debug(f"shaping rule not found for '{filter_param}'")
                 continue
 
+            network_set = filter_param.get(Tc.Param.NETWORK_SET)
+            if typepy.is_not_null_string(network_set):
+                # a rule of a network set represents all of the members of the set
+                members = self.__get_network_set_members(network_set)
+                if members is not None:
+                    shaping_rule["network_set_members"] = members
+
             self.__logger.debug(f"shaping rule found: {filter_key} {shaping_rule}")
 
             rule_with_keys.update(shaping_rule)
@@ -297,17 +437,32 @@ class TcShapingRuleParser:
         return (shaping_rule_mapping, shaping_rules)
 
     def __parse_tc_qdisc(self, device):
-        TcQdiscParser(self.__con).parse(
+        entries = run_tc_show_json(TcSubCommand.QDISC, device, self.__tc_command_output)
+        if entries is not None:
+            TcJsonParser(self.__store, self.__ip_version).parse_qdisc(device, entries)
+            return
+
+        TcQdiscParser(self.__store).parse(
             device, run_tc_show(TcSubCommand.QDISC, device, self.__tc_command_output)
         )
 
     def __parse_tc_filter(self, device):
+        entries = run_tc_show_json(TcSubCommand.FILTER, device, self.__tc_command_output)
+        if entries is not None:
+            TcJsonParser(self.__store, self.__ip_version).parse_filter(device, entries)
+            return
+
         self.__filter_parser.parse(
             device, run_tc_show(TcSubCommand.FILTER, device, self.__tc_command_output)
         )
 
     def __parse_tc_class(self, device):
-        TcClassParser(self.__con).parse(
+        entries = run_tc_show_json(TcSubCommand.CLASS, device, self.__tc_command_output)
+        if entries is not None:
+            TcJsonParser(self.__store, self.__ip_version).parse_class(device, entries)
+            return
+
+        TcClassParser(self.__store).parse(
             device, run_tc_show(TcSubCommand.CLASS, device, self.__tc_command_output)
         )
 
@@ -0,0 +1,82 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+from .._logger import logger
+
+
+MAX_ID = 0xFFFF
+
+_allocator_table = {}
+
+
+class IdAllocator:
+    """
+    Allocate unused qdisc major ids/class minor ids.
+    Used ids are stored to a bitmap: finding the lowest unused id is a few
+    big integer operations instead of a scan of the used id list.
+    """
+
+    def __init__(self, used_ids=(), max_id=MAX_ID):
+        self.__max_id = max_id
+        self.__bitmap = 0
+
+        for used_id in used_ids:
+            self.reserve(used_id)
+
+    def reserve(self, target_id):
+        if target_id < 0:
+            raise ValueError(f"id must be greater than or equal to zero: {target_id}")
+
+        self.__bitmap |= 1 << target_id
+
+    def allocate(self, start_id):
+        """
+        Reserve the lowest unused id that is greater than or equal to ``start_id``.
+
+        :return: Reserved id.
+        :rtype: int
+        :raises ValueError: If there are no unused ids in the range.
+        """
+
+        if start_id < 0:
+            raise ValueError(f"id must be greater than or equal to zero: {start_id}")
+
+        unused_bits = ~(self.__bitmap >> start_id)
+        target_id = start_id + (unused_bits & -unused_bits).bit_length() - 1
+
+        if target_id > self.__max_id:
+            raise ValueError(f"no unused ids in the range of {start_id:#x}-{self.__max_id:#x}")
+
+        self.reserve(target_id)
+
+        return target_id
+
+
+def get_id_allocator(key, extract_used_ids):
+    """
+    Get the allocator associated with the ``key``.
+    An allocator is created from ``extract_used_ids()`` only at the first call
+    for each key: ids allocated by earlier rules of the process remain reserved,
+    so applying a batch of rules does not re-read the existing ids per rule.
+    """
+
+    allocator = _allocator_table.get(key)
+
+    if allocator is None:
+        used_ids = extract_used_ids()
+        logger.debug(f"existing ids of {key}: {used_ids}")
+
+        allocator = IdAllocator(used_ids)
+        _allocator_table[key] = allocator
+
+    return allocator
+
+
+def clear_id_allocators():
+    """
+    Discard allocators: the existing ids are re-read at the next allocation.
+    Should be called after deleting qdiscs/classes.
+    """
+
+    _allocator_table.clear()
@@ -4,16 +4,27 @@
 
 import abc
 
-import subprocrunner
 import typepy
 from humanreadable import ParameterError
 
-from .._common import run_command_helper
-from .._const import TcSubCommand, TrafficDirection
+from .._common import run_command_helper, to_port_range_str
+from .._const import Classifier, TcSubCommand, TrafficDirection
 from .._iptables import IptablesMangleMarkEntry
 from .._logger import logger
-from .._network import get_anywhere_network
+from .._network import get_anywhere_network, is_anywhere_network
 from .._shaping_rule_finder import TcShapingRuleFinder
+from .._tc_backend import get_tc_backend
+from .._tc_command_helper import run_tc_show
+from ._u32_hash import (
+    REGEXP_FILTER_EXISTS,
+    ROOT_HASH_TABLE_ID,
+    add_created_hash_table,
+    find_hash_bucket,
+    find_root_hash_table_id,
+    is_hash_table_created,
+    make_hash_link_command,
+    make_hash_table_command,
+)
 
 
 class ShaperInterface(metaclass=abc.ABCMeta):
@@ -96,6 +107,12 @@ class AbstractShaper(ShaperInterface):
         if is_exclude_filter:
             offset = 0
 
+        if self._tc_obj.classifier == Classifier.FLOWER and not self._is_use_iptables():
+            # filters of different classifiers can not share a priority
+            offset += 8
+        elif self._tc_obj.network_set_name:
+            offset += 16
+
         if self._tc_obj.protocol == "ip":
             return 1 + offset
 
@@ -118,17 +135,33 @@ class AbstractShaper(ShaperInterface):
 
         if self._is_use_iptables():
             command_item_list.append(f"handle {self._get_unique_mangle_mark_id():d} fw")
+        elif self._tc_obj.classifier == Classifier.FLOWER:
+            command_item_list.extend(
+                self._make_flower_match_items(
+                    dst_network=self._tc_obj.dst_network,
+                    src_network=self._tc_obj.src_network,
+                    dst_port=self.__get_port_str(self._tc_obj.dst_port, self._tc_obj.dst_port_max),
+                    src_port=self.__get_port_str(self._tc_obj.src_port, self._tc_obj.src_port_max),
+                )
+            )
+        elif self._tc_obj.network_set_name:
+            # a single ipset lookup matches all of the networks in the set
+            command_item_list.append(f"basic match 'ipset({self._tc_obj.network_set_name:s} dst)'")
         else:
             if typepy.is_null_string(self._tc_obj.dst_network):
                 dst_network = get_anywhere_network(self._tc_obj.ip_version)
             else:
                 dst_network = self._tc_obj.dst_network
 
-            command_item_list.extend(
-                [
-                    "u32",
-                    "match {:s} {:s} {:s}".format(self._tc_obj.protocol_match, "dst", dst_network),
-                ]
+            hash_bucket = self.__setup_u32_hash_table(" ".join(command_item_list), dst_network)
+
+            command_item_list.append("u32")
+            if hash_bucket:
+                command_item_list.append(
+                    f"ht {hash_bucket.hash_table_id:x}:{hash_bucket.bucket:x}:"
+                )
+            command_item_list.append(
+                "match {:s} {:s} {:s}".format(self._tc_obj.protocol_match, "dst", dst_network)
             )
 
             if typepy.is_not_null_string(self._tc_obj.src_network):
@@ -156,11 +189,38 @@ class AbstractShaper(ShaperInterface):
             f"flowid {self._tc_obj.qdisc_major_id_str:s}:{self._get_qdisc_minor_id():d}"
         )
 
-        return subprocrunner.SubprocessRunner(" ".join(command_item_list)).run()
+        return get_tc_backend().run(" ".join(command_item_list)).returncode
 
     def _add_exclude_filter(self):
         pass
 
+    def _make_flower_match_items(self, dst_network, src_network, dst_port, src_port):
+        """
+        :return:
+            Classifier and match parts of a flower filter command.
+            Networks that match any addresses are omitted.
+        :rtype: list
+        """
+
+        command_item_list = ["flower"]
+
+        if typepy.is_not_null_string(self._tc_obj.ip_proto):
+            command_item_list.append(f"ip_proto {self._tc_obj.ip_proto:s}")
+
+        for key, network in (("dst_ip", dst_network), ("src_ip", src_network)):
+            if typepy.is_null_string(network) or is_anywhere_network(
+                network, self._tc_obj.ip_version
+            ):
+                continue
+
+            command_item_list.append(f"{key:s} {network:s}")
+
+        for key, port in (("dst_port", dst_port), ("src_port", src_port)):
+            if typepy.is_not_null_string(port):
+                command_item_list.append(f"{key:s} {port:s}")
+
+        return command_item_list
+
     def _is_use_iptables(self):
         return all(
             [
@@ -225,6 +285,78 @@ class AbstractShaper(ShaperInterface):
     def _add_rate(self):  # pragma: no cover
         ...
 
+    def __setup_u32_hash_table(self, filter_command, dst_network):
+        """
+        Create a u32 hash table (and a link to the table from the root hash table)
+        that the filter of the rule to be added to.
+
+        :return: Hash table and bucket of the filter. ``None`` if the filter is a linear filter.
+        """
+
+        if not self._tc_obj.is_enable_u32_hash or self._tc_obj.ip_version != 4:
+            return None
+
+        priority = self._get_filter_prio(is_exclude_filter=False)
+        hash_bucket = find_hash_bucket(
+            priority,
+            dst_network=dst_network,
+            src_network=self._tc_obj.src_network,
+            dst_port=self._tc_obj.dst_port,
+            src_port=self._tc_obj.src_port,
+        )
+        if hash_bucket is None:
+            logger.debug("add a linear u32 filter: no hash keys are fixed by the rule")
+            return None
+
+        table_key = (
+            self._tc_device,
+            self._tc_obj.qdisc_major_id_str,
+            priority,
+            hash_bucket.hash_table_id,
+        )
+        if not is_hash_table_created(table_key):
+            # hash tables and links have fixed handles: those that already exist are kept
+            run_command_helper(
+                make_hash_table_command(filter_command, hash_bucket),
+                ignore_error_msg_regexp=REGEXP_FILTER_EXISTS,
+                notice_msg=None,
+            )
+            run_command_helper(
+                make_hash_link_command(
+                    filter_command, hash_bucket, self.__get_root_hash_table_id(priority)
+                ),
+                ignore_error_msg_regexp=REGEXP_FILTER_EXISTS,
+                notice_msg=None,
+            )
+
+            add_created_hash_table(table_key)
+
+        return hash_bucket
+
+    def __get_root_hash_table_id(self, priority):
+        # the root hash table of the priority exists after creating the hash table
+        root_hash_table_id = find_root_hash_table_id(
+            run_tc_show(TcSubCommand.FILTER, self._tc_device, self._tc_obj.tc_command_output) or "",
+            f"{self._tc_obj.qdisc_major_id_str:s}:",
+            priority,
+        )
+
+        if root_hash_table_id is None:
+            # filters can not be read when tc commands are not executed
+            logger.debug(
+                f"root hash table of prio {priority:d} not found: assume {ROOT_HASH_TABLE_ID:x}:"
+            )
+            return ROOT_HASH_TABLE_ID
+
+        return root_hash_table_id
+
+    @staticmethod
+    def __get_port_str(port, max_port):
+        if not port:
+            return None
+
+        return to_port_range_str(port, max_port)
+
     def __add_mangle_mark(self, mark_id):
         dst_network = None
         src_network = None
@@ -0,0 +1,180 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import ipaddress
+import re
+from collections import namedtuple
+
+import typepy
+
+
+HASH_DIVISOR = 256
+
+# the kernel creates a root hash table for each u32 filter priority of a qdisc
+# (800:, 801:, ...): the id is used only when filters can not be read.
+ROOT_HASH_TABLE_ID = 0x800
+
+# tc of older iproute2 outputs 'RTNETLINK answers: File exists'
+REGEXP_FILTER_EXISTS = re.compile("File exists|Filter already exists")
+
+_RE_ROOT_HASH_TABLE = re.compile(
+    r"^filter parent (?P<parent>[0-9a-f]+:) protocol \S+ pref (?P<priority>\d+) u32 "
+    r"(?:chain \d+ )?fh (?P<hash_table_id>[0-9a-f]+): ht divisor 1\b",
+    re.MULTILINE,
+)
+
+U32HashKey = namedtuple("U32HashKey", "name offset mask")
+U32HashBucket = namedtuple("U32HashBucket", "key hash_table_id bucket")
+
+# keys are tried in order: a rule is bucketed by the first key that the rule fixes all of
+# the masked bits. keys are in the same u32 words as the matches of the rules.
+HASH_KEYS = (
+    U32HashKey(name="dst", offset=16, mask=0x0000FF00),  # the third octet of dst address
+    U32HashKey(name="src", offset=12, mask=0x0000FF00),  # the third octet of src address
+    U32HashKey(name="dport", offset=20, mask=0x000000FF),
+    U32HashKey(name="sport", offset=20, mask=0x00FF0000),
+)
+
+# link nodes are placed at the tail of the root hash table: ids of the nodes that
+# are automatically assigned to filters start from 0x800.
+_LINK_NODE_ID_BASE = 0xFFC
+
+# (device, parent, priority, hash table id) of hash tables that created by the process
+_created_hash_tables = set()
+
+
+def get_hash_table_id(key, priority):
+    """
+    :return:
+        Hash table id of a key for a filter priority.
+        Filters of a priority are bucketed to the hash tables of the priority.
+    :rtype: int
+    """
+
+    return 0x100 * (HASH_KEYS.index(key) + 1) + priority
+
+
+def get_link_node_handle(key, root_hash_table_id):
+    return "{:x}::{:x}".format(root_hash_table_id, _LINK_NODE_ID_BASE + HASH_KEYS.index(key))
+
+
+def find_root_hash_table_id(filter_output, parent, priority):
+    """
+    :param str filter_output: Output of ``tc filter show dev <device>``.
+    :param str parent: Parent of the filters (e.g. ``1a1a:``).
+    :return:
+        Id of the root hash table of the u32 filters of a priority.
+        ``None`` if the priority has no u32 filters.
+    :rtype: int
+    """
+
+    hash_table_ids = [
+        int(match.group("hash_table_id"), 16)
+        for match in _RE_ROOT_HASH_TABLE.finditer(filter_output)
+        if match.group("parent") == parent and int(match.group("priority")) == priority
+    ]
+    if not hash_table_ids:
+        return None
+
+    # hash tables of a priority are listed from the newest one:
+    # the root hash table is created with the first filter of the priority
+    return hash_table_ids[-1]
+
+
+def find_hash_bucket(priority, dst_network=None, src_network=None, dst_port=None, src_port=None):
+    """
+    :return:
+        Hash table and bucket for an IPv4 rule.
+        ``None`` if none of the hash keys are fixed by the rule:
+        such rules are added to the root hash table as linear filters.
+    :rtype: U32HashBucket
+    """
+
+    word_table = {}
+
+    for key_name, network in (("dst", dst_network), ("src", src_network)):
+        if typepy.is_null_string(network):
+            continue
+
+        network = ipaddress.IPv4Network(network, strict=False)
+        word_table[key_name] = (int(network.network_address), int(network.netmask))
+
+    if dst_port:
+        word_table["dport"] = (dst_port, 0x0000FFFF)
+    if src_port:
+        word_table["sport"] = (src_port << 16, 0xFFFF0000)
+
+    for key in HASH_KEYS:
+        if key.name not in word_table:
+            continue
+
+        value, value_mask = word_table[key.name]
+        if value_mask & key.mask != key.mask:
+            continue
+
+        shift = (key.mask & -key.mask).bit_length() - 1
+
+        return U32HashBucket(
+            key=key,
+            hash_table_id=get_hash_table_id(key, priority),
+            bucket=(value & key.mask) >> shift,
+        )
+
+    return None
+
+
+def make_hash_table_command(filter_command, hash_bucket):
+    """
+    :param str filter_command:
+        Common part of the filter commands: 'tc filter add dev <device> protocol ip
+        parent <major>: prio <priority>'.
+    :return: Command that creates a hash table of the bucket.
+    :rtype: str
+    """
+
+    return "{:s} handle {:x}: u32 divisor {:d}".format(
+        filter_command, hash_bucket.hash_table_id, HASH_DIVISOR
+    )
+
+
+def make_hash_link_command(filter_command, hash_bucket, root_hash_table_id):
+    """
+    :param int root_hash_table_id:
+        Id of the root hash table of the filter priority. Should be found by
+        ``find_root_hash_table_id`` after the priority has filters.
+    :return: Command that creates a link from the root hash table to the hash table.
+    :rtype: str
+    """
+
+    key = hash_bucket.key
+
+    return (
+        "{:s} handle {:s} u32 ht {:x}: match u32 0 0 at {:d} "
+        "hashkey mask 0x{:08x} at {:d} link {:x}:".format(
+            filter_command,
+            get_link_node_handle(key, root_hash_table_id),
+            root_hash_table_id,
+            key.offset,
+            key.mask,
+            key.offset,
+            hash_bucket.hash_table_id,
+        )
+    )
+
+
+def is_hash_table_created(table_key):
+    return table_key in _created_hash_tables
+
+
+def add_created_hash_table(table_key):
+    _created_hash_tables.add(table_key)
+
+
+def clear_created_hash_tables():
+    """
+    Forget the hash tables that created by the process.
+    Should be called after deleting qdiscs.
+    """
+
+    _created_hash_tables.clear()
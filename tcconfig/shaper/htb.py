@@ -9,11 +9,13 @@ from typing import List
 import typepy
 
 from .._common import is_execute_tc_command, logging_context, run_command_helper
-from .._const import ShapingAlgorithm, TcSubCommand
+from .._const import Classifier, ShapingAlgorithm, TcSubCommand
 from .._error import TcAlreadyExist
 from .._logger import logger
 from .._network import get_upper_limit_rate
+from .._tc_backend import get_tc_backend
 from .._tc_command_helper import run_tc_show
+from ._id_allocator import get_id_allocator
 from ._interface import AbstractShaper
 
 
@@ -137,8 +139,6 @@ class HtbShaper(AbstractShaper):
         )
 
     def _add_exclude_filter(self):
-        import subprocrunner
-
         if all(
             [
                 typepy.is_null_string(param)
@@ -159,9 +159,23 @@ class HtbShaper(AbstractShaper):
             f"protocol {self._tc_obj.protocol:s}",
             f"parent {self._tc_obj.qdisc_major_id_str:s}:",
             f"prio {self._get_filter_prio(is_exclude_filter=True):d}",
-            "u32",
         ]
 
+        if self._tc_obj.classifier == Classifier.FLOWER:
+            command_item_list.extend(
+                self._make_flower_match_items(
+                    dst_network=self._tc_obj.exclude_dst_network,
+                    src_network=self._tc_obj.exclude_src_network,
+                    dst_port=self._tc_obj.exclude_dst_port,
+                    src_port=self._tc_obj.exclude_src_port,
+                )
+            )
+            command_item_list.append(f"flowid {self.__classid_wo_shaping:s}")
+
+            return get_tc_backend().run(" ".join(command_item_list)).returncode
+
+        command_item_list.append("u32")
+
         if typepy.is_not_null_string(self._tc_obj.exclude_dst_network):
             command_item_list.append(
                 "match {:s} {:s} {:s}".format(
@@ -192,7 +206,7 @@ class HtbShaper(AbstractShaper):
 
         command_item_list.append(f"flowid {self.__classid_wo_shaping:s}")
 
-        return subprocrunner.SubprocessRunner(" ".join(command_item_list)).run()
+        return get_tc_backend().run(" ".join(command_item_list)).returncode
 
     def set_shaping(self):
         is_add_shaping_rule = self._tc_obj.is_add_shaping_rule
@@ -200,6 +214,7 @@ class HtbShaper(AbstractShaper):
         with logging_context("_make_qdisc"):
             try:
                 self._make_qdisc()
+                self.__flush_unless_add(is_add_shaping_rule)
             except TcAlreadyExist:
                 if not is_add_shaping_rule:
                     return errno.EINVAL
@@ -207,6 +222,7 @@ class HtbShaper(AbstractShaper):
         with logging_context("_add_rate"):
             try:
                 self._add_rate()
+                self.__flush_unless_add(is_add_shaping_rule)
             except TcAlreadyExist:
                 if not is_add_shaping_rule:
                     return errno.EINVAL
@@ -222,6 +238,14 @@ class HtbShaper(AbstractShaper):
 
         return 0
 
+    @staticmethod
+    def __flush_unless_add(is_add_shaping_rule):
+        # commands after an existing qdisc/class must not be executed unless adding a rule:
+        # execute deferred commands to detect TcAlreadyExist at this point.
+        # errors that occurred while adding a rule are ignored at TrafficControl.
+        if not is_add_shaping_rule:
+            get_tc_backend().flush()
+
     def __get_unique_qdisc_minor_id(self):
         if not is_execute_tc_command(self._tc_obj.tc_command_output):
             return (
@@ -237,6 +261,12 @@ class HtbShaper(AbstractShaper):
 
             return self.__DEFAULT_CLASS_MINOR_ID + self.__qdisc_minor_id_count
 
+        return get_id_allocator(
+            (self._tc_device, TcSubCommand.CLASS.value, self._tc_obj.qdisc_major_id_str),
+            self.__extract_exist_class_minor_ids,
+        ).allocate(self.__DEFAULT_CLASS_MINOR_ID)
+
+    def __extract_exist_class_minor_ids(self) -> List[int]:
         exist_class_item_list = re.findall(
             "class {algorithm:s} {qdisc_major_id:s}:[0-9]+".format(
                 algorithm=ShapingAlgorithm.HTB,
@@ -246,6 +276,8 @@ class HtbShaper(AbstractShaper):
             re.MULTILINE,
         )
 
+        logger.debug(f"existing class list with {self._dev:s}: {exist_class_item_list}")
+
         exist_class_minor_id_list = []
         for class_item in exist_class_item_list:
             try:
@@ -253,17 +285,7 @@ class HtbShaper(AbstractShaper):
             except typepy.TypeConversionError:
                 continue
 
-        logger.debug(f"existing class list with {self._dev:s}: {exist_class_item_list}")
-        logger.debug(f"existing minor classid list with {self._dev:s}: {exist_class_minor_id_list}")
-
-        next_minor_id = self.__DEFAULT_CLASS_MINOR_ID
-        while True:
-            if next_minor_id not in exist_class_minor_id_list:
-                break
-
-            next_minor_id += 1
-
-        return next_minor_id
+        return exist_class_minor_id_list
 
     def __extract_exist_netem_major_ids(self) -> List[int]:
         tcshow_out = run_tc_show(
@@ -284,18 +306,10 @@ class HtbShaper(AbstractShaper):
         return exist_netem_major_id_list
 
     def __get_unique_netem_major_id(self):
-        exist_netem_major_ids = self.__extract_exist_netem_major_ids()
-
-        logger.debug(f"existing netem major id list with {self._dev:s}: {exist_netem_major_ids}")
-
-        next_netem_major_id = self._tc_obj.netem_param.calc_device_qdisc_major_id()
-        while True:
-            if next_netem_major_id not in exist_netem_major_ids:
-                break
-
-            next_netem_major_id += 1
-
-        return next_netem_major_id
+        return get_id_allocator(
+            (self._tc_device, TcSubCommand.QDISC.value),
+            self.__extract_exist_netem_major_ids,
+        ).allocate(self._tc_obj.netem_param.calc_device_qdisc_major_id())
 
     def __add_default_class(self):
         base_command = self._tc_obj.get_tc_command(TcSubCommand.CLASS)
@@ -4,11 +4,11 @@
 
 import typepy
 from humanreadable import ParameterError
-from subprocrunner import SubprocessRunner
 
 from .._common import logging_context, run_command_helper
 from .._const import ShapingAlgorithm, TcSubCommand, TrafficDirection
 from .._network import get_anywhere_network, get_upper_limit_rate
+from .._tc_backend import get_tc_backend
 from ._interface import AbstractShaper
 
 
@@ -142,19 +142,19 @@ class TbfShaper(AbstractShaper):
         else:
             flowid = f"{self._tc_obj.qdisc_major_id_str:s}:2"
 
-        return SubprocessRunner(
-            " ".join(
-                [
-                    self._tc_obj.get_tc_command(TcSubCommand.FILTER),
-                    self._dev,
-                    f"protocol {self._tc_obj.protocol:s}",
-                    f"parent {self._tc_obj.qdisc_major_id_str:s}:",
-                    "prio 2 u32 match {:s} {:s} {:s}".format(
-                        self._tc_obj.protocol,
-                        self._get_network_direction_str(),
-                        get_anywhere_network(self._tc_obj.ip_version),
-                    ),
-                    f"flowid {flowid:s}",
-                ]
-            )
-        ).run()
+        command = " ".join(
+            [
+                self._tc_obj.get_tc_command(TcSubCommand.FILTER),
+                self._dev,
+                f"protocol {self._tc_obj.protocol:s}",
+                f"parent {self._tc_obj.qdisc_major_id_str:s}:",
+                "prio 2 u32 match {:s} {:s} {:s}".format(
+                    self._tc_obj.protocol,
+                    self._get_network_direction_str(),
+                    get_anywhere_network(self._tc_obj.ip_version),
+                ),
+                f"flowid {flowid:s}",
+            ]
+        )
+
+        return get_tc_backend().run(command).returncode
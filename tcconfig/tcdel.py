@@ -12,25 +12,31 @@ import subprocrunner as spr
 from .__version__ import __version__
 from ._argparse_wrapper import ArgparseWrapper
 from ._capabilities import check_execution_authority
-from ._common import initialize_cli, is_execute_tc_command, normalize_tc_value
+from ._common import (
+    initialize_cli,
+    is_execute_tc_command,
+    normalize_tc_value,
+    to_port_range_str,
+)
 from ._const import Tc
 from ._error import NetworkInterfaceNotFoundError
 from ._logger import LogLevel, logger, set_logger
 from ._main import Main
-from ._network import verify_network_interface
-from .parser._model import Filter
+from ._network import expand_network_interfaces, verify_network_interface
 from .traffic_control import TrafficControl
 
 
-def parse_option():
+def get_arg_parser():
     parser = ArgparseWrapper(__version__)
 
     group = parser.parser.add_argument_group("Traffic Control")
-    if {"-d", "--device"}.intersection(set(sys.argv)):
-        # deprecated: remain for backward compatibility
-        group.add_argument("-d", "--device", required=True, help="network device name (e.g. eth0)")
-    else:
-        group.add_argument("device", help="network device name (e.g. eth0)")
+    parser.add_device_argument(
+        group,
+        help="""network device names (e.g. eth0).
+        devices can be specified with glob patterns (e.g. 'veth*', 'eth0.*')
+        or regular expressions with 're:' prefix (e.g. 're:eth0\\.[0-9]+').
+        """,
+    )
     group.add_argument(
         "-a",
         "--all",
@@ -49,36 +55,41 @@ def parse_option():
 
     parser.add_routing_group()
     parser.add_docker_group()
+    parser.add_jobs_argument()
 
-    return parser.parser.parse_args()
+    return parser.parser
 
 
 class TcDelMain(Main):
     def run(self, is_delete_all):
-        return_code_list = []
+        self.__is_delete_all = is_delete_all
 
-        for tc_target in self._fetch_tc_targets():
-            tc = self.__create_tc_obj(tc_target)
-            if self._options.log_level == LogLevel.INFO:
-                spr.set_log_level("ERROR")
-            normalize_tc_value(tc)
+        try:
+            tc_targets = self._fetch_tc_targets()
+        except NetworkInterfaceNotFoundError as e:
+            logger.error(e)
+            return errno.EINVAL
 
-            try:
-                if is_delete_all:
-                    return_code_list.append(0 if tc.delete_all_rules() is True else 1)
-                else:
-                    return_code_list.append(tc.delete_tc())
-            except NetworkInterfaceNotFoundError as e:
-                logger.error(e)
-                return errno.EINVAL
+        return self._run_targets(tc_targets, self.__delete_shaping_rule, Tc.Command.TCDEL)
 
-            self._dump_history(tc, Tc.Command.TCDEL)
+    def __delete_shaping_rule(self, tc_target):
+        tc = self.__create_tc_obj(tc_target)
+        if self._options.log_level == LogLevel.INFO:
+            spr.set_log_level("ERROR")
+        normalize_tc_value(tc)
 
-        return self._get_return_code(return_code_list)
+        try:
+            if self.__is_delete_all:
+                return_code = 0 if tc.delete_all_rules() is True else 1
+            else:
+                return_code = tc.delete_tc()
+        except NetworkInterfaceNotFoundError as e:
+            logger.error(e)
+            return self._to_target_result(tc_target, errno.EINVAL)
 
-    def __create_tc_obj(self, tc_target):
-        from simplesqlite.query import Where
+        return self._to_target_result(tc_target, return_code, tc)
 
+    def __create_tc_obj(self, tc_target):
         from .parser.shaping_rule import TcShapingRuleParser
 
         options = self._options
@@ -92,11 +103,15 @@ class TcDelMain(Main):
                 logger=logger,
             )
             shaping_rule_parser.parse()
-            for record in Filter.select(where=Where(Tc.Param.FILTER_ID, options.filter_id)):
+            for record in shaping_rule_parser.store.find_filters(
+                {Tc.Param.FILTER_ID: options.filter_id}
+            ):
                 dst_network = record.dst_network
                 src_network = record.src_network
-                dst_port = record.dst_port
-                src_port = record.src_port
+                dst_port = self.__to_port(record.dst_port, record.dst_port_max)
+                src_port = self.__to_port(record.src_port, record.src_port_max)
+                ip_proto = record.ip_proto
+                network_set_name = record.network_set
                 break
             else:
                 logger.error(
@@ -108,21 +123,33 @@ class TcDelMain(Main):
             src_network = self._extract_src_network()
             dst_port = options.dst_port
             src_port = options.src_port
+            ip_proto = options.ip_proto
+            network_set_name = None
 
         return TrafficControl(
             tc_target,
             direction=options.direction,
             dst_network=dst_network,
             src_network=src_network,
+            dst_network_file=options.dst_network_file,
+            network_set_name=network_set_name,
             dst_port=dst_port,
             src_port=src_port,
+            ip_proto=ip_proto,
             is_ipv6=options.is_ipv6,
             tc_command_output=options.tc_command_output,
         )
 
+    @staticmethod
+    def __to_port(port, max_port):
+        if port is None:
+            return None
+
+        return to_port_range_str(port, max_port)
+
 
 def main():
-    options = parse_option()
+    options = get_arg_parser().parse_args()
 
     initialize_cli(options)
 
@@ -131,7 +158,8 @@ def main():
 
         if not options.use_docker:
             try:
-                verify_network_interface(options.device, options.tc_command_output)
+                for device in expand_network_interfaces(options.device):
+                    verify_network_interface(device, options.tc_command_output)
             except NetworkInterfaceNotFoundError as e:
                 logger.error(e)
                 return errno.EINVAL
@@ -20,12 +20,14 @@ from ._common import initialize_cli, is_execute_tc_command, normalize_tc_value
 from ._const import (
     DELAY_DISTRIBUTIONS,
     IPV6_OPTION_ERROR_MSG_FORMAT,
+    Classifier,
+    MarkBackend,
     ShapingAlgorithm,
     Tc,
     TrafficDirection,
 )
 from ._error import ContainerNotFoundError, ModuleNotFoundError, NetworkInterfaceNotFoundError
-from ._importer import set_tc_from_file
+from ._kernel_module import KernelModule, find_unavailable_modules
 from ._logger import LogLevel, set_log_level
 from ._main import Main
 from ._netem_param import (
@@ -39,6 +41,7 @@ from ._netem_param import (
     MIN_REORDERING_RATE,
     NetemParameter,
 )
+from ._nftables import TABLE_NAME
 from ._shaping_rule_finder import TcShapingRuleFinder
 from .traffic_control import TrafficControl
 
@@ -50,15 +53,13 @@ def _get_unit_help_msg():
 def get_arg_parser():
     parser = ArgparseWrapper(__version__)
 
-    if {"-d", "--device"}.intersection(set(sys.argv)):
-        # deprecated: remain for backward compatibility
-        parser.parser.add_argument(
-            "-d", "--device", required=True, help="network device name (e.g. eth0)"
-        )
-    else:
-        parser.parser.add_argument(
-            "device", help="target name: network-interface/config-file (e.g. eth0)"
-        )
+    parser.add_device_argument(
+        parser.parser,
+        help="""target names: network-interfaces/config-file (e.g. eth0).
+        network-interfaces can be specified with glob patterns (e.g. 'veth*', 'eth0.*')
+        or regular expressions with 're:' prefix (e.g. 're:eth0\\.[0-9]+').
+        """,
+    )
 
     parser.parser.add_argument(
         "--import-setting",
@@ -92,6 +93,18 @@ def get_arg_parser():
         default=False,
         help="add a traffic shaping rule in addition to existing rules.",
     )
+    group.add_argument(
+        "--reconcile",
+        dest="is_reconcile",
+        action="store_true",
+        default=False,
+        help="""apply only the differences between the configuration file and
+        the existing shaping rules: delete rules that not in the file, change rules that
+        have different parameters, and add new rules.
+        this option is effective only with --import-setting option and
+        can not be used with --overwrite option.
+        """,
+    )
 
     group = parser.parser.add_argument_group("Traffic Control Parameters")
     group.add_argument(
@@ -193,6 +206,41 @@ def get_arg_parser():
         default=False,
         help="use iptables for traffic control.",
     )
+    group.add_argument(
+        "--mark-backend",
+        choices=MarkBackend.LIST,
+        default=MarkBackend.IPTABLES,
+        help="""the method to mark packets when executing with the --iptables option.
+        {iptables}: add mark entries to the iptables mangle table.
+        {nftables}: add marks to address-to-mark maps of a dedicated '{table}' nftables table.
+        marks are added with a single nft transaction. networks of the rules can not
+        overlap with each other, and the rules can not classify packets by ports.
+        (default = %(default)s)
+        """.format(iptables=MarkBackend.IPTABLES, nftables=MarkBackend.NFTABLES, table=TABLE_NAME),
+    )
+    group.add_argument(
+        "--classifier",
+        choices=Classifier.LIST,
+        default=Classifier.U32,
+        help="""the classifier of filters.
+        {u32}: match packet headers by offsets.
+        {flower}: match packet headers by keys. port ranges and --ip-proto are available.
+        (default = %(default)s)
+        """.format(u32=Classifier.U32, flower=Classifier.FLOWER),
+    )
+    group.add_argument(
+        "--u32-hash",
+        dest="is_enable_u32_hash",
+        action="store_true",
+        default=False,
+        help="""add IPv4 u32 filters to hash tables keyed on the third octet of
+        the destination/source address or the lower byte of the destination/source port
+        instead of a linear list of filters.
+        classification cost stays roughly constant with thousands of rules.
+        rules that fix none of the keys are added as linear filters and
+        take precedence over hashed rules.
+        """,
+    )
 
     group = parser.add_routing_group()
     group.add_argument(
@@ -212,79 +260,94 @@ def get_arg_parser():
     )
 
     parser.add_docker_group()
+    parser.add_jobs_argument()
 
     return parser.parser
 
 
-def verify_netem_module():
-    import re
+def get_required_kernel_modules(options):
+    modules = [KernelModule.NETEM]
 
-    runner = spr.SubprocessRunner("lsmod")
+    if options.shaping_algorithm == ShapingAlgorithm.TBF:
+        modules.append(KernelModule.TBF)
+    else:
+        modules.append(KernelModule.HTB)
 
-    try:
-        if runner.run() != 0:
-            raise OSError(runner.returncode, "failed to execute lsmod")
-    except spr.CommandError as e:
-        # reach here when the kmod package is not installed.
-        # this kind of environment could exist such as slim Docker containers.
-        logger.debug(msgfy.to_debug_message(e))
+    if options.is_enable_iptables:
+        modules.append(KernelModule.FW)
+    elif options.classifier == Classifier.FLOWER:
+        modules.append(KernelModule.FLOWER)
     else:
-        if re.search(r"\bsch_netem\b", runner.stdout) is None:
-            raise ModuleNotFoundError("sch_netem module not found")
+        modules.append(KernelModule.U32)
+
+    if options.direction == TrafficDirection.INCOMING:
+        modules.append(KernelModule.IFB)
+
+    return modules
+
+
+def verify_kernel_modules(modules):
+    unavailable_modules = find_unavailable_modules(modules)
+
+    if unavailable_modules:
+        raise ModuleNotFoundError("module not found: {}".format(", ".join(unavailable_modules)))
 
 
 class TcSetMain(Main):
     def run(self):
-        return_code_list = []
-
-        for device in self._fetch_tc_targets():
-            tc = self.__create_tc(device)
-            return_code = self.__check_tc(tc)
-
-            if return_code != 0:
-                return_code_list.append(return_code)
-                continue
-
-            normalize_tc_value(tc)
-
-            if self._options.overwrite:
-                if self._options.log_level == LogLevel.INFO:
-                    set_log_level("ERROR")
-
-                try:
-                    tc.delete_all_rules()
-                except NetworkInterfaceNotFoundError:
-                    pass
-
-                set_log_level(self._options.log_level)
-
-            if (
-                self._options.is_add_shaping_rule
-                and TcShapingRuleFinder(logger=logger, tc=tc).is_exist_rule()
-            ):
-                logger.error(
-                    "\n".join(
-                        [
-                            "adding a shaping rule failed. a shaping rule for the same "
-                            "network/port already exists. try to execute with:",
-                            "  (a) --overwrite option if you want to overwrite "
-                            "the existing rules.",
-                            "  (b) --change option if you want to change "
-                            "the existing rule parameters.",
-                        ]
-                    )
-                )
-                return errno.EINVAL
+        try:
+            tc_targets = self._fetch_tc_targets()
+        except NetworkInterfaceNotFoundError as e:
+            logger.error(e)
+            return errno.EINVAL
+
+        return self._run_targets(tc_targets, self.__set_shaping_rule, Tc.Command.TCSET)
+
+    def __set_shaping_rule(self, device):
+        tc = self.__create_tc(device)
+        return_code = self.__check_tc(tc)
+
+        if return_code != 0:
+            return self._to_target_result(device, return_code)
+
+        normalize_tc_value(tc)
+
+        if self._options.overwrite:
+            if self._options.log_level == LogLevel.INFO:
+                set_log_level("ERROR")
 
             try:
-                return_code_list.append(tc.set_shaping_rule())
-            except NetworkInterfaceNotFoundError as e:
-                logger.error(e)
-                return errno.EINVAL
+                tc.delete_all_rules()
+            except NetworkInterfaceNotFoundError:
+                pass
+
+            set_log_level(self._options.log_level)
+
+        if (
+            self._options.is_add_shaping_rule
+            and TcShapingRuleFinder(logger=logger, tc=tc).is_exist_rule()
+        ):
+            logger.error(
+                "\n".join(
+                    [
+                        "adding a shaping rule failed. a shaping rule for the same "
+                        "network/port already exists. try to execute with:",
+                        "  (a) --overwrite option if you want to overwrite "
+                        "the existing rules.",
+                        "  (b) --change option if you want to change "
+                        "the existing rule parameters.",
+                    ]
+                )
+            )
+            return self._to_target_result(device, errno.EINVAL)
 
-            self._dump_history(tc, Tc.Command.TCSET)
+        try:
+            return_code = tc.set_shaping_rule()
+        except NetworkInterfaceNotFoundError as e:
+            logger.error(e)
+            return self._to_target_result(device, errno.EINVAL)
 
-        return self._get_return_code(return_code_list)
+        return self._to_target_result(device, return_code, tc)
 
     def __check_tc(self, tc):
         try:
@@ -320,6 +383,7 @@ class TcSetMain(Main):
                 packet_limit_count=options.packet_limit_count,
             ),
             dst_network=self._extract_dst_network(),
+            dst_network_file=options.dst_network_file,
             exclude_dst_network=options.exclude_dst_network,
             src_network=self._extract_src_network(),
             exclude_src_network=options.exclude_src_network,
@@ -327,10 +391,14 @@ class TcSetMain(Main):
             exclude_src_port=options.exclude_src_port,
             dst_port=options.dst_port,
             exclude_dst_port=options.exclude_dst_port,
+            ip_proto=options.ip_proto,
             is_ipv6=options.is_ipv6,
             is_change_shaping_rule=options.is_change_shaping_rule,
             is_add_shaping_rule=options.is_add_shaping_rule,
             is_enable_iptables=options.is_enable_iptables,
+            mark_backend=options.mark_backend,
+            is_enable_u32_hash=options.is_enable_u32_hash,
+            classifier=options.classifier,
             shaping_algorithm=options.shaping_algorithm,
             tc_command_output=options.tc_command_output,
         )
@@ -346,18 +414,31 @@ def main():
 
         if options.direction == TrafficDirection.INCOMING:
             check_execution_authority("ip")
+
+        if options.dst_network_file:
+            check_execution_authority("ipset")
     else:
-        if not options.import_setting:
-            spr.SubprocessRunner.default_is_dry_run = True
+        spr.SubprocessRunner.default_is_dry_run = True
 
     try:
-        verify_netem_module()
+        verify_kernel_modules(get_required_kernel_modules(options))
     except ModuleNotFoundError as e:
         logger.debug(e)
 
     if options.import_setting:
+        if len(options.device) > 1:
+            logger.error("--import-setting option requires a single config file")
+            return errno.EINVAL
+
+        from ._importer import set_tc_from_file
+
         return set_tc_from_file(
-            logger, options.device, options.overwrite, options.tc_command_output
+            logger,
+            options.device[0],
+            options.overwrite,
+            options.tc_command_output,
+            options.log_level,
+            is_reconcile=options.is_reconcile,
         )
 
     spr.SubprocessRunner.clear_history()
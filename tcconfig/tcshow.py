@@ -4,23 +4,21 @@
 .. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
 """
 
+import errno
 import sys
 
 import msgfy
 import subprocrunner as spr
-from docker.errors import DockerException
-from simplesqlite import SimpleSQLite
-from simplesqlite.model import Integer, Model, Text
 
 from .__version__ import __version__
 from ._argparse_wrapper import ArgparseWrapper
 from ._common import check_command_installation, initialize_cli
 from ._const import Tc, TcCommandOutput
-from ._docker import DockerClient
 from ._error import TargetNotFoundError
 from ._logger import logger
-from ._network import verify_network_interface
+from ._network import expand_network_interfaces, verify_network_interface
 from ._tc_script import write_tc_script
+from .parser._rule_index import parse_flow
 from .parser.shaping_rule import TcShapingRuleParser
 
 
@@ -30,41 +28,17 @@ except ImportError:
     import json  # type: ignore
 
 
-class ShapingRuleModel(Model):
-    device = Text(not_null=True)
-    direction = Text(not_null=True)
-    filter_id = Text(not_null=True)
-    dst_network = Text()
-    dst_port = Integer()
-    src_network = Text()
-    src_port = Integer()
-    protocol = Text(not_null=True)
-
-    delay = Text()
-    delay_distro = Text()
-    loss = Text()
-    duplicate = Text()
-    corrupt = Text()
-    reorder = Text()
-    rate = Text()
-    limit = Text()
-
-
 def parse_option():
     parser = ArgparseWrapper(__version__)
 
     group = parser.parser.add_argument_group("Traffic Control")
-    if {"-d", "--device"}.intersection(set(sys.argv)):
-        # deprecated: remain for backward compatibility
-        group.add_argument(
-            "-d",
-            "--device",
-            action="append",
-            required=True,
-            help="network device name (e.g. eth0)",
-        )
-    else:
-        group.add_argument("device", nargs="+", help="network device name (e.g. eth0)")
+    parser.add_device_argument(
+        group,
+        help="""network device names (e.g. eth0).
+        devices can be specified with glob patterns (e.g. 'veth*', 'eth0.*')
+        or regular expressions with 're:' prefix (e.g. 're:eth0\\.[0-9]+').
+        """,
+    )
     group.add_argument(
         "--ipv6",
         dest="ip_version",
@@ -74,6 +48,18 @@ def parse_option():
         help="Display IPv6 shaping rules. Defaults to show IPv4 shaping rules.",
     )
 
+    group.add_argument(
+        "--match",
+        dest="flow",
+        nargs="+",
+        metavar="TERM",
+        help="""display only the shaping rules that a flow hits.
+        a flow is specified with dst=<address>[:<port>], src=<address>[:<port>]
+        and proto=<L4 protocol> terms (e.g. --match dst=10.0.0.5:443 proto=tcp).
+        IPv6 addresses with ports are enclosed in brackets (e.g. dst=[2001:db8::1]:443).
+        """,
+    )
+
     parser.add_docker_group(is_add_srcdst=False)
 
     parser.parser.add_argument(
@@ -120,21 +106,20 @@ def print_tc(text, is_colorize):
         print(text)
 
 
-def export_settings(export_path, out_rules, in_rules):
-    with SimpleSQLite(export_path, mode="a") as con:
-        ShapingRuleModel.attach(con)
-        ShapingRuleModel.create()
-
-        for out_rule in out_rules:
-            ShapingRuleModel.insert(ShapingRuleModel(**out_rule))
+def get_tc_parameter(rule_parser, flow):
+    if flow is None:
+        return rule_parser.get_tc_parameter()
 
-        for in_rule in in_rules:
-            ShapingRuleModel.insert(ShapingRuleModel(**in_rule))
+    return rule_parser.get_matched_tc_parameter(flow)
 
 
 def extract_tc_params(options):
     dclient = None
     if options.use_docker:
+        from docker.errors import DockerException
+
+        from ._docker import DockerClient
+
         try:
             dclient = DockerClient(options.tc_command_output)
         except DockerException as e:
@@ -174,32 +159,37 @@ def extract_tc_params(options):
                     rule_parser.parse()
 
                     if options.export_path:
+                        from ._exporter import export_settings
+
                         rule_parser.con.dump(options.export_path)
                         out_rules, in_rules = rule_parser.extract_export_parameters()
                         export_settings(options.export_path, out_rules, in_rules)
 
-                    tc_params.update(rule_parser.get_tc_parameter())
+                    tc_params.update(get_tc_parameter(rule_parser, options.flow))
                     key = f"{container_info.id[:12]} (device={veth})"
                     tc_params[key] = tc_params.pop(veth)
             else:
-                verify_network_interface(device, options.tc_command_output)
-                rule_parser = TcShapingRuleParser(
-                    device=device,
-                    ip_version=options.ip_version,
-                    tc_command_output=options.tc_command_output,
-                    logger=logger,
-                    export_path=options.export_path,
-                    is_parse_filter_id=not options.exclude_filter_id,
-                    dump_db_path=options.dump_db_path,
-                )
-                rule_parser.parse()
-
-                if options.export_path:
-                    rule_parser.con.dump(options.export_path)
-                    out_rules, in_rules = rule_parser.extract_export_parameters()
-                    export_settings(options.export_path, out_rules, in_rules)
-
-                tc_params.update(rule_parser.get_tc_parameter())
+                for iface in expand_network_interfaces([device]):
+                    verify_network_interface(iface, options.tc_command_output)
+                    rule_parser = TcShapingRuleParser(
+                        device=iface,
+                        ip_version=options.ip_version,
+                        tc_command_output=options.tc_command_output,
+                        logger=logger,
+                        export_path=options.export_path,
+                        is_parse_filter_id=not options.exclude_filter_id,
+                        dump_db_path=options.dump_db_path,
+                    )
+                    rule_parser.parse()
+
+                    if options.export_path:
+                        from ._exporter import export_settings
+
+                        rule_parser.con.dump(options.export_path)
+                        out_rules, in_rules = rule_parser.extract_export_parameters()
+                        export_settings(options.export_path, out_rules, in_rules)
+
+                    tc_params.update(get_tc_parameter(rule_parser, options.flow))
         except TargetNotFoundError as e:
             logger.warning(e)
             continue
@@ -216,6 +206,21 @@ def main():
     if options.tc_command_output != TcCommandOutput.NOT_SET:
         spr.SubprocessRunner.default_is_dry_run = True
 
+    if options.flow:
+        try:
+            options.flow = parse_flow(options.flow)
+        except ValueError as e:
+            logger.error(f"invalid --match: {e}")
+            return errno.EINVAL
+
+        flow_ip_version = (options.flow.dst_address or options.flow.src_address).version
+        if flow_ip_version != options.ip_version:
+            if flow_ip_version == 6:
+                logger.error("--match: IPv6 flows require --ipv6 option")
+            else:
+                logger.error("--match: IPv4 flows can not be used with --ipv6 option")
+            return errno.EINVAL
+
     tc_params = extract_tc_params(options)
     command_history = "\n".join(spr.SubprocessRunner.get_history())
 
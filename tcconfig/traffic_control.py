@@ -3,6 +3,7 @@
 """
 
 import errno
+import os
 import re
 
 import msgfy
@@ -15,22 +16,37 @@ from ._common import (
     is_execute_tc_command,
     logging_context,
     run_command_helper,
+    split_port_range,
     validate_within_min_max,
 )
 from ._const import (
     LIST_MANGLE_TABLE_OPTION,
+    Classifier,
+    IpProto,
+    MarkBackend,
     ShapingAlgorithm,
     Tc,
     TcCommandOutput,
     TcSubCommand,
     TrafficDirection,
 )
-from ._error import NetworkInterfaceNotFoundError
+from ._error import NetworkInterfaceNotFoundError, TcAlreadyExist, TcCommandExecutionError
+from ._ipset import (
+    NetworkSetController,
+    get_ipset_command,
+    load_network_file,
+    make_network_set_name,
+)
 from ._iptables import IptablesMangleController, get_iptables_base_command
+from ._kernel_module import KernelModule, load_module
 from ._logger import LogLevel, logger
-from ._network import sanitize_network, verify_network_interface
+from ._network import is_anywhere_network, sanitize_network, verify_network_interface
+from ._nftables import NftablesMarkController, get_nft_command
 from ._shaping_rule_finder import TcShapingRuleFinder
+from ._tc_backend import get_tc_backend
 from ._tc_command_helper import get_tc_base_command
+from .shaper._id_allocator import clear_id_allocators
+from .shaper._u32_hash import clear_created_hash_tables
 from .shaper.htb import HtbShaper
 from .shaper.tbf import TbfShaper
 
@@ -74,6 +90,20 @@ class TrafficControl:
     def dst_network(self):
         return self.__dst_network
 
+    @property
+    def dst_network_file(self):
+        return self.__dst_network_file
+
+    @property
+    def network_set_name(self):
+        if self.__network_set_name:
+            return self.__network_set_name
+
+        if not self.__dst_network_file:
+            return None
+
+        return make_network_set_name(self.__dst_network_file, self.ip_version)
+
     @property
     def exclude_dst_network(self):
         return self.__exclude_dst_network
@@ -90,6 +120,10 @@ class TrafficControl:
     def src_port(self):
         return self.__src_port
 
+    @property
+    def src_port_max(self):
+        return self.__src_port_max
+
     @property
     def exclude_src_port(self):
         return self.__exclude_src_port
@@ -98,10 +132,22 @@ class TrafficControl:
     def dst_port(self):
         return self.__dst_port
 
+    @property
+    def dst_port_max(self):
+        return self.__dst_port_max
+
     @property
     def exclude_dst_port(self):
         return self.__exclude_dst_port
 
+    @property
+    def ip_proto(self):
+        return self.__ip_proto
+
+    @property
+    def classifier(self):
+        return self.__classifier
+
     @property
     def is_change_shaping_rule(self):
         return self.__is_change_shaping_rule
@@ -114,6 +160,10 @@ class TrafficControl:
     def is_enable_iptables(self):
         return self.__is_enable_iptables
 
+    @property
+    def is_enable_u32_hash(self):
+        return self.__is_enable_u32_hash
+
     @property
     def qdisc_major_id(self):
         return self.__qdisc_major_id
@@ -148,6 +198,8 @@ class TrafficControl:
         direction=None,
         netem_param=None,
         dst_network=None,
+        dst_network_file=None,
+        network_set_name=None,
         exclude_dst_network=None,
         src_network=None,
         exclude_src_network=None,
@@ -155,10 +207,14 @@ class TrafficControl:
         exclude_dst_port=None,
         src_port=None,
         exclude_src_port=None,
+        ip_proto=None,
         is_ipv6=False,
         is_change_shaping_rule=False,
         is_add_shaping_rule=False,
         is_enable_iptables=False,
+        mark_backend=MarkBackend.IPTABLES,
+        is_enable_u32_hash=False,
+        classifier=Classifier.U32,
         shaping_algorithm=None,
         tc_command_output=TcCommandOutput.NOT_SET,
     ):
@@ -167,22 +223,32 @@ class TrafficControl:
         self.__direction = direction
         self.__netem_param = netem_param
         self.__dst_network = dst_network
+        self.__dst_network_file = dst_network_file
+        self.__network_set_name = network_set_name
+        self.__network_set_networks = None
         self.__exclude_dst_network = exclude_dst_network
         self.__src_network = src_network
         self.__exclude_src_network = exclude_src_network
-        self.__src_port = src_port
+        self.__src_port, self.__src_port_max = split_port_range(src_port)
         self.__exclude_src_port = exclude_src_port
-        self.__dst_port = dst_port
+        self.__dst_port, self.__dst_port_max = split_port_range(dst_port)
         self.__exclude_dst_port = exclude_dst_port
+        self.__ip_proto = ip_proto
+        self.__classifier = classifier
         self.__is_ipv6 = is_ipv6
         self.__is_change_shaping_rule = is_change_shaping_rule
         self.__is_add_shaping_rule = is_add_shaping_rule
         self.__is_enable_iptables = is_enable_iptables
+        self.__is_enable_u32_hash = is_enable_u32_hash
         self.__tc_command_output = tc_command_output
 
         self.__qdisc_major_id = self.__get_device_qdisc_major_id()
 
-        self.__iptables_ctrl = IptablesMangleController(is_enable_iptables, self.ip_version)
+        self.__mark_backend = mark_backend
+        if mark_backend == MarkBackend.NFTABLES:
+            self.__iptables_ctrl = NftablesMarkController(is_enable_iptables, self.ip_version)
+        else:
+            self.__iptables_ctrl = IptablesMangleController(is_enable_iptables, self.ip_version)
 
         self.__init_shaper(shaping_algorithm)
 
@@ -191,6 +257,9 @@ class TrafficControl:
         self.__netem_param.validate_netem_parameter()
         self.__validate_src_network()
         self.__validate_port()
+        self.__validate_classifier()
+        self.__validate_mark_backend()
+        self.__validate_network_file()
 
     def __validate_src_network(self):
         if any(
@@ -234,18 +303,28 @@ class TrafficControl:
 
     def get_command_history(self):
         def tc_command_filter(command):
-            if get_iptables_base_command():
+            if get_iptables_base_command(self.ip_version):
                 if re.search(
                     "^{:s} {:s}".format(
-                        get_iptables_base_command(), re.escape(LIST_MANGLE_TABLE_OPTION)
+                        get_iptables_base_command(self.ip_version),
+                        re.escape(LIST_MANGLE_TABLE_OPTION),
                     ),
                     command,
                 ):
                     return False
 
+            if re.search("^{:s} -j list table".format(get_nft_command()), command):
+                return False
+
+            if re.search("^{:s} list -terse".format(get_ipset_command()), command):
+                return False
+
             if re.search("^{:s} .* show dev".format(find_bin_path("tc")), command):
                 return False
 
+            if re.search("^{:s} -batch ".format(find_bin_path("tc")), command):
+                return False
+
             if re.search("^ip (netns exec |link show )", command):
                 return False
 
@@ -285,7 +364,43 @@ class TrafficControl:
 
         self.__setup_ifb()
 
-        return self.__shaper.set_shaping()
+        if self.network_set_name:
+            return_code = self.__restore_network_set()
+            if return_code != 0:
+                return return_code
+
+        try:
+            return_code = self.__shaper.set_shaping()
+
+            iptables_return_code = self.iptables_ctrl.flush()
+            if iptables_return_code != 0:
+                # filters that classify packets by the marks would never match
+                get_tc_backend().discard()
+                return iptables_return_code
+
+            try:
+                get_tc_backend().flush()
+            except TcAlreadyExist:
+                if not self.is_add_shaping_rule:
+                    return errno.EINVAL
+        except TcCommandExecutionError as e:
+            # deferred tc commands were aborted
+            logger.error(e)
+            return errno.EIO
+
+        return return_code
+
+    def __restore_network_set(self):
+        if self.__network_set_networks is None:
+            self.__network_set_networks = load_network_file(self.dst_network_file, self.ip_version)
+
+        try:
+            return NetworkSetController(self.ip_version).restore(
+                self.network_set_name, self.__network_set_networks
+            )
+        except OSError as e:
+            logger.error(e)
+            return e.errno
 
     def delete_all_rules(self):
         result_list = []
@@ -305,6 +420,10 @@ class TrafficControl:
             except OSError as e:
                 logger.warning(f"{e} (can not delete iptables entries)")
 
+        get_tc_backend().flush()
+        clear_id_allocators()
+        clear_created_hash_tables()
+
         return any(result_list)
 
     def delete_tc(self):
@@ -327,13 +446,14 @@ class TrafficControl:
 
         filter_del_command = (
             "{command:s} del dev {dev:s} protocol {protocol:s} "
-            "parent {parent:} handle {handle:s} prio {prio:} u32".format(
+            "parent {parent:} handle {handle:s} prio {prio:} {classifier:s}".format(
                 command=get_tc_base_command(TcSubCommand.FILTER),
                 dev=rule_finder.get_parsed_device(),
                 protocol=filter_param.get(Tc.Param.PROTOCOL),
                 parent="{:s}:".format(rule_finder.find_parent().split(":")[0]),
                 handle=filter_param.get(Tc.Param.FILTER_ID),
                 prio=filter_param.get(Tc.Param.PRIORITY),
+                classifier=filter_param.get(Tc.Param.CLASSIFIER) or Classifier.U32,
             )
         )
 
@@ -346,6 +466,8 @@ class TrafficControl:
             logger.debug("there are no filters remain. delete qdiscs.")
             self.delete_all_rules()
 
+        get_tc_backend().flush()
+
         return result
 
     def __init_shaper(self, shaping_algorithm):
@@ -376,6 +498,97 @@ class TrafficControl:
             "dst_port", self.dst_port, self.__MIN_PORT, self.__MAX_PORT, unit=None
         )
 
+        validate_within_min_max(
+            "src_port_max", self.src_port_max, self.__MIN_PORT, self.__MAX_PORT, unit=None
+        )
+
+        validate_within_min_max(
+            "dst_port_max", self.dst_port_max, self.__MIN_PORT, self.__MAX_PORT, unit=None
+        )
+
+    def __validate_mark_backend(self):
+        if not self.is_enable_iptables or self.__mark_backend != MarkBackend.NFTABLES:
+            return
+
+        # maps of the nftables mark backend are keyed by addresses only
+        if any([self.src_port, self.dst_port, self.exclude_src_port, self.exclude_dst_port]):
+            raise ParameterError(
+                f"--mark-backend {MarkBackend.NFTABLES} option can not classify packets by ports",
+                value=self.__mark_backend,
+            )
+
+    def __validate_network_file(self):
+        if not self.dst_network_file:
+            return
+
+        if not os.path.isfile(self.dst_network_file):
+            raise ParameterError("network file not found", value=self.dst_network_file)
+
+        def is_specified(network):
+            return typepy.is_not_null_string(network) and not is_anywhere_network(
+                network, self.ip_version
+            )
+
+        if any(
+            [
+                is_specified(self.dst_network),
+                is_specified(self.src_network),
+                self.src_port,
+                self.dst_port,
+                self.ip_proto,
+                self.is_enable_iptables,
+                self.classifier != Classifier.U32,
+            ]
+        ):
+            raise ParameterError(
+                "a network file can not be used with other filter conditions "
+                "(networks/ports/--ip-proto/--classifier/--iptables)",
+                value=self.dst_network_file,
+            )
+
+        try:
+            self.__network_set_networks = load_network_file(self.dst_network_file, self.ip_version)
+        except ValueError as e:
+            raise ParameterError(str(e), value=self.dst_network_file) from e
+
+        if not self.__network_set_networks:
+            raise ParameterError("no networks in the network file", value=self.dst_network_file)
+
+    def __validate_classifier(self):
+        if self.classifier != Classifier.FLOWER:
+            if self.ip_proto:
+                raise ParameterError(
+                    "--classifier {} option required to use --ip-proto option".format(
+                        Classifier.FLOWER
+                    ),
+                    value=self.classifier,
+                )
+
+            if self.src_port_max is not None or self.dst_port_max is not None:
+                raise ParameterError(
+                    f"--classifier {Classifier.FLOWER} option required to use port ranges",
+                    value=self.classifier,
+                )
+
+            return
+
+        if self.ip_proto in (IpProto.ICMP, IpProto.ICMPV6):
+            expected = IpProto.ICMPV6 if self.ip_version == 6 else IpProto.ICMP
+            if self.ip_proto != expected:
+                raise ParameterError(
+                    f"invalid --ip-proto for IPv{self.ip_version}",
+                    expected=expected,
+                    value=self.ip_proto,
+                )
+
+        if any([self.src_port, self.dst_port, self.exclude_src_port, self.exclude_dst_port]):
+            if self.ip_proto not in IpProto.PORT_LIST:
+                raise ParameterError(
+                    "flower filters require --ip-proto option to match ports",
+                    expected=IpProto.PORT_LIST,
+                    value=self.ip_proto,
+                )
+
     def __get_device_qdisc_major_id(self):
         import hashlib
 
@@ -392,13 +605,7 @@ class TrafficControl:
             return -1
 
         return_code = 0
-        modprobe_proc = spr.SubprocessRunner("modprobe ifb")
-
-        try:
-            if modprobe_proc.run() != 0:
-                logger.error(modprobe_proc.stderr)
-        except spr.CommandError as e:
-            logger.debug(msgfy.to_debug_message(e))
+        load_module(KernelModule.IFB, self.__tc_command_output)
 
         if self.is_add_shaping_rule or self.is_change_shaping_rule:
             notice_message = None
@@ -413,9 +620,11 @@ class TrafficControl:
             notice_msg=notice_message,
         )
 
-        return_code |= spr.SubprocessRunner(
-            "{:s} link set dev {:s} up".format(find_bin_path("ip"), self.ifb_device)
-        ).run()
+        return_code |= (
+            get_tc_backend()
+            .run("{:s} link set dev {:s} up".format(find_bin_path("ip"), self.ifb_device))
+            .returncode
+        )
 
         base_command = f"{get_tc_base_command(TcSubCommand.QDISC):s} add"
         if self.is_add_shaping_rule or self.is_change_shaping_rule:
@@ -430,18 +639,22 @@ class TrafficControl:
             notice_msg=notice_message,
         )
 
-        return_code |= spr.SubprocessRunner(
-            " ".join(
-                [
-                    f"{get_tc_base_command(TcSubCommand.FILTER):s} add",
-                    f"dev {self.device:s}",
-                    f"parent ffff: protocol {self.protocol:s} u32 match u32 0 0",
-                    f"flowid {self.__qdisc_major_id:x}:",
-                    "action mirred egress redirect",
-                    f"dev {self.ifb_device:s}",
-                ]
+        return_code |= (
+            get_tc_backend()
+            .run(
+                " ".join(
+                    [
+                        f"{get_tc_base_command(TcSubCommand.FILTER):s} add",
+                        f"dev {self.device:s}",
+                        f"parent ffff: protocol {self.protocol:s} u32 match u32 0 0",
+                        f"flowid {self.__qdisc_major_id:x}:",
+                        "action mirred egress redirect",
+                        f"dev {self.ifb_device:s}",
+                    ]
+                )
             )
-        ).run()
+            .returncode
+        )
 
         return return_code
 
@@ -519,7 +732,8 @@ class TrafficControl:
                 "{:s} link delete {:s} type ifb".format(find_bin_path("ip"), self.ifb_device),
             ]
 
-            if all([spr.SubprocessRunner(command).run() != 0 for command in commands]):
+            tc_backend = get_tc_backend()
+            if all([tc_backend.run(command).returncode != 0 for command in commands]):
                 return 2
 
         logger.info(logging_msg)
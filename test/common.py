@@ -100,3 +100,57 @@ class NullLogger:
 
     def warning(self, __message, *args, **kwargs):  # pragma: no cover
         pass
+
+
+class SubprocessRunnerStub:
+    """
+    A stub of ``subprocrunner.SubprocessRunner`` that records commands instead of executing.
+    An instance of the stub is patched in place of the class: calls of the instance
+    create runners that share the records of the instance.
+
+    :param dict results:
+        Mapping of command suffixes to ``(returncode, stdout)`` or
+        ``(returncode, stdout, stderr)`` of the commands.
+        Commands that not match with any of the suffixes return ``returncode`` and
+        an empty output.
+    """
+
+    def __init__(self, results=None, returncode=0, default_is_dry_run=False):
+        self.results = results or {}
+        self.returncode = returncode
+        self.default_is_dry_run = default_is_dry_run
+        self.commands = []
+        self.inputs = []
+
+    def __call__(self, command, **kwargs):
+        return _SubprocessRunnerStubProcess(self, command)
+
+    def get_result(self, command):
+        for suffix, result in self.results.items():
+            if command.endswith(suffix):
+                return result
+
+        return (self.returncode, "")
+
+
+class _SubprocessRunnerStubProcess:
+    def __init__(self, stub, command):
+        self.__stub = stub
+        self.command = command
+        self.returncode = None
+        self.stdout = ""
+        self.stderr = ""
+
+    def run(self, input=None):
+        self.__stub.commands.append(self.command)
+        if input is not None:
+            self.__stub.inputs.append(input)
+
+        result = self.__stub.get_result(self.command)
+        self.returncode, self.stdout = result[:2]
+        if len(result) > 2:
+            self.stderr = result[2]
+        elif self.returncode != 0:
+            self.stderr = f"failed to execute: {self.command}"
+
+        return self.returncode
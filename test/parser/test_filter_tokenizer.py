@@ -0,0 +1,219 @@
+import pytest
+
+import tcconfig.parser._filter
+from tcconfig.parser._filter import TcFilterParser, _parse_with_grammar, tokenize_filter_line
+from tcconfig.parser._store import TcRecordStore
+
+
+DEVICE = "eth0"
+
+# outputs of 'tc filter show' that the tokenizer results are compared with the grammar results
+GOLDEN_IPV4_OUTPUTS = [
+    """filter parent 1a1a: protocol ip pref 5 u32 chain 0
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800: ht divisor 1
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 flowid 1a1a:2 not_in_hw
+  match c0a80000/ffffff00 at 16
+  match 0a000001/ffffffff at 12
+  match 00001f90/0000ffff at 20
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::801 order 2049 key ht 800 bkt 0 *flowid 1a1a:3 not_in_hw
+  match 00000000/00000000 at 16
+  match 0050000a/ffffffff at 20""",
+    """filter parent 1a1a: protocol ip pref 5 u32 chain 0
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 105: ht divisor 256
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 105:2a:800 order 2048 key ht 105 bkt 2a flowid 1a1a:2 not_in_hw
+  match c0a82a00/ffffff00 at 16
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800: ht divisor 1
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::ffc order 4092 key ht 800 bkt 0 link 105: not_in_hw
+  match 00000000/00000000 at 16
+    hash mask 0000ff00 at 16
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 flowid 1a1a:3 not_in_hw
+  match 0a000000/ff000000 at 16""",
+    """filter parent 1f1c: protocol ip pref 1 fw chain 0
+filter parent 1f1c: protocol ip pref 1 fw chain 0 handle 0x65 classid 1f1c:1
+filter parent 1f1c: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 flowid 1f1c:2
+  match 0a000000/ff000000 at 16""",
+    """filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 flowid 1a1a:2
+  match c0a80000/ffffff00 at 16
+filter parent 1a1a: protocol ip pref 13 flower chain 0
+filter parent 1a1a: protocol ip pref 13 flower chain 0 handle 0x1 classid 1a1a:3
+  eth_type ipv4
+  ip_proto tcp
+  dst_ip 192.168.0.0/24
+  dst_port 80-90
+  not_in_hw
+filter parent 1a1a: protocol ipv6 pref 14 flower chain 0 handle 0x1 classid 1a1a:4
+  eth_type ipv6
+  ip_proto udp""",
+    """filter parent 1a1a: protocol ip pref 21 basic chain 0
+filter parent 1a1a: protocol ip pref 21 basic chain 0 handle 0x1 flowid 1a1a:2
+  ipset(tc_blocklist_abcdef dst)
+filter parent 1a1a: protocol ip pref 22 basic chain 0 handle 0x1 flowid 1a1a:4
+  meta(priority eq 1)""",
+    # unaligned keys of filters that added via netlink
+    """filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 flowid 1a1a:2
+  match 00500000/ffff0000 at 22""",
+    # lines that the tokenizer falls back to the grammar
+    """filter parent 1a1a: protocol ip pref x u32 chain 0 fh 800::800 flowid 1a1a:2
+  match c0a80000/ffffff00 at 16
+filter protocol ip pref 5 u32 chain 0 fh 800::801 flowid 1a1a:3
+  match 0a000000/ff000000 at sixteen
+  match c0a80000 at 16
+
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::802 flowid 1a1a:4
+  action order 1: gact action pass
+  match 0a000000/ff000000 at 12""",
+]
+
+GOLDEN_IPV6_OUTPUTS = [
+    """filter parent 1a1a: protocol ipv6 pref 6 u32 chain 0
+filter parent 1a1a: protocol ipv6 pref 6 u32 chain 0 fh 801: ht divisor 1
+filter parent 1a1a: protocol ipv6 pref 6 u32 chain 0 fh 801::800 order 2048 key ht 801 bkt 0 flowid 1a1a:2 not_in_hw
+  match 20010db8/ffffffff at 24
+  match 00000000/ffff0000 at 28
+  match 04d20000/ffff0000 at 40
+filter parent 1a1a: protocol ipv6 pref 6 u32 chain 0 fh 801::801 order 2049 key ht 801 bkt 0 flowid 1a1a:3 not_in_hw
+  match 20010db8/ffffffff at 8
+  match 00010000/ffff0000 at 12
+  match 20010db8/ffffffff at 24
+  match 00000000/ffffffff at 28
+  match 00000000/ffffffff at 32
+  match 00000001/ffffffff at 36""",
+    """filter parent 1a1a: protocol ipv6 pref 14 flower chain 0 handle 0x1 classid 1a1a:4
+  eth_type ipv6
+  ip_proto udp
+  dst_ip 2001:db8::/32
+  src_port 53
+filter parent 1a1a: protocol ipv6 pref 6 u32 chain 0 fh 801::800 order 2048 key ht 801 bkt 0 flowid 1a1a:2
+  match 20010db8/ffffffff at 24""",
+]
+
+
+def parse(text, ip_version):
+    parser = TcFilterParser(TcRecordStore(), ip_version)
+    parser.parse(DEVICE, text)
+
+    return parser.store.filters
+
+
+def parse_with_grammar(monkeypatch, text, ip_version):
+    def raise_value_error(line):
+        raise ValueError("tokenizer disabled")
+
+    with monkeypatch.context() as m:
+        m.setattr(tcconfig.parser._filter, "tokenize_filter_line", raise_value_error)
+        return parse(text, ip_version)
+
+
+class Test_tokenize_filter_line:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [
+                "filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 "
+                "key ht 800 bkt 0 *flowid 1a1a:2 not_in_hw",
+                (
+                    "filter",
+                    {
+                        "parent": "1a1a:",
+                        "protocol": "ip",
+                        "pref": "5",
+                        "kind": "u32",
+                        "fh": "800::800",
+                        "flowid": "1a1a:2",
+                    },
+                ),
+            ],
+            [
+                "filter parent 1f1c: protocol ip pref 1 fw chain 0 handle 0x65 classid 1f1c:1",
+                (
+                    "filter",
+                    {
+                        "parent": "1f1c:",
+                        "protocol": "ip",
+                        "pref": "1",
+                        "kind": "fw",
+                        "handle": "0x65",
+                        "classid": "1f1c:1",
+                    },
+                ),
+            ],
+            ["match c0a80000/ffffff00 at 16", ("match", ("c0a80000", "ffffff00", 16))],
+            ["ip_proto tcp", ("ip_proto", ["tcp"])],
+            ["", ("", [])],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert tokenize_filter_line(value) == expected
+
+    @pytest.mark.parametrize(
+        ["value"],
+        [
+            ["filter protocol ip pref 5 u32 chain 0 fh 800::800 flowid 1a1a:2"],
+            ["filter parent 1a1a: protocol ip pref x u32 chain 0"],
+            ["filter parent 1a1a: protocol ip pref 5 fw handle 0xzz classid 1a1a:1"],
+            ["match c0a80000/ffffff00 at sixteen"],
+            ["match c0a80000 at 16"],
+        ],
+    )
+    def test_exception(self, value):
+        with pytest.raises(ValueError):
+            tokenize_filter_line(value)
+
+
+class Test_parse_with_grammar:
+    @pytest.mark.parametrize(
+        ["name", "value", "expected"],
+        [
+            ["priority", "filter parent 1a1a: protocol ip pref 5 u32 chain 0", "5"],
+            ["match", "match c0a80000/ffffff00 at 16", "16"],
+        ],
+    )
+    def test_normal(self, name, value, expected):
+        assert _parse_with_grammar(name, value)[-1] == expected
+
+    @pytest.mark.parametrize(
+        ["name", "value"],
+        [
+            ["flowid", "filter parent 1a1a: protocol ip pref 5 u32 chain 0"],
+            ["match", "filter parent 1a1a: protocol ip pref 5 u32 chain 0"],
+        ],
+    )
+    def test_exception(self, name, value):
+        import pyparsing as pp
+
+        with pytest.raises(ValueError) as e:
+            _parse_with_grammar(name, value)
+
+        assert isinstance(e.value.__cause__, pp.ParseException)
+
+
+class Test_TcFilterParser_golden:
+    @pytest.mark.parametrize(["text"], [[text] for text in GOLDEN_IPV4_OUTPUTS])
+    def test_normal_ipv4(self, monkeypatch, text):
+        expected = parse_with_grammar(monkeypatch, text, 4)
+
+        assert expected
+        assert parse(text, 4) == expected
+
+    @pytest.mark.parametrize(["text"], [[text] for text in GOLDEN_IPV6_OUTPUTS])
+    def test_normal_ipv6(self, monkeypatch, text):
+        expected = parse_with_grammar(monkeypatch, text, 6)
+
+        assert expected
+        assert parse(text, 6) == expected
+
+    def test_normal_many_filters(self, monkeypatch):
+        text = "\n".join(
+            [
+                "filter parent 1a1a: protocol ip pref 5 u32 chain 0 "
+                f"fh 800::{i:x} order {i:d} key ht 800 bkt 0 flowid 1a1a:{i % 256 + 1:x}\n"
+                f"  match {i:08x}/ffffffff at 16\n"
+                f"  match {i % 65536:08x}/0000ffff at 20"
+                for i in range(1, 300)
+            ]
+        )
+
+        filters = parse(text, 4)
+
+        assert len(filters) == 299
+        assert filters == parse_with_grammar(monkeypatch, text, 4)
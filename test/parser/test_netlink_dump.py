@@ -0,0 +1,291 @@
+import pytest
+from pyroute2.netlink.rtnl.tcmsg import tcmsg
+from pyroute2.netlink.rtnl.tcmsg.common import percent2u32, tick_in_usec
+
+from tcconfig._error import NetworkInterfaceNotFoundError
+from tcconfig.parser._class import TcClassParser
+from tcconfig.parser._filter import TcFilterParser
+from tcconfig.parser._netlink_dump import (
+    TcNetlinkDumpReader,
+    format_percent,
+    format_rate,
+    format_tc_handle,
+    format_time,
+    format_u32_filter_handle,
+    to_aligned_u32_words,
+)
+from tcconfig.parser._qdisc import TcQdiscParser
+from tcconfig.parser._store import FilterRecord, TcRecordStore
+
+DEVICE = "eth0"
+IFINDEX = 3
+
+
+def make_tcmsg(attrs, **kwargs):
+    # encode and decode a message to get the same layout as a netlink dump
+    msg = tcmsg()
+    msg.update(kwargs)
+    msg["index"] = IFINDEX
+    msg["attrs"] = attrs
+    msg.encode()
+
+    decoded = tcmsg(msg.data)
+    decoded.decode()
+
+    return decoded
+
+
+def make_u32_filter(protocol, prio, handle, keys, classid):
+    return make_tcmsg(
+        [
+            ["TCA_KIND", "u32"],
+            [
+                "TCA_OPTIONS",
+                {"attrs": [["TCA_U32_SEL", {"keys": keys}], ["TCA_U32_CLASSID", classid]]},
+            ],
+        ],
+        handle=handle,
+        parent=0x1A1A0000,
+        info=(prio << 16) | int.from_bytes(protocol.to_bytes(2, "big"), "little"),
+    )
+
+
+class IPRouteStub:
+    def __init__(self, qdiscs=(), classes=(), filters=()):
+        self.__qdiscs = list(qdiscs)
+        self.__classes = list(classes)
+        self.__filters = list(filters)
+
+    def link_lookup(self, ifname):
+        return [IFINDEX] if ifname == DEVICE else []
+
+    def get_qdiscs(self, index):
+        return self.__qdiscs
+
+    def get_classes(self, index):
+        return self.__classes
+
+    def get_filters(self, index, parent=None):
+        return self.__filters
+
+
+def select_all(read):
+    store = TcRecordStore()
+
+    read(store)
+
+    return (
+        [f.as_dict() for f in store.filters],
+        [q.as_dict() for q in store.qdiscs],
+        [c.as_dict() for c in store.classes],
+    )
+
+
+class Test_format_tc_handle:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [0x1A1A0000, "1a1a:"],
+            [0x1A1A0002, "1a1a:2"],
+            [0x00000001, ":1"],
+            [0xFFFFFFFF, "root"],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert format_tc_handle(value) == expected
+
+
+class Test_format_u32_filter_handle:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [0x80000800, "800::800"],
+            [0x80100800, "801::800"],
+            [0x80000000, "800:"],
+            [0x80001002, "800:1:2"],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert format_u32_filter_handle(value) == expected
+
+
+class Test_format_value:
+    @pytest.mark.parametrize(
+        ["method", "value", "expected"],
+        [
+            [format_rate, 125000, "1Mbit"],
+            [format_rate, 4000000000, "32Gbit"],
+            [format_rate, 187500, "1500Kbit"],
+            [format_rate, 100, "800bit"],
+            [format_time, 10000, "10ms"],
+            [format_time, 2500, "2.5ms"],
+            [format_time, 1500000, "1.5s"],
+            [format_time, 100, "100us"],
+            [format_percent, percent2u32(1), "1%"],
+            [format_percent, percent2u32(0.5), "0.5%"],
+        ],
+    )
+    def test_normal(self, method, value, expected):
+        assert method(value) == expected
+
+
+class Test_to_aligned_u32_words:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [[(0xC0A80000, 0xFFFFFF00, 16)], {16: (0xC0A80000, 0xFFFFFF00)}],
+            [[(0x1F900000, 0xFFFF0000, 22)], {20: (0x00001F90, 0x0000FFFF)}],
+            [
+                [(0x04D20000, 0xFFFF0000, 20), (0x1F900000, 0xFFFF0000, 22)],
+                {20: (0x04D21F90, 0xFFFFFFFF)},
+            ],
+            [[(0, 0, 16)], {}],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert to_aligned_u32_words(value) == expected
+
+
+class Test_TcNetlinkDumpReader_read:
+    def test_normal_ipv4(self):
+        ipr = IPRouteStub(
+            qdiscs=[
+                make_tcmsg(
+                    [
+                        ["TCA_KIND", "htb"],
+                        ["TCA_OPTIONS", {"attrs": [["TCA_HTB_DIRECT_QLEN", 32]]}],
+                    ],
+                    handle=0x1A1A0000,
+                    parent=0xFFFFFFFF,
+                ),
+                make_tcmsg(
+                    [
+                        ["TCA_KIND", "netem"],
+                        [
+                            "TCA_OPTIONS",
+                            {
+                                "delay": int(10000 * tick_in_usec),
+                                "limit": 1000,
+                                "loss": percent2u32(1),
+                                "gap": 0,
+                                "duplicate": percent2u32(0.5),
+                                "jitter": int(2000 * tick_in_usec),
+                                "attrs": [
+                                    [
+                                        "TCA_NETEM_CORRUPT",
+                                        {"prob_corrupt": percent2u32(0.1), "corr_corrupt": 0},
+                                    ]
+                                ],
+                            },
+                        ],
+                    ],
+                    handle=0x28730000,
+                    parent=0x1A1A0002,
+                ),
+            ],
+            classes=[
+                make_tcmsg(
+                    [
+                        ["TCA_KIND", "htb"],
+                        [
+                            "TCA_OPTIONS",
+                            {"attrs": [["TCA_HTB_PARMS", {"rate": 125000, "ceil": 125000}]]},
+                        ],
+                    ],
+                    handle=0x1A1A0002,
+                    parent=0xFFFFFFFF,
+                )
+            ],
+            filters=[
+                make_u32_filter(
+                    0x0800,
+                    5,
+                    0x80000800,
+                    [
+                        "0x0a000001/0xffffffff+12",
+                        "0xc0a80000/0xffffff00+16",
+                        "0x00001f90/0x0000ffff+20",
+                    ],
+                    0x1A1A0002,
+                ),
+                make_tcmsg(
+                    [
+                        ["TCA_KIND", "fw"],
+                        ["TCA_OPTIONS", {"attrs": [["TCA_FW_CLASSID", 0x1A1A0003]]}],
+                    ],
+                    handle=12,
+                    parent=0x1A1A0000,
+                    info=(7 << 16) | 0x0008,
+                ),
+            ],
+        )
+
+        actual_filters, actual_qdiscs, actual_classes = select_all(
+            lambda store: TcNetlinkDumpReader(store, 4, ipr).read(DEVICE)
+        )
+
+        def parse_text(store):
+            TcClassParser(store).parse(
+                DEVICE,
+                "class htb 1a1a:2 root prio 0 rate 1Mbit ceil 1Mbit burst 1600b cburst 1600b",
+            )
+            TcFilterParser(store, 4).parse(
+                DEVICE,
+                """filter parent 1a1a: protocol ip pref 5 u32 chain 0
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800: ht divisor 1
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 flowid 1a1a:2 not_in_hw
+  match 0a000001/ffffffff at 12
+  match c0a80000/ffffff00 at 16
+  match 00001f90/0000ffff at 20""",
+            )
+            store.add_filter(FilterRecord(device=DEVICE, classid="1a1a:3", handle=12))
+            TcQdiscParser(store).parse(
+                DEVICE,
+                """qdisc htb 1a1a: root refcnt 2 r2q 10 default 0x1 direct_packets_stat 0 direct_qlen 32
+qdisc netem 2873: parent 1a1a:2 limit 1000 delay 10ms  2ms loss 1% duplicate 0.5% corrupt 0.1%""",
+            )
+
+        expected_filters, expected_qdiscs, expected_classes = select_all(parse_text)
+
+        assert actual_filters == expected_filters
+        assert actual_qdiscs == expected_qdiscs
+        assert actual_classes == expected_classes
+
+    def test_normal_ipv6(self):
+        ipr = IPRouteStub(
+            filters=[
+                make_u32_filter(
+                    0x86DD,
+                    6,
+                    0x80100800,
+                    [
+                        "0x20010db8/0xffffffff+24",
+                        "0x0/0xffff0000+28",
+                        "0x04d20000/0xffff0000+40",
+                    ],
+                    0x1A1A0002,
+                )
+            ]
+        )
+
+        actual_filters, _, _ = select_all(
+            lambda store: TcNetlinkDumpReader(store, 6, ipr).read(DEVICE)
+        )
+
+        assert actual_filters == [
+            FilterRecord(
+                device=DEVICE,
+                filter_id="801::800",
+                flowid="1a1a:2",
+                protocol="ipv6",
+                priority=6,
+                src_network="::/0",
+                dst_network="2001:db8::/48",
+                src_port=1234,
+                dst_port=None,
+            ).as_dict()
+        ]
+
+    def test_exception(self):
+        with pytest.raises(NetworkInterfaceNotFoundError):
+            TcNetlinkDumpReader(TcRecordStore(), 4, IPRouteStub()).read("not-exist")
@@ -0,0 +1,177 @@
+import pytest
+
+import tcconfig.parser._qdisc
+from tcconfig.parser._qdisc import TcQdiscParser, tokenize_qdisc_line
+from tcconfig.parser._store import TcRecordStore
+
+
+DEVICE = "eth0"
+
+# outputs of 'tc qdisc show' that the tokenizer results are compared with the grammar results
+GOLDEN_OUTPUTS = [
+    """qdisc htb 1f87: root refcnt 2 r2q 10 default 1 direct_packets_stat 1 direct_qlen 1000
+qdisc netem 2007: parent 1f87:2 limit 1000 delay 1.0ms loss 0.01%""",
+    """qdisc htb 1a1a: root refcnt 2 r2q 10 default 0x1 direct_packets_stat 0 direct_qlen 32
+qdisc netem 2873: parent 1a1a:2 limit 1000 delay 10ms  2ms loss 1% duplicate 0.5% corrupt 0.1%
+qdisc netem 2874: parent 1a1a:3 limit 1000 delay 0.5s  1.0ms 25% reorder 10% 50% gap 5
+qdisc netem 2875: parent 1a1a:4 limit 1000 delay 500us loss 5% 25%
+qdisc ingress ffff: parent ffff:fff1 ----------------""",
+    """qdisc htb 1a1a: root refcnt 2 r2q 10 default 1 direct_packets_stat 0 ver 3.17 direct_qlen 1000
+qdisc tbf 20: parent 1a1a:2 rate 1Mbit burst 32Kb lat 50ms
+qdisc tbf 21: parent 1a1a:3 rate 800bit burst 1600b peakrate 2Mbit minburst 1600b lat 10.0ms""",
+    """qdisc prio 1a1a: root refcnt 2 bands 3 priomap  1 2 2 2 1 2 0 0 1 1 1 1 1 1 1 1
+qdisc netem 2873: parent 1a1a:1 limit 1000 delay 10.0ms ecn rate 1Gbit
+qdisc netem 2874: parent 1a1a:2 limit 1000 rate 100Kbit packetoverhead 4 cellsize 10""",
+    # lines that the tokenizer falls back to the grammar
+    """qdisc netem 2873: parent 1a1a:2 limit 1000 loss state p13 5% p31 95%
+qdisc netem 2874: parent 1a1a:3 limit 1000 delay
+qdisc netem 2875 parent 1a1a:4 limit 1000 delay 10ms""",
+]
+
+
+def parse(text):
+    parser = TcQdiscParser(TcRecordStore())
+    parser.parse(DEVICE, text)
+
+    return parser.store.qdiscs
+
+
+def parse_with_grammar(monkeypatch, text):
+    def raise_value_error(line):
+        raise ValueError("tokenizer disabled")
+
+    with monkeypatch.context() as m:
+        m.setattr(tcconfig.parser._qdisc, "tokenize_qdisc_line", raise_value_error)
+        return parse(text)
+
+
+class Test_tokenize_qdisc_line:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [
+                "qdisc htb 1a1a: root refcnt 2 r2q 10 default 0x1 direct_packets_stat 0 "
+                "direct_qlen 32",
+                (
+                    "htb",
+                    {
+                        "handle": "1a1a:",
+                        "root": True,
+                        "refcnt": "2",
+                        "r2q": "10",
+                        "default": "0x1",
+                        "direct_packets_stat": "0",
+                        "direct_qlen": "32",
+                    },
+                ),
+            ],
+            [
+                "qdisc netem 2873: parent 1a1a:2 limit 1000 delay 10ms  2ms 25% loss 1% "
+                "duplicate 0.5% corrupt 0.1% reorder 10% 50% gap 5",
+                (
+                    "netem",
+                    {
+                        "handle": "2873:",
+                        "parent": "1a1a:2",
+                        "limit": "1000",
+                        "delay": "10ms",
+                        "delay-distro": "2ms",
+                        "delay-correlation": "25%",
+                        "loss": "1%",
+                        "duplicate": "0.5%",
+                        "corrupt": "0.1%",
+                        "reorder": "10%",
+                        "reorder-correlation": "50%",
+                        "gap": "5",
+                    },
+                ),
+            ],
+            [
+                "qdisc netem 2873: parent 1a1a:2 limit 1000 delay 10ms slot 1ms 2ms packets 10 "
+                "bytes 1500 ecn rate 1Mbit packetoverhead -4 cellsize 10 seed 42",
+                (
+                    "netem",
+                    {
+                        "handle": "2873:",
+                        "parent": "1a1a:2",
+                        "limit": "1000",
+                        "delay": "10ms",
+                        "slot": "1ms",
+                        "slot-max": "2ms",
+                        "packets": "10",
+                        "bytes": "1500",
+                        "ecn": True,
+                        "rate": "1Mbit",
+                        "packetoverhead": "-4",
+                        "cellsize": "10",
+                        "seed": "42",
+                    },
+                ),
+            ],
+            [
+                "qdisc tbf 20: parent 1a1a:2 rate 1Mbit burst 32Kb lat 50ms",
+                (
+                    "tbf",
+                    {
+                        "handle": "20:",
+                        "parent": "1a1a:2",
+                        "rate": "1Mbit",
+                        "burst": "32Kb",
+                        "lat": "50ms",
+                    },
+                ),
+            ],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert tokenize_qdisc_line(value) == expected
+
+    @pytest.mark.parametrize(
+        ["value"],
+        [
+            [""],
+            ["class htb 1a1a:1 root rate 1Gbit"],
+            ["qdisc netem 2873 parent 1a1a:2"],
+            ["qdisc netem 2873: parent 1a1a:2 limit 1000 delay"],
+            ["qdisc netem 2873: parent 1a1a:2 loss state p13 5%"],
+            ["qdisc netem 2873: parent 1a1a:2 slot 1ms packets 10"],
+        ],
+    )
+    def test_exception(self, value):
+        with pytest.raises(ValueError):
+            tokenize_qdisc_line(value)
+
+
+class Test_TcQdiscParser_golden:
+    @pytest.mark.parametrize(["text"], [[text] for text in GOLDEN_OUTPUTS])
+    def test_normal(self, monkeypatch, text):
+        expected = parse_with_grammar(monkeypatch, text)
+
+        assert expected
+        assert parse(text) == expected
+
+    def test_normal_slot(self):
+        # jitter of delay is not mistaken for the words of the following options
+        qdiscs = parse("qdisc netem 2873: parent 1a1a:2 limit 1000 delay 10.0ms slot 1ms 2ms")
+
+        assert len(qdiscs) == 1
+        assert qdiscs[0].delay == "10.0ms"
+        assert qdiscs[0].delay_distro is None
+
+    def test_normal_many_qdiscs(self, monkeypatch):
+        text = "\n".join(
+            [
+                "qdisc htb 1a1a: root refcnt 2 r2q 10 default 1 direct_packets_stat 0 "
+                "direct_qlen 1000"
+            ]
+            + [
+                f"qdisc netem {i + 0x2000:x}: parent 1a1a:{i + 2:x} limit 1000 "
+                f"delay {i % 100:d}.0ms  1.0ms loss {i % 10:d}% rate {i:d}Kbit"
+                for i in range(300)
+            ]
+        )
+
+        qdiscs = parse(text)
+
+        assert len(qdiscs) == 300
+        assert qdiscs == parse_with_grammar(monkeypatch, text)
@@ -0,0 +1,149 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import ipaddress
+
+import pytest
+
+from tcconfig._rule_compiler import parse_filter_key
+from tcconfig.parser._rule_index import Flow, ShapingRuleIndex, parse_flow
+
+
+def make_index(ip_version, rules):
+    rule_index = ShapingRuleIndex(ip_version)
+    for filter_key, priority in rules:
+        rule_index.add(filter_key, parse_filter_key(filter_key), priority)
+
+    return rule_index
+
+
+IPV4_RULES = [
+    ("dst_network=192.168.0.5/32, protocol=ip", 1),
+    ("dst_network=10.0.0.0/8, protocol=ip", 5),
+    ("dst_network=10.1.0.0/16, dst_port=443, protocol=ip", 5),
+    ("dst_network=192.168.0.0/24, protocol=ip", 5),
+    ("src_network=172.16.0.0/12, dst_network=192.168.1.0/24, protocol=ip", 5),
+    ("dst_network=10.2.0.0/16, dst_port=1000-2000, ip_proto=udp, protocol=ip", 13),
+    ("src_port=53, protocol=ip", 5),
+]
+
+
+class Test_parse_flow:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [
+                ["dst=10.0.0.5:443"],
+                Flow(ipaddress.ip_address("10.0.0.5"), 443, None, None, None),
+            ],
+            [
+                ["dst=10.0.0.5", "src=192.168.0.1:1234", "proto=tcp"],
+                Flow(
+                    ipaddress.ip_address("10.0.0.5"),
+                    None,
+                    ipaddress.ip_address("192.168.0.1"),
+                    1234,
+                    "tcp",
+                ),
+            ],
+            [
+                "dst=[2001:db8::1]:443,proto=udp",
+                Flow(ipaddress.ip_address("2001:db8::1"), 443, None, None, "udp"),
+            ],
+            [
+                ["src=2001:db8::1"],
+                Flow(None, None, ipaddress.ip_address("2001:db8::1"), None, None),
+            ],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert parse_flow(value) == expected
+
+    @pytest.mark.parametrize(
+        ["value"],
+        [
+            [["proto=tcp"]],
+            [["dport=80"]],
+            [["dst=10.0.0.0/8"]],
+            [["dst=10.0.0.5", "src=2001:db8::1"]],
+            [["dst=10.0.0.5", "proto=gre"]],
+        ],
+    )
+    def test_exception(self, value):
+        with pytest.raises(ValueError):
+            parse_flow(value)
+
+
+class Test_ShapingRuleIndex_lookup:
+    @pytest.mark.parametrize(
+        ["flow", "expected"],
+        [
+            # filters of the same priority are evaluated in the order they are added
+            ["dst=10.1.2.3:443", "dst_network=10.0.0.0/8, protocol=ip"],
+            # filters of a lower priority number are evaluated first
+            ["dst=192.168.0.5", "dst_network=192.168.0.5/32, protocol=ip"],
+            ["dst=192.168.0.6", "dst_network=192.168.0.0/24, protocol=ip"],
+            [
+                "dst=192.168.1.1 src=172.16.1.1",
+                "src_network=172.16.0.0/12, dst_network=192.168.1.0/24, protocol=ip",
+            ],
+            ["dst=192.168.1.1 src=192.168.0.1", None],
+            [
+                "dst=10.2.0.1:1500 proto=udp",
+                "dst_network=10.0.0.0/8, protocol=ip",
+            ],
+            ["dst=8.8.8.8 src=8.8.4.4:53", "src_port=53, protocol=ip"],
+            ["src=8.8.4.4:53", "src_port=53, protocol=ip"],
+            ["dst=8.8.8.8", None],
+        ],
+    )
+    def test_normal(self, flow, expected):
+        assert make_index(4, IPV4_RULES).lookup(parse_flow(flow)) == expected
+
+    @pytest.mark.parametrize(
+        ["flow", "expected"],
+        [
+            [
+                "dst=10.2.0.1:1500 proto=udp",
+                "dst_network=10.2.0.0/16, dst_port=1000-2000, " "ip_proto=udp, protocol=ip",
+            ],
+            ["dst=10.2.0.1:1500 proto=tcp", None],
+            ["dst=10.2.0.1:2001 proto=udp", None],
+        ],
+    )
+    def test_normal_flower(self, flow, expected):
+        rules = [rule for rule in IPV4_RULES if "10.0.0.0/8" not in rule[0]]
+
+        assert make_index(4, rules).lookup(parse_flow(flow)) == expected
+
+    def test_normal_ipv6(self):
+        rule_index = make_index(
+            6,
+            [
+                ("dst_network=2001:db8::/32, protocol=ipv6", 6),
+                ("dst_network=2001:db8:1::/48, dst_port=80, protocol=ipv6", 6),
+            ],
+        )
+
+        assert (
+            rule_index.lookup(parse_flow("dst=[2001:db8:1::1]:80"))
+            == "dst_network=2001:db8::/32, protocol=ipv6"
+        )
+        assert rule_index.lookup(parse_flow("dst=2001:db9::1")) is None
+
+    def test_exception(self):
+        with pytest.raises(ValueError):
+            make_index(4, IPV4_RULES).lookup(parse_flow("dst=2001:db8::1"))
+
+    def test_normal_many_rules(self):
+        rules = [
+            (f"dst_network=10.{i // 256:d}.{i % 256:d}.0/24, protocol=ip", 5) for i in range(50000)
+        ]
+        rule_index = make_index(4, rules)
+
+        assert len(rule_index) == 50000
+        assert (
+            rule_index.lookup(parse_flow("dst=10.195.79.1"))
+            == "dst_network=10.195.79.0/24, protocol=ip"
+        )
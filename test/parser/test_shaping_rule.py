@@ -4,8 +4,12 @@ import pytest
 
 import tcconfig
 import tcconfig.parser.shaping_rule
-from tcconfig._const import TrafficDirection
+from tcconfig._const import TcCommandOutput, TcSubCommand, TrafficDirection
+from tcconfig._iptables import IptablesMangleController, IptablesMangleMarkEntry
 from tcconfig._netem_param import NetemParameter
+from tcconfig._nftables import NftablesMarkController
+from tcconfig._tc_command_helper import get_tc_show_command
+from tcconfig._tc_snapshot import clear_snapshot, set_snapshot
 from tcconfig.traffic_control import TrafficControl, delete_all_rules
 
 from ..common import NullLogger, print_test_result
@@ -86,3 +90,69 @@ class Test_TcShapingRuleParser:
 
         print_test_result(expected=expected, actual=result)
         assert result == expected
+
+
+class Test_TcShapingRuleParser_mark:
+    DEVICE = "mark0"
+    TC_OUTPUTS = {
+        TcSubCommand.QDISC: """\
+qdisc htb 1a1a: root refcnt 2 r2q 10 default 1 direct_packets_stat 0 direct_qlen 1000
+qdisc netem 2000: parent 1a1a:2 limit 1000 delay 1.0ms
+qdisc netem 2001: parent 1a1a:3 limit 1000 delay 2.0ms
+""",
+        TcSubCommand.CLASS: """\
+class htb 1a1a:1 root rate 1Gbit ceil 1Gbit burst 1375b cburst 1375b
+class htb 1a1a:2 parent 1a1a:1 leaf 2000: prio 0 rate 1Mbit ceil 1Mbit burst 1600b cburst 1600b
+class htb 1a1a:3 parent 1a1a:1 leaf 2001: prio 0 rate 2Mbit ceil 2Mbit burst 1600b cburst 1600b
+""",
+        TcSubCommand.FILTER: """\
+filter parent 1a1a: protocol ip pref 1 fw chain 0
+filter parent 1a1a: protocol ip pref 1 fw chain 0 handle 0x65 classid 1a1a:2
+filter parent 1a1a: protocol ip pref 1 fw chain 0 handle 0x66 classid 1a1a:3
+""",
+    }
+
+    @pytest.fixture(autouse=True)
+    def snapshot(self):
+        clear_snapshot()
+        for subcommand, text in self.TC_OUTPUTS.items():
+            for is_json in (False, True):
+                set_snapshot(
+                    self.DEVICE, get_tc_show_command(subcommand, self.DEVICE, is_json=is_json), text
+                )
+
+        yield
+
+        clear_snapshot()
+
+    def test_normal_failed_controller(self, monkeypatch):
+        calls = []
+
+        def get_iptables_mark(self, mark_id):
+            calls.append(("iptables", mark_id))
+            raise OSError("iptables-nft failed")
+
+        def get_nftables_mark(self, mark_id):
+            calls.append(("nftables", mark_id))
+            return IptablesMangleMarkEntry(
+                ip_version=4,
+                mark_id=mark_id,
+                source=None,
+                destination=f"10.0.{mark_id - 0x65:d}.0/24",
+                chain="OUTPUT",
+            )
+
+        monkeypatch.setattr(IptablesMangleController, "get_mangle_mark", get_iptables_mark)
+        monkeypatch.setattr(NftablesMarkController, "get_mangle_mark", get_nftables_mark)
+
+        tc_param = tcconfig.parser.shaping_rule.TcShapingRuleParser(
+            device=self.DEVICE,
+            ip_version=4,
+            logger=NullLogger(),
+            tc_command_output=TcCommandOutput.STDOUT,
+        ).get_tc_parameter()
+
+        assert len(tc_param[self.DEVICE][TrafficDirection.OUTGOING]) == 2
+
+        # iptables is not retried after the failure
+        assert calls == [("iptables", 0x65), ("nftables", 0x65), ("nftables", 0x66)]
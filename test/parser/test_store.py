@@ -0,0 +1,114 @@
+import pytest
+from simplesqlite import connect_memdb
+
+from tcconfig.parser._model import Filter, Qdisc
+from tcconfig.parser._store import ClassRecord, FilterRecord, QdiscRecord, TcRecordStore
+
+
+DEVICE = "eth0"
+
+
+@pytest.fixture
+def store():
+    store = TcRecordStore()
+
+    store.add_filter(
+        FilterRecord(
+            device=DEVICE,
+            filter_id="800::800",
+            flowid="1a1a:2",
+            protocol="ip",
+            priority=5,
+            dst_network="192.168.0.0/24",
+            dst_port="80",
+        )
+    )
+    store.add_filter(
+        FilterRecord(device=DEVICE, filter_id="800::801", flowid="1a1a:3", protocol="ip")
+    )
+    store.add_filter(FilterRecord(device="ifb0", filter_id="800::800", flowid="1a1a:2"))
+    store.add_qdisc(
+        QdiscRecord(
+            **{
+                "device": DEVICE,
+                "parent": "1a1a:2",
+                "handle": "2873:",
+                "delay": "10ms",
+                "delay-distro": "2ms",
+                "limit": "1000",
+            }
+        )
+    )
+    store.add_class(ClassRecord(device=DEVICE, classid="1a1a:2", rate="1Mbps"))
+
+    return store
+
+
+class Test_FilterRecord:
+    def test_normal(self):
+        record = FilterRecord(device=DEVICE, priority="5", dst_port=80, unknown="value")
+
+        assert record.priority == 5
+        assert record.dst_network is None
+        assert record.as_dict() == {"device": DEVICE, "priority": 5, "dst_port": 80}
+        assert record == FilterRecord(device=DEVICE, priority=5, dst_port=80)
+        assert record != FilterRecord(device=DEVICE, priority=5)
+        assert repr(record) == "FilterRecord (device=eth0, priority=5, dst_port=80)"
+
+    def test_normal_column_name(self):
+        record = QdiscRecord(**{"device": DEVICE, "delay-distro": "2ms"})
+
+        assert record.delay_distro == "2ms"
+        assert record.as_dict() == {"device": DEVICE, "delay-distro": "2ms"}
+
+
+class Test_TcRecordStore:
+    def test_normal_join(self, store):
+        assert [record.filter_id for record in store.get_filters(DEVICE)] == [
+            "800::800",
+            "800::801",
+        ]
+        assert [record.handle for record in store.get_qdiscs(DEVICE, "1a1a:2")] == ["2873:"]
+        assert store.get_qdiscs("ifb0", "1a1a:2") == []
+        assert store.get_class(DEVICE, "1a1a:2").rate == "1Mbps"
+        assert store.get_class(DEVICE, "1a1a:3") is None
+
+    @pytest.mark.parametrize(
+        ["conditions", "expected"],
+        [
+            [{"device": DEVICE, "dst_network": "192.168.0.0/24", "dst_port": 80}, ["800::800"]],
+            [{"device": DEVICE, "dst_network": "192.168.0.0/24", "dst_port": "80"}, ["800::800"]],
+            [{"device": DEVICE, "dst_network": None, "dst_port": None}, ["800::801"]],
+            [{"filter_id": "800::800"}, ["800::800", "800::800"]],
+            [{"device": "ifb1"}, []],
+        ],
+    )
+    def test_normal_find_filters(self, store, conditions, expected):
+        assert [record.filter_id for record in store.find_filters(conditions)] == expected
+
+    def test_normal_to_sqlite(self, store):
+        con = store.to_sqlite(connect_memdb())
+
+        assert [record.as_dict() for record in Filter.select()] == [
+            record.as_dict() for record in store.filters
+        ]
+        assert [record.delay_distro for record in Qdisc.select()] == ["2ms"]
+        assert con.select_as_dict(table_name="class") == [
+            {"device": DEVICE, "classid": "1a1a:2", "rate": "1Mbps"}
+        ]
+
+        indexes = con.execute_query(
+            "SELECT tbl_name, sql FROM sqlite_master WHERE type='index'"
+        ).fetchall()
+        assert {
+            (table_name, sql.rsplit("(", 1)[-1].strip('")')) for table_name, sql in indexes
+        } == {
+            ("filter", "device"),
+            ("filter", "flowid"),
+            ("filter", "classid"),
+            ("filter", "filter_id"),
+            ("qdisc", "device"),
+            ("qdisc", "parent"),
+            ("class", "device"),
+            ("class", "classid"),
+        }
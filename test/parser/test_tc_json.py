@@ -0,0 +1,136 @@
+import pytest
+
+from tcconfig.parser._class import TcClassParser
+from tcconfig.parser._filter import TcFilterParser
+from tcconfig.parser._qdisc import TcQdiscParser
+from tcconfig.parser._store import TcRecordStore
+from tcconfig.parser._tc_json import TcJsonParser, load_tc_json
+
+
+DEVICE = "eth0"
+
+
+def select_all(parse):
+    store = TcRecordStore()
+
+    parse(store)
+
+    return (
+        [f.as_dict() for f in store.filters],
+        [q.as_dict() for q in store.qdiscs],
+        [c.as_dict() for c in store.classes],
+    )
+
+
+class Test_load_tc_json:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [None, None],
+            ["", []],
+            ["\n", []],
+            ["class htb 1a1a:2 root prio 0 rate 1Mbit ceil 1Mbit burst 1600b cburst 1600b", None],
+            ["[{", None],
+            [
+                '[{"kind":"htb","handle":"1a1a:","root":true}]',
+                [{"kind": "htb", "handle": "1a1a:", "root": True}],
+            ],
+            [
+                '[{"options":{"fh":"800::800","match":{"off":16},"match":{"off":12}}}]',
+                [{"options": {"fh": "800::800", "match": [{"off": 16}, {"off": 12}]}}],
+            ],
+            [
+                '[{"options":{"match":{"off":16},"actions":[{"order":1}]}}]',
+                [{"options": {"match": {"off": 16}, "actions": [{"order": 1}]}}],
+            ],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert load_tc_json(value) == expected
+
+
+class Test_TcJsonParser:
+    @pytest.mark.parametrize(
+        ["ip_version", "qdisc_json", "filter_json", "qdisc_text", "filter_text"],
+        [
+            [
+                4,
+                """[{"kind":"htb","handle":"1a1a:","root":true,"refcnt":2,"options":{"r2q":10,"default":"0x1","direct_packets_stat":0,"direct_qlen":32}},{"kind":"tbf","handle":"20:","parent":"1a1a:2","options":{"rate":125000,"burst":32768,"lat":50000}},{"kind":"ingress","handle":"ffff:","parent":"ffff:fff1","options":{}}]""",  # noqa
+                """[{"parent":"1a1a:","protocol":"ip","pref":5,"kind":"u32","chain":0},{"parent":"1a1a:","protocol":"ip","pref":5,"kind":"u32","chain":0,"options":{"fh":"800:","ht_divisor":1}},{"parent":"1a1a:","protocol":"ip","pref":5,"kind":"u32","chain":0,"options":{"fh":"800::800","order":2048,"key_ht":"800","bkt":"0","flowid":"1a1a:2","not_in_hw":true,"match":{"value":"c0a80000","mask":"ffffff00","offmask":"","off":16},"match":{"value":"a000001","mask":"ffffffff","offmask":"","off":12},"match":{"value":"1f90","mask":"ffff","offmask":"","off":20}}}]""",  # noqa
+                """qdisc htb 1a1a: root refcnt 2 r2q 10 default 0x1 direct_packets_stat 0 direct_qlen 32
+qdisc tbf 20: parent 1a1a:2 rate 1Mbit burst 32Kb lat 50ms
+qdisc ingress ffff: parent ffff:fff1 ----------------""",
+                """filter parent 1a1a: protocol ip pref 5 u32 chain 0
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800: ht divisor 1
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 *flowid 1a1a:2 not_in_hw
+  match c0a80000/ffffff00 at 16
+  match 0a000001/ffffffff at 12
+  match 00001f90/0000ffff at 20""",
+            ],
+            [
+                6,
+                """[{"kind":"htb","handle":"1a1a:","root":true,"refcnt":2,"options":{"r2q":10,"default":"0x1","direct_packets_stat":0,"direct_qlen":1000}},{"kind":"netem","handle":"2873:","parent":"1a1a:2","options":{"limit":1000,"delay":{"delay":0.01,"jitter":0.002},"loss-random":{"loss":1},"duplicate":{"duplicate":0.5},"corrupt":{"corrupt":0.1},"ecn":false,"gap":0}}]""",  # noqa
+                """[{"parent":"1a1a:","protocol":"ipv6","pref":6,"kind":"u32","chain":0},{"parent":"1a1a:","protocol":"ipv6","pref":6,"kind":"u32","chain":0,"options":{"fh":"801:","ht_divisor":1}},{"parent":"1a1a:","protocol":"ipv6","pref":6,"kind":"u32","chain":0,"options":{"fh":"801::800","order":2048,"key_ht":"801","bkt":"0","flowid":"1a1a:2","not_in_hw":true,"match":{"value":"20010db8","mask":"ffffffff","offmask":"","off":24},"match":{"value":"0","mask":"ffff0000","offmask":"","off":28},"match":{"value":"4d20000","mask":"ffff0000","offmask":"","off":40}}}]""",  # noqa
+                """qdisc htb 1a1a: root refcnt 2 r2q 10 default 0x1 direct_packets_stat 0 direct_qlen 1000
+qdisc netem 2873: parent 1a1a:2 limit 1000 delay 10ms  2ms loss 1% duplicate 0.5% corrupt 0.1%""",
+                """filter parent 1a1a: protocol ipv6 pref 6 u32 chain 0
+filter parent 1a1a: protocol ipv6 pref 6 u32 chain 0 fh 801: ht divisor 1
+filter parent 1a1a: protocol ipv6 pref 6 u32 chain 0 fh 801::800 order 2048 key ht 801 bkt 0 *flowid 1a1a:2 not_in_hw
+  match 20010db8/ffffffff at 24
+  match 00000000/ffff0000 at 28
+  match 04d20000/ffff0000 at 40""",
+            ],
+            [
+                4,
+                """[{"kind":"htb","handle":"1a1a:","root":true,"refcnt":2,"options":{"r2q":10,"default":"0x1","direct_packets_stat":0,"direct_qlen":32}},{"kind":"tbf","handle":"20:","parent":"1a1a:2","options":{"rate":125000,"burst":32768,"lat":50000}}]""",  # noqa
+                """[{"parent":"1a1a:","protocol":"ip","pref":13,"kind":"flower","chain":0},{"parent":"1a1a:","protocol":"ip","pref":13,"kind":"flower","chain":0,"options":{"handle":1,"classid":"1a1a:2","keys":{"eth_type":"ipv4","ip_proto":"tcp","dst_ip":"192.168.0.0/24","src_ip":"10.0.0.1","dst_port":{"start":1000,"end":2000},"src_port":80},"not_in_hw":true}},{"parent":"1a1a:","protocol":"ipv6","pref":14,"kind":"flower","chain":0},{"parent":"1a1a:","protocol":"ipv6","pref":14,"kind":"flower","chain":0,"options":{"handle":1,"classid":"1a1a:3","keys":{"eth_type":"ipv6","dst_ip":"2001:db8::/32"},"not_in_hw":true}}]""",  # noqa
+                """qdisc htb 1a1a: root refcnt 2 r2q 10 default 0x1 direct_packets_stat 0 direct_qlen 32
+qdisc tbf 20: parent 1a1a:2 rate 1Mbit burst 32Kb lat 50ms""",
+                """filter parent 1a1a: protocol ip pref 13 flower chain 0
+filter parent 1a1a: protocol ip pref 13 flower chain 0 handle 0x1 classid 1a1a:2
+  eth_type ipv4
+  ip_proto tcp
+  dst_ip 192.168.0.0/24
+  src_ip 10.0.0.1
+  dst_port 1000-2000
+  src_port 80
+  not_in_hw
+filter parent 1a1a: protocol ipv6 pref 14 flower chain 0
+filter parent 1a1a: protocol ipv6 pref 14 flower chain 0 handle 0x1 classid 1a1a:3
+  eth_type ipv6
+  dst_ip 2001:db8::/32
+  not_in_hw""",
+            ],
+        ],
+    )
+    def test_normal(self, ip_version, qdisc_json, filter_json, qdisc_text, filter_text):
+        def parse_json(store):
+            parser = TcJsonParser(store, ip_version)
+            parser.parse_filter(DEVICE, load_tc_json(filter_json))
+            parser.parse_qdisc(DEVICE, load_tc_json(qdisc_json))
+
+        def parse_text(store):
+            TcFilterParser(store, ip_version).parse(DEVICE, filter_text)
+            TcQdiscParser(store).parse(DEVICE, qdisc_text)
+
+        assert select_all(parse_json) == select_all(parse_text)
+
+    def test_normal_class(self):
+        def parse_json(store):
+            TcJsonParser(store, 4).parse_class(
+                DEVICE,
+                load_tc_json(
+                    '[{"class":"htb","handle":"1a1a:2","root":true,"leaf":"20:","prio":0,'
+                    '"rate":125000,"ceil":125000,"burst":1600,"cburst":1600},'
+                    '{"class":"tbf","handle":"20:1","parent":"20:"}]'
+                ),
+            )
+
+        def parse_text(store):
+            TcClassParser(store).parse(
+                DEVICE,
+                """class htb 1a1a:2 root leaf 20: prio 0 rate 1Mbit ceil 1Mbit burst 1600b cburst 1600b
+class tbf 20:1 parent 20:""",
+            )
+
+        assert select_all(parse_json) == select_all(parse_text)
@@ -0,0 +1,86 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import sys
+
+import pytest
+
+from tcconfig._argparse_wrapper import get_default_options, set_option_value
+from tcconfig._const import Classifier, TcCommandOutput
+from tcconfig.tcdel import get_arg_parser as get_tcdel_arg_parser
+from tcconfig.tcset import get_arg_parser as get_tcset_arg_parser
+
+
+class Test_device_argument:
+    @pytest.mark.parametrize(
+        ["args", "expected"],
+        [
+            [["eth0"], ["eth0"]],
+            [["eth0", "eth1"], ["eth0", "eth1"]],
+            [["-d", "eth0"], ["eth0"]],
+            [["-d", "eth0", "--device", "eth1"], ["eth0", "eth1"]],
+            [["eth0", "-d", "eth1"], ["eth0", "eth1"]],
+        ],
+    )
+    def test_normal(self, monkeypatch, args, expected):
+        # parsers must not depend on the command line of the process
+        monkeypatch.setattr(sys, "argv", ["tcset", "-d", "eth9"])
+
+        for get_arg_parser in (get_tcset_arg_parser, get_tcdel_arg_parser):
+            options = get_arg_parser().parse_args(args)
+
+            assert options.device == expected
+            assert not hasattr(options, "deprecated_device")
+
+    def test_exception(self):
+        with pytest.raises(SystemExit):
+            get_tcset_arg_parser().parse_args(["--rate", "1Mbps"])
+
+
+class Test_set_option_value:
+    @pytest.mark.parametrize(
+        ["name", "value", "dest", "expected"],
+        [
+            ["rate", "1Mbps", "bandwidth_rate", "1Mbps"],
+            ["dst-network", "192.168.0.0/24", "dst_network", "192.168.0.0/24"],
+            ["dst-port", 80, "dst_port", "80"],
+            ["classifier", Classifier.FLOWER, "classifier", Classifier.FLOWER],
+            ["ipv6", True, "is_ipv6", True],
+            ["add", True, "is_add_shaping_rule", True],
+            ["tc-command", True, "tc_command_output", TcCommandOutput.STDOUT],
+        ],
+    )
+    def test_normal(self, name, value, dest, expected):
+        parser = get_tcset_arg_parser()
+        options = get_default_options(parser)
+
+        set_option_value(parser, options, name, value)
+
+        assert getattr(options, dest) == expected
+
+    @pytest.mark.parametrize(
+        ["name", "value"],
+        [
+            ["not-exist", "1"],
+            ["classifier", "not-exist"],
+            ["dst-port", "80-abc"],
+            ["ipv6", "yes"],
+        ],
+    )
+    def test_exception(self, name, value):
+        parser = get_tcset_arg_parser()
+
+        with pytest.raises(ValueError):
+            set_option_value(parser, get_default_options(parser), name, value)
+
+
+class Test_get_default_options:
+    def test_normal(self):
+        options = get_default_options(get_tcset_arg_parser())
+
+        assert options.device is None
+        assert options.direction == "outgoing"
+        assert options.tc_command_output == TcCommandOutput.NOT_SET
+        assert options.is_add_shaping_rule is False
+        assert not hasattr(options, "help")
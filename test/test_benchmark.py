@@ -0,0 +1,95 @@
+import pytest
+
+from benchmarks import BenchmarkTarget, TcShowOutputGenerator, find_regressions, run_benchmark
+from benchmarks._runner import DEVICE, run_target
+from tcconfig._const import Tc, TcSubCommand, TrafficDirection
+from tcconfig._tc_command_helper import get_tc_show_command
+from tcconfig._tc_snapshot import get_snapshot
+
+
+def to_result(rules_per_sec, peak_memory):
+    return {
+        "target": BenchmarkTarget.FILTER,
+        "ip_version": 4,
+        "is_mark": False,
+        "num_rules": 100,
+        "rules_per_sec": rules_per_sec,
+        "peak_memory": peak_memory,
+    }
+
+
+class Test_TcShowOutputGenerator:
+    @pytest.mark.parametrize(
+        ["ip_version", "is_mark"],
+        [[4, False], [4, True], [6, False], [6, True]],
+    )
+    def test_normal(self, ip_version, is_mark):
+        num_rules = 20
+        generator = TcShowOutputGenerator(num_rules, ip_version=ip_version, is_mark=is_mark)
+
+        tc_param = run_target(BenchmarkTarget.SHAPING_RULE, generator)
+        out_rules = tc_param[DEVICE][TrafficDirection.OUTGOING]
+
+        assert len(out_rules) == num_rules
+        assert tc_param[DEVICE][TrafficDirection.INCOMING] == {}
+
+        # snapshots of the benchmark are not left to the process
+        assert get_snapshot(DEVICE, get_tc_show_command(TcSubCommand.FILTER, DEVICE)) is None
+
+        for rule_idx, (filter_key, shaping_rule) in enumerate(out_rules.items()):
+            assert f"{Tc.Param.DST_NETWORK}={generator.get_dst_network(rule_idx)}" in filter_key
+            assert shaping_rule["delay"] == f"{rule_idx % 100 + 1:d}.0ms"
+            assert shaping_rule["rate"] == f"{rule_idx % 1000 + 1:d}Mbps"
+
+            if not is_mark:
+                assert f"{Tc.Param.DST_PORT}={generator.get_dst_port(rule_idx)}" in filter_key
+
+    @pytest.mark.parametrize(
+        ["num_rules", "ip_version", "expected"],
+        [
+            [0, 4, ValueError],
+            [0xE000, 4, ValueError],
+            [1, 5, ValueError],
+        ],
+    )
+    def test_exception(self, num_rules, ip_version, expected):
+        with pytest.raises(expected):
+            TcShowOutputGenerator(num_rules, ip_version=ip_version)
+
+
+class Test_run_benchmark:
+    @pytest.mark.parametrize(["target"], [[target] for target in BenchmarkTarget.LIST])
+    def test_normal(self, target):
+        result = run_benchmark(target, 10, repeat=1)
+
+        assert result.target == target
+        assert result.num_rules == 10
+        assert result.rules_per_sec > 0
+        assert result.peak_memory > 0
+
+    def test_exception(self):
+        with pytest.raises(ValueError):
+            run_benchmark("unknown", 10)
+
+
+class Test_find_regressions:
+    @pytest.mark.parametrize(
+        ["result", "expected"],
+        [
+            [to_result(1000, 1000), 0],
+            [to_result(850, 1150), 0],
+            [to_result(700, 1000), 1],
+            [to_result(1000, 1300), 1],
+            [to_result(700, 1300), 2],
+        ],
+    )
+    def test_normal(self, result, expected):
+        regressions = find_regressions([result], [to_result(1000, 1000)], tolerance=0.2)
+
+        assert len(regressions) == expected
+
+    def test_normal_no_baseline(self):
+        baseline = to_result(1000, 1000)
+        baseline["num_rules"] = 1000
+
+        assert find_regressions([to_result(1, 1)], [baseline], tolerance=0.2) == []
@@ -0,0 +1,131 @@
+import errno
+import os
+import struct
+
+import pytest
+
+import tcconfig._capabilities
+from tcconfig._capabilities import _has_capabilies, clear_capability_cache, parse_file_capabilities
+
+
+CAP_NET_ADMIN = 1 << 12
+CAP_NET_RAW = 1 << 13
+
+
+def to_vfs_cap_data(magic_etc, permitted_list, rootid=None):
+    data = struct.pack("<I", magic_etc)
+    for permitted in permitted_list:
+        data += struct.pack("<II", permitted, 0)
+    if rootid is not None:
+        data += struct.pack("<I", rootid)
+
+    return data
+
+
+@pytest.fixture
+def bin_path(tmp_path):
+    bin_path = tmp_path / "tc"
+    bin_path.write_text("")
+
+    clear_capability_cache()
+    yield str(bin_path)
+    clear_capability_cache()
+
+
+class Test_parse_file_capabilities:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [to_vfs_cap_data(0x01000001, [CAP_NET_ADMIN]), (CAP_NET_ADMIN, True)],
+            [
+                to_vfs_cap_data(0x02000001, [CAP_NET_ADMIN | CAP_NET_RAW, 0]),
+                (CAP_NET_ADMIN | CAP_NET_RAW, True),
+            ],
+            [to_vfs_cap_data(0x02000000, [CAP_NET_ADMIN, 0]), (CAP_NET_ADMIN, False)],
+            [to_vfs_cap_data(0x02000001, [0, 1]), (1 << 32, True)],
+            [to_vfs_cap_data(0x03000001, [CAP_NET_ADMIN, 0], rootid=1000), (CAP_NET_ADMIN, True)],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert parse_file_capabilities(value) == expected
+
+    @pytest.mark.parametrize(
+        ["value"],
+        [
+            [b""],
+            [to_vfs_cap_data(0x04000001, [CAP_NET_ADMIN, 0])],
+            [to_vfs_cap_data(0x02000001, [CAP_NET_ADMIN])],
+        ],
+    )
+    def test_exception(self, value):
+        with pytest.raises(ValueError):
+            parse_file_capabilities(value)
+
+
+class Test_has_capabilies:
+    @pytest.mark.parametrize(
+        ["value", "capabilities", "expected"],
+        [
+            [
+                to_vfs_cap_data(0x02000001, [CAP_NET_ADMIN | CAP_NET_RAW, 0]),
+                ["cap_net_raw", "cap_net_admin"],
+                True,
+            ],
+            [to_vfs_cap_data(0x02000001, [CAP_NET_ADMIN, 0]), ["cap_net_admin"], True],
+            [
+                to_vfs_cap_data(0x02000001, [CAP_NET_ADMIN, 0]),
+                ["cap_net_raw", "cap_net_admin"],
+                False,
+            ],
+            [to_vfs_cap_data(0x02000000, [CAP_NET_ADMIN, 0]), ["cap_net_admin"], False],
+            [OSError(errno.ENODATA, "No data available"), ["cap_net_admin"], False],
+        ],
+    )
+    def test_normal(self, monkeypatch, bin_path, value, capabilities, expected):
+        def getxattr(path, name):
+            if isinstance(value, Exception):
+                raise value
+
+            return value
+
+        monkeypatch.setattr(os, "getxattr", getxattr)
+
+        assert _has_capabilies(bin_path, capabilities) == expected
+
+    def test_normal_cache(self, monkeypatch, bin_path):
+        read_paths = []
+
+        def getxattr(path, name):
+            read_paths.append(path)
+            return to_vfs_cap_data(0x02000001, [CAP_NET_ADMIN, 0])
+
+        monkeypatch.setattr(os, "getxattr", getxattr)
+
+        for _ in range(3):
+            assert _has_capabilies(bin_path, ["cap_net_admin"])
+        assert len(read_paths) == 1
+
+        # modifications of the binary invalidate the cache
+        stat = os.stat(bin_path)
+        os.utime(bin_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert _has_capabilies(bin_path, ["cap_net_admin"])
+        assert len(read_paths) == 2
+
+    def test_normal_fallback_getcap(self, monkeypatch, bin_path):
+        getcap_paths = []
+
+        def getxattr(path, name):
+            raise OSError(errno.ENOTSUP, "Operation not supported")
+
+        def has_capabilies_by_getcap(path, capabilities):
+            getcap_paths.append(path)
+            return True
+
+        monkeypatch.setattr(os, "getxattr", getxattr)
+        monkeypatch.setattr(
+            tcconfig._capabilities, "_has_capabilies_by_getcap", has_capabilies_by_getcap
+        )
+
+        assert _has_capabilies(bin_path, ["cap_net_admin"])
+        assert _has_capabilies(bin_path, ["cap_net_admin"])
+        assert getcap_paths == [os.path.realpath(bin_path)]
@@ -0,0 +1,40 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import pytest
+from humanreadable import ParameterError
+
+from tcconfig._common import split_port_range, to_port_range_str
+
+
+class Test_split_port_range:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [None, (None, None)],
+            ["", (None, None)],
+            [80, (80, None)],
+            ["80", (80, None)],
+            ["1000-2000", (1000, 2000)],
+            ["8080-8080", (8080, None)],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert split_port_range(value) == expected
+
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [["abc", ParameterError], ["2000-1000", ParameterError], ["1-2-3", ParameterError]],
+    )
+    def test_exception(self, value, expected):
+        with pytest.raises(expected):
+            split_port_range(value)
+
+
+class Test_to_port_range_str:
+    @pytest.mark.parametrize(
+        ["port", "max_port", "expected"], [[80, None, "80"], [1000, 2000, "1000-2000"]]
+    )
+    def test_normal(self, port, max_port, expected):
+        assert to_port_range_str(port, max_port) == expected
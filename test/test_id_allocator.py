@@ -0,0 +1,60 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import pytest
+
+from tcconfig.shaper._id_allocator import IdAllocator, clear_id_allocators, get_id_allocator
+
+
+class Test_IdAllocator_allocate:
+    @pytest.mark.parametrize(
+        ["used_ids", "start_ids", "expected"],
+        [
+            [[], [1, 1, 1], [1, 2, 3]],
+            [[1, 2, 4], [1, 1, 1], [3, 5, 6]],
+            [[40, 41], [1, 40, 40], [1, 42, 43]],
+            [[0x2873], [0x2873, 0x2873], [0x2874, 0x2875]],
+            [list(range(1, 1000)), [1], [1000]],
+        ],
+    )
+    def test_normal(self, used_ids, start_ids, expected):
+        allocator = IdAllocator(used_ids)
+
+        assert [allocator.allocate(start_id) for start_id in start_ids] == expected
+
+    @pytest.mark.parametrize(
+        ["used_ids", "max_id", "start_id", "expected"],
+        [
+            [[], 0xFFFF, -1, ValueError],
+            [[0xFFFE, 0xFFFF], 0xFFFF, 0xFFFE, ValueError],
+            [[1, 2, 3], 3, 1, ValueError],
+        ],
+    )
+    def test_exception(self, used_ids, max_id, start_id, expected):
+        with pytest.raises(expected):
+            IdAllocator(used_ids, max_id=max_id).allocate(start_id)
+
+
+class Test_get_id_allocator:
+    def test_normal(self):
+        extract_count = 0
+
+        def extract_used_ids():
+            nonlocal extract_count
+            extract_count += 1
+
+            return [1, 2]
+
+        try:
+            assert get_id_allocator(("eth0", "class"), extract_used_ids).allocate(1) == 3
+            assert get_id_allocator(("eth0", "class"), extract_used_ids).allocate(1) == 4
+            assert get_id_allocator(("eth1", "class"), extract_used_ids).allocate(1) == 3
+            assert extract_count == 2
+
+            clear_id_allocators()
+
+            assert get_id_allocator(("eth0", "class"), extract_used_ids).allocate(1) == 3
+            assert extract_count == 3
+        finally:
+            clear_id_allocators()
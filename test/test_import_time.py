@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+import pytest
+
+
+# dependencies that only the code paths of docker, SQLite, netlink and
+# --import-setting use: the commands must not import them at the startup
+LAZY_MODULES = ("docker", "pyroute2", "simplesqlite", "pyparsing")
+
+
+def import_modules(module_name):
+    """
+    :return: Names of the modules that ``python -X importtime`` reported.
+    """
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name:s}"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    # line format: 'import time: <self [us]> | <cumulative [us]> | <indented module name>'
+    return {
+        line.rsplit("|", 1)[-1].strip()
+        for line in proc.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+
+
+class Test_import_time:
+    @pytest.mark.parametrize(
+        ["module_name"], [["tcconfig.tcset"], ["tcconfig.tcdel"], ["tcconfig.tcshow"]]
+    )
+    def test_normal(self, module_name):
+        modules = import_modules(module_name)
+
+        assert module_name in modules
+        assert {module.split(".")[0] for module in modules}.isdisjoint(LAZY_MODULES)
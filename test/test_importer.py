@@ -0,0 +1,403 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import errno
+import json
+import sys
+
+import pytest
+
+import tcconfig.parser.shaping_rule
+import tcconfig.tcdel
+import tcconfig.tcset
+from tcconfig._const import TcCommandOutput
+from tcconfig._importer import TcConfigLoader, set_tc_from_file
+from tcconfig._logger import LogLevel, logger
+
+
+DEVICE = "eth0"
+CONFIG = {
+    DEVICE: {
+        "outgoing": {
+            "dst_network=192.168.0.0/24, protocol=ip": {"filter_id": "800::800", "rate": "1Mbps"},
+            "dst_network=192.168.1.0/24, dst_port=80, protocol=ip": {
+                "filter_id": "800::801",
+                "delay": "10.0ms",
+            },
+        },
+        "incoming": {"src_network=10.0.0.1/32, protocol=ip": {"loss": "1%"}},
+    }
+}
+
+
+class TcShapingRuleParserStub:
+    # tables of the devices for each IP version
+    current_tables = {}
+
+    def __init__(self, device, ip_version, logger, tc_command_output):
+        self.__device = device
+        self.__ip_version = ip_version
+
+    def get_tc_parameter(self):
+        return {self.__device: self.current_tables.get(self.__ip_version, {})}
+
+
+@pytest.fixture
+def parser_stub(monkeypatch):
+    monkeypatch.setattr(TcShapingRuleParserStub, "current_tables", {})
+    monkeypatch.setattr(
+        tcconfig.parser.shaping_rule, "TcShapingRuleParser", TcShapingRuleParserStub
+    )
+
+    return TcShapingRuleParserStub
+
+
+@pytest.fixture
+def loader(tmp_path):
+    config_path = tmp_path / "tcconfig.json"
+    config_path.write_text(json.dumps(CONFIG))
+
+    loader = TcConfigLoader(logger)
+    loader.load_tcconfig(str(config_path))
+
+    return loader
+
+
+class Test_TcConfigLoader_get_tcconfig_commands:
+    @pytest.mark.parametrize(
+        ["is_overwrite", "expected"],
+        [
+            [
+                False,
+                [
+                    "tcset eth0 --direction=outgoing --rate=1Mbps --dst-network=192.168.0.0/24",
+                    "tcset eth0 --direction=outgoing --delay=10.0ms "
+                    "--dst-network=192.168.1.0/24 --dst-port=80 --add",
+                    "tcset eth0 --direction=incoming --loss=1% --src-network=10.0.0.1/32",
+                ],
+            ],
+            [
+                True,
+                [
+                    "tcdel eth0 --all",
+                    "tcset eth0 --direction=outgoing --rate=1Mbps --dst-network=192.168.0.0/24",
+                    "tcset eth0 --direction=outgoing --delay=10.0ms "
+                    "--dst-network=192.168.1.0/24 --dst-port=80 --add",
+                    "tcset eth0 --direction=incoming --loss=1% --src-network=10.0.0.1/32",
+                ],
+            ],
+        ],
+    )
+    def test_normal(self, loader, is_overwrite, expected):
+        loader.is_overwrite = is_overwrite
+
+        assert loader.get_tcconfig_commands() == expected
+
+    @pytest.mark.parametrize(
+        ["current_table", "expected"],
+        [
+            [
+                {
+                    "outgoing": {
+                        "dst_network=192.168.0.0/24, protocol=ip": {
+                            "filter_id": "800::800",
+                            "rate": "1Mbps",
+                        },
+                        "dst_port=80, dst_network=192.168.1.0/24, protocol=ip": {
+                            "filter_id": "800::801",
+                            "delay": "20.0ms",
+                        },
+                        "dst_network=192.168.2.0/24, protocol=ip": {
+                            "filter_id": "800::802",
+                            "rate": "2Mbps",
+                        },
+                    },
+                    "incoming": {},
+                },
+                [
+                    "tcdel eth0 --direction=outgoing --dst-network=192.168.2.0/24",
+                    "tcset eth0 --direction=outgoing --delay=10.0ms "
+                    "--dst-network=192.168.1.0/24 --dst-port=80 --change",
+                    "tcset eth0 --direction=incoming --loss=1% --src-network=10.0.0.1/32",
+                ],
+            ],
+            [
+                {
+                    "outgoing": {
+                        "dst_network=192.168.2.0/24, protocol=ip": {
+                            "filter_id": "800::800",
+                            "rate": "2Mbps",
+                        },
+                    },
+                },
+                [
+                    "tcdel eth0 --all",
+                    "tcset eth0 --direction=outgoing --rate=1Mbps --dst-network=192.168.0.0/24",
+                    "tcset eth0 --direction=outgoing --delay=10.0ms "
+                    "--dst-network=192.168.1.0/24 --dst-port=80 --add",
+                    "tcset eth0 --direction=incoming --loss=1% --src-network=10.0.0.1/32",
+                ],
+            ],
+        ],
+    )
+    def test_normal_reconcile(self, parser_stub, loader, current_table, expected):
+        # IPv4 filters that the parser of IPv6 read are not the rules of the device
+        parser_stub.current_tables = {4: current_table, 6: current_table}
+        loader.is_reconcile = True
+
+        assert loader.get_tcconfig_commands() == expected
+
+    def test_exception_overwrite_reconcile(self, loader):
+        loader.is_overwrite = True
+        loader.is_reconcile = True
+
+        with pytest.raises(ValueError):
+            loader.get_tcconfig_commands()
+
+
+class Test_TcConfigLoader_reconcile_ipv6:
+    CONFIG = {
+        DEVICE: {
+            "outgoing": {
+                "dst_network=192.168.0.0/24, protocol=ip": {
+                    "filter_id": "800::800",
+                    "rate": "1Mbps",
+                },
+                "dst_network=2001:db8::/32, protocol=ipv6": {
+                    "filter_id": "800::800",
+                    "delay": "10ms",
+                },
+            },
+            "incoming": {},
+        }
+    }
+
+    @pytest.mark.parametrize(
+        ["current_tables", "expected"],
+        [
+            [
+                {
+                    4: {
+                        "outgoing": {
+                            "dst_network=192.168.0.0/24, protocol=ip": {
+                                "filter_id": "800::800",
+                                "rate": "1Mbps",
+                            },
+                        },
+                        "incoming": {},
+                    },
+                    6: {
+                        "outgoing": {
+                            "dst_network=2001:db8::/32, protocol=ipv6": {
+                                "filter_id": "800::800",
+                                "delay": "10ms",
+                            },
+                            "dst_network=2001:db8:1::/48, protocol=ipv6": {
+                                "filter_id": "800::801",
+                                "delay": "20ms",
+                            },
+                        },
+                        "incoming": {},
+                    },
+                },
+                ["tcdel eth0 --direction=outgoing --ipv6 --dst-network=2001:db8:1::/48"],
+            ],
+            [
+                {
+                    6: {
+                        "outgoing": {
+                            "dst_network=2001:db8::/32, protocol=ipv6": {
+                                "filter_id": "800::800",
+                                "delay": "20ms",
+                            },
+                        },
+                        "incoming": {},
+                    },
+                },
+                [
+                    "tcset eth0 --direction=outgoing --delay=10ms --ipv6 "
+                    "--dst-network=2001:db8::/32 --change",
+                    "tcset eth0 --direction=outgoing --rate=1Mbps "
+                    "--dst-network=192.168.0.0/24 --add",
+                ],
+            ],
+        ],
+    )
+    def test_normal(self, tmp_path, parser_stub, current_tables, expected):
+        config_path = tmp_path / "tcconfig.json"
+        config_path.write_text(json.dumps(self.CONFIG))
+        parser_stub.current_tables = current_tables
+
+        loader = TcConfigLoader(logger)
+        loader.load_tcconfig(str(config_path))
+        loader.is_reconcile = True
+
+        assert loader.get_tcconfig_commands() == expected
+
+
+class Test_TcConfigLoader_flower:
+    def test_normal(self, tmp_path):
+        config_path = tmp_path / "tcconfig.json"
+        config_path.write_text(
+            json.dumps(
+                {
+                    DEVICE: {
+                        "outgoing": {
+                            "dst_network=192.168.0.0/24, dst_port=1000-2000, ip_proto=tcp, "
+                            "protocol=ip": {"filter_id": "0x1", "rate": "1Mbps"},
+                        },
+                        "incoming": {},
+                    }
+                }
+            )
+        )
+
+        loader = TcConfigLoader(logger)
+        loader.load_tcconfig(str(config_path))
+
+        assert loader.get_tcconfig_commands() == [
+            "tcset eth0 --direction=outgoing --rate=1Mbps --dst-network=192.168.0.0/24 "
+            "--dst-port=1000-2000 --ip-proto=tcp --classifier=flower",
+        ]
+
+
+class Test_TcConfigLoader_network_set:
+    FILTER = "network_set=tc_nets_4e39e2, protocol=ip"
+    CONFIG = {DEVICE: {"outgoing": {FILTER: {"delay": "10ms", "rate": "1Mbps"}}, "incoming": {}}}
+
+    @pytest.fixture
+    def config_path(self, tmp_path):
+        config_path = tmp_path / "tcconfig.json"
+        config_path.write_text(json.dumps(self.CONFIG))
+
+        return str(config_path)
+
+    @pytest.mark.parametrize(["is_overwrite"], [[False], [True]])
+    def test_exception(self, config_path, is_overwrite):
+        loader = TcConfigLoader(logger)
+        loader.load_tcconfig(config_path)
+        loader.is_overwrite = is_overwrite
+
+        # the rule must not be widened to all of the traffic of the device
+        with pytest.raises(ValueError):
+            loader.get_tcconfig_commands()
+
+    def test_exception_set_tc_from_file(self, config_path):
+        assert set_tc_from_file(logger, config_path, False, TcCommandOutput.STDOUT) == errno.EINVAL
+
+    def test_normal_reconcile_unchanged(self, config_path, parser_stub):
+        parser_stub.current_tables = {
+            4: {"outgoing": {self.FILTER: {"delay": "10ms", "rate": "1Mbps"}}, "incoming": {}}
+        }
+
+        loader = TcConfigLoader(logger)
+        loader.load_tcconfig(config_path)
+        loader.is_reconcile = True
+
+        assert loader.get_tcconfig_commands() == []
+
+    def test_exception_reconcile_delete(self, config_path, parser_stub):
+        parser_stub.current_tables = {
+            4: {
+                "outgoing": {
+                    self.FILTER: {"delay": "10ms", "rate": "1Mbps"},
+                    "network_set=tc_nets_000000, protocol=ip": {"delay": "20ms"},
+                },
+                "incoming": {},
+            }
+        }
+
+        loader = TcConfigLoader(logger)
+        loader.load_tcconfig(config_path)
+        loader.is_reconcile = True
+
+        # tcdel without the filter would delete another rule
+        with pytest.raises(ValueError):
+            loader.get_tcconfig_commands()
+
+
+class MainStub:
+    options_list = []
+
+    def __init__(self, options):
+        self.options = options
+
+    def run(self, *args):
+        self.options_list.append(self.options)
+
+        return 0
+
+
+class Test_set_tc_from_file:
+    @pytest.fixture
+    def main_stub(self, monkeypatch):
+        monkeypatch.setattr(MainStub, "options_list", [])
+        monkeypatch.setattr(tcconfig.tcset, "TcSetMain", MainStub)
+        monkeypatch.setattr(tcconfig.tcdel, "TcDelMain", MainStub)
+
+        return MainStub
+
+    @pytest.fixture
+    def config_path(self, tmp_path):
+        config_path = tmp_path / "tcconfig.json"
+        config_path.write_text(json.dumps(CONFIG))
+
+        return str(config_path)
+
+    @pytest.mark.parametrize(
+        ["argv"],
+        [
+            [["tcset", "tcconfig.json", "--import-setting", "--overwrite", "--tc-command"]],
+            # the options must not depend on the command line of the process
+            [["tcset", "-d", "tcconfig.json", "--import-setting", "--overwrite", "--tc-command"]],
+        ],
+    )
+    def test_normal(self, monkeypatch, main_stub, config_path, argv):
+        monkeypatch.setattr(sys, "argv", argv)
+
+        assert (
+            set_tc_from_file(logger, config_path, True, TcCommandOutput.STDOUT, LogLevel.QUIET)
+            == 0
+        )
+
+        assert [
+            (
+                options.device,
+                getattr(options, "is_delete_all", None),
+                getattr(options, "direction", None),
+                getattr(options, "dst_network", None),
+                getattr(options, "dst_port", None),
+                getattr(options, "latency_time", None),
+                getattr(options, "is_add_shaping_rule", None),
+            )
+            for options in main_stub.options_list
+        ] == [
+            (["eth0"], True, "outgoing", None, None, None, None),
+            (["eth0"], None, "outgoing", "192.168.0.0/24", None, "0ms", False),
+            (["eth0"], None, "outgoing", "192.168.1.0/24", "80", "10.0ms", True),
+            (["eth0"], None, "incoming", None, None, "0ms", False),
+        ]
+        assert {options.tc_command_output for options in main_stub.options_list} == {
+            TcCommandOutput.STDOUT
+        }
+        assert {options.log_level for options in main_stub.options_list} == {LogLevel.QUIET}
+
+    @pytest.mark.parametrize(
+        ["params"],
+        [
+            [{"rate": "1Mbps", "delay-distribution": "not-exist"}],
+            [{"rate": "1Mbps", "iptables": "yes"}],
+        ],
+    )
+    def test_exception(self, tmp_path, main_stub, params):
+        config_path = tmp_path / "tcconfig.json"
+        config_path.write_text(
+            json.dumps({DEVICE: {"outgoing": {"dst_network=192.168.0.0/24, protocol=ip": params}}})
+        )
+
+        assert (
+            set_tc_from_file(logger, str(config_path), False, TcCommandOutput.STDOUT)
+            == errno.EINVAL
+        )
+        assert main_stub.options_list == []
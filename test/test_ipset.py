@@ -0,0 +1,182 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import pytest
+
+import tcconfig._ipset
+from tcconfig._ipset import (
+    NetworkSetController,
+    load_network_file,
+    make_network_set_name,
+    render_network_set_restore,
+    to_temp_set_name,
+)
+
+from .common import SubprocessRunnerStub
+
+
+class Test_make_network_set_name:
+    @pytest.mark.parametrize(
+        ["network_file", "ip_version", "expected_prefix"],
+        [
+            ["/etc/tcconfig/blocked.txt", 4, "tc_blocked_"],
+            ["/etc/tcconfig/blocked.txt", 6, "tc_blocked_"],
+            ["/etc/tcconfig/a very.long.file-name_of_networks.txt", 4, "tc_a_very_long_file-n_"],
+        ],
+    )
+    def test_normal(self, network_file, ip_version, expected_prefix):
+        set_name = make_network_set_name(network_file, ip_version)
+
+        assert set_name.startswith(expected_prefix)
+        assert len(set_name) <= 31
+        assert set_name == make_network_set_name(network_file, ip_version)
+
+    def test_normal_ip_version(self):
+        assert make_network_set_name("nets.txt", 4) != make_network_set_name("nets.txt", 6)
+
+
+class Test_load_network_file:
+    @pytest.mark.parametrize(
+        ["content", "ip_version", "expected"],
+        [
+            [
+                "10.0.0.0/8\n# comment\n192.168.1.5\n\n172.16.0.0/12  # inline\n",
+                4,
+                ["10.0.0.0/8", "192.168.1.5/32", "172.16.0.0/12"],
+            ],
+            ["2001:db8::/32\n::1\n", 6, ["2001:db8::/32", "::1"]],
+            ["# empty\n", 4, []],
+        ],
+    )
+    def test_normal(self, tmp_path, content, ip_version, expected):
+        network_file = tmp_path / "nets.txt"
+        network_file.write_text(content)
+
+        assert load_network_file(str(network_file), ip_version) == expected
+
+    @pytest.mark.parametrize(
+        ["content", "ip_version"],
+        [["10.0.0.0/8\ninvalid\n", 4], ["10.0.0.0/8\n", 6]],
+    )
+    def test_exception(self, tmp_path, content, ip_version):
+        network_file = tmp_path / "nets.txt"
+        network_file.write_text(content)
+
+        with pytest.raises(ValueError):
+            load_network_file(str(network_file), ip_version)
+
+
+class Test_to_temp_set_name:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            ["tc_test", "tc_test_n"],
+            [
+                make_network_set_name("/etc/a very.long.file-name_of_networks.txt", 4),
+                make_network_set_name("/etc/a very.long.file-name_of_networks.txt", 4) + "_n",
+            ],
+            ["a" * 31, "a" * 29 + "_n"],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert to_temp_set_name(value) == expected
+        assert len(to_temp_set_name(value)) <= 31
+
+
+class Test_render_network_set_restore:
+    @pytest.mark.parametrize(
+        ["networks", "ip_version", "is_set_exist", "expected"],
+        [
+            [
+                ["10.0.0.0/8", "192.168.1.5/32"],
+                4,
+                True,
+                [
+                    "create tc_test_n hash:net family inet maxelem 65536",
+                    "flush tc_test_n",
+                    "add tc_test_n 10.0.0.0/8",
+                    "add tc_test_n 192.168.1.5/32",
+                    "swap tc_test_n tc_test",
+                    "destroy tc_test_n",
+                ],
+            ],
+            [
+                ["2001:db8::/32"],
+                6,
+                False,
+                [
+                    "create tc_test hash:net family inet6 maxelem 65536",
+                    "create tc_test_n hash:net family inet6 maxelem 65536",
+                    "flush tc_test_n",
+                    "add tc_test_n 2001:db8::/32",
+                    "swap tc_test_n tc_test",
+                    "destroy tc_test_n",
+                ],
+            ],
+        ],
+    )
+    def test_normal(self, networks, ip_version, is_set_exist, expected):
+        assert (
+            render_network_set_restore("tc_test", networks, ip_version, is_set_exist=is_set_exist)
+            == expected
+        )
+
+    def test_normal_maxelem(self):
+        networks = [f"10.{i // 256:d}.{i % 256:d}.0/24" for i in range(70000)]
+
+        # the members of the current set are never added to the set: only the temporary set
+        # that created from scratch needs to store the networks
+        lines = render_network_set_restore("tc_test", networks, 4, is_set_exist=True)
+        assert lines[0] == "create tc_test_n hash:net family inet maxelem 70000"
+        assert not any(line.startswith("add tc_test ") for line in lines)
+
+
+IPSET_LIST_OUTPUT = """Name: tc_test
+Type: hash:net
+Revision: 7
+Header: family inet hashsize 1024 maxelem 65536 bucketsize 12 initval 0x8c1a2d8e
+Size in memory: 1352
+References: 0
+Number of entries: 3
+"""
+
+
+class Test_NetworkSetController:
+    @pytest.fixture(autouse=True)
+    def runner_stub(self, monkeypatch):
+        runner_stub = SubprocessRunnerStub(
+            {"list -terse tc_test": (0, IPSET_LIST_OUTPUT), "list -terse tc_new": (1, "")}
+        )
+        monkeypatch.setattr(tcconfig._ipset, "SubprocessRunner", runner_stub)
+        monkeypatch.setattr(
+            NetworkSetController,
+            "_NetworkSetController__check_execution_authority",
+            staticmethod(lambda: None),
+        )
+
+        return runner_stub
+
+    @pytest.mark.parametrize(
+        ["set_name", "is_set_exist"],
+        [
+            ["tc_test", True],
+            ["tc_new", False],
+        ],
+    )
+    def test_normal_restore(self, runner_stub, set_name, is_set_exist):
+        networks = ["10.0.0.0/8", "192.168.1.5/32"]
+
+        assert NetworkSetController(4).restore(set_name, networks) == 0
+        assert [command.split(" ", 1)[1] for command in runner_stub.commands] == [
+            f"list -terse {set_name:s}",
+            "-exist restore",
+        ]
+        assert runner_stub.inputs == [
+            "\n".join(render_network_set_restore(set_name, networks, 4, is_set_exist=is_set_exist))
+            + "\n"
+        ]
+
+    @pytest.mark.parametrize(["set_name", "expected"], [["tc_test", 3], ["tc_new", None]])
+    def test_normal_get_member_count(self, set_name, expected):
+        assert NetworkSetController(4).get_member_count(set_name) == expected
@@ -6,6 +6,7 @@ import random
 
 import pytest
 
+import tcconfig._iptables
 from tcconfig._iptables import (
     VALID_CHAIN_LIST,
     IptablesMangleController,
@@ -13,6 +14,8 @@ from tcconfig._iptables import (
     get_iptables_base_command,
 )
 
+from .common import SubprocessRunnerStub
+
 
 _DEF_SRC = "192.168.0.0/24"
 _DEF_DST = "192.168.100.0/24"
@@ -77,11 +80,52 @@ reverse_mangle_mark_list = (
 )
 
 
+MANGLE_TABLE = """Chain PREROUTING (policy ACCEPT)
+num  target     prot opt source               destination
+1    MARK       all  --  192.168.0.0/24       192.168.100.0/24     MARK set 0x65
+
+Chain INPUT (policy ACCEPT)
+num  target     prot opt source               destination
+1    MARK       all  --  anywhere             192.168.100.0/24     MARK set 0x66
+
+Chain FORWARD (policy ACCEPT)
+num  target     prot opt source               destination
+
+Chain OUTPUT (policy ACCEPT)
+num  target     prot opt source               destination
+1    MARK       tcp  --  192.168.0.0/24       192.168.100.0/24     MARK set 0x68
+2    ACCEPT     all  --  anywhere             anywhere
+3    MARK       all  --  192.168.0.0/24       anywhere             MARK set 0x67
+
+Chain POSTROUTING (policy ACCEPT)
+num  target     prot opt source               destination
+"""
+
+
 @pytest.fixture
 def iptables_ctrl_ipv4():
     return IptablesMangleController(True, ip_version=4)
 
 
+@pytest.fixture
+def mangle_table_ctrl(monkeypatch):
+    get_iptables_count = 0
+
+    def get_iptables(self):
+        nonlocal get_iptables_count
+        get_iptables_count += 1
+        assert get_iptables_count == 1
+
+        return MANGLE_TABLE
+
+    monkeypatch.setattr(IptablesMangleController, "get_iptables", get_iptables)
+    IptablesMangleController.clear_snapshot()
+
+    yield IptablesMangleController(True, ip_version=4)
+
+    IptablesMangleController.clear_snapshot()
+
+
 class Test_IptablesMangleMark_repr:
     def test_smoke(self):
         for mangle_mark in mangle_mark_list:
@@ -247,6 +291,44 @@ class Test_IptablesMangleMark_to_delete_command:
             mark.to_delete_command()
 
 
+class Test_IptablesMangleMark_to_restore_line:
+    @pytest.mark.parametrize(
+        ["ip_version", "source", "destination", "chain", "line_number", "expected"],
+        [
+            [
+                4,
+                _DEF_SRC,
+                _DEF_DST,
+                "PREROUTING",
+                1,
+                [
+                    f"-A PREROUTING -j MARK --set-mark 2 -p all -s {_DEF_SRC} -d {_DEF_DST}",
+                    "-D PREROUTING 1",
+                ],
+            ],
+            [
+                6,
+                "anywhere",
+                "2001:db8::/32",
+                "OUTPUT",
+                3,
+                ["-A OUTPUT -j MARK --set-mark 2 -p all -d 2001:db8::/32", "-D OUTPUT 3"],
+            ],
+        ],
+    )
+    def test_normal(self, ip_version, source, destination, chain, line_number, expected):
+        mark = IptablesMangleMarkEntry(
+            ip_version=ip_version,
+            mark_id=2,
+            source=source,
+            destination=destination,
+            chain=chain,
+            line_number=line_number,
+        )
+
+        assert [mark.to_restore_append_line(), mark.to_restore_delete_line()] == expected
+
+
 class Test_IptablesMangleController_get_unique_mark_id:
     @pytest.mark.xfail(run=False)
     def test_normal(self, iptables_ctrl_ipv4):
@@ -310,3 +392,109 @@ class Test_IptablesMangleController_parse:
             print(f"rhs: {rhs_mangle}")
 
             assert lhs_mangle == rhs_mangle
+
+
+class Test_IptablesMangleController_snapshot:
+    def test_normal_parse(self, mangle_table_ctrl):
+        assert [
+            (mangle.chain, mangle.line_number, mangle.mark_id)
+            for mangle in mangle_table_ctrl.parse()
+        ] == [
+            ("PREROUTING", 1, 0x65),
+            ("INPUT", 1, 0x66),
+            ("OUTPUT", 3, 0x67),
+            ("OUTPUT", 1, 0x68),
+        ]
+
+    def test_normal_get_mangle_mark(self, mangle_table_ctrl):
+        assert mangle_table_ctrl.get_mangle_mark(0x68) == IptablesMangleMarkEntry(
+            ip_version=4,
+            mark_id=0x68,
+            source=_DEF_SRC,
+            destination=_DEF_DST,
+            chain="OUTPUT",
+            protocol="tcp",
+        )
+        assert mangle_table_ctrl.get_mangle_mark(0x69) is None
+
+    def test_normal_get_unique_mark_id(self, mangle_table_ctrl):
+        assert mangle_table_ctrl.get_unique_mark_id() == 0x69
+
+    def test_normal_add_entry(self, mangle_table_ctrl):
+        snapshot = mangle_table_ctrl.get_snapshot()
+        snapshot.add_entry(
+            4,
+            IptablesMangleMarkEntry(
+                ip_version=4,
+                mark_id=0x69,
+                source=_DEF_SRC,
+                destination=_DEF_DST,
+                chain="OUTPUT",
+            ),
+        )
+
+        assert mangle_table_ctrl.get_unique_mark_id() == 0x6A
+        assert mangle_table_ctrl.get_mangle_mark(0x69).line_number == 4
+        assert [mangle.line_number for mangle in snapshot.entries if mangle.chain == "OUTPUT"] == [
+            4,
+            3,
+            1,
+        ]
+
+
+class Test_IptablesMangleController_bulk:
+    def test_normal(self, monkeypatch, mangle_table_ctrl):
+        runner_stub = SubprocessRunnerStub()
+        monkeypatch.setattr(tcconfig._iptables, "SubprocessRunner", runner_stub)
+        monkeypatch.setattr(
+            tcconfig._iptables,
+            "get_iptables_restore_command",
+            lambda ip_version: "/sbin/iptables-restore",
+        )
+        monkeypatch.setattr(
+            IptablesMangleController, "_IptablesMangleController__is_authority_verified", True
+        )
+
+        for chain in ["OUTPUT", "INPUT"]:
+            assert (
+                mangle_table_ctrl.add(
+                    IptablesMangleMarkEntry(
+                        ip_version=4,
+                        mark_id=mangle_table_ctrl.get_unique_mark_id(),
+                        source="anywhere",
+                        destination=_DEF_DST,
+                        chain=chain,
+                    )
+                )
+                == 0
+            )
+        assert runner_stub.inputs == []
+
+        assert mangle_table_ctrl.flush() == 0
+        mangle_table_ctrl.clear()
+
+        assert runner_stub.commands == ["/sbin/iptables-restore --noflush"] * 2
+        assert runner_stub.inputs == [
+            "\n".join(
+                [
+                    "*mangle",
+                    f"-A OUTPUT -j MARK --set-mark 105 -p all -d {_DEF_DST}",
+                    f"-A INPUT -j MARK --set-mark 106 -p all -d {_DEF_DST}",
+                    "COMMIT",
+                    "",
+                ]
+            ),
+            "\n".join(
+                [
+                    "*mangle",
+                    "-D PREROUTING 1",
+                    "-D INPUT 2",
+                    "-D INPUT 1",
+                    "-D OUTPUT 4",
+                    "-D OUTPUT 3",
+                    "-D OUTPUT 1",
+                    "COMMIT",
+                    "",
+                ]
+            ),
+        ]
@@ -0,0 +1,176 @@
+import os
+from argparse import Namespace
+
+import pytest
+
+import tcconfig._kernel_module
+from tcconfig._const import Classifier, ShapingAlgorithm, TcCommandOutput, TrafficDirection
+from tcconfig._kernel_module import (
+    KernelModule,
+    clear_module_state_cache,
+    find_unavailable_modules,
+    is_module_available,
+    load_module,
+)
+from tcconfig.tcset import get_required_kernel_modules
+
+from .common import SubprocessRunnerStub
+
+
+PROC_MODULES = """\
+sch_netem 20480 1 - Live 0x0000000000000000
+cls_u32 28672 1 - Live 0x0000000000000000
+sch_htb 32768 1 - Live 0x0000000000000000
+"""
+
+
+@pytest.fixture
+def module_paths(monkeypatch, tmp_path):
+    proc_modules_path = tmp_path / "modules"
+    sys_module_dir = tmp_path / "sys_module"
+    lib_modules_dir = tmp_path / "lib_modules"
+
+    monkeypatch.setattr(tcconfig._kernel_module, "PROC_MODULES_PATH", str(proc_modules_path))
+    monkeypatch.setattr(tcconfig._kernel_module, "SYS_MODULE_DIR_PATH", str(sys_module_dir))
+    monkeypatch.setattr(tcconfig._kernel_module, "LIB_MODULES_DIR_PATH", str(lib_modules_dir))
+
+    clear_module_state_cache()
+    yield (proc_modules_path, sys_module_dir, lib_modules_dir)
+    clear_module_state_cache()
+
+
+@pytest.fixture
+def runner_stub(monkeypatch):
+    runner_stub = SubprocessRunnerStub()
+    monkeypatch.setattr(tcconfig._kernel_module.spr, "SubprocessRunner", runner_stub)
+
+    return runner_stub
+
+
+def write_builtin_modules(lib_modules_dir, text):
+    builtin_dir = lib_modules_dir / os.uname().release
+    builtin_dir.mkdir(parents=True)
+    (builtin_dir / "modules.builtin").write_text(text)
+
+
+class Test_is_module_available:
+    def test_normal_proc_modules(self, module_paths):
+        proc_modules_path, _, lib_modules_dir = module_paths
+        proc_modules_path.write_text(PROC_MODULES)
+        write_builtin_modules(lib_modules_dir, "kernel/net/sched/sch_tbf.ko\n")
+
+        assert is_module_available(KernelModule.NETEM)
+        assert is_module_available("cls-u32")
+        assert is_module_available(KernelModule.TBF)
+        assert is_module_available(KernelModule.IFB) is False
+
+        assert find_unavailable_modules(
+            [KernelModule.NETEM, KernelModule.TBF, KernelModule.FW, KernelModule.IFB]
+        ) == [KernelModule.FW, KernelModule.IFB]
+
+    def test_normal_cache(self, module_paths):
+        proc_modules_path, sys_module_dir, _ = module_paths
+        proc_modules_path.write_text(PROC_MODULES)
+        sys_module_dir.mkdir()
+
+        assert is_module_available(KernelModule.IFB) is False
+
+        # /proc/modules is read once in a process
+        proc_modules_path.write_text(PROC_MODULES + "ifb 16384 0 - Live 0x0000000000000000\n")
+        assert is_module_available(KernelModule.IFB) is False
+
+        clear_module_state_cache()
+        assert is_module_available(KernelModule.IFB)
+
+    def test_normal_sys_module(self, module_paths):
+        _, sys_module_dir, _ = module_paths
+        (sys_module_dir / KernelModule.HTB).mkdir(parents=True)
+
+        assert is_module_available(KernelModule.HTB)
+        assert is_module_available(KernelModule.NETEM) is False
+
+    def test_normal_builtin_not_found(self, module_paths):
+        proc_modules_path, sys_module_dir, _ = module_paths
+        proc_modules_path.write_text(PROC_MODULES)
+
+        # modules that not found in /proc/modules may be built into the kernel
+        assert is_module_available(KernelModule.NETEM)
+        assert is_module_available(KernelModule.TBF) is None
+        assert find_unavailable_modules([KernelModule.NETEM, KernelModule.TBF]) == []
+
+        clear_module_state_cache()
+        (sys_module_dir / KernelModule.TBF).mkdir(parents=True)
+        assert is_module_available(KernelModule.TBF)
+        assert is_module_available(KernelModule.IFB) is False
+
+    def test_normal_unknown(self, module_paths):
+        assert is_module_available(KernelModule.NETEM) is None
+        assert find_unavailable_modules([KernelModule.NETEM]) == []
+
+
+class Test_load_module:
+    def test_normal(self, module_paths, runner_stub):
+        proc_modules_path, _, _ = module_paths
+        proc_modules_path.write_text(PROC_MODULES)
+
+        assert load_module(KernelModule.NETEM) == 0
+        assert runner_stub.commands == []
+
+        assert load_module(KernelModule.IFB) == 0
+        assert load_module(KernelModule.IFB) == 0
+        assert runner_stub.commands == ["modprobe ifb"]
+
+    def test_normal_not_execute(self, module_paths, runner_stub):
+        proc_modules_path, _, _ = module_paths
+        proc_modules_path.write_text(PROC_MODULES)
+
+        # outputs of the commands include modprobe regardless of the state of the modules
+        assert load_module(KernelModule.NETEM, TcCommandOutput.STDOUT) == 0
+        assert runner_stub.commands == ["modprobe sch_netem"]
+
+    def test_abnormal(self, module_paths, runner_stub):
+        proc_modules_path, _, _ = module_paths
+        proc_modules_path.write_text(PROC_MODULES)
+        runner_stub.returncode = 1
+
+        assert load_module(KernelModule.IFB) == 1
+        assert load_module(KernelModule.IFB) == 1
+        assert runner_stub.commands == ["modprobe ifb", "modprobe ifb"]
+
+
+class Test_get_required_kernel_modules:
+    @pytest.mark.parametrize(
+        ["shaping_algorithm", "is_enable_iptables", "classifier", "direction", "expected"],
+        [
+            [
+                ShapingAlgorithm.HTB,
+                False,
+                Classifier.U32,
+                TrafficDirection.OUTGOING,
+                [KernelModule.NETEM, KernelModule.HTB, KernelModule.U32],
+            ],
+            [
+                ShapingAlgorithm.TBF,
+                True,
+                Classifier.U32,
+                TrafficDirection.INCOMING,
+                [KernelModule.NETEM, KernelModule.TBF, KernelModule.FW, KernelModule.IFB],
+            ],
+            [
+                ShapingAlgorithm.HTB,
+                False,
+                Classifier.FLOWER,
+                TrafficDirection.OUTGOING,
+                [KernelModule.NETEM, KernelModule.HTB, KernelModule.FLOWER],
+            ],
+        ],
+    )
+    def test_normal(self, shaping_algorithm, is_enable_iptables, classifier, direction, expected):
+        options = Namespace(
+            shaping_algorithm=shaping_algorithm,
+            is_enable_iptables=is_enable_iptables,
+            classifier=classifier,
+            direction=direction,
+        )
+
+        assert get_required_kernel_modules(options) == expected
@@ -0,0 +1,69 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import os
+from argparse import Namespace
+
+import pytest
+
+from tcconfig._const import Tc, TcCommandOutput
+from tcconfig._main import Main, TargetResult
+
+
+def make_options(**kwargs):
+    options = Namespace(
+        use_docker=False,
+        jobs=2,
+        dst_network_file=None,
+        tc_command_output=TcCommandOutput.NOT_SET,
+    )
+    for key, value in kwargs.items():
+        setattr(options, key, value)
+
+    return options
+
+
+def apply_with_pid(target):
+    return TargetResult(target, 0, [f"pid={os.getpid()}"], None)
+
+
+class Test_Main_run_targets:
+    @pytest.mark.parametrize(
+        ["options"],
+        [
+            [make_options(is_enable_iptables=True)],
+            [make_options(dst_network_file="networks.txt")],
+        ],
+    )
+    def test_normal_sequential(self, capsys, options):
+        options.tc_command_output = TcCommandOutput.STDOUT
+
+        assert Main(options)._run_targets(["eth0", "eth1"], apply_with_pid, Tc.Command.TCSET) == 0
+
+        out, _err = capsys.readouterr()
+        assert out.splitlines() == [f"pid={os.getpid()}"] * 2
+
+    def test_normal_concurrent(self, capsys):
+        options = make_options(is_enable_iptables=False, tc_command_output=TcCommandOutput.STDOUT)
+
+        assert Main(options)._run_targets(["eth0", "eth1"], apply_with_pid, Tc.Command.TCSET) == 0
+
+        out, _err = capsys.readouterr()
+        assert f"pid={os.getpid()}" not in out.splitlines()
+
+
+class Test_Main_get_return_code:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [[0], 0],
+            [[0, 0], 0],
+            [[1, 0], 0],
+            [[0, 22], 0],
+            [[1], 1],
+            [[1, 22], 22],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert Main(make_options())._get_return_code(value) == expected
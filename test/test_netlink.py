@@ -0,0 +1,185 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import pytest
+from pyroute2 import protocols
+from pyroute2.netlink.rtnl import TC_H_INGRESS, TC_H_ROOT
+
+from tcconfig._netlink import (
+    NetlinkRequest,
+    TcNetlinkTranslator,
+    UnsupportedCommandError,
+    to_bytes,
+    to_bytes_per_sec,
+    to_tc_handle,
+    to_u32_filter_handle,
+    to_usec,
+)
+
+
+@pytest.fixture
+def translator():
+    return TcNetlinkTranslator()
+
+
+class Test_to_tc_handle:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            ["1:", 0x10000],
+            ["1a1a:", 0x1A1A0000],
+            ["1a1a:2", 0x1A1A0002],
+            ["1f87:10", 0x1F870010],
+            [":1", 0x1],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert to_tc_handle(value) == expected
+
+    @pytest.mark.parametrize(["value", "expected"], [["1a1a", UnsupportedCommandError]])
+    def test_exception(self, value, expected):
+        with pytest.raises(expected):
+            to_tc_handle(value)
+
+
+class Test_to_u32_filter_handle:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            ["800::800", 0x80000800],
+            ["801::800", 0x80100800],
+            ["800:1:2", 0x80001002],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert to_u32_filter_handle(value) == expected
+
+
+class Test_unit_conversion:
+    @pytest.mark.parametrize(
+        ["method", "value", "expected"],
+        [
+            [to_bytes_per_sec, "1000.0Kbit", 125000],
+            [to_bytes_per_sec, "32000000.0kbit", 4000000000],
+            [to_bytes_per_sec, "8bit", 1],
+            [to_bytes, "125.0KB", 128000],
+            [to_bytes, "1600", 1600],
+            [to_usec, "10ms", 10000],
+            [to_usec, "2.5ms", 2500],
+            [to_usec, "1s", 1000000],
+        ],
+    )
+    def test_normal(self, method, value, expected):
+        assert method(value) == expected
+
+    @pytest.mark.parametrize(
+        ["method", "value", "expected"],
+        [
+            [to_bytes_per_sec, "10xbit", UnsupportedCommandError],
+            [to_usec, "abc", UnsupportedCommandError],
+        ],
+    )
+    def test_exception(self, method, value, expected):
+        with pytest.raises(expected):
+            method(value)
+
+
+class Test_TcNetlinkTranslator_translate:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [
+                "/usr/sbin/tc qdisc add dev eth0 root handle 1a1a: htb default 1",
+                NetlinkRequest(
+                    "tc",
+                    "add",
+                    "htb",
+                    "eth0",
+                    {"parent": TC_H_ROOT, "handle": 0x1A1A0000, "default": 1},
+                ),
+            ],
+            [
+                "/usr/sbin/tc qdisc del dev eth0 root",
+                NetlinkRequest("tc", "del", None, "eth0", {"parent": TC_H_ROOT}),
+            ],
+            [
+                "/usr/sbin/tc qdisc add dev eth0 ingress",
+                NetlinkRequest(
+                    "tc", "add", "ingress", "eth0", {"parent": TC_H_INGRESS, "handle": 0xFFFF0000}
+                ),
+            ],
+            [
+                "/usr/sbin/tc class add dev eth0 parent 1a1a: classid 1a1a:2 htb "
+                "rate 1000.0Kbit ceil 1000.0Kbit burst 125.0KB cburst 125.0KB",
+                NetlinkRequest(
+                    "tc",
+                    "add-class",
+                    "htb",
+                    "eth0",
+                    {
+                        "parent": 0x1A1A0000,
+                        "handle": 0x1A1A0002,
+                        "rate": 125000,
+                        "ceil": 125000,
+                        "burst": 128000,
+                        "cburst": 128000,
+                    },
+                ),
+            ],
+            [
+                "/usr/sbin/tc qdisc add dev eth0 parent 1a1a:2 handle 2873: netem "
+                "loss 1.000000% delay 10ms 2ms limit 1000.000000",
+                NetlinkRequest(
+                    "tc",
+                    "add",
+                    "netem",
+                    "eth0",
+                    {
+                        "parent": 0x1A1A0002,
+                        "handle": 0x28730000,
+                        "loss": 1.0,
+                        "delay": 10000,
+                        "jitter": 2000,
+                        "limit": 1000,
+                    },
+                ),
+            ],
+            [
+                "/usr/sbin/tc filter add dev eth0 protocol ip parent 1a1a: prio 5 u32 "
+                "match ip dst 192.168.0.0/24 match ip dport 8080 0xffff flowid 1a1a:2",
+                NetlinkRequest(
+                    "tc",
+                    "add-filter",
+                    "u32",
+                    "eth0",
+                    {
+                        "parent": 0x1A1A0000,
+                        "protocol": protocols.ETH_P_IP,
+                        "prio": 5,
+                        "keys": ["0xc0a80000/0xffffff00+16", "0x00001f90/0x0000ffff+20"],
+                        "target": 0x1A1A0002,
+                    },
+                ),
+            ],
+        ],
+    )
+    def test_normal(self, translator, value, expected):
+        assert translator.translate(value) == expected
+
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            ["/usr/sbin/tc qdisc show dev eth0", UnsupportedCommandError],
+            [
+                "/usr/sbin/tc qdisc add dev eth0 parent 1a1a:2 handle 2873: netem "
+                "delay 10ms 2ms distribution pareto",
+                UnsupportedCommandError,
+            ],
+            ["/usr/sbin/iptables -t mangle -F", UnsupportedCommandError],
+            ["/usr/sbin/tc qdisc add dev eth0 root handle 1a1a: cake", UnsupportedCommandError],
+        ],
+    )
+    def test_exception(self, translator, value, expected):
+        with pytest.raises(expected):
+            translator.translate(value)
@@ -5,8 +5,10 @@
 import humanreadable as hr
 import pytest
 
+from tcconfig._error import NetworkInterfaceNotFoundError
 from tcconfig._network import (
     _get_iproute2_upper_limite_rate,
+    expand_network_interfaces,
     get_anywhere_network,
     get_upper_limit_rate,
     is_anywhere_network,
@@ -151,3 +153,36 @@ class Test_sanitize_network:
     def test_exception(self, value, ip_version, expected):
         with pytest.raises(expected):
             sanitize_network(value, ip_version)
+
+
+class Test_expand_network_interfaces:
+    AVAIL_INTERFACES = ["lo", "eth0", "eth0.100", "eth0.20", "eth1", "veth1a2b", "veth0c3d"]
+
+    @pytest.mark.parametrize(
+        ["targets", "expected"],
+        [
+            [["eth0"], ["eth0"]],
+            [["eth1", "eth0"], ["eth1", "eth0"]],
+            [["not-exist"], ["not-exist"]],
+            [["veth*"], ["veth0c3d", "veth1a2b"]],
+            [["eth0.*"], ["eth0.100", "eth0.20"]],
+            [["eth[01]"], ["eth0", "eth1"]],
+            [["re:eth0\\.\\d{2}"], ["eth0.20"]],
+            [["re:eth\\d"], ["eth0", "eth1"]],
+            [["eth1", "eth*"], ["eth1", "eth0", "eth0.100", "eth0.20"]],
+        ],
+    )
+    def test_normal(self, targets, expected):
+        assert expand_network_interfaces(targets, self.AVAIL_INTERFACES) == expected
+
+    @pytest.mark.parametrize(
+        ["targets", "expected"],
+        [
+            [["wlan*"], NetworkInterfaceNotFoundError],
+            [["eth0", "re:wlan\\d"], NetworkInterfaceNotFoundError],
+            [["re:eth0("], NetworkInterfaceNotFoundError],
+        ],
+    )
+    def test_exception(self, targets, expected):
+        with pytest.raises(expected):
+            expand_network_interfaces(targets, self.AVAIL_INTERFACES)
@@ -0,0 +1,255 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import errno
+import json
+
+import pytest
+
+import tcconfig._nftables
+from tcconfig._iptables import IptablesMangleMarkEntry
+from tcconfig._nftables import NftablesMarkController, render_mark_element, render_mark_map_commands
+
+from .common import SubprocessRunnerStub
+
+
+_DEF_SRC = "192.168.0.0/24"
+_DEF_DST = "192.168.100.0/24"
+_NEW_DST = "192.168.200.0/24"
+
+NFT_OUTPUT = json.dumps(
+    {
+        "nftables": [
+            {"metainfo": {"version": "1.0.6", "json_schema_version": 1}},
+            {"table": {"family": "inet", "name": "tcconfig", "handle": 1}},
+            {
+                "map": {
+                    "family": "inet",
+                    "name": "output_ip4",
+                    "table": "tcconfig",
+                    "type": "ipv4_addr",
+                    "handle": 2,
+                    "map": "mark",
+                    "flags": ["interval"],
+                    "elem": [
+                        [{"prefix": {"addr": "192.168.100.0", "len": 24}}, 101],
+                        ["10.0.0.1", 102],
+                    ],
+                }
+            },
+            {
+                "map": {
+                    "family": "inet",
+                    "name": "prerouting_ip4",
+                    "table": "tcconfig",
+                    "type": ["ipv4_addr", "ipv4_addr"],
+                    "handle": 3,
+                    "map": "mark",
+                    "flags": ["interval"],
+                    "elem": [
+                        [
+                            {
+                                "concat": [
+                                    {"prefix": {"addr": "192.168.0.0", "len": 24}},
+                                    {"prefix": {"addr": "192.168.100.0", "len": 24}},
+                                ]
+                            },
+                            103,
+                        ],
+                        [{"range": ["10.0.0.1", "10.0.0.9"]}, 104],
+                    ],
+                }
+            },
+            {
+                "map": {
+                    "family": "inet",
+                    "name": "output_ip6",
+                    "table": "tcconfig",
+                    "type": "ipv6_addr",
+                    "handle": 4,
+                    "map": "mark",
+                    "flags": ["interval"],
+                    "elem": [[{"prefix": {"addr": "2001:db8::", "len": 32}}, 105]],
+                }
+            },
+        ]
+    }
+)
+
+
+class Test_render_mark_map_commands:
+    @pytest.mark.parametrize(
+        ["chain", "ip_version", "expected"],
+        [
+            [
+                "OUTPUT",
+                4,
+                [
+                    "add map inet tcconfig output_ip4 "
+                    "{ type ipv4_addr : mark; flags interval; }",
+                    "add chain inet tcconfig output_ip4 "
+                    "{ type route hook output priority mangle; policy accept; }",
+                    "flush chain inet tcconfig output_ip4",
+                    "add rule inet tcconfig output_ip4 meta mark set ip daddr map @output_ip4",
+                ],
+            ],
+            [
+                "PREROUTING",
+                6,
+                [
+                    "add map inet tcconfig prerouting_ip6 "
+                    "{ type ipv6_addr . ipv6_addr : mark; flags interval; }",
+                    "add chain inet tcconfig prerouting_ip6 "
+                    "{ type filter hook prerouting priority mangle; policy accept; }",
+                    "flush chain inet tcconfig prerouting_ip6",
+                    "add rule inet tcconfig prerouting_ip6 "
+                    "meta mark set ip6 saddr . ip6 daddr map @prerouting_ip6",
+                ],
+            ],
+        ],
+    )
+    def test_normal(self, chain, ip_version, expected):
+        assert render_mark_map_commands(chain, ip_version) == expected
+
+
+class Test_render_mark_element:
+    @pytest.mark.parametrize(
+        ["source", "destination", "chain", "expected"],
+        [
+            [None, _DEF_DST, "OUTPUT", f"{_DEF_DST} : 101"],
+            [_DEF_SRC, _DEF_DST, "PREROUTING", f"{_DEF_SRC} . {_DEF_DST} : 101"],
+            [_DEF_SRC, None, "INPUT", f"{_DEF_SRC} : 101"],
+        ],
+    )
+    def test_normal(self, source, destination, chain, expected):
+        entry = IptablesMangleMarkEntry(
+            ip_version=4, mark_id=101, source=source, destination=destination, chain=chain
+        )
+
+        assert render_mark_element(entry) == expected
+
+
+class Test_NftablesMarkController_parse_nftables:
+    @pytest.mark.parametrize(
+        ["ip_version", "expected"],
+        [
+            [
+                4,
+                [
+                    ("OUTPUT", 101, "0.0.0.0/0", _DEF_DST),
+                    ("OUTPUT", 102, "0.0.0.0/0", "10.0.0.1/32"),
+                    ("PREROUTING", 103, _DEF_SRC, _DEF_DST),
+                ],
+            ],
+            [6, [("OUTPUT", 105, "::/0", "2001:db8::/32")]],
+        ],
+    )
+    def test_normal(self, ip_version, expected):
+        entries = NftablesMarkController(True, ip_version).parse_nftables(NFT_OUTPUT)
+
+        assert [
+            (entry.chain, entry.mark_id, entry.source, entry.destination) for entry in entries
+        ] == expected
+
+    @pytest.mark.parametrize(["value"], [[""], ["Error: No such file or directory"]])
+    def test_abnormal(self, value):
+        assert NftablesMarkController(True, 4).parse_nftables(value) == []
+
+
+class Test_NftablesMarkController_flush:
+    @pytest.fixture
+    def runner_stub(self, request, monkeypatch):
+        results = {"-j list table inet tcconfig": (0, NFT_OUTPUT)}
+        results.update(getattr(request, "param", {}))
+        runner_stub = SubprocessRunnerStub(results)
+        monkeypatch.setattr(tcconfig._nftables, "SubprocessRunner", runner_stub)
+        monkeypatch.setattr(
+            NftablesMarkController,
+            "_NftablesMarkController__check_execution_authority",
+            staticmethod(lambda: None),
+        )
+        NftablesMarkController.clear_snapshot()
+
+        yield runner_stub
+
+        NftablesMarkController.clear_snapshot()
+
+    @staticmethod
+    def add_entries(mark_ctrl, entries):
+        return [
+            mark_ctrl.add(
+                IptablesMangleMarkEntry(
+                    ip_version=4,
+                    mark_id=mark_ctrl.get_unique_mark_id(),
+                    source=source,
+                    destination=destination,
+                    chain=chain,
+                )
+            )
+            for source, destination, chain in entries
+        ]
+
+    def test_normal(self, runner_stub):
+        mark_ctrl = NftablesMarkController(True, 4)
+
+        assert self.add_entries(
+            mark_ctrl,
+            [
+                (None, _NEW_DST, "OUTPUT"),
+                (_DEF_SRC, _NEW_DST, "PREROUTING"),
+                (None, "172.16.0.0/12", "OUTPUT"),
+            ],
+        ) == [0, 0, 0]
+        assert runner_stub.inputs == []
+
+        assert mark_ctrl.flush() == 0
+        assert runner_stub.commands[-1].endswith(" -f -")
+        assert runner_stub.inputs == [
+            "\n".join(
+                ["add table inet tcconfig"]
+                + render_mark_map_commands("PREROUTING", 4)
+                + [
+                    "add element inet tcconfig prerouting_ip4 "
+                    f"{{ {_DEF_SRC} . {_NEW_DST} : 105 }}"
+                ]
+                + render_mark_map_commands("OUTPUT", 4)
+                + [
+                    "add element inet tcconfig output_ip4 "
+                    f"{{ {_NEW_DST} : 104, 172.16.0.0/12 : 106 }}"
+                ]
+            )
+            + "\n"
+        ]
+
+    @pytest.mark.parametrize(
+        ["entries"],
+        [
+            # overlaps with an entry of the map
+            [[(None, _NEW_DST, "OUTPUT"), (None, "192.168.100.128/25", "OUTPUT")]],
+            [[(None, "10.0.0.0/8", "OUTPUT")]],
+            [[(_DEF_SRC, _DEF_DST, "PREROUTING")]],
+            # overlaps with a pending entry
+            [[(None, "172.16.0.0/12", "OUTPUT"), (None, "172.16.1.0/24", "OUTPUT")]],
+        ],
+    )
+    def test_abnormal_overlap(self, runner_stub, entries):
+        mark_ctrl = NftablesMarkController(True, 4)
+
+        assert self.add_entries(mark_ctrl, entries)[-1] == errno.EINVAL
+        assert mark_ctrl.flush() == errno.EINVAL
+        assert runner_stub.inputs == []
+
+        # the rejected transaction does not affect the next one
+        assert self.add_entries(mark_ctrl, [(None, _NEW_DST, "OUTPUT")]) == [0]
+        assert mark_ctrl.flush() == 0
+        assert len(runner_stub.inputs) == 1
+
+    @pytest.mark.parametrize(
+        ["runner_stub"], [[{" -f -": (1, "", "Error: Could not process rule")}]], indirect=True
+    )
+    def test_abnormal_nft(self, runner_stub):
+        mark_ctrl = NftablesMarkController(True, 4)
+        self.add_entries(mark_ctrl, [(None, _NEW_DST, "OUTPUT")])
+
+        assert mark_ctrl.flush() == 1
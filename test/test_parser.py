@@ -3,14 +3,13 @@
 """
 
 import pytest
-from simplesqlite import connect_memdb
 
 import tcconfig.parser._filter
 import tcconfig.parser._qdisc
 import tcconfig.parser.shaping_rule
 from tcconfig._const import Tc
 from tcconfig.parser._class import TcClassParser
-from tcconfig.parser._model import Filter, Qdisc
+from tcconfig.parser._store import FilterRecord, QdiscRecord, TcRecordStore
 
 from .common import print_test_result
 
@@ -20,22 +19,22 @@ DEVICE = "eth0"
 
 @pytest.fixture
 def filter_parser_ipv4():
-    return tcconfig.parser._filter.TcFilterParser(connect_memdb(), ip_version=4)
+    return tcconfig.parser._filter.TcFilterParser(TcRecordStore(), ip_version=4)
 
 
 @pytest.fixture
 def filter_parser_ipv6():
-    return tcconfig.parser._filter.TcFilterParser(connect_memdb(), ip_version=6)
+    return tcconfig.parser._filter.TcFilterParser(TcRecordStore(), ip_version=6)
 
 
 @pytest.fixture
 def qdisc_parser():
-    return tcconfig.parser._qdisc.TcQdiscParser(connect_memdb())
+    return tcconfig.parser._qdisc.TcQdiscParser(TcRecordStore())
 
 
 @pytest.fixture
 def class_parser():
-    return TcClassParser(connect_memdb())
+    return TcClassParser(TcRecordStore())
 
 
 def six_b(s):
@@ -61,7 +60,7 @@ filter parent 1: protocol ip pref 2 u32 fh 800::800 order 2048 key ht 800 bkt 0
   match 00000000/00000000 at 16"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "801::800",
@@ -74,7 +73,7 @@ filter parent 1: protocol ip pref 2 u32 fh 800::800 order 2048 key ht 800 bkt 0
                             Tc.Param.DST_PORT: None,
                         }
                     ),
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::800",
@@ -104,7 +103,7 @@ filter parent 1: protocol ip pref 2 u32 fh 800::800 order 2048 key ht 800 bkt 0
   match 04d20000/ffff0000 at 20"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "801::800",
@@ -117,7 +116,7 @@ filter parent 1: protocol ip pref 2 u32 fh 800::800 order 2048 key ht 800 bkt 0
                             Tc.Param.DST_PORT: 80,
                         }
                     ),
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::800",
@@ -146,7 +145,7 @@ filter parent 1: protocol ip pref 2 u32 fh 800::800 order 2048 key ht 800 bkt 0
   match 00000000/00000000 at 12"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "801::800",
@@ -159,7 +158,7 @@ filter parent 1: protocol ip pref 2 u32 fh 800::800 order 2048 key ht 800 bkt 0
                             Tc.Param.DST_PORT: 8080,
                         }
                     ),
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::800",
@@ -184,7 +183,7 @@ filter parent 1a1a: protocol ip pref 1 u32 fh 800::800 order 2048 key ht 800 bkt
   match 15b3115c/ffffffff at 20"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::800",
@@ -205,7 +204,7 @@ filter parent 1a1a: protocol ip pref 1 u32 fh 800::800 order 2048 key ht 800 bkt
                     """filter parent 1f1c: protocol ip pref 1 fw
 filter parent 1f1c: protocol ip pref 1 fw handle 0x65 classid 1f1c:1"""
                 ),
-                [Filter(**{Tc.Param.DEVICE: DEVICE, "classid": "1f1c:1", "handle": 101})],
+                [FilterRecord(**{Tc.Param.DEVICE: DEVICE, "classid": "1f1c:1", "handle": 101})],
             ],
             [
                 8,
@@ -221,7 +220,7 @@ filter parent 120a: protocol ip pref 5 u32 chain 0 fh 801::800 order 2048 key ht
   match 00000000/00000000 at 12"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         device="eth0",
                         filter_id="800::800",
                         flowid="120a:1",
@@ -230,7 +229,7 @@ filter parent 120a: protocol ip pref 5 u32 chain 0 fh 801::800 order 2048 key ht
                         src_network="0.0.0.0/0",
                         dst_network="1.2.3.0/24",
                     ),
-                    Filter(
+                    FilterRecord(
                         device="eth0",
                         filter_id="801::800",
                         flowid="120a:2",
@@ -254,7 +253,7 @@ filter parent 120a: protocol ipv6 pref 6 u32 chain 0 fh 801: ht divisor 1
 filter parent 120a: protocol ipv6 pref 6 u32 chain 0 fh 801::800 order 2048 key ht 801 bkt 0 flowid 120a:3 not_in_hw"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::800",
@@ -267,7 +266,7 @@ filter parent 120a: protocol ipv6 pref 6 u32 chain 0 fh 801::800 order 2048 key
                             Tc.Param.DST_PORT: None,
                         }
                     ),
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "801::800",
@@ -282,14 +281,167 @@ filter parent 120a: protocol ipv6 pref 6 u32 chain 0 fh 801::800 order 2048 key
                     ),
                 ],
             ],
+            [
+                10,
+                six_b(
+                    """filter parent 1a1a: protocol ip pref 5 u32 chain 0
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800: ht divisor 1
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 *flowid 1a1a:2 not_in_hw
+  match 0a000001/ffffffff at 12
+  match c0a80000/ffffff00 at 16
+  match 1f900000/ffff0000 at 22"""
+                ),
+                [
+                    FilterRecord(
+                        **{
+                            Tc.Param.DEVICE: DEVICE,
+                            Tc.Param.FILTER_ID: "800::800",
+                            Tc.Param.FLOW_ID: "1a1a:2",
+                            Tc.Param.SRC_NETWORK: "10.0.0.1/32",
+                            Tc.Param.DST_NETWORK: "192.168.0.0/24",
+                            Tc.Param.PROTOCOL: "ip",
+                            Tc.Param.PRIORITY: 5,
+                            Tc.Param.SRC_PORT: None,
+                            Tc.Param.DST_PORT: 8080,
+                        }
+                    ),
+                ],
+            ],
+            [
+                11,
+                six_b(
+                    """filter parent 1a1a: protocol ip pref 5 u32 chain 0
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 105: ht divisor 256
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 105:2a:800 order 2048 key ht 105 bkt 2a *flowid 1a1a:2 not_in_hw
+  match c0a82a00/ffffff00 at 16
+  match 00000050/0000ffff at 20
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800: ht divisor 1
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 *flowid 1a1a:3 not_in_hw
+  match 0a000000/ff000000 at 16
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::ffc order 4092 key ht 800 bkt 0 link 105: not_in_hw
+  match 00000000/00000000 at 16
+    hash mask 0000ff00 at 16"""
+                ),
+                [
+                    FilterRecord(
+                        **{
+                            Tc.Param.DEVICE: DEVICE,
+                            Tc.Param.FILTER_ID: "105:2a:800",
+                            Tc.Param.FLOW_ID: "1a1a:2",
+                            Tc.Param.SRC_NETWORK: "0.0.0.0/0",
+                            Tc.Param.DST_NETWORK: "192.168.42.0/24",
+                            Tc.Param.PROTOCOL: "ip",
+                            Tc.Param.PRIORITY: 5,
+                            Tc.Param.SRC_PORT: None,
+                            Tc.Param.DST_PORT: 80,
+                        }
+                    ),
+                    FilterRecord(
+                        **{
+                            Tc.Param.DEVICE: DEVICE,
+                            Tc.Param.FILTER_ID: "800::800",
+                            Tc.Param.FLOW_ID: "1a1a:3",
+                            Tc.Param.SRC_NETWORK: "0.0.0.0/0",
+                            Tc.Param.DST_NETWORK: "10.0.0.0/8",
+                            Tc.Param.PROTOCOL: "ip",
+                            Tc.Param.PRIORITY: 5,
+                            Tc.Param.SRC_PORT: None,
+                            Tc.Param.DST_PORT: None,
+                        }
+                    ),
+                ],
+            ],
+            [
+                12,
+                six_b(
+                    """filter parent 1a1a: protocol ip pref 5 u32 chain 0
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800: ht divisor 1
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 *flowid 1a1a:3 not_in_hw
+  match 0a000000/ff000000 at 16
+filter parent 1a1a: protocol ip pref 13 flower chain 0
+filter parent 1a1a: protocol ip pref 13 flower chain 0 handle 0x1 classid 1a1a:2
+  eth_type ipv4
+  ip_proto udp
+  dst_ip 192.168.0.0/24
+  dst_port 1000-2000
+  not_in_hw"""
+                ),
+                [
+                    FilterRecord(
+                        **{
+                            Tc.Param.DEVICE: DEVICE,
+                            Tc.Param.FILTER_ID: "800::800",
+                            Tc.Param.FLOW_ID: "1a1a:3",
+                            Tc.Param.SRC_NETWORK: "0.0.0.0/0",
+                            Tc.Param.DST_NETWORK: "10.0.0.0/8",
+                            Tc.Param.PROTOCOL: "ip",
+                            Tc.Param.PRIORITY: 5,
+                        }
+                    ),
+                    FilterRecord(
+                        **{
+                            Tc.Param.DEVICE: DEVICE,
+                            Tc.Param.FILTER_ID: "0x1",
+                            Tc.Param.FLOW_ID: "1a1a:2",
+                            Tc.Param.SRC_NETWORK: "0.0.0.0/0",
+                            Tc.Param.DST_NETWORK: "192.168.0.0/24",
+                            Tc.Param.PROTOCOL: "ip",
+                            Tc.Param.PRIORITY: 13,
+                            Tc.Param.CLASSIFIER: "flower",
+                            Tc.Param.IP_PROTO: "udp",
+                            Tc.Param.DST_PORT: 1000,
+                            Tc.Param.DST_PORT_MAX: 2000,
+                        }
+                    ),
+                ],
+            ],
+            [
+                13,
+                six_b(
+                    """filter parent 1a1a: protocol ip pref 5 u32 chain 0
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800: ht divisor 1
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 flowid 1a1a:3 not_in_hw
+  match 0a000000/ff000000 at 16
+filter parent 1a1a: protocol ip pref 21 basic chain 0
+filter parent 1a1a: protocol ip pref 21 basic chain 0 handle 0x1 flowid 1a1a:2
+  ipset(tc_nets_4e39e2 dst)
+filter parent 1a1a: protocol ip pref 22 basic chain 0
+filter parent 1a1a: protocol ip pref 22 basic chain 0 handle 0x1 flowid 1a1a:4
+  meta(nf_mark eq 1)"""
+                ),
+                [
+                    FilterRecord(
+                        **{
+                            Tc.Param.DEVICE: DEVICE,
+                            Tc.Param.FILTER_ID: "800::800",
+                            Tc.Param.FLOW_ID: "1a1a:3",
+                            Tc.Param.SRC_NETWORK: "0.0.0.0/0",
+                            Tc.Param.DST_NETWORK: "10.0.0.0/8",
+                            Tc.Param.PROTOCOL: "ip",
+                            Tc.Param.PRIORITY: 5,
+                        }
+                    ),
+                    FilterRecord(
+                        **{
+                            Tc.Param.DEVICE: DEVICE,
+                            Tc.Param.FILTER_ID: "0x1",
+                            Tc.Param.FLOW_ID: "1a1a:2",
+                            Tc.Param.SRC_NETWORK: "0.0.0.0/0",
+                            Tc.Param.DST_NETWORK: "0.0.0.0/0",
+                            Tc.Param.PROTOCOL: "ip",
+                            Tc.Param.PRIORITY: 21,
+                            Tc.Param.CLASSIFIER: "basic",
+                            Tc.Param.NETWORK_SET: "tc_nets_4e39e2",
+                        }
+                    ),
+                ],
+            ],
         ],
         ids=lambda i: f"Test_TcFilterParser_parse_filter_ipv4_{i}",
     )
     def test_normal(self, test_id, filter_parser_ipv4, value, expected):
-        Filter.attach(filter_parser_ipv4.con)
-        Filter.create()
         filter_parser_ipv4.parse(DEVICE, value)
-        actual = [f for f in Filter().select()]
+        actual = filter_parser_ipv4.store.filters
 
         assert actual == expected, test_id
 
@@ -312,7 +464,7 @@ filter parent 1f87: protocol ipv6 pref 1 u32 fh 800::800 order 2048 key ht 800 b
   match 00000001/ffffffff at 36"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::800",
@@ -339,7 +491,7 @@ filter parent 1f87: protocol ipv6 pref 1 u32 fh 800::800 order 2048 key ht 800 b
   match 00000001/ffffffff at 20"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::800",
@@ -370,7 +522,7 @@ filter parent 1f87: protocol ipv6 pref 1 u32 fh 800::802 order 2050 key ht 800 b
   match 00001f90/0000ffff at 40"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::800",
@@ -383,7 +535,7 @@ filter parent 1f87: protocol ipv6 pref 1 u32 fh 800::802 order 2050 key ht 800 b
                             Tc.Param.DST_PORT: None,
                         }
                     ),
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::801",
@@ -396,7 +548,7 @@ filter parent 1f87: protocol ipv6 pref 1 u32 fh 800::802 order 2050 key ht 800 b
                             Tc.Param.DST_PORT: None,
                         }
                     ),
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::802",
@@ -420,7 +572,7 @@ filter parent 1f87: protocol ipv6 pref 1 u32 fh 800::802 order 2050 key ht 800 b
   match 00501f90/ffffffff at 40"""
                 ),
                 [
-                    Filter(
+                    FilterRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.FILTER_ID: "800::802",
@@ -439,10 +591,8 @@ filter parent 1f87: protocol ipv6 pref 1 u32 fh 800::802 order 2050 key ht 800 b
         ids=lambda i: f"Test_TcFilterParser_parse_filter_ipv6_{i}",
     )
     def test_normal(self, test_id, filter_parser_ipv6, value, expected):
-        Filter.attach(filter_parser_ipv6.con)
-        Filter.create()
         filter_parser_ipv6.parse(DEVICE, value)
-        actual = [f for f in Filter().select()]
+        actual = filter_parser_ipv6.store.filters
 
         print(f"test_id={test_id}\n     got={actual}\nexpected={expected}")
         assert actual == expected
@@ -493,7 +643,7 @@ qdisc netem 2007: parent 1f87:2 limit 1000 delay 1.0ms loss 0.01%
 """
                 ),
                 [
-                    Qdisc(
+                    QdiscRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             "delay": "1.0ms",
@@ -513,7 +663,7 @@ qdisc netem 1a9a: parent 1a1a:2 limit 1000
 """
                 ),
                 [
-                    Qdisc(
+                    QdiscRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             Tc.Param.HANDLE: "1a9a:",
@@ -533,7 +683,7 @@ qdisc netem 2008: parent 1f87:3 limit 1000 delay 50.0ms  1.0ms loss 5%
 """
                 ),
                 [
-                    Qdisc(
+                    QdiscRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             "delay": "5.0ms",
@@ -543,7 +693,7 @@ qdisc netem 2008: parent 1f87:3 limit 1000 delay 50.0ms  1.0ms loss 5%
                             "limit": 1000,
                         }
                     ),
-                    Qdisc(
+                    QdiscRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             "delay": "50.0ms",
@@ -565,7 +715,7 @@ qdisc netem 2008: parent 1f87:3 limit 1000 delay 0.5s  1.0ms loss 5%
 """
                 ),
                 [
-                    Qdisc(
+                    QdiscRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             "delay": "2.5s",
@@ -575,7 +725,7 @@ qdisc netem 2008: parent 1f87:3 limit 1000 delay 0.5s  1.0ms loss 5%
                             "limit": 1000,
                         }
                     ),
-                    Qdisc(
+                    QdiscRecord(
                         **{
                             Tc.Param.DEVICE: DEVICE,
                             "delay": "0.5s",
@@ -592,10 +742,8 @@ qdisc netem 2008: parent 1f87:3 limit 1000 delay 0.5s  1.0ms loss 5%
         ids=lambda i: f"Test_TcQdiscParser_parse_{i}",
     )
     def test_normal(self, qdisc_parser, value, expected):
-        Qdisc.attach(qdisc_parser.con)
-        Qdisc.create()
         qdisc_parser.parse(DEVICE, value)
-        actual = [qdisc for qdisc in Qdisc.select()]
+        actual = qdisc_parser.store.qdiscs
 
         assert actual == expected
 
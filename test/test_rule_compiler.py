@@ -0,0 +1,124 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import pytest
+
+from tcconfig._logger import logger
+from tcconfig._rule_compiler import ShapingRuleCompiler, get_filter_priority, parse_filter_key
+
+
+_DELAY = {"delay": "10.0ms"}
+_LOSS = {"loss": "1%"}
+_RATE = {"rate": "1Mbps"}
+
+
+class Test_get_filter_priority:
+    @pytest.mark.parametrize(
+        ["filter_key", "expected"],
+        [
+            ["dst_network=192.168.0.0/24, protocol=ip", 5],
+            ["dst_network=2001:db8::/32, protocol=ipv6", 6],
+            ["dst_port=1000-2000, protocol=ip", 13],
+            ["ip_proto=tcp, protocol=ip", 13],
+            ["network_set=tc_nets_4e39e2, protocol=ip", 21],
+        ],
+    )
+    def test_normal(self, filter_key, expected):
+        assert get_filter_priority(parse_filter_key(filter_key)) == expected
+
+
+class Test_ShapingRuleCompiler_compile:
+    @pytest.mark.parametrize(
+        ["rules", "expected"],
+        [
+            [
+                # adjacent networks
+                [
+                    ("dst_network=192.168.0.0/25, protocol=ip", _DELAY),
+                    ("dst_network=192.168.0.128/25, protocol=ip", _DELAY),
+                    ("dst_network=192.168.1.0/24, protocol=ip", _DELAY),
+                    ("dst_network=10.0.0.0/8, protocol=ip", _LOSS),
+                ],
+                [
+                    ("dst_network=192.168.0.0/23, protocol=ip", _DELAY),
+                    ("dst_network=10.0.0.0/8, protocol=ip", _LOSS),
+                ],
+            ],
+            [
+                # overlapping networks
+                [
+                    ("dst_network=10.0.0.0/8, dst_port=80, protocol=ip", _DELAY),
+                    ("dst_network=10.1.0.0/16, dst_port=80, protocol=ip", _DELAY),
+                    ("dst_network=172.16.0.0/12, dst_port=80, protocol=ip", _DELAY),
+                ],
+                [
+                    ("dst_network=10.0.0.0/8, dst_port=80, protocol=ip", _DELAY),
+                    ("dst_network=172.16.0.0/12, dst_port=80, protocol=ip", _DELAY),
+                ],
+            ],
+            [
+                # per class parameters
+                [
+                    ("dst_network=192.168.0.0/25, protocol=ip", _RATE),
+                    ("dst_network=192.168.0.128/25, protocol=ip", _RATE),
+                ],
+                [
+                    ("dst_network=192.168.0.0/25, protocol=ip", _RATE),
+                    ("dst_network=192.168.0.128/25, protocol=ip", _RATE),
+                ],
+            ],
+            [
+                # a rule of other parameters overlaps with the merged network
+                [
+                    ("dst_network=192.168.0.0/25, protocol=ip", _DELAY),
+                    ("dst_network=192.168.0.128/26, protocol=ip", _LOSS),
+                    ("dst_network=192.168.0.128/25, protocol=ip", _DELAY),
+                ],
+                [
+                    ("dst_network=192.168.0.0/25, protocol=ip", _DELAY),
+                    ("dst_network=192.168.0.128/26, protocol=ip", _LOSS),
+                    ("dst_network=192.168.0.128/25, protocol=ip", _DELAY),
+                ],
+            ],
+            [
+                # the other conditions differ
+                [
+                    ("dst_network=192.168.0.0/25, dst_port=80, protocol=ip", _DELAY),
+                    ("dst_network=192.168.0.128/25, dst_port=443, protocol=ip", _DELAY),
+                    ("dst_network=2001:db8::/33, protocol=ipv6", _DELAY),
+                    ("dst_network=2001:db8:8000::/33, protocol=ipv6", _DELAY),
+                ],
+                [
+                    ("dst_network=192.168.0.0/25, dst_port=80, protocol=ip", _DELAY),
+                    ("dst_network=192.168.0.128/25, dst_port=443, protocol=ip", _DELAY),
+                    ("dst_network=2001:db8::/32, protocol=ipv6", _DELAY),
+                ],
+            ],
+        ],
+    )
+    def test_normal(self, rules, expected):
+        compiled = ShapingRuleCompiler(logger).compile(dict(rules))
+
+        assert list(compiled.items()) == expected
+
+    def test_normal_shadowed(self):
+        rules = [
+            ("dst_network=10.0.0.0/8, protocol=ip", _DELAY),
+            ("dst_network=10.1.0.0/16, dst_port=80, protocol=ip", _LOSS),
+            ("dst_network=10.2.0.0/16, dst_port=1000-2000, protocol=ip", _LOSS),
+        ]
+
+        # a rule shadowed by a rule of different parameters is kept.
+        # flower rules are evaluated after u32 rules.
+        assert list(ShapingRuleCompiler(logger).compile(dict(rules)).items()) == rules
+
+    def test_normal_filter_id(self):
+        rules = {
+            "dst_network=192.168.0.0/25, protocol=ip": {"filter_id": "800::800", **_DELAY},
+            "dst_network=192.168.0.128/25, protocol=ip": {"filter_id": "800::801", **_DELAY},
+        }
+
+        assert list(ShapingRuleCompiler(logger).compile(rules)) == [
+            "dst_network=192.168.0.0/24, protocol=ip"
+        ]
@@ -0,0 +1,254 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import pytest
+
+import tcconfig._tc_backend
+from tcconfig._const import TcBackend
+from tcconfig._error import TcAlreadyExist, TcCommandExecutionError
+from tcconfig._tc_backend import (
+    BatchBackend,
+    CommandResult,
+    SubprocessBackend,
+    get_tc_backend,
+    set_tc_backend,
+)
+
+from .common import SubprocessRunnerStub
+
+
+class BackendStub(SubprocessBackend):
+    def __init__(self):
+        self.commands = []
+
+    @property
+    def name(self):
+        return "stub"
+
+    def run(self, command, error_log_level=None, result_handler=None):
+        self.commands.append(command)
+
+        return self._handle_result(
+            CommandResult(returncode=1, stdout="", stderr=""), result_handler
+        )
+
+
+class Test_set_tc_backend:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [TcBackend.SUBPROCESS, SubprocessBackend],
+            [TcBackend.BATCH, BatchBackend],
+        ],
+    )
+    def test_normal(self, value, expected):
+        try:
+            assert isinstance(set_tc_backend(value), expected)
+            assert get_tc_backend().name == value
+        finally:
+            set_tc_backend(TcBackend.SUBPROCESS)
+
+    def test_exception(self):
+        with pytest.raises(ValueError):
+            set_tc_backend("not-exist")
+
+
+class Test_BatchBackend_run:
+    def test_normal_queue(self):
+        fallback = BackendStub()
+        backend = BatchBackend(fallback=fallback)
+
+        result = backend.run(
+            "/usr/sbin/tc qdisc add dev eth0 root handle 1a1a: htb default 1",
+            result_handler=lambda result: 3,
+        )
+
+        assert result.returncode == 0
+        assert fallback.commands == []
+
+    def test_normal_fallback(self):
+        fallback = BackendStub()
+        backend = BatchBackend(fallback=fallback)
+
+        result = backend.run("ip link set dev ifb0 up", result_handler=lambda result: 3)
+
+        assert result.returncode == 3
+        assert fallback.commands == ["ip link set dev ifb0 up"]
+
+
+class BatchRunnerStub(SubprocessRunnerStub):
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = errors
+
+    @property
+    def batch_inputs(self):
+        return [input.splitlines() for input in self.inputs]
+
+    def get_result(self, command):
+        if not command.endswith(" -batch -"):
+            return (0, "")
+
+        # tc -batch stops at the first failed line
+        for line_no, line in enumerate(self.inputs[-1].splitlines(), start=1):
+            if line in self.errors:
+                return (1, "", f"{self.errors[line]}\nCommand failed -:{line_no:d}\n")
+
+        return (0, "", "")
+
+
+class Test_BatchBackend_sync:
+    QDISC = "qdisc add dev eth0 root handle 1a1a: htb default 1"
+    CLASS = "class add dev eth0 parent 1a1a: classid 1a1a:2 htb rate 1000Kbit"
+    FILTER = "filter add dev eth0 protocol ip parent 1a1a: prio 5 u32 flowid 1a1a:2"
+
+    @pytest.fixture
+    def runner_stub(self, request, monkeypatch):
+        runner_stub = BatchRunnerStub(getattr(request, "param", {}))
+        monkeypatch.setattr(tcconfig._tc_backend.spr, "SubprocessRunner", runner_stub)
+
+        return runner_stub
+
+    def run(self, backend, tc_args, results, handler_result=0):
+        def handle_result(result):
+            results.append((tc_args, result.returncode))
+
+            if isinstance(handler_result, Exception):
+                raise handler_result
+
+            return handler_result if result.returncode != 0 else 0
+
+        backend.run(f"/sbin/tc {tc_args:s}", result_handler=handle_result)
+
+    def test_normal(self, runner_stub):
+        backend = BatchBackend(fallback=BackendStub())
+        results = []
+
+        for tc_args in [self.QDISC, self.CLASS, self.FILTER]:
+            self.run(backend, tc_args, results)
+        backend.flush()
+
+        assert runner_stub.batch_inputs == [[self.QDISC, self.CLASS, self.FILTER]]
+        assert "-force" not in runner_stub.commands[-1]
+        assert results == [(self.QDISC, 0), (self.CLASS, 0), (self.FILTER, 0)]
+
+    @pytest.mark.parametrize(
+        ["runner_stub", "handler_result"],
+        [
+            [{CLASS: "Error: Invalid handle."}, 2],
+            [{CLASS: "Error: Invalid handle."}, TcCommandExecutionError("invalid handle")],
+        ],
+        indirect=["runner_stub"],
+    )
+    def test_abnormal_abort(self, runner_stub, handler_result):
+        backend = BatchBackend(fallback=BackendStub())
+        results = []
+
+        self.run(backend, self.QDISC, results)
+        self.run(backend, self.CLASS, results, handler_result=handler_result)
+        self.run(backend, self.FILTER, results)
+        backend.sync()
+
+        # lines after the failed line are not executed
+        assert runner_stub.batch_inputs == [[self.QDISC, self.CLASS, self.FILTER]]
+        assert results == [(self.QDISC, 0), (self.CLASS, 2)]
+
+        # lines queued after the failure are dropped until the error is raised
+        self.run(backend, self.FILTER, results)
+        with pytest.raises(TcCommandExecutionError):
+            backend.flush()
+        assert len(runner_stub.batch_inputs) == 1
+
+        self.run(backend, self.FILTER, results)
+        backend.flush()
+        assert runner_stub.batch_inputs[1:] == [[self.FILTER]]
+
+    @pytest.mark.parametrize(
+        ["runner_stub"], [[{QDISC: "RTNETLINK answers: File exists"}]], indirect=True
+    )
+    def test_normal_already_exist(self, runner_stub):
+        backend = BatchBackend(fallback=BackendStub())
+        results = []
+
+        self.run(backend, self.QDISC, results, handler_result=TcAlreadyExist("exists"))
+        self.run(backend, self.CLASS, results)
+        self.run(backend, self.FILTER, results)
+
+        with pytest.raises(TcAlreadyExist):
+            backend.flush()
+
+        # the rest of the lines are executed by another batch
+        assert runner_stub.batch_inputs == [
+            [self.QDISC, self.CLASS, self.FILTER],
+            [self.CLASS, self.FILTER],
+        ]
+        assert results == [(self.QDISC, 2), (self.CLASS, 0), (self.FILTER, 0)]
+
+    def test_normal_discard(self, runner_stub):
+        backend = BatchBackend(fallback=BackendStub())
+        results = []
+
+        self.run(backend, self.QDISC, results)
+        backend.discard()
+        backend.flush()
+
+        assert runner_stub.batch_inputs == []
+        assert results == []
+
+        self.run(backend, self.CLASS, results)
+        backend.flush()
+
+        assert runner_stub.batch_inputs == [[self.CLASS]]
+
+    @pytest.mark.parametrize(
+        ["runner_stub"],
+        [[{"qdisc del dev ifb0 root": "Error: Cannot delete qdisc with handle of zero."}]],
+        indirect=True,
+    )
+    def test_normal_delete(self, runner_stub):
+        backend = BatchBackend(fallback=BackendStub())
+
+        backend.run("/sbin/tc qdisc del dev ifb0 root")
+        backend.run(f"/sbin/tc {self.QDISC:s}")
+        backend.flush()
+
+        assert runner_stub.batch_inputs == [["qdisc del dev ifb0 root", self.QDISC], [self.QDISC]]
+
+
+class Test_BatchBackend_parse_batch_errors:
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            ["", {}],
+            [
+                "Error: Exclusivity flag on, cannot modify.\nCommand failed -:1\n",
+                {1: "Error: Exclusivity flag on, cannot modify."},
+            ],
+            [
+                "\n".join(
+                    [
+                        "RTNETLINK answers: File exists",
+                        "Command failed -:2",
+                        "Warning: sch_htb: quantum of class 1A1A0002 is big. Consider r2q change.",
+                        "Error: Invalid handle.",
+                        "We have an error talking to the kernel",
+                        "Command failed -:5",
+                    ]
+                ),
+                {
+                    2: "RTNETLINK answers: File exists",
+                    5: "\n".join(
+                        [
+                            "Warning: sch_htb: quantum of class 1A1A0002 is big. "
+                            "Consider r2q change.",
+                            "Error: Invalid handle.",
+                            "We have an error talking to the kernel",
+                        ]
+                    ),
+                },
+            ],
+        ],
+    )
+    def test_normal(self, value, expected):
+        assert BatchBackend.parse_batch_errors(value) == expected
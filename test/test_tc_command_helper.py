@@ -5,8 +5,12 @@
 import pytest
 
 import tcconfig._common
+import tcconfig._tc_command_helper
 from tcconfig._const import TcSubCommand
-from tcconfig._tc_command_helper import get_tc_base_command
+from tcconfig._tc_command_helper import get_tc_base_command, run_show_command
+from tcconfig._tc_snapshot import clear_snapshot, invalidate_snapshot
+
+from .common import SubprocessRunnerStub
 
 
 class Test_get_tc_base_command:
@@ -29,3 +33,61 @@ class Test_get_tc_base_command:
     def test_exception(self, subcommand, expected):
         with pytest.raises(expected):
             get_tc_base_command(subcommand)
+
+
+class CountingRunnerStub(SubprocessRunnerStub):
+    def get_result(self, command):
+        # outputs differ for each execution of the commands
+        return (0, f"output {len(self.commands):d}")
+
+
+class Test_run_show_command:
+    @pytest.fixture(autouse=True)
+    def runner_stub(self, monkeypatch):
+        runner_stub = CountingRunnerStub()
+        monkeypatch.setattr(tcconfig._tc_command_helper.spr, "SubprocessRunner", runner_stub)
+        clear_snapshot()
+        yield runner_stub
+        clear_snapshot()
+
+    def test_normal(self, runner_stub):
+        command = "tc qdisc show dev eth0"
+
+        assert run_show_command("eth0", command).stdout == "output 1"
+        assert run_show_command("eth0", command).stdout == "output 1"
+        assert run_show_command("eth1", "tc qdisc show dev eth1").stdout == "output 2"
+        assert runner_stub.commands == [command, "tc qdisc show dev eth1"]
+
+    @pytest.mark.parametrize(
+        ["write_command", "expected"],
+        [
+            ["tc qdisc add dev eth0 root handle 1a1a: htb default 1", ["output 3", "output 2"]],
+            ["tc qdisc add dev eth1 root handle 1a1a: htb default 1", ["output 1", "output 3"]],
+            [
+                "tc filter add dev eth0 parent ffff: protocol ip u32 match u32 0 0 "
+                "flowid 1a1a: action mirred egress redirect dev eth1",
+                ["output 3", "output 4"],
+            ],
+            ["ip link add ifb0 type ifb", ["output 3", "output 4"]],
+        ],
+    )
+    def test_normal_invalidate(self, write_command, expected):
+        commands = ["tc qdisc show dev eth0", "tc qdisc show dev eth1"]
+        for device, command in zip(["eth0", "eth1"], commands):
+            run_show_command(device, command)
+
+        invalidate_snapshot(write_command)
+
+        assert [
+            run_show_command(device, command).stdout
+            for device, command in zip(["eth0", "eth1"], commands)
+        ] == expected
+
+    def test_normal_dry_run(self, runner_stub):
+        runner_stub.default_is_dry_run = True
+        command = "tc qdisc show dev eth0"
+
+        run_show_command("eth0", command)
+        run_show_command("eth0", command)
+
+        assert runner_stub.commands == [command, command]
@@ -2,6 +2,7 @@
 .. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
 """
 
+import errno
 import json
 
 import pytest
@@ -18,6 +19,27 @@ def device_value(request):
     return request.config.getoption("--device")
 
 
+class Test_tcshow_match:
+    @pytest.mark.parametrize(
+        ["options", "expected"],
+        [
+            [["--match", "dst=2001:db8::1"], "IPv6 flows require --ipv6 option"],
+            [
+                ["--match", "dst=10.0.0.5", "--ipv6"],
+                "IPv4 flows can not be used with --ipv6 option",
+            ],
+        ],
+    )
+    def test_abnormal_ip_version(self, options, expected):
+        # the IP version of a flow is verified before the device is accessed
+        runner = SubprocessRunner([Tc.Command.TCSHOW, "lo"] + options)
+        runner.run()
+
+        print_test_result(expected=expected, actual=runner.stdout, error=runner.stderr)
+        assert runner.returncode == errno.EINVAL
+        assert expected in runner.stderr
+
+
 class Test_tcshow:
     """
     Tests in this class are not executable on CI services.
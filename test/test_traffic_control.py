@@ -8,7 +8,15 @@ import pytest
 from allpairspy import AllPairs
 from humanreadable import ParameterError
 
-from tcconfig._const import ShapingAlgorithm, Tc, TrafficDirection
+import tcconfig._tc_backend
+from tcconfig._const import (
+    MarkBackend,
+    ShapingAlgorithm,
+    Tc,
+    TcBackend,
+    TcCommandOutput,
+    TrafficDirection,
+)
 from tcconfig._netem_param import (
     MAX_CORRUPTION_RATE,
     MAX_PACKET_DUPLICATE_RATE,
@@ -20,9 +28,10 @@ from tcconfig._netem_param import (
     MIN_REORDERING_RATE,
     NetemParameter,
 )
+from tcconfig._tc_backend import get_tc_backend, set_tc_backend
 from tcconfig.traffic_control import TrafficControl
 
-from .common import is_invalid_param
+from .common import SubprocessRunnerStub, is_invalid_param
 
 
 MIN_VALID_PACKET_LOSS = 0.0000000232  # [%]
@@ -331,6 +340,45 @@ class Test_TrafficControl_validate:
             tc_obj.validate()
 
 
+class Test_TrafficControl_validate_mark_backend:
+    @pytest.mark.parametrize(
+        ["mark_backend", "is_enable_iptables", "value"],
+        [
+            [MarkBackend.NFTABLES, True, {}],
+            [MarkBackend.IPTABLES, True, {"dst_port": 80}],
+            [MarkBackend.NFTABLES, False, {"dst_port": 80}],
+        ],
+    )
+    def test_normal(self, mark_backend, is_enable_iptables, value):
+        self.make_tc_obj(mark_backend, is_enable_iptables, value).validate()
+
+    @pytest.mark.parametrize(
+        ["value"],
+        [
+            [{"src_port": 80}],
+            [{"dst_port": 80}],
+            [{"exclude_src_port": 80}],
+            [{"exclude_dst_port": 80}],
+        ],
+    )
+    def test_exception(self, value):
+        with pytest.raises(ParameterError):
+            self.make_tc_obj(MarkBackend.NFTABLES, True, value).validate()
+
+    @staticmethod
+    def make_tc_obj(mark_backend, is_enable_iptables, value):
+        return TrafficControl(
+            device="eth0",
+            netem_param=NetemParameter(device="eth0", bandwidth_rate="1Mbps"),
+            dst_network="192.168.0.0/24",
+            shaping_algorithm=ShapingAlgorithm.HTB,
+            is_enable_iptables=is_enable_iptables,
+            mark_backend=mark_backend,
+            tc_command_output=TcCommandOutput.STDOUT,
+            **value,
+        )
+
+
 class Test_TrafficControl_ipv4:
     @pytest.mark.parametrize(
         [
@@ -374,3 +422,34 @@ class Test_TrafficControl_ipv4:
         assert tc_obj.ip_version == expected_ip_ver
         assert tc_obj.protocol == expected_protocol
         assert tc_obj.protocol_match == expected_protocol_match
+
+
+class Test_TrafficControl_set_shaping_rule:
+    @pytest.fixture
+    def batch_backend(self):
+        yield set_tc_backend(TcBackend.BATCH)
+        set_tc_backend(TcBackend.SUBPROCESS)
+
+    def test_abnormal_iptables(self, monkeypatch, batch_backend):
+        runner_stub = SubprocessRunnerStub()
+        monkeypatch.setattr(tcconfig._tc_backend.spr, "SubprocessRunner", runner_stub)
+
+        tc_obj = TrafficControl(
+            device="eth0",
+            netem_param=NetemParameter(device="eth0", bandwidth_rate="1Mbps"),
+            shaping_algorithm=ShapingAlgorithm.HTB,
+            is_enable_iptables=True,
+        )
+
+        def set_shaping():
+            batch_backend.run("/sbin/tc qdisc add dev eth0 root handle 1a1a: htb default 1")
+            return 0
+
+        monkeypatch.setattr(tc_obj._TrafficControl__shaper, "set_shaping", set_shaping)
+        monkeypatch.setattr(tc_obj.iptables_ctrl, "flush", lambda: 4)
+
+        assert tc_obj.set_shaping_rule() == 4
+
+        # tc commands are not applied when the mark entries failed to be added
+        get_tc_backend().flush()
+        assert not [command for command in runner_stub.commands if " -batch " in command]
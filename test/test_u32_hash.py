@@ -0,0 +1,160 @@
+"""
+.. codeauthor:: Tsuyoshi Hombashi <tsuyoshi.hombashi@gmail.com>
+"""
+
+import pytest
+import subprocrunner as spr
+
+import tcconfig._network
+from tcconfig._const import ShapingAlgorithm, TcSubCommand, TrafficDirection
+from tcconfig._netem_param import NetemParameter
+from tcconfig._tc_snapshot import clear_snapshot
+from tcconfig.shaper._u32_hash import (
+    HASH_KEYS,
+    clear_created_hash_tables,
+    find_hash_bucket,
+    find_root_hash_table_id,
+    make_hash_link_command,
+    make_hash_table_command,
+)
+from tcconfig.traffic_control import TrafficControl
+
+from .common import SubprocessRunnerStub
+
+
+_DST_KEY, _SRC_KEY, _DPORT_KEY, _SPORT_KEY = HASH_KEYS
+_FILTER_COMMAND = "tc filter add dev eth0 protocol ip parent 1a1a: prio 5"
+
+# u32 filters of two priorities: an exclude filter of prio 1 and a hashed filter of prio 5
+_TWO_PRIO_FILTER_OUTPUT = """\
+filter parent 1a1a: protocol ip pref 1 u32 chain 0
+filter parent 1a1a: protocol ip pref 1 u32 chain 0 fh 800: ht divisor 1
+filter parent 1a1a: protocol ip pref 1 u32 chain 0 fh 800::800 order 2048 key ht 800 bkt 0 flowid 1a1a:1 not_in_hw
+  match c0a80a00/ffffff00 at 16
+filter parent 1a1a: protocol ip pref 5 u32 chain 0
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 105: ht divisor 256
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 801: ht divisor 1
+filter parent 1a1a: protocol ip pref 5 u32 chain 0 fh 801::ffc order 4092 key ht 801 bkt 0 link 105: not_in_hw
+  match 00000000/00000000 at 16
+    hash mask 0000ff00 at 16
+"""
+
+
+class Test_find_hash_bucket:
+    @pytest.mark.parametrize(
+        ["params", "expected"],
+        [
+            [{"dst_network": "192.168.42.0/24"}, (_DST_KEY, 0x105, 0x2A)],
+            [{"dst_network": "192.168.42.7/32"}, (_DST_KEY, 0x105, 0x2A)],
+            [
+                {"dst_network": "0.0.0.0/0", "src_network": "10.0.255.0/24"},
+                (_SRC_KEY, 0x205, 0xFF),
+            ],
+            [{"dst_network": "192.168.0.0/16", "dst_port": 8080}, (_DPORT_KEY, 0x305, 0x90)],
+            [{"dst_network": "0.0.0.0/0", "src_port": 0x1234}, (_SPORT_KEY, 0x405, 0x34)],
+            [{"dst_network": "192.168.0.0/16"}, None],
+            [{"dst_network": "0.0.0.0/0", "src_network": "10.0.0.0/8"}, None],
+            [{}, None],
+        ],
+    )
+    def test_normal(self, params, expected):
+        hash_bucket = find_hash_bucket(5, **params)
+
+        if expected is None:
+            assert hash_bucket is None
+        else:
+            assert tuple(hash_bucket) == expected
+
+
+class Test_find_root_hash_table_id:
+    @pytest.mark.parametrize(
+        ["filter_output", "parent", "priority", "expected"],
+        [
+            [_TWO_PRIO_FILTER_OUTPUT, "1a1a:", 1, 0x800],
+            [_TWO_PRIO_FILTER_OUTPUT, "1a1a:", 5, 0x801],
+            [_TWO_PRIO_FILTER_OUTPUT, "1a1a:", 6, None],
+            [_TWO_PRIO_FILTER_OUTPUT, "1b1b:", 5, None],
+            [
+                # output of older iproute2
+                "filter parent 1a1a: protocol ip pref 5 u32 fh 802: ht divisor 1\n",
+                "1a1a:",
+                5,
+                0x802,
+            ],
+            ["", "1a1a:", 5, None],
+        ],
+    )
+    def test_normal(self, filter_output, parent, priority, expected):
+        assert find_root_hash_table_id(filter_output, parent, priority) == expected
+
+
+class Test_make_hash_table_command:
+    def test_normal(self):
+        hash_bucket = find_hash_bucket(5, dst_network="192.168.42.0/24")
+
+        assert (
+            make_hash_table_command(_FILTER_COMMAND, hash_bucket)
+            == f"{_FILTER_COMMAND} handle 105: u32 divisor 256"
+        )
+
+
+class Test_make_hash_link_command:
+    @pytest.mark.parametrize(
+        ["root_hash_table_id", "expected"],
+        [
+            [
+                0x800,
+                f"{_FILTER_COMMAND} handle 800::ffc u32 ht 800: match u32 0 0 at 16 "
+                "hashkey mask 0x0000ff00 at 16 link 105:",
+            ],
+            [
+                0x801,
+                f"{_FILTER_COMMAND} handle 801::ffc u32 ht 801: match u32 0 0 at 16 "
+                "hashkey mask 0x0000ff00 at 16 link 105:",
+            ],
+        ],
+    )
+    def test_normal(self, root_hash_table_id, expected):
+        hash_bucket = find_hash_bucket(5, dst_network="192.168.42.0/24")
+
+        assert make_hash_link_command(_FILTER_COMMAND, hash_bucket, root_hash_table_id) == expected
+
+
+class Test_setup_u32_hash_table:
+    def test_normal_two_prios(self, monkeypatch):
+        tc_obj = TrafficControl(
+            device="eth0",
+            direction=TrafficDirection.OUTGOING,
+            netem_param=NetemParameter(device="eth0", bandwidth_rate="1Mbps"),
+            dst_network="192.168.42.0/24",
+            shaping_algorithm=ShapingAlgorithm.HTB,
+            is_enable_u32_hash=True,
+        )
+        filter_output = _TWO_PRIO_FILTER_OUTPUT.replace("1a1a:", f"{tc_obj.qdisc_major_id_str}:")
+        runner_stub = SubprocessRunnerStub({"filter show dev eth0": (0, filter_output)})
+        monkeypatch.setattr(spr, "SubprocessRunner", runner_stub)
+        monkeypatch.setattr(tcconfig._network, "verify_network_interface", lambda *args: None)
+        clear_created_hash_tables()
+
+        filter_command = " ".join(
+            [
+                tc_obj.get_tc_command(TcSubCommand.FILTER),
+                "dev eth0 protocol ip",
+                f"parent {tc_obj.qdisc_major_id_str}:",
+                "prio 5",
+            ]
+        )
+
+        try:
+            hash_bucket = tc_obj._TrafficControl__shaper._AbstractShaper__setup_u32_hash_table(
+                filter_command, tc_obj.dst_network
+            )
+        finally:
+            clear_created_hash_tables()
+            clear_snapshot()
+
+        # the link is created in the root hash table of prio 5 rather than that of prio 1
+        assert [command for command in runner_stub.commands if " add " in command] == [
+            make_hash_table_command(filter_command, hash_bucket),
+            make_hash_link_command(filter_command, hash_bucket, 0x801),
+        ]